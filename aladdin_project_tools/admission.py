@@ -0,0 +1,361 @@
+"""
+Admission control for component builds, based on their CPU and memory needs.
+
+Builds started by separate ``components`` invocations, or by concurrent builds within one, can
+easily add up to more than a laptop can take, while a plain limit on the number of builds wastes
+the capacity of a large CI host. Instead, every build declares the CPUs and memory it is expected
+to use, and waits until the builds already running, across every ``components`` process using the
+same cache directory, leave enough of the budget for it. A build is always admitted when nothing
+else is running, even if it needs more than the whole budget.
+
+A component's expected usage comes from the ``build`` hints in its component.yaml file, e.g.
+
+.. code-block:: yaml
+
+    build:
+      cpus: 2
+      memory: 3g
+
+or else from the peak usage measured during its recent builds. Usage is measured from the whole
+machine's load while the build runs, on Linux only, so it's only recorded for builds that no other
+admitted build overlapped, and it still errs on the high side when other work is running at the
+same time.
+
+The budget defaults to all of the CPUs and three quarters of the memory of the machine. Every
+admission decision is appended to ``admission/decisions.log`` in the cache directory, as a JSON
+object per line, to help tune the hints and budgets.
+"""
+import contextlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+
+from . import locks
+from .cache import get_cache_dir
+
+CPUS_ENVVAR = "COMPONENTS_BUILD_CPUS"
+MEMORY_ENVVAR = "COMPONENTS_BUILD_MEMORY"
+
+DEFAULT_CPUS = 1.0
+DEFAULT_MEMORY = 1 << 30
+MINIMUM_CPUS = 0.25
+MINIMUM_MEMORY = 256 << 20
+HISTORY_SIZE = 5
+POLL_INTERVAL = 1.0
+SAMPLE_INTERVAL = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+class Resources(NamedTuple):
+    """An amount of CPUs and memory."""
+
+    cpus: float
+    memory: int
+
+    def __str__(self) -> str:
+        return f"{self.cpus:g} CPUs, {self.memory / (1 << 30):.1f} GB"
+
+
+def parse_memory(value) -> int:
+    """
+    Parse an amount of memory.
+
+    :param value: A number of bytes, or a number with a ``k``, ``m`` or ``g`` suffix.
+    :returns: The number of bytes.
+    """
+    match = re.fullmatch(r"\s*([\d.]+)\s*([kmg]?)b?\s*", str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid amount of memory: {value}")
+    return int(float(match.group(1)) * 1024 ** " kmg".index(match.group(2).lower() or " "))
+
+
+def get_budget(cpus: float = None, memory=None) -> Resources:
+    """
+    Get the resources that concurrent builds may use between them.
+
+    :param cpus: The number of CPUs, defaults to the ``COMPONENTS_BUILD_CPUS`` environment variable
+                 or the number of CPUs of the machine.
+    :param memory: The amount of memory, defaults to the ``COMPONENTS_BUILD_MEMORY`` environment
+                   variable or three quarters of the machine's memory.
+    :returns: The budget.
+    """
+    cpus = cpus or os.environ.get(CPUS_ENVVAR) or os.cpu_count() or 1
+    memory = memory or os.environ.get(MEMORY_ENVVAR)
+    if not memory:
+        try:
+            memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") * 3 // 4
+        except (ValueError, OSError, AttributeError):
+            memory = 8 << 30
+    return Resources(float(cpus), parse_memory(memory))
+
+
+def get_demand(component: str, component_config: Optional[dict]) -> Resources:
+    """
+    Get the resources a component's build is expected to use.
+
+    :param component: The component.
+    :param component_config: The component's component.yaml contents.
+    :returns: The ``build`` hints from component.yaml, falling back to the peak measured usage of
+              its recent builds (but no less than the minimums), or else the defaults.
+    """
+    hints = (component_config or {}).get("build") or {}
+    history = _load_json(get_cache_dir("admission") / "history.json", {}).get(component, [])
+
+    if history:
+        # Measurements of quick builds may come out close to nothing
+        measured = Resources(
+            max(MINIMUM_CPUS, *(entry["cpus"] for entry in history)),
+            max(MINIMUM_MEMORY, *(entry["memory"] for entry in history)),
+        )
+    else:
+        measured = Resources(DEFAULT_CPUS, DEFAULT_MEMORY)
+    return Resources(
+        float(hints.get("cpus") or measured.cpus),
+        parse_memory(hints.get("memory") or measured.memory),
+    )
+
+
+def add(*resources: Resources) -> Resources:
+    """
+    Add up amounts of resources.
+
+    :param resources: The amounts.
+    :returns: The total.
+    """
+    return Resources(
+        sum(resource.cpus for resource in resources), sum(resource.memory for resource in resources)
+    )
+
+
+@contextlib.contextmanager
+def admitted(
+    name: str, demand: Resources, budget: Resources, components: Sequence[str] = ()
+) -> Iterator[None]:
+    """
+    Wait until a build fits within the budget, and hold its share of the budget while it runs.
+
+    :param name: The name of the build, for the decision log.
+    :param demand: The resources the build is expected to use.
+    :param budget: The resources that concurrent builds may use between them.
+    :param components: The components being built. If there is just one, and no other build ran
+                       alongside it, the usage measured during the build is recorded for it.
+    """
+    token = f"{os.getpid()}-{threading.get_ident()}-{time.monotonic()}"
+    waited = 0.0
+    while True:
+        with _ledger() as ledger:
+            running = add(*(Resources(entry["cpus"], entry["memory"]) for entry in ledger.values()))
+            projected = add(running, demand)
+            fits = projected.cpus <= budget.cpus and projected.memory <= budget.memory
+            if fits or not ledger:
+                # Whole-machine usage can't be told apart between builds that overlap
+                for entry in ledger.values():
+                    entry["alone"] = False
+                ledger[token] = dict(
+                    pid=os.getpid(),
+                    name=name,
+                    cpus=demand.cpus,
+                    memory=demand.memory,
+                    alone=not ledger,
+                )
+                break
+
+        if not waited:
+            logger.info(
+                "Waiting to build %s (%s): %d build(s) running would bring usage to %s of %s",
+                name,
+                demand,
+                len(ledger),
+                projected,
+                budget,
+            )
+            _log_decision("waiting", name, demand, running, budget)
+        time.sleep(POLL_INTERVAL)
+        waited += POLL_INTERVAL
+
+    decision = "admitted" if fits else "admitted-over-budget"
+    logger.debug("Admitted %s (%s); projected usage %s of %s", name, demand, projected, budget)
+    if not fits:
+        logger.warning("Building %s alone, as it needs more than the %s budget", name, budget)
+    _log_decision(decision, name, demand, running, budget, waited=waited)
+
+    sampler = _UsageSampler()
+    sampler.start()
+    try:
+        yield
+    finally:
+        measured = sampler.stop()
+        with _ledger() as ledger:
+            alone = ledger.pop(token, {}).get("alone", False)
+        _log_decision("finished", name, demand, None, budget, measured=measured)
+        if measured and alone and len(components) == 1:
+            _record_usage(components[0], measured)
+
+
+@contextlib.contextmanager
+def _ledger() -> Iterator[dict]:
+    """
+    Lock and open the ledger of the builds that are running, across processes.
+
+    Entries of processes that have exited are dropped.
+
+    :returns: The running builds, keyed by a unique token, which may be changed in place.
+    """
+    path = get_cache_dir("admission") / "ledger.json"
+    with locks.cache_locked("admission-ledger"):
+        ledger = {
+            token: entry
+            for token, entry in _load_json(path, {}).items()
+            if is_running(entry["pid"])
+        }
+        yield ledger
+        _write_json(path, ledger)
+
+
+def is_running(pid: int) -> bool:
+    """
+    Determine whether a process is still running.
+
+    :param pid: The process ID.
+    :returns: Whether it's running.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _record_usage(component: str, measured: Resources) -> None:
+    """
+    Remember the usage measured during a component's build.
+
+    :param component: The component.
+    :param measured: The measured peak usage.
+    """
+    path = get_cache_dir("admission") / "history.json"
+    with locks.cache_locked("admission-history"):
+        history = _load_json(path, {})
+        entries = history.setdefault(component, [])
+        entries.append(dict(cpus=measured.cpus, memory=measured.memory, time=time.time()))
+        del entries[:-HISTORY_SIZE]
+        _write_json(path, history)
+
+
+def _log_decision(
+    decision: str,
+    name: str,
+    demand: Resources,
+    running: Optional[Resources],
+    budget: Resources,
+    **details,
+) -> None:
+    """
+    Append an admission decision to the decision log.
+
+    :param decision: What was decided.
+    :param name: The name of the build.
+    :param demand: The resources the build is expected to use.
+    :param running: The resources used by the other builds that were running.
+    :param budget: The budget.
+    :param details: Any other details.
+    """
+    record = dict(
+        time=time.time(),
+        pid=os.getpid(),
+        decision=decision,
+        build=name,
+        demand=demand._asdict(),
+        running=running._asdict() if running else None,
+        budget=budget._asdict(),
+        **{
+            key: value._asdict() if isinstance(value, Resources) else value
+            for key, value in details.items()
+        },
+    )
+    with open(get_cache_dir("admission") / "decisions.log", "a") as log_file:
+        log_file.write(json.dumps(record) + "\n")
+
+
+class _UsageSampler(threading.Thread):
+    """
+    Measure the machine's peak CPU and memory usage above what it was when sampling started.
+
+    This relies on ``/proc``, so nothing is measured on other platforms.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self._stopped = threading.Event()
+        self._baseline = _read_usage()
+        self._peak_memory = 0
+        self._peak_cpus = 0.0
+
+    def run(self) -> None:
+        previous = self._baseline
+        while previous and not self._stopped.wait(SAMPLE_INTERVAL):
+            current = _read_usage()
+            if not current:
+                break
+            self._peak_memory = max(self._peak_memory, current[0] - self._baseline[0])
+            elapsed = current[2] - previous[2]
+            if elapsed > 0:
+                self._peak_cpus = max(self._peak_cpus, (current[1] - previous[1]) / elapsed)
+            previous = current
+
+    def stop(self) -> Optional[Resources]:
+        """
+        Stop sampling.
+
+        :returns: The peak usage, or ``None`` if it could not be measured.
+        """
+        self._stopped.set()
+        self.join()
+        if not self._baseline or not self._peak_cpus:
+            return None
+        return Resources(round(self._peak_cpus, 2), self._peak_memory)
+
+
+def _read_usage() -> Optional[List[float]]:
+    """
+    Read the machine's memory in use and the CPU time spent busy so far.
+
+    :returns: The memory in use in bytes, the busy CPU time in seconds and the sampling time, or
+              ``None`` if ``/proc`` is not available.
+    """
+    try:
+        with open("/proc/meminfo") as meminfo_file:
+            meminfo = dict(
+                (line.split(":")[0], int(line.split()[1]) * 1024) for line in meminfo_file
+            )
+        with open("/proc/stat") as stat_file:
+            cpu_times = [int(value) for value in stat_file.readline().split()[1:]]
+    except (OSError, ValueError, IndexError):
+        return None
+
+    # All of the CPU time other than idle and iowait
+    busy = (sum(cpu_times) - sum(cpu_times[3:5])) / os.sysconf("SC_CLK_TCK")
+    used = meminfo["MemTotal"] - meminfo.get("MemAvailable", meminfo["MemTotal"])
+    return [used, busy, time.monotonic()]
+
+
+def _load_json(path, default):
+    """Load a JSON file, or return the default if it's missing or invalid."""
+    try:
+        with open(path) as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return default
+
+
+def _write_json(path, data) -> None:
+    """Write a JSON file atomically."""
+    with locks.atomic_write(path) as json_file:
+        json.dump(data, json_file)
@@ -0,0 +1,318 @@
+"""
+Export and import of build artifacts, for machines that start with cold caches.
+
+An export directory holds everything needed to warm up another machine's caches:
+
+* The component images, as saved by ``docker save``.
+* The tools' own cache directory, including the BuildKit cache exported by
+  ``components cache export`` and the wheelhouse.
+
+The directory is content-addressed. Every file, including each file inside the ``docker save``
+archives, is stored once under ``blobs/sha256/<digest>``, and ``manifest.json`` records how to put
+them back together. Layers shared by many component images are therefore only stored once, and
+exporting into the same directory again only writes the blobs that changed, so the directory can be
+kept between CI jobs with any cache mechanism that saves a plain directory.
+
+Importing restores only the missing pieces: images that are already present with the same ID are
+not loaded again, and existing cache files are left alone.
+
+An export holds an exclusive lock on the export directory, and an import a shared one, so that
+concurrent jobs on the same machine never read a half-written export or lose blobs to another
+export's garbage collection.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import subprocess
+import tarfile
+import tempfile
+from typing import Dict, IO, Iterable, List, Mapping, NamedTuple
+
+from . import images as docker_images
+from . import locks
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+
+EXCLUDED_CACHE_PATHS = (
+    "build",
+    "locks",
+    "pool",
+    os.path.join("admission", "ledger.json"),
+    os.path.join("wheelhouse", "incoming"),
+)
+"""
+The cache subdirectories and files that only make sense on the machine that created them.
+"""
+
+
+class TransferSummary(NamedTuple):
+    """What an export or import did."""
+
+    images: int
+    files: int
+    blobs: int
+    bytes: int
+
+
+def export_artifacts(
+    path: pathlib.Path, image_refs: Iterable[str], cache_root: pathlib.Path
+) -> TransferSummary:
+    """
+    Export component images and the cache directory into a content-addressed directory.
+
+    Blobs that are no longer referenced by the new export are removed.
+
+    :param path: The export directory. It is created if it doesn't exist.
+    :param image_refs: The images to export. Any that are not present are skipped.
+    :param cache_root: The tools' cache directory.
+    :returns: The number of images and cache files exported, and the number and total size of the
+              blobs that had to be written.
+    """
+    with _export_locked(path):
+        blobs = _Blobs(path)
+
+        # Save each distinct image once, under all of its references
+        refs_by_id = {}
+        for ref, info in docker_images.inspect_images(image_refs).items():
+            if info:
+                refs_by_id.setdefault(info["Id"], []).append(ref)
+        image_manifests = {
+            image_id: dict(refs=refs, members=_save_image(refs, blobs))
+            for image_id, refs in refs_by_id.items()
+        }
+
+        files = {}
+        for file_path in _walk_cache(cache_root, exclude=path):
+            with open(file_path, "rb") as cache_file:
+                files[file_path.relative_to(cache_root).as_posix()] = blobs.put(cache_file)
+
+        manifest = dict(version=MANIFEST_VERSION, images=image_manifests, files=files)
+        _write_json(path / MANIFEST, manifest)
+        blobs.collect_garbage(_get_digests(manifest))
+
+        return TransferSummary(len(image_manifests), len(files), blobs.written, blobs.written_bytes)
+
+
+def import_artifacts(path: pathlib.Path, cache_root: pathlib.Path) -> TransferSummary:
+    """
+    Restore the missing images and cache files from an export directory.
+
+    :param path: The export directory.
+    :param cache_root: The tools' cache directory.
+    :returns: The number of images loaded and cache files restored, and the number and total size
+              of the blobs that were read.
+    """
+    with _export_locked(path, shared=True):
+        with open(path / MANIFEST) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported export format version: {manifest.get('version')}")
+
+        blobs = _Blobs(path)
+
+        all_refs = [ref for image in manifest["images"].values() for ref in image["refs"]]
+        present = docker_images.inspect_images(all_refs)
+        loaded = 0
+        for image_id, image in manifest["images"].items():
+            if all((present.get(ref) or {}).get("Id") == image_id for ref in image["refs"]):
+                continue
+            _load_image(image["members"], blobs)
+            loaded += 1
+
+        restored = 0
+        for relative_path, digest in manifest["files"].items():
+            file_path = cache_root / relative_path
+            if file_path.exists():
+                continue
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(blobs.get_path(digest), "rb") as blob_file, locks.atomic_write(
+                file_path, "wb"
+            ) as cache_file:
+                shutil.copyfileobj(blob_file, cache_file)
+            blobs.read(digest)
+            restored += 1
+
+        return TransferSummary(loaded, restored, blobs.read_count, blobs.read_bytes)
+
+
+class _Blobs:
+    """The content-addressed blob store of an export directory."""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path / "blobs" / "sha256"
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.written = 0
+        self.written_bytes = 0
+        self.read_count = 0
+        self.read_bytes = 0
+
+    def get_path(self, digest: str) -> pathlib.Path:
+        """
+        Get the path of a blob.
+
+        :param digest: The blob's sha256 hex digest.
+        :returns: The path.
+        """
+        return self.path / digest
+
+    def put(self, source: IO[bytes]) -> str:
+        """
+        Store a blob, unless an identical one is already stored.
+
+        :param source: The blob's content.
+        :returns: The blob's sha256 hex digest.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=self.path, prefix=".", delete=False) as temp_file:
+            for block in iter(lambda: source.read(1 << 20), b""):
+                digest.update(block)
+                temp_file.write(block)
+                size += len(block)
+
+        blob_path = self.get_path(digest.hexdigest())
+        if blob_path.exists():
+            os.unlink(temp_file.name)
+        else:
+            os.replace(temp_file.name, blob_path)
+            self.written += 1
+            self.written_bytes += size
+        return digest.hexdigest()
+
+    def read(self, digest: str) -> None:
+        """
+        Count a blob as read.
+
+        :param digest: The blob's sha256 hex digest.
+        """
+        self.read_count += 1
+        self.read_bytes += self.get_path(digest).stat().st_size
+
+    def collect_garbage(self, keep: Iterable[str]) -> None:
+        """
+        Remove every blob that is not to be kept.
+
+        :param keep: The digests of the blobs to keep.
+        """
+        keep = set(keep)
+        for blob_path in self.path.iterdir():
+            if blob_path.name not in keep:
+                blob_path.unlink()
+
+
+def _save_image(refs: List[str], blobs: _Blobs) -> List[dict]:
+    """
+    Store the contents of an image's ``docker save`` archive as blobs.
+
+    :param refs: The image's references.
+    :param blobs: The blob store.
+    :returns: The archive members, with the blob digests of the regular files.
+    """
+    ps = subprocess.Popen(["docker", "save"] + refs, stdout=subprocess.PIPE)
+    members = []
+    with tarfile.open(fileobj=ps.stdout, mode="r|") as archive:
+        for info in archive:
+            member = dict(name=info.name, type=info.type.decode(), mode=info.mode, mtime=info.mtime)
+            if info.isfile():
+                member["digest"] = blobs.put(archive.extractfile(info))
+            elif info.issym() or info.islnk():
+                member["linkname"] = info.linkname
+            members.append(member)
+    ps.stdout.close()
+    if ps.wait():
+        raise subprocess.CalledProcessError(ps.returncode, ps.args)
+    return members
+
+
+def _load_image(members: List[dict], blobs: _Blobs) -> None:
+    """
+    Rebuild an image's ``docker save`` archive from its blobs and ``docker load`` it.
+
+    :param members: The archive members.
+    :param blobs: The blob store.
+    """
+    ps = subprocess.Popen(["docker", "load"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+    with tarfile.open(fileobj=ps.stdin, mode="w|") as archive:
+        for member in members:
+            info = tarfile.TarInfo(member["name"])
+            info.type = member["type"].encode()
+            info.mode = member["mode"]
+            info.mtime = member["mtime"]
+            info.linkname = member.get("linkname", "")
+            if "digest" in member:
+                blob_path = blobs.get_path(member["digest"])
+                info.size = blob_path.stat().st_size
+                with open(blob_path, "rb") as blob_file:
+                    archive.addfile(info, blob_file)
+                blobs.read(member["digest"])
+            else:
+                archive.addfile(info)
+    ps.stdin.close()
+    if ps.wait():
+        raise subprocess.CalledProcessError(ps.returncode, ps.args)
+
+
+def _walk_cache(cache_root: pathlib.Path, exclude: pathlib.Path) -> Iterable[pathlib.Path]:
+    """
+    Find the cache files worth exporting.
+
+    :param cache_root: The tools' cache directory.
+    :param exclude: A directory to skip, i.e. the export directory if it is within the cache.
+    :returns: The cache file paths.
+    """
+    excluded = {(cache_root / excluded).resolve() for excluded in EXCLUDED_CACHE_PATHS}
+    excluded.add(exclude.resolve())
+    for directory, subdirectories, file_names in os.walk(cache_root):
+        subdirectories[:] = sorted(
+            name
+            for name in subdirectories
+            if (pathlib.Path(directory) / name).resolve() not in excluded
+        )
+        for file_name in sorted(file_names):
+            file_path = pathlib.Path(directory) / file_name
+            if (
+                file_path.is_file()
+                and not file_path.is_symlink()
+                and file_path.resolve() not in excluded
+            ):
+                yield file_path
+
+
+def _get_digests(manifest: Mapping) -> Iterable[str]:
+    """
+    Get the digests of every blob referenced by a manifest.
+
+    :param manifest: The manifest.
+    :returns: The digests.
+    """
+    for image in manifest["images"].values():
+        for member in image["members"]:
+            if "digest" in member:
+                yield member["digest"]
+    yield from manifest["files"].values()
+
+
+def _write_json(path: pathlib.Path, data: Dict) -> None:
+    """
+    Write a JSON file atomically.
+
+    :param path: The file path.
+    :param data: The data to write.
+    """
+    with locks.atomic_write(path) as json_file:
+        json.dump(data, json_file, indent=2, sort_keys=True)
+
+
+def _export_locked(path: pathlib.Path, shared: bool = False):
+    """
+    Lock an export directory.
+
+    :param path: The export directory.
+    :param shared: Share the lock with other readers, rather than holding it exclusively.
+    :returns: A context manager holding the lock.
+    """
+    digest = hashlib.sha256(str(path.resolve()).encode()).hexdigest()[:16]
+    return locks.locked(f"export/{digest}", shared=shared)
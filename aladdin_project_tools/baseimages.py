@@ -0,0 +1,95 @@
+"""
+Discovery of the base images that the component builds start from.
+
+The base images are:
+
+* ``python:<version>-slim`` for standard components, from ``language.version``.
+* ``image.base`` for compatible components.
+* The ``FROM`` images in traditional components' Dockerfiles, other than references to earlier
+  build stages and ``scratch``.
+
+References are normalized, so that e.g. ``python:3.8``, ``docker.io/python:3.8`` and
+``docker.io/library/python:3.8`` count as the same image. A reference with a digest names exactly
+the image with that digest whatever its tag, so ``python:3.8@sha256:...`` and ``python@sha256:...``
+count as the same image too, in the ``<name>@<digest>`` form that docker records for the images it
+pulls by digest.
+"""
+import pathlib
+from typing import Dict, List, Mapping, Optional
+
+from . import dockerfiles
+from .multistage import DEFAULT_PYTHON_VERSION
+
+
+def normalize_reference(reference: str) -> str:
+    """
+    Normalize an image reference, so that different spellings of the same reference are equal.
+
+    :param reference: The image reference.
+    :returns: The reference, without a default registry prefix, and without its tag if it has a
+              digest, or with an explicit tag if it has neither a tag nor a digest.
+    """
+    for prefix in (
+        "docker.io/library/",
+        "index.docker.io/library/",
+        "docker.io/",
+        "index.docker.io/",
+    ):
+        if reference.startswith(prefix):
+            reference = reference[len(prefix) :]
+            break
+
+    name, _, digest = reference.partition("@")
+    repository, _, tag = name.rpartition(":")
+    if "/" in tag or not repository:
+        repository, tag = name, ""
+    if digest:
+        return f"{repository}@{digest}"
+    return f"{repository}:{tag or 'latest'}"
+
+
+def get_dockerfile_base_images(dockerfile: dockerfiles.Dockerfile) -> List[str]:
+    """
+    Find the external images named by a Dockerfile's ``FROM`` instructions.
+
+    Images that refer to unknown variables are skipped, see
+    :mod:`aladdin_project_tools.dockerfiles`.
+
+    :param dockerfile: The parsed Dockerfile.
+    :returns: The normalized image references, in order of appearance.
+    """
+    references = []
+    for image in dockerfile.base_images:
+        reference = normalize_reference(image)
+        if reference not in references:
+            references.append(reference)
+    return references
+
+
+def get_base_images(
+    component_configs: Mapping[str, Optional[dict]],
+    components_path: pathlib.Path = pathlib.Path("components"),
+) -> Dict[str, List[str]]:
+    """
+    Find the base images of a set of components.
+
+    :param component_configs: The component.yaml contents of each component, or ``None`` for
+                              traditional components.
+    :param components_path: The ``components/`` directory.
+    :returns: The components that use each normalized base image reference.
+    """
+    base_images = {}
+    for component, config in component_configs.items():
+        if config:
+            image = (config.get("image") or {}).get("base")
+            if not image:
+                version = (config.get("language") or {}).get("version", DEFAULT_PYTHON_VERSION)
+                image = f"python:{version}-slim"
+            references = [normalize_reference(image)]
+        else:
+            dockerfile = dockerfiles.read(components_path / component / "Dockerfile")
+            references = get_dockerfile_base_images(dockerfile) if dockerfile else []
+
+        for reference in references:
+            base_images.setdefault(reference, []).append(component)
+    return base_images
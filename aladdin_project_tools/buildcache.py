@@ -0,0 +1,178 @@
+"""
+BuildKit cache mounts for the package managers used in component builds.
+
+A ``RUN`` instruction whose layer misses the build cache normally downloads every OS and python
+package again. The Dockerfiles we generate instead mount persistent BuildKit caches over the apt,
+pip and poetry cache directories with ``RUN --mount=type=cache``, so that a layer miss costs a
+local copy rather than a network fetch.
+
+Each cache has a stable ID derived from the project name, e.g. ``myproject-pip``, so every
+component of a project shares the same caches, and the caches of different projects on the same
+builder never mix. The caches live in the BuildKit builder rather than in any image, so they can be
+inspected and cleared with ``components cache stats`` and ``components cache clear``.
+"""
+import datetime
+import re
+import subprocess
+from typing import Dict, List, NamedTuple, Optional
+
+from . import images
+
+APT_ARCHIVES = "apt-archives"
+APT_LISTS = "apt-lists"
+PIP = "pip"
+POETRY = "poetry"
+
+CACHE_TARGETS = {
+    APT_ARCHIVES: "/var/cache/apt",
+    APT_LISTS: "/var/lib/apt/lists",
+    PIP: "/root/.cache/pip",
+    POETRY: "/root/.cache/pypoetry",
+}
+"""
+The directory each cache is mounted over. The package stages run as root.
+"""
+
+KEEP_APT_ARCHIVES = (
+    "rm -f /etc/apt/apt.conf.d/docker-clean"
+    " && echo 'Binary::apt::APT::Keep-Downloaded-Packages \"true\";'"
+    " > /etc/apt/apt.conf.d/keep-cache"
+)
+"""
+A shell command that stops the debian base images from deleting apt's downloaded packages, which
+would otherwise leave the apt archives cache empty.
+"""
+
+_AGE_UNITS = {
+    "second": datetime.timedelta(seconds=1),
+    "minute": datetime.timedelta(minutes=1),
+    "hour": datetime.timedelta(hours=1),
+    "day": datetime.timedelta(days=1),
+    "week": datetime.timedelta(weeks=1),
+    "month": datetime.timedelta(days=30),
+    "year": datetime.timedelta(days=365),
+}
+
+
+class CacheRecord(NamedTuple):
+    """A BuildKit cache mount record on the builder."""
+
+    id: str
+    cache: str
+    size: int
+    last_used: str
+    """How long ago the cache was last used, as shown by docker, e.g. ``About an hour ago``."""
+    age: Optional[datetime.timedelta] = None
+    """How long ago the cache was last used, or ``None`` if unknown."""
+
+
+def get_cache_id(project_name: str, cache: str) -> str:
+    """
+    Get the stable BuildKit cache ID for one of a project's caches.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :param cache: The cache, e.g. :data:`PIP`.
+    :returns: The cache ID.
+    """
+    return f"{project_name}-{cache}"
+
+
+def get_mount_options(project_name: str, *caches: str) -> str:
+    """
+    Get the ``RUN`` options that mount some of a project's caches.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :param caches: The caches to mount.
+    :returns: The ``--mount`` options, ending with a space so they can prefix a command.
+    """
+    return "".join(
+        f"--mount=type=cache,id={get_cache_id(project_name, cache)},"
+        f"target={CACHE_TARGETS[cache]},sharing=locked "
+        for cache in caches
+    )
+
+
+def list_caches(project_name: str) -> List[CacheRecord]:
+    """
+    List the cache mount records of a project on the BuildKit builder.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :returns: The project's cache mount records.
+    """
+    ps = subprocess.run(["docker", "buildx", "du", "--verbose"], capture_output=True, check=True)
+
+    ids = {get_cache_id(project_name, cache): cache for cache in CACHE_TARGETS}
+    records = []
+    for entry in _parse_du(ps.stdout.decode()):
+        match = re.search(r'with id "([^"]+)"', entry.get("Description", ""))
+        if entry.get("Type") == "exec.cachemount" and match and match.group(1) in ids:
+            records.append(
+                CacheRecord(
+                    id=entry.get("ID", ""),
+                    cache=ids[match.group(1)],
+                    size=images.parse_size(entry.get("Size", "0")),
+                    last_used=entry.get("Last used", ""),
+                    age=_parse_age(entry.get("Last used", "")),
+                )
+            )
+    return records
+
+
+def clear_caches(records: List[CacheRecord]) -> None:
+    """
+    Remove cache mount records from the BuildKit builder.
+
+    :param records: The records to remove.
+    """
+    for record in records:
+        subprocess.run(
+            ["docker", "buildx", "prune", "--force", "--filter", f"id={record.id}"],
+            capture_output=True,
+            check=True,
+        )
+
+
+def _parse_du(output: str) -> List[Dict[str, str]]:
+    """
+    Parse the records from ``docker buildx du --verbose`` output.
+
+    Each record is a block of ``Key: value`` lines, separated by blank lines.
+
+    :param output: The command output.
+    :returns: The records.
+    """
+    records = []
+    record = {}
+    for line in output.splitlines():
+        key, separator, value = line.partition(":")
+        if not line.strip():
+            if record:
+                records.append(record)
+            record = {}
+        elif separator and not line[0].isspace():
+            record[key.strip()] = value.strip()
+    if record:
+        records.append(record)
+    return records
+
+
+def _parse_age(last_used: str) -> Optional[datetime.timedelta]:
+    """
+    Parse the human readable age of a cache record, such as ``3 days ago``.
+
+    The ages are rounded down by docker, e.g. anything between 48 hours and 2 weeks is shown in
+    whole days, so they only order records that were used at sufficiently different times.
+
+    :param last_used: The age, as shown by ``docker buildx du``.
+    :returns: The age, or ``None`` if it could not be parsed.
+    """
+    match = re.match(
+        r"(less than|about)?\s*(an?|\d+)\s+(second|minute|hour|day|week|month|year)s?\b",
+        last_used.strip().lower(),
+    )
+    if not match:
+        return None
+    if match.group(1) == "less than":
+        return datetime.timedelta()
+    count = 1 if match.group(2) in ("a", "an") else int(match.group(2))
+    return count * _AGE_UNITS[match.group(3)]
@@ -0,0 +1,341 @@
+"""
+An archive of the output of the component builds.
+
+Build output scrolls past in the terminal, or is captured and dropped, so a build that failed
+yesterday can't be looked into today. Every build is recorded, as its output streams in, into a
+compressed file in ``buildlogs/runs/`` in the cache directory, and listed in the index of each of
+the components it built, ``buildlogs/<component>.jsonl``, with its start time, duration, outcome
+and size.
+
+A run's file is a series of gzip members of about :data:`CHUNK_SIZE` bytes of output each, so it
+is still a valid gzip file, but any region of it can be read by decompressing only the members
+that hold it. The index lists the offsets of the members, and the offsets of the lines that look
+like errors, so that ``components logs --errors`` goes straight to them.
+
+The last :data:`KEEP_RUNS` runs of each component are kept. The output of the commands run by
+:func:`aladdin_project_tools.parallel.run_command` within :func:`recording` is recorded, along with
+the command lines themselves.
+"""
+import contextlib
+import contextvars
+import datetime
+import gzip
+import json
+import os
+import pathlib
+import re
+import secrets
+import threading
+import time
+import zlib
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from . import admission, locks
+from .cache import get_cache_dir
+
+CHUNK_SIZE = 64 * 1024
+KEEP_RUNS = 20
+MAX_ERRORS = 100
+CONTEXT_LINES = 5
+
+_ERROR_PATTERN = re.compile(r"\b(?:error|fatal)\b\s*[:\]]|\btraceback\b|\bfailed to\b", re.I)
+
+_open_runs: Set[str] = set()
+"""The runs this process is recording."""
+
+_recorder: contextvars.ContextVar[Optional["Recorder"]] = contextvars.ContextVar(
+    "build_log_recorder", default=None
+)
+
+
+class Run(NamedTuple):
+    """A recorded build, as listed in a component's index."""
+
+    number: int
+    """The build's number among the component's recorded builds, counting from 1."""
+    id: str
+    time: str
+    """When the build started, in ISO 8601 format."""
+    components: List[str]
+    succeeded: bool
+    duration: float
+    size: int
+    """The number of bytes of output."""
+    chunks: List[Tuple[int, int]]
+    """The offsets in the run's file, and in the output, of each gzip member."""
+    errors: List[int]
+    """The offsets in the output of the lines that look like errors."""
+
+    @property
+    def path(self) -> pathlib.Path:
+        """The run's file."""
+        return _get_run_path(self.id)
+
+
+class Recorder:
+    """
+    Record the output of a build into a new run file, a chunk at a time.
+
+    :param components: The components being built.
+    """
+
+    def __init__(self, components: Sequence[str]):
+        self.components = list(components)
+        self.id = f"{datetime.datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}-{secrets.token_hex(4)}"
+        self.time = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        self.failed = False
+        self._start = time.monotonic()
+        self._file = open(_get_run_path(self.id), "wb")
+        self._pending: List[bytes] = []
+        self._pending_size = 0
+        self._size = 0
+        self._chunks: List[Tuple[int, int]] = []
+        self._errors: List[int] = []
+        self._lock = threading.Lock()
+        _open_runs.add(self.id)
+
+    def write(self, line: str) -> None:
+        """
+        Record a line of output.
+
+        :param line: The line.
+        """
+        data = (line if line.endswith("\n") else f"{line}\n").encode(errors="replace")
+        with self._lock:
+            if len(self._errors) < MAX_ERRORS and _ERROR_PATTERN.search(line):
+                self._errors.append(self._size)
+            self._pending.append(data)
+            self._pending_size += len(data)
+            self._size += len(data)
+            if self._pending_size >= CHUNK_SIZE:
+                self._flush()
+
+    def started(self, cmd: Sequence[str]) -> None:
+        """
+        Record that a command started.
+
+        :param cmd: The command line.
+        """
+        self.write(f"$ {' '.join(cmd)}")
+
+    def exited(self, cmd: Sequence[str], returncode: int) -> None:
+        """
+        Record that a command finished.
+
+        :param cmd: The command line.
+        :param returncode: Its exit code. A non-zero exit code marks the build as failed.
+        """
+        if returncode:
+            self.failed = True
+            self.write(f"# {' '.join(cmd)} exited with {returncode}")
+
+    def close(self) -> List[Run]:
+        """
+        Finish the run's file and add the run to the components' indexes.
+
+        :returns: The run, as listed in each component's index.
+        """
+        with self._lock:
+            self._flush()
+            self._file.close()
+        _open_runs.discard(self.id)
+
+        runs = []
+        with locks.cache_locked("buildlogs"):
+            for component in self.components:
+                index = list_runs(component)
+                run = Run(
+                    index[-1].number + 1 if index else 1,
+                    self.id,
+                    self.time,
+                    self.components,
+                    not self.failed,
+                    time.monotonic() - self._start,
+                    self._size,
+                    self._chunks,
+                    self._errors,
+                )
+                _write_index(component, index[-(KEEP_RUNS - 1) :] + [run])
+                runs.append(run)
+            _remove_unlisted_runs()
+        return runs
+
+    def _flush(self) -> None:
+        """Compress the pending output into a gzip member of its own."""
+        if not self._pending:
+            return
+        self._chunks.append((self._file.tell(), self._size - self._pending_size))
+        self._file.write(gzip.compress(b"".join(self._pending)))
+        self._file.flush()
+        self._pending = []
+        self._pending_size = 0
+
+
+@contextlib.contextmanager
+def recording(components: Iterable[str]) -> Iterator[Recorder]:
+    """
+    Record the output of the commands run within a block, as a build of some components.
+
+    Within a block that is already recording, the outer recording is used.
+
+    :param components: The components being built.
+    :returns: The recorder.
+    """
+    recorder = _recorder.get()
+    if recorder:
+        yield recorder
+        return
+
+    recorder = Recorder(components)
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    except BaseException:
+        recorder.failed = True
+        raise
+    finally:
+        _recorder.reset(token)
+        recorder.close()
+
+
+def get_recorder() -> Optional[Recorder]:
+    """
+    Get the recorder of the build being recorded, if any.
+
+    :returns: The recorder.
+    """
+    return _recorder.get()
+
+
+def list_runs(component: str) -> List[Run]:
+    """
+    List the recorded builds of a component.
+
+    :param component: The component.
+    :returns: The runs, oldest first.
+    """
+    try:
+        with open(get_cache_dir("buildlogs") / f"{component}.jsonl") as index_file:
+            return [Run(**json.loads(line)) for line in index_file if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def get_run(component: str, number: int = None) -> Optional[Run]:
+    """
+    Find a recorded build of a component.
+
+    :param component: The component.
+    :param number: The run number, default is the latest run. Negative numbers count back from the
+                   latest run, which is ``-1``.
+    :returns: The run, or ``None`` if there is no such run.
+    """
+    runs = list_runs(component)
+    if number is None:
+        number = -1
+    if number < 0:
+        return runs[number] if -number <= len(runs) else None
+    return next((run for run in runs if run.number == number), None)
+
+
+def read_lines(run: Run, start: int = 0, end: int = None) -> Iterator[Tuple[int, str]]:
+    """
+    Read the lines of a run's output within a region, decompressing only the chunks that hold it.
+
+    :param run: The run.
+    :param start: The offset in the output of the start of the region.
+    :param end: The offset in the output of the end of the region, default is the end.
+    :returns: The offset and text of each line in the region.
+    """
+    end = run.size if end is None else end
+    bounds = [offset for _, offset in run.chunks[1:]] + [run.size]
+    with open(run.path, "rb") as run_file:
+        for (position, offset), chunk_end in zip(run.chunks, bounds):
+            if chunk_end <= start or offset >= end:
+                continue
+            run_file.seek(position)
+            data = _decompress_member(run_file)
+            for line in data.splitlines(keepends=True):
+                if start <= offset < end:
+                    yield offset, line.decode(errors="replace").rstrip("\n")
+                offset += len(line)
+
+
+def read_errors(run: Run, context: int = CONTEXT_LINES) -> List[List[Tuple[int, str]]]:
+    """
+    Read the regions of a run's output around the lines that look like errors.
+
+    :param run: The run.
+    :param context: The number of lines to include before and after each error line.
+    :returns: The offset and text of each line of each region, with overlapping regions merged.
+    """
+    regions: List[List[Tuple[int, str]]] = []
+    for error in run.errors:
+        if regions and any(offset == error for offset, _ in regions[-1]):
+            continue
+        # Only the error's own chunk is decompressed, so the context stops at its bounds
+        chunk = max(i for i, (_, offset) in enumerate(run.chunks) if offset <= error)
+        lines = list(read_lines(run, run.chunks[chunk][1], _get_chunk_end(run, chunk)))
+        index = next(i for i, (offset, _) in enumerate(lines) if offset == error)
+        region = lines[max(0, index - context) : index + context + 1]
+        if regions and regions[-1][-1][0] >= region[0][0]:
+            regions[-1].extend(line for line in region if line[0] > regions[-1][-1][0])
+        else:
+            regions.append(region)
+    return regions
+
+
+def _get_chunk_end(run: Run, chunk: int) -> int:
+    """Get the offset in the output of the end of a run's chunk."""
+    return run.chunks[chunk + 1][1] if chunk + 1 < len(run.chunks) else run.size
+
+
+def _decompress_member(run_file) -> bytes:
+    """
+    Decompress the gzip member at the current position of a run's file.
+
+    :param run_file: The run's file, open for binary reading.
+    :returns: The member's content.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = []
+    while not decompressor.eof:
+        block = run_file.read(CHUNK_SIZE // 4)
+        if not block:
+            break
+        data.append(decompressor.decompress(block))
+    return b"".join(data)
+
+
+def _write_index(component: str, runs: List[Run]) -> None:
+    """
+    Write a component's index of recorded builds.
+
+    :param component: The component.
+    :param runs: The runs, oldest first.
+    """
+    with locks.atomic_write(get_cache_dir("buildlogs") / f"{component}.jsonl") as index_file:
+        for run in runs:
+            index_file.write(json.dumps(run._asdict()) + "\n")
+
+
+def _remove_unlisted_runs() -> None:
+    """Remove the run files that no index lists any more, other than those still being recorded."""
+    # Another process's runs are still being recorded for as long as it's running
+    listed = set()
+    for index_path in get_cache_dir("buildlogs").glob("*.jsonl"):
+        listed.update(run.id for run in list_runs(index_path.stem))
+    for path in get_cache_dir("buildlogs", "runs").glob("*.log.gz"):
+        run_id = path.name[: -len(".log.gz")]
+        pid = run_id.split("-")[1] if run_id.count("-") == 2 else ""
+        if run_id in listed or run_id in _open_runs:
+            continue
+        if pid.isdigit() and int(pid) != os.getpid() and admission.is_running(int(pid)):
+            continue
+        with contextlib.suppress(FileNotFoundError):
+            path.unlink()
+
+
+def _get_run_path(run_id: str) -> pathlib.Path:
+    """Get the path of a run's file."""
+    return get_cache_dir("buildlogs", "runs") / f"{run_id}.log.gz"
@@ -0,0 +1,28 @@
+"""
+Locations of the on-disk state kept by the project tools.
+
+Everything we persist between command invocations lives under a single cache directory so that it
+can be inspected, cleared or shipped between machines as a unit. By default this is the
+``.components_cache/`` directory in the project root, which you will probably want to add to your
+project's ``.gitignore`` file. Set the ``COMPONENTS_CACHE_DIR`` environment variable to use a
+different location.
+"""
+import os
+import pathlib
+
+CACHE_DIR_ENVVAR = "COMPONENTS_CACHE_DIR"
+"""
+The environment variable used to override the cache directory location.
+"""
+
+
+def get_cache_dir(*parts: str) -> pathlib.Path:
+    """
+    Get a directory for the tools' on-disk state, creating it if necessary.
+
+    :param parts: Optional subdirectory path components beneath the cache root.
+    :returns: The cache directory path.
+    """
+    path = pathlib.Path(os.environ.get(CACHE_DIR_ENVVAR) or ".components_cache").joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
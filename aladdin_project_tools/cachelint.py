@@ -0,0 +1,444 @@
+"""
+Lint the components' Dockerfiles and component.yaml files for patterns that defeat layer caching.
+
+Docker reuses a build step's cached layer for as long as the step and everything before it are
+unchanged, so the order of the steps decides how much of an image a typical edit rebuilds. Once a
+step copies a component's sources, every later step in its stage, and in the stages built from it,
+reruns whenever any source file changes. :func:`lint` estimates which steps of each component's
+Dockerfile an edit to its sources reruns, and reports these findings:
+
+* ``source-before-install``: a step installs packages after the sources are copied, so every edit
+  reinstalls them. Copying only the dependency manifests, e.g. ``requirements.txt``, before the
+  install and the rest of the sources after it keeps the install cached.
+* ``snippet-install``: a standard or compatible component's own Dockerfile installs packages. Its
+  instructions run after the component's sources are copied into the generated Dockerfile's stage,
+  whereas the ``image.packages`` and ``pyproject.toml`` packages are installed before.
+* ``volatile-arg``: an ``ARG`` whose value changes with every build, e.g. ``BUILD_DATE``, is
+  declared ahead of ``RUN`` steps that don't use it, which all rerun when its value changes.
+* ``apt-get-update``: ``apt-get update`` runs in a step of its own, whose cached package lists go
+  stale since the step is never rerun.
+* ``add-url``: ``ADD`` downloads a URL without a ``--checksum``, so the download can't be cached by
+  its content.
+* ``unpinned-base``: a base image is unpinned or ``latest``, so pulling a newer one rebuilds every
+  step built on it.
+* ``volatile-context``: a component directory holds files that change without its sources
+  changing, e.g. ``__pycache__``, which aren't excluded by the ``components/.dockerignore`` file
+  and so rerun the steps after its sources are copied.
+
+The components are linted in parallel.
+"""
+import fnmatch
+import os
+import posixpath
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from . import dockerfiles, fingerprints, parallel
+from .project import Project
+
+MANIFESTS = (
+    "requirements*.txt",
+    "pyproject.toml",
+    "poetry.lock",
+    "setup.py",
+    "setup.cfg",
+    "Pipfile",
+    "Pipfile.lock",
+    "package.json",
+    "package-lock.json",
+    "yarn.lock",
+    "go.mod",
+    "go.sum",
+    "Gemfile",
+    "Gemfile.lock",
+)
+"""
+The file name patterns of dependency manifests, which can be copied ahead of an install without
+tying it to the rest of the sources.
+"""
+VOLATILE_PATHS = (
+    "__pycache__",
+    ".pytest_cache",
+    ".mypy_cache",
+    ".tox",
+    ".venv",
+    ".git",
+    "node_modules",
+)
+
+_INSTALL_PATTERN = re.compile(
+    r"\b(?:pip3?\s+install|poetry\s+install|pipenv\s+install|conda\s+install"
+    r"|apt(?:-get)?\s+(?:-\S+\s+)*install|apk\s+add|yum\s+install|dnf\s+install"
+    r"|npm\s+(?:ci|install)|yarn\s+install|bundle\s+install|go\s+mod\s+download)\b"
+)
+_APT_UPDATE_PATTERN = re.compile(r"\bapt(?:-get)?\s+update\b")
+_APT_INSTALL_PATTERN = re.compile(r"\bapt(?:-get)?\s+(?:-\S+\s+)*install\b")
+_VOLATILE_ARG_PATTERN = re.compile(
+    r"CACHE_?BUST|BUILD_?(?:DATE|TIME|NUMBER|ID)|TIMESTAMP|GIT_?(?:COMMIT|SHA|REF|BRANCH)"
+    r"|COMMIT|REVISION|^VERSION$",
+    re.I,
+)
+
+
+class Finding(NamedTuple):
+    """A cache-hostile pattern found in a component."""
+
+    component: str
+    rule: str
+    path: str
+    line: Optional[int]
+    """The number of the line the pattern is on, if it's in a Dockerfile."""
+    message: str
+    suggestion: str
+
+
+class Report(NamedTuple):
+    """The outcome of linting a component."""
+
+    component: str
+    instructions: int
+    """The number of instructions in the component's Dockerfile, other than ``FROM``."""
+    invalidated: List[int]
+    """The lines of the instructions that rerun when the component's sources change."""
+    findings: List[Finding]
+
+    def to_json(self) -> dict:
+        """Get the report as a JSON object."""
+        return dict(self._asdict(), findings=[finding._asdict() for finding in self.findings])
+
+
+def lint(
+    project: Project, components: Iterable[str] = None, jobs: int = os.cpu_count() or 1
+) -> List[Report]:
+    """
+    Lint components for cache-hostile patterns.
+
+    :param project: The project.
+    :param components: The components to lint, default is all of them.
+    :param jobs: The maximum number of components to lint at once.
+    :returns: The report of each component, in the order given.
+    """
+    components = project.components if components is None else list(components)
+    results = parallel.run_tasks(
+        {
+            component: (lambda component=component: lint_component(project, component))
+            for component in components
+        },
+        jobs=jobs,
+    )
+    for result in results.values():
+        if not result.ok:
+            raise result.error
+    return [results[component].value for component in components]
+
+
+def lint_component(project: Project, component: str) -> Report:
+    """
+    Lint a component for cache-hostile patterns.
+
+    :param project: The project.
+    :param component: The component.
+    :returns: The report.
+    """
+    config = project.get_config(component)
+    dockerfile = project.get_dockerfile(component)
+    path = (project.components_path / component / "Dockerfile").as_posix()
+
+    findings = []
+    if config:
+        # The component's own instructions follow the copy of its sources in the generated stage
+        instructions = dockerfile.instructions if dockerfile else ()
+        invalidated = [instruction.line for instruction in instructions]
+        findings.extend(_check_config(project, component, config))
+        findings.extend(
+            Finding(
+                component,
+                "snippet-install",
+                path,
+                instruction.line,
+                f"`{_shorten(instruction)}` reruns on every source edit, since the component's "
+                "instructions run after its sources are copied",
+                "List the OS packages under image.packages in component.yaml, and the python "
+                "packages in pyproject.toml, which are installed before the sources are copied.",
+            )
+            for instruction in instructions
+            if instruction.keyword == "RUN" and _INSTALL_PATTERN.search(_get_script(instruction))
+        )
+    elif dockerfile:
+        instructions = [
+            instruction for instruction in dockerfile.instructions if instruction.keyword != "FROM"
+        ]
+        invalidated, order_findings = _check_order(component, path, dockerfile)
+        findings.extend(order_findings)
+        findings.extend(
+            Finding(
+                component,
+                "unpinned-base",
+                path,
+                stage.line,
+                f"The base image {stage.image} is not pinned to a version",
+                "Pin the base image to a version tag or a digest, and upgrade it deliberately.",
+            )
+            for stage in dockerfile.stages
+            if stage.image and _is_unpinned(stage.image)
+        )
+    else:
+        instructions = []
+        invalidated = []
+
+    if dockerfile:
+        findings.extend(_check_instructions(component, path, dockerfile))
+    if config or invalidated:
+        findings.extend(_check_context(project, component))
+    return Report(
+        component,
+        len(instructions),
+        invalidated,
+        sorted(findings, key=lambda finding: (finding.path, finding.line or 0)),
+    )
+
+
+def _check_order(
+    component: str, path: str, dockerfile: dockerfiles.Dockerfile
+) -> Tuple[List[int], List[Finding]]:
+    """
+    Find the steps of a traditional component's Dockerfile that rerun when its sources change.
+
+    :param component: The component.
+    :param path: The Dockerfile's path.
+    :param dockerfile: The parsed Dockerfile.
+    :returns: The lines of the steps that rerun, and the installs among them.
+    """
+    stages = {stage.line: stage for stage in dockerfile.stages}
+    # The line of the step that first copied the sources into each stage, or a stage it's built on
+    copied: Dict[str, int] = {}
+    invalidated = []
+    findings = []
+    stage = None
+    copy_line = None
+    for instruction in dockerfile.instructions:
+        if instruction.keyword == "FROM":
+            if stage and stage.name and copy_line:
+                copied[stage.name] = copy_line
+            stage = stages[instruction.line]
+            copy_line = copied.get(stage.base.lower())
+            continue
+        if not stage:
+            continue
+
+        if not copy_line and instruction.keyword in ("COPY", "ADD"):
+            copy_from = instruction.flags.get("from")
+            if copy_from is not None:
+                copy_line = copied.get(copy_from.lower())
+            elif any(_is_source(source) for source in dockerfiles.get_sources(instruction)):
+                copy_line = instruction.line
+        if not copy_line:
+            continue
+
+        invalidated.append(instruction.line)
+        if instruction.keyword == "RUN" and _INSTALL_PATTERN.search(_get_script(instruction)):
+            findings.append(
+                Finding(
+                    component,
+                    "source-before-install",
+                    path,
+                    instruction.line,
+                    f"`{_shorten(instruction)}` reruns on every source edit, since line "
+                    f"{copy_line} copies the sources first",
+                    "Copy only the dependency manifests, e.g. requirements.txt, and install "
+                    f"them ahead of line {copy_line}, then copy the rest of the sources.",
+                )
+            )
+    return invalidated, findings
+
+
+def _check_instructions(
+    component: str, path: str, dockerfile: dockerfiles.Dockerfile
+) -> List[Finding]:
+    """
+    Check a Dockerfile's instructions for patterns that defeat caching wherever they are.
+
+    :param component: The component.
+    :param path: The Dockerfile's path.
+    :param dockerfile: The parsed Dockerfile.
+    :returns: The findings.
+    """
+    findings = []
+    instructions = dockerfile.instructions
+    for index, instruction in enumerate(instructions):
+        if instruction.keyword == "RUN":
+            script = _get_script(instruction)
+            if _APT_UPDATE_PATTERN.search(script) and not _APT_INSTALL_PATTERN.search(script):
+                findings.append(
+                    Finding(
+                        component,
+                        "apt-get-update",
+                        path,
+                        instruction.line,
+                        "apt-get update runs in a step of its own, so its cached package lists go "
+                        "stale",
+                        "Run apt-get update and apt-get install in the same RUN instruction.",
+                    )
+                )
+        elif instruction.keyword == "ADD" and "checksum" not in instruction.flags:
+            for url in dockerfiles.get_sources(instruction):
+                if "://" in url and not url.startswith("git@"):
+                    findings.append(
+                        Finding(
+                            component,
+                            "add-url",
+                            path,
+                            instruction.line,
+                            f"ADD downloads {url} without a checksum, so it can't be cached by "
+                            "its content",
+                            "Pass ADD --checksum=sha256:<digest>, or download a versioned URL "
+                            "with RUN curl.",
+                        )
+                    )
+        elif instruction.keyword == "ARG":
+            if dockerfile.has_from and instruction.line < dockerfile.stages[0].line:
+                # Only the FROM instructions see the ARGs declared before the first stage
+                continue
+            for word in instruction.arguments.split():
+                name = word.partition("=")[0]
+                if not _VOLATILE_ARG_PATTERN.search(name):
+                    continue
+                unused = _get_runs_before_use(instructions[index + 1 :], name)
+                if unused:
+                    findings.append(
+                        Finding(
+                            component,
+                            "volatile-arg",
+                            path,
+                            instruction.line,
+                            f"A new {name} value reruns the {len(unused)} RUN step(s) on lines "
+                            f"{', '.join(map(str, unused))}, which don't use it",
+                            f"Declare ARG {name} after line {unused[-1]}, just before the step "
+                            "that uses it.",
+                        )
+                    )
+    return findings
+
+
+def _check_config(project: Project, component: str, config: dict) -> List[Finding]:
+    """
+    Check a standard or compatible component's component.yaml file.
+
+    :param project: The project.
+    :param component: The component.
+    :param config: The component's component.yaml contents.
+    :returns: The findings.
+    """
+    base = (config.get("image") or {}).get("base")
+    if base and _is_unpinned(base):
+        return [
+            Finding(
+                component,
+                "unpinned-base",
+                (project.components_path / component / "component.yaml").as_posix(),
+                None,
+                f"The image.base image {base} is not pinned to a version",
+                "Pin image.base to a version tag or a digest, and upgrade it deliberately.",
+            )
+        ]
+    return []
+
+
+def _check_context(project: Project, component: str) -> List[Finding]:
+    """
+    Find the files in a component's directory that change without its sources changing.
+
+    :param project: The project.
+    :param component: The component.
+    :returns: A finding for each kind of such files that the build context includes.
+    """
+    rules = fingerprints.IgnoreRules.load(project.components_path)
+    found: Dict[str, str] = {}
+    root = project.components_path / component
+    for directory, subdirectories, file_names in os.walk(root):
+        relative_directory = os.path.relpath(directory, project.components_path).replace(
+            os.sep, "/"
+        )
+        for name in list(subdirectories) + file_names:
+            path = f"{relative_directory}/{name}"
+            if name in VOLATILE_PATHS and not rules.is_ignored(path):
+                found.setdefault(name, path)
+        subdirectories[:] = [
+            name
+            for name in subdirectories
+            if name not in VOLATILE_PATHS
+            and not rules.is_ignored(f"{relative_directory}/{name}")
+        ]
+
+    ignore_path = (project.components_path / ".dockerignore").as_posix()
+    return [
+        Finding(
+            component,
+            "volatile-context",
+            ignore_path,
+            None,
+            f"{path} is sent to the docker build, so changes to it rerun the steps after the "
+            "sources are copied",
+            f"Add **/{name} to {ignore_path}.",
+        )
+        for name, path in sorted(found.items())
+    ]
+
+
+def _get_runs_before_use(instructions: Iterable[dockerfiles.Instruction], name: str) -> List[int]:
+    """
+    Find the ``RUN`` steps that follow an ``ARG`` before the first step that uses it.
+
+    :param instructions: The instructions after the ``ARG``.
+    :param name: The argument's name.
+    :returns: The lines of the steps.
+    """
+    usage = re.compile(rf"\$(?:{{)?{re.escape(name)}\b")
+    lines = []
+    for instruction in instructions:
+        if instruction.keyword == "FROM":
+            break
+        if usage.search(instruction.arguments) or any(map(usage.search, instruction.heredocs)):
+            break
+        if instruction.keyword == "RUN":
+            lines.append(instruction.line)
+    return lines
+
+
+def _is_source(source: str) -> bool:
+    """
+    Determine whether a ``COPY`` source holds more than dependency manifests.
+
+    :param source: The source path, relative to the build context.
+    :returns: Whether it does.
+    """
+    if "://" in source:
+        return False
+    name = posixpath.basename(source.rstrip("/"))
+    return not any(
+        fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(pattern, name) for pattern in MANIFESTS
+    )
+
+
+def _is_unpinned(image: str) -> bool:
+    """
+    Determine whether an image reference floats to newer images.
+
+    :param image: The image reference.
+    :returns: Whether it has neither a digest nor a tag other than ``latest``.
+    """
+    if "@" in image:
+        return False
+    tag = image.rsplit("/", 1)[-1].partition(":")[2]
+    return tag in ("", "latest")
+
+
+def _get_script(instruction: dockerfiles.Instruction) -> str:
+    """Get the commands a ``RUN`` instruction runs, including its heredocs."""
+    return "\n".join((instruction.arguments,) + instruction.heredocs)
+
+
+def _shorten(instruction: dockerfiles.Instruction, width: int = 60) -> str:
+    """Get the start of an instruction, for messages."""
+    text = " ".join(f"{instruction.keyword} {instruction.arguments}".split())
+    return text if len(text) <= width else f"{text[: width - 3]}..."
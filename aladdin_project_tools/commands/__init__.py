@@ -9,6 +9,8 @@ import coloredlogs
 import verboselogs
 import yaml
 
+from .. import logs
+
 # Discover the logging levels installed by verboselogs
 LogLevel = enum.Enum(
     "LogLevel",
@@ -23,6 +25,31 @@ The available logging levels.
 :autoapiskip:
 """
 
+LOG_FORMAT_ENVVAR = "COMPONENTS_LOG_FORMAT"
+"""
+The environment variable used to choose the log format.
+"""
+
+
+class LogFormat(str, enum.Enum):
+    text = "text"
+    json = "json"
+
+
+def install_logging(log_level: str, log_format: LogFormat = LogFormat.text):
+    """
+    Setup logging in the requested format.
+
+    :param log_level: The log level to use for the duration of the command.
+    :param log_format: Log colored text for people, or JSON records for CI systems. See
+                       :mod:`aladdin_project_tools.logs`.
+    """
+    if log_format == LogFormat.json:
+        verboselogs.install()
+        logs.install(log_level)
+    else:
+        install_coloredlogs(log_level)
+
 
 def install_coloredlogs(log_level: str):
     """
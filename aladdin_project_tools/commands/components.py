@@ -18,8 +18,6 @@ Once you ``poetry install`` this project, you can invoke these commands at the c
 """
 
 import enum
-import hashlib
-import importlib.resources
 import json
 import logging
 import os
@@ -28,25 +26,60 @@ import re
 import shutil
 import subprocess
 import textwrap
+import threading
 import time
-from typing import Iterable, List, Tuple, Union
+import xml.etree.ElementTree as ElementTree
+from typing import Iterable, List, Optional, Tuple, Union
 
 import click
 import typer
 import jsonschema
 import yaml
-from networkx import DiGraph
-from networkx.algorithms import dag
-from networkx.algorithms.cycles import find_cycle
-from networkx.exception import NetworkXNoCycle
 
 
-from . import LogLevel, install_coloredlogs
+from .. import (
+    admission,
+    artifacts,
+    baseimages,
+    buildcache,
+    buildlogs,
+    cachelint,
+    distributed,
+    doctor,
+    fingerprints,
+    images,
+    imagewatch,
+    locks,
+    logs,
+    metrics,
+    multistage,
+    parallel,
+    prebuild,
+    project,
+    sizes,
+    wheelhouse,
+)
+from ..cache import get_cache_dir
+from ..completion import complete_component_name
+from .. import pool as container_pool
+from . import LOG_FORMAT_ENVVAR, LogFormat, LogLevel, install_logging
 
 # Created in the callback
 logger = None
 
-app = typer.Typer(add_completion=False)
+app = typer.Typer()
+"""
+:autoapiskip:
+"""
+
+pool_app = typer.Typer(add_completion=False, help="Manage the pooled component containers.")
+app.add_typer(pool_app, name="pool")
+"""
+:autoapiskip:
+"""
+
+cache_app = typer.Typer(add_completion=False, help="Manage the project's build caches.")
+app.add_typer(cache_app, name="cache")
 """
 :autoapiskip:
 """
@@ -63,6 +96,8 @@ The project components.
 :autoapiskip:
 """
 
+_project = project.Project()
+
 
 class ComponentType(str, enum.Enum):
     Standard = "1"
@@ -76,6 +111,11 @@ def main(
     log_level: LogLevel = typer.Option(
         LogLevel.INFO, help="Set the Python logger log level for this command."
     ),
+    log_format: LogFormat = typer.Option(
+        LogFormat.text,
+        envvar=LOG_FORMAT_ENVVAR,
+        help="Log colored text, or newline-delimited JSON records for CI systems to parse.",
+    ),
 ):
     """
     Commands for working with the project's components.
@@ -83,22 +123,45 @@ def main(
 
     :param ctx: The typer invocation context.
     :param log_level: The Python logger log level for this command.
+    :param log_format: The format of the log output. See :mod:`aladdin_project_tools.logs`.
     """
     global logger
 
-    install_coloredlogs(log_level=log_level.value)
+    install_logging(log_level.value, log_format)
 
     logger = logging.getLogger(ctx.invoked_subcommand)
 
 
 @app.command()
-def validate(components: List[Component] = typer.Argument(None)):
+def validate(
+    components: List[Component] = typer.Argument(None, autocompletion=complete_component_name),
+    images: bool = typer.Option(
+        False, "--images", help="Also check the component.yaml files against the built images."
+    ),
+    jobs: int = typer.Option(
+        os.cpu_count() or 1, "--jobs", "-j", help="With --images, the maximum parallel probes."
+    ),
+):
     """
     Validate the components' component.yaml files.
 
+    With --images, the image.user, image.workdir and language.version settings are also checked
+    against the components' local images and their base images.
+    \f
+
     :param components: The components to validate, default is all of them.
+    :param images: Whether to check the component.yaml files against the built images too.
+    :param jobs: With --images, the maximum number of probe containers to run at once.
     """
     _validate_components(components or Component)
+    if images:
+        problems = _project.validate_images(
+            [component.value for component in components or Component], jobs=jobs
+        )
+        for problem in problems:
+            logger.error("%s: %s", problem.component, problem.message)
+        if problems:
+            raise typer.Abort()
 
 
 @app.command("list")
@@ -107,42 +170,48 @@ def _list():
     logger.info(
         "Current components:\n%s",
         "\n".join(
-            f"    {component.value:16} | {_get_component_type(component):10}"
+            f"    {component.value:16} | {_project.get_component_type(component.value):10}"
             for component in Component
         ),
     )
 
 
-def _get_component_type(component: Component) -> str:
-    component_config = _get_component_config(component)
-    if not component_config:
-        return "traditional"
-    elif component_config.get("image", {}).get("base"):
-        return "compatible"
-    return "standard"
+_COMPONENT_TYPE_PROMPT = textwrap.dedent(
+    """
+    What kind of component do you wish to create?
+
+    1) Standard - An aladdin component where most of the boilerplate is taken
+                  care of for you already. It will be built from the default
+                  python base image.
+    2) Compatible - Use this if you need to use an alternative base image, but
+                    it's still a python-based image. You will still be able to
+                    compose other components into this component's image.
+    3) Traditional - No special handling will take place and you must provide your
+                     own Dockerfile.
+    """
+)
 
 
 @app.command()
 def create(
     name: pathlib.Path = typer.Argument(None),
-    component_type: ComponentType = typer.Option(
-        ComponentType.Standard,
-        hidden=True,
-        prompt=textwrap.dedent(
-            """
-            What kind of component do you wish to create?
-
-            1) Standard - An aladdin component where most of the boilerplate is taken
-                          care of for you already. It will be built from the default
-                          python base image.
-            2) Compatible - Use this if you need to use an alternative base image, but
-                            it's still a python-based image. You will still be able to
-                            compose other components into this component's image.
-            3) Traditional - No special handling will take place and you must provide your
-                             own Dockerfile.
-            """
-        ),
-        show_choices=False,
+    component_type: ComponentType = typer.Option(None, hidden=True, show_choices=False),
+    from_spec: pathlib.Path = typer.Option(
+        None,
+        exists=True,
+        dir_okay=False,
+        help="Create the components described in this file without prompting.",
+    ),
+    force: bool = typer.Option(
+        False, help="With --from-spec, delete and recreate any existing component directories."
+    ),
+    jobs: int = typer.Option(
+        os.cpu_count() or 1, "--jobs", "-j", help="With --from-spec, the maximum parallel builds."
+    ),
+    prebuild_editors: bool = typer.Option(
+        False,
+        envvar=prebuild.ENVVAR,
+        help="Then build any missing or outdated editor images in the background.",
     ),
 ):
     """
@@ -150,7 +219,43 @@ def create(
     \f
 
     :param name: The name of the new component.
+    :param component_type: The kind of component to create. You will be prompted if not provided.
+    :param from_spec: Create all of the components described in this spec file instead of prompting
+                      for the details. See :func:`_create_components_from_spec`.
+    :param force: When creating components from a spec file, replace any existing component
+                  directories rather than aborting.
+    :param jobs: When creating components from a spec file, the maximum number of components to
+                 build at once.
+    :param prebuild_editors: Then build the new components' editor images in the background, see
+                             :mod:`aladdin_project_tools.prebuild`.
+
+    **Examples:**
+
+    .. code-block:: shell
+        :caption: Create a component interactively
+
+        $ components create api
+
+    .. code-block:: shell
+        :caption: Create several components in CI, building them in parallel
+
+        $ components create --from-spec new-components.yaml --jobs 4
     """
+    if from_spec:
+        names = _create_components_from_spec(from_spec, force=force, jobs=jobs)
+        if prebuild_editors:
+            _prebuild_editors(names)
+        return
+
+    if component_type is None:
+        component_type = ComponentType(
+            typer.prompt(
+                _COMPONENT_TYPE_PROMPT,
+                default=ComponentType.Standard.value,
+                type=click.Choice([choice.value for choice in ComponentType]),
+                show_choices=False,
+            )
+        )
 
     if not name:
         name = pathlib.Path(typer.prompt("What is the name of the new component?"))
@@ -164,25 +269,28 @@ def create(
 
     if path.exists():
         typer.confirm("Directory already exists. Delete and recreate?", abort=True)
-        logger.notice("Deleting existing directory")
-        shutil.rmtree(path)
 
-    # Create the component directory
-    try:
-        logger.notice("Creating component directory")
-        path.mkdir()
-    except Exception:
-        logger.error("Could not create component directory")
-        raise typer.Abort()
+    lamp = _project.lamp
+
+    # Don't pull the component out from under another job that's building it
+    with locks.components_locked([component]):
+        if path.exists():
+            logger.notice("Deleting existing directory")
+            shutil.rmtree(path)
 
-    with open("lamp.json") as lamp_file:
-        lamp = json.load(lamp_file)
+        # Create the component directory
+        try:
+            logger.notice("Creating component directory")
+            path.mkdir()
+        except Exception:
+            logger.error("Could not create component directory")
+            raise typer.Abort()
 
-    # Delete the editor image, if it exists
-    project_name = lamp["name"]
-    editor_image = f"{project_name}-{component}:editor"
+        # Delete the editor image, if it exists
+        project_name = lamp["name"]
+        editor_image = f"{project_name}-{component}:editor"
 
-    subprocess.run(["docker", "rmi", "-f", editor_image], capture_output=True)
+        subprocess.run(["docker", "rmi", "-f", editor_image], capture_output=True)
 
     if component_type == ComponentType.Standard:
         _create_standard_component(lamp, component)
@@ -191,6 +299,279 @@ def create(
     else:
         _create_traditional_component(lamp, component)
 
+    if prebuild_editors:
+        _prebuild_editors([component])
+
+
+def _create_components_from_spec(spec_path: pathlib.Path, force: bool, jobs: int) -> List[str]:
+    """
+    Create components from a spec file without any prompts or container round trips.
+
+    The spec file holds either a single component spec or a ``components`` list of them. Each spec
+    has a ``name`` and optionally a ``type`` (``standard``, ``compatible`` or ``traditional``),
+    whether to create a ``dockerfile`` (default ``true``) and a ``pyproject`` mapping with the
+    ``description``, ``dependencies`` and ``dev-dependencies`` for the generated
+    ``pyproject.toml``. The ``language``, ``image`` and ``dependencies`` values are written to the
+    component.yaml file as-is, and a traditional component's Dockerfile is created ``FROM`` its
+    ``base`` value. See ``etc/sample_component_spec.yaml``.
+
+    Every file is generated on the host and validated before anything is built, then each new
+    component is built exactly once. Independent components are built in parallel.
+
+    :param spec_path: The spec file.
+    :param force: Replace any existing component directories rather than aborting.
+    :param jobs: The maximum number of components to build at once.
+    :returns: The names of the new components.
+    """
+    with open(spec_path) as spec_file:
+        spec_data = yaml.safe_load(spec_file) or {}
+    specs = spec_data["components"] if "components" in spec_data else [spec_data]
+    if not specs:
+        logger.error("%s does not describe any components", spec_path.as_posix())
+        raise typer.Abort()
+    if not all(isinstance(spec, dict) for spec in specs):
+        logger.error("Component specs in %s must be mappings", spec_path.as_posix())
+        raise typer.Abort()
+
+    lamp = _project.lamp
+
+    schema = project.load_schema()
+    names = [spec.get("name") for spec in specs]
+    known = set(names) | set(component.value for component in Component)
+
+    # Check everything up front so that we don't leave a partially created set of components
+    for name, spec in zip(names, specs):
+        if not name or len(pathlib.Path(name).parts) != 1:
+            logger.error("Component name must be a valid file name and not be a path: %s", name)
+            raise typer.Abort()
+
+        path = pathlib.Path("components") / name
+        if path.exists() and not force:
+            logger.error("Component directory %s already exists; Use --force", path.as_posix())
+            raise typer.Abort()
+
+        unknown = set(spec.get("dependencies", [])) - known
+        if unknown:
+            logger.error("Component '%s' has unknown dependencies: %s", name, ", ".join(unknown))
+            raise typer.Abort()
+
+        try:
+            component_type = _get_spec_component_type(spec)
+        except ValueError as e:
+            logger.error("Component '%s' has %s", name, e)
+            raise typer.Abort()
+        if component_type == ComponentType.Compatible and not _get_spec_base_image(spec):
+            logger.error("Compatible component '%s' must provide an image.base image", name)
+            raise typer.Abort()
+
+    if len(set(names)) != len(names):
+        logger.error("Component names in %s must be unique", spec_path.as_posix())
+        raise typer.Abort()
+
+    component_yamls = {}
+    for name, spec in zip(names, specs):
+        component_type = _get_spec_component_type(spec)
+        if component_type != ComponentType.Traditional:
+            component_yaml_data = _get_spec_component_yaml_data(spec, component_type)
+            try:
+                jsonschema.validate(instance=component_yaml_data, schema=schema)
+            except jsonschema.exceptions.ValidationError as e:
+                logger.error("Invalid component.yaml for %s component:\n%s", name, e)
+                raise typer.Abort()
+            component_yamls[name] = component_yaml_data
+        elif not spec.get("base"):
+            logger.error("Traditional component '%s' must provide a base image", name)
+            raise typer.Abort()
+
+    # Generate all of the files on the host, while no other job may be building these components
+    with locks.components_locked(names):
+        for name, spec in zip(names, specs):
+            component_type = _get_spec_component_type(spec)
+            path = pathlib.Path("components") / name
+            if path.exists():
+                logger.notice("Deleting existing %s directory", path.as_posix())
+                shutil.rmtree(path)
+            path.mkdir()
+
+            if component_type != ComponentType.Traditional:
+                _write_component_yaml(name, component_type, component_yamls[name])
+            if component_type == ComponentType.Traditional or spec.get("dockerfile", True):
+                _write_dockerfile(name, component_type, base_image=spec.get("base"))
+            if component_type != ComponentType.Traditional and spec.get("pyproject") is not None:
+                _write_pyproject_toml(
+                    name,
+                    f"{lamp['name']}-{name}",
+                    python_version=component_yamls[name]["language"].get("version", "3.8"),
+                    pyproject=spec["pyproject"] or {},
+                )
+
+        # Delete any stale editor images in one go
+        subprocess.run(
+            ["docker", "rmi", "-f"] + [f"{lamp['name']}-{name}:editor" for name in names],
+            capture_output=True,
+        )
+
+    # Build each new component once, waiting for any new components it depends on
+    width = max(len(name) for name in names)
+    results = parallel.run_tasks(
+        {
+            name: (
+                lambda name=name: _aladdin_build(
+                    [name], prefix=f"{name:{width}} | " if len(names) > 1 else None
+                ).returncode
+            )
+            for name in names
+        },
+        jobs=jobs,
+        dependencies={name: spec.get("dependencies", []) for name, spec in zip(names, specs)},
+    )
+
+    failed = [name for name in names if not results[name].ok or results[name].value]
+    if failed:
+        logger.error("Could not build components: %s", ", ".join(failed))
+        raise typer.Abort()
+
+    logger.success("New components created: %s", ", ".join(names))
+    return names
+
+
+def _get_spec_component_type(spec: dict) -> ComponentType:
+    """
+    Determine the kind of component described by a component spec.
+
+    :param spec: The component spec.
+    :returns: The component type.
+    :raises ValueError: If the spec has an unknown ``type``.
+    """
+    if spec.get("type"):
+        try:
+            return ComponentType[str(spec["type"]).capitalize()]
+        except KeyError:
+            raise ValueError(
+                f"an unknown type '{spec['type']}', expected standard, compatible or traditional"
+            ) from None
+    elif spec.get("base"):
+        return ComponentType.Traditional
+    elif _get_spec_base_image(spec):
+        return ComponentType.Compatible
+    return ComponentType.Standard
+
+
+def _get_spec_base_image(spec: dict) -> Optional[str]:
+    """
+    Get the ``image.base`` image of a component spec.
+
+    :param spec: The component spec.
+    :returns: The base image, if any.
+    """
+    image = spec.get("image")
+    return image.get("base") if isinstance(image, dict) else None
+
+
+def _get_spec_component_yaml_data(spec: dict, component_type: ComponentType) -> dict:
+    """
+    Get the component.yaml contents for a component spec.
+
+    Any python or image details missing from a compatible component's spec are read from its base
+    image, which is the only time we need to run a container when creating from a spec.
+
+    :param spec: The component spec.
+    :param component_type: The kind of component.
+    :returns: The component.yaml contents.
+    """
+    component_yaml_data = {
+        "meta": {"version": 1},
+        "language": {"name": "python", **spec.get("language", {})},
+    }
+    if spec.get("image"):
+        component_yaml_data["image"] = spec["image"]
+    if spec.get("dependencies"):
+        component_yaml_data["dependencies"] = list(spec["dependencies"])
+
+    if component_type == ComponentType.Standard:
+        component_yaml_data["language"].setdefault("version", "3.8")
+        return component_yaml_data
+
+    language = component_yaml_data["language"]
+    image = component_yaml_data["image"]
+    if not (
+        language.get("version")
+        and language.get("spec", {}).get("location")
+        and image.get("user", {}).get("name")
+        and image.get("workdir", {}).get("path")
+    ):
+        python_version, python_location, user_info, workdir = _get_image_info(image["base"])
+        language.setdefault("version", python_version)
+        language.setdefault("spec", {}).setdefault("location", python_location)
+        image.setdefault("user", {})
+        for key, value in user_info.items():
+            image["user"].setdefault(key, value)
+        image.setdefault("workdir", {"create": False}).setdefault("path", workdir)
+
+    return component_yaml_data
+
+
+def _write_pyproject_toml(
+    component: str, package_name: str, python_version: str, pyproject: dict
+) -> None:
+    """
+    Write a new component's pyproject.toml file, like ``poetry init`` would.
+
+    :param component: The name of the new component.
+    :param package_name: The poetry package name.
+    :param python_version: The component's python version, used for the python constraint.
+    :param pyproject: The ``description``, ``dependencies`` and ``dev-dependencies`` to include.
+    """
+    path = pathlib.Path("components") / component
+
+    def _toml_value(value) -> str:
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        elif isinstance(value, (int, float)):
+            return str(value)
+        elif isinstance(value, (list, tuple)):
+            return "[" + ", ".join(_toml_value(item) for item in value) + "]"
+        elif isinstance(value, dict):
+            items = (f"{_toml_key(k)} = {_toml_value(v)}" for k, v in value.items())
+            return "{" + ", ".join(items) + "}"
+        return json.dumps(str(value))
+
+    def _toml_key(key) -> str:
+        return key if re.match(r"^[A-Za-z0-9_-]+$", key) else json.dumps(key)
+
+    python_constraint = "^" + ".".join(str(python_version).split(".")[:2])
+    dependencies = {"python": python_constraint, **pyproject.get("dependencies", {})}
+
+    lines = [
+        "[tool.poetry]",
+        f"name = {_toml_value(package_name)}",
+        f"version = {_toml_value(pyproject.get('version', '0.1.0'))}",
+        f"description = {_toml_value(pyproject.get('description', ''))}",
+        f"authors = {_toml_value(pyproject.get('authors', []))}",
+        "",
+        "[tool.poetry.dependencies]",
+    ]
+    lines.extend(f"{_toml_key(k)} = {_toml_value(v)}" for k, v in dependencies.items())
+    lines.extend(["", "[tool.poetry.dev-dependencies]"])
+    lines.extend(
+        f"{_toml_key(k)} = {_toml_value(v)}"
+        for k, v in pyproject.get("dev-dependencies", {}).items()
+    )
+    lines.extend(
+        [
+            "",
+            "[build-system]",
+            'requires = ["poetry>=0.12"]',
+            'build-backend = "poetry.masonry.api"',
+            "",
+        ]
+    )
+
+    with open(path / "pyproject.toml", "w") as pyproject_file:
+        pyproject_file.write("\n".join(lines))
+
+    logger.notice("Created %s/pyproject.toml", path.as_posix())
+
 
 def _create_standard_component(lamp: dict, component: str) -> None:
     """
@@ -243,53 +624,11 @@ def _create_standard_component(lamp: dict, component: str) -> None:
             print()
 
     # Create the initial component.yaml file
-    with open(path / "component.yaml", "w") as component_yaml:
-        component_yaml.write(
-            textwrap.dedent(
-                f"""
-                ################################################################################
-                # This file was originally created with 'components create {component}'.
-                # You may modify it by hand, but take care when doing so.
-                ################################################################################
-
-                # Warning: If you add image.base, you will be transforming this to a "compatible",
-                #          component and the semantics of the values in this file will change.
-                #          If that's your intent, ensure that the other values in this file are
-                #          updated to match the new image as well. See the docs for further details.
-
-                """
-            ).lstrip()
-        )
-        component_yaml.write(yaml.dump(component_yaml_data))
-
-    logger.notice("Created %s/component.yaml file", path.as_posix())
+    _write_component_yaml(component, ComponentType.Standard, component_yaml_data)
 
     # Prompt them to potentially create a Dockerfile for their component
     if typer.confirm("Create a Dockerfile for the new component?", default=True):
-        with open(path / "Dockerfile", "w") as dockerfile:
-            dockerfile.write(
-                textwrap.dedent(
-                    f"""
-                    ### STANDARD DOCKERFILE ########################################################
-                    # Edit this file to further specialize your component image
-                    ################################################################################
-
-                    # Warning: If you change the image USER, be sure to update the component.yaml
-                    #          file accordingly to ensure that your python packages still work as
-                    #          expected.
-
-                    # Note: Do not provide any FROM instructions in this file.
-
-                    # Note: The WORKDIR contains the components/ directory with all of our
-                    #       components in it. Bear this in mind if you need to reference paths
-                    #       and files in this component's directory.
-                    #       For example:
-                    #           ENTRYPOINT "components/{component}/entrypoint.sh"
-                    """
-                ).lstrip()
-            )
-
-        logger.notice("Created %s/Dockerfile", path.as_posix())
+        _write_dockerfile(component, ComponentType.Standard)
 
     # Build the component image so we can use poetry to add dependencies
     logger.info("Building initial component image")
@@ -401,52 +740,11 @@ def _create_compatible_component(lamp: dict, component: str) -> None:
             print()
 
     # Create the initial component.yaml file
-    with open(path / "component.yaml", "w") as component_yaml:
-        component_yaml.write(
-            textwrap.dedent(
-                f"""
-                ################################################################################
-                # This file was originally created with 'components create {component}'.
-                # You may modify it by hand, but take care when doing so.
-                ################################################################################
-
-                # Warning: If you update image.base, ensure that the other values in this file are
-                #          updated to match the new image as well.
-
-                # Note: The WORKDIR contains the components/ directory with all of our components
-                #       in it. Bear this in mind if you need to reference paths and files in this
-                #       component's directory.
-                #       For example:
-                #           ENTRYPOINT "components/{component}/entrypoint.sh"
-                """
-            ).lstrip()
-        )
-        component_yaml.write(yaml.dump(component_yaml_data))
-
-    logger.notice("Created %s/component.yaml file", path.as_posix())
+    _write_component_yaml(component, ComponentType.Compatible, component_yaml_data)
 
     # Prompt them to potentially create a Dockerfile for their component
     if typer.confirm("Create a Dockerfile for the new component?", default=True):
-        with open(path / "Dockerfile", "w") as dockerfile:
-            dockerfile.write(
-                textwrap.dedent(
-                    f"""
-                    ### COMPATIBLE DOCKERFILE ######################################################
-                    # Edit this file to further specialize your component image
-                    ################################################################################
-
-                    # Note: Do not provide any FROM instructions in this file.
-
-                    # Note: The WORKDIR contains the components/ directory with all of our
-                    #       components in it. Bear this in mind if you need to reference paths
-                    #       and files in this component's directory.
-                    #       For example:
-                    #           ENTRYPOINT "components/{component}/entrypoint.sh"
-                    """
-                ).lstrip()
-            )
-
-        logger.notice("Created %s/Dockerfile", path.as_posix())
+        _write_dockerfile(component, ComponentType.Compatible)
 
     # Build the component image so we can use poetry to add dependencies
     logger.info("Building initial component image")
@@ -478,6 +776,114 @@ def _create_compatible_component(lamp: dict, component: str) -> None:
     )
 
 
+def _write_component_yaml(
+    component: str, component_type: ComponentType, component_yaml_data: dict
+) -> None:
+    """
+    Write a new component's component.yaml file.
+
+    :param component: The name of the new component.
+    :param component_type: The kind of component, either standard or compatible.
+    :param component_yaml_data: The contents of the component.yaml file.
+    """
+    path = pathlib.Path("components") / component
+
+    if component_type == ComponentType.Standard:
+        header = f"""
+            ################################################################################
+            # This file was originally created with 'components create {component}'.
+            # You may modify it by hand, but take care when doing so.
+            ################################################################################
+
+            # Warning: If you add image.base, you will be transforming this to a "compatible",
+            #          component and the semantics of the values in this file will change.
+            #          If that's your intent, ensure that the other values in this file are
+            #          updated to match the new image as well. See the docs for further details.
+
+            """
+    else:
+        header = f"""
+            ################################################################################
+            # This file was originally created with 'components create {component}'.
+            # You may modify it by hand, but take care when doing so.
+            ################################################################################
+
+            # Warning: If you update image.base, ensure that the other values in this file are
+            #          updated to match the new image as well.
+
+            # Note: The WORKDIR contains the components/ directory with all of our components
+            #       in it. Bear this in mind if you need to reference paths and files in this
+            #       component's directory.
+            #       For example:
+            #           ENTRYPOINT "components/{component}/entrypoint.sh"
+            """
+
+    with open(path / "component.yaml", "w") as component_yaml:
+        component_yaml.write(textwrap.dedent(header).lstrip())
+        component_yaml.write(yaml.dump(component_yaml_data))
+
+    logger.notice("Created %s/component.yaml file", path.as_posix())
+
+
+def _write_dockerfile(
+    component: str, component_type: ComponentType, base_image: str = None
+) -> None:
+    """
+    Write a new component's Dockerfile.
+
+    :param component: The name of the new component.
+    :param component_type: The kind of component.
+    :param base_image: The FROM image of a traditional component's Dockerfile.
+    """
+    path = pathlib.Path("components") / component
+
+    if component_type == ComponentType.Standard:
+        content = f"""
+            ### STANDARD DOCKERFILE ########################################################
+            # Edit this file to further specialize your component image
+            ################################################################################
+
+            # Warning: If you change the image USER, be sure to update the component.yaml
+            #          file accordingly to ensure that your python packages still work as
+            #          expected.
+
+            # Note: Do not provide any FROM instructions in this file.
+
+            # Note: The WORKDIR contains the components/ directory with all of our
+            #       components in it. Bear this in mind if you need to reference paths
+            #       and files in this component's directory.
+            #       For example:
+            #           ENTRYPOINT "components/{component}/entrypoint.sh"
+            """
+    elif component_type == ComponentType.Compatible:
+        content = f"""
+            ### COMPATIBLE DOCKERFILE ######################################################
+            # Edit this file to further specialize your component image
+            ################################################################################
+
+            # Note: Do not provide any FROM instructions in this file.
+
+            # Note: The WORKDIR contains the components/ directory with all of our
+            #       components in it. Bear this in mind if you need to reference paths
+            #       and files in this component's directory.
+            #       For example:
+            #           ENTRYPOINT "components/{component}/entrypoint.sh"
+            """
+    else:
+        content = f"""
+            ### TRADITIONAL DOCKERFILE #####################################################
+            # Edit this file to further specialize your component image
+            ################################################################################
+
+            FROM {base_image}
+            """
+
+    with open(path / "Dockerfile", "w") as dockerfile:
+        dockerfile.write(textwrap.dedent(content).lstrip())
+
+    logger.notice("Created %s/Dockerfile", path.as_posix())
+
+
 def _get_image_info(image: str) -> Tuple[str, str, dict, str]:
     """
     Retrieve the python version and user details of the image.
@@ -486,9 +892,9 @@ def _get_image_info(image: str) -> Tuple[str, str, dict, str]:
     :returns: The python version, python installation location, user details and workdir.
     """
     try:
-        # Perform a "no context" docker build
-        tag = f"{image}-extractor"
-        _docker_build(
+        # Perform a "no context" docker build, under a tag no other job will be using
+        tag = images.get_temporary_tag(image, "extractor")
+        project.docker_build(
             tags=tag,
             dockerfile=textwrap.dedent(
                 f"""
@@ -584,25 +990,11 @@ def _create_traditional_component(lamp: dict, component: str) -> None:
     :param lamp: The lamp file data.
     :param component: The name of the component to create.
     """
-    path = pathlib.Path("components") / component
     base_image = typer.prompt("What base image will you use?")
 
     # Prompt them to potentially create a Dockerfile for their component
     if typer.confirm("Create a Dockerfile for the new component?", default=True):
-        with open(path / "Dockerfile", "w") as dockerfile:
-            dockerfile.write(
-                textwrap.dedent(
-                    f"""
-                    ### TRADITIONAL DOCKERFILE #####################################################
-                    # Edit this file to further specialize your component image
-                    ################################################################################
-
-                    FROM {base_image}
-                    """
-                ).lstrip()
-            )
-
-        logger.notice("Created %s/Dockerfile", path.as_posix())
+        _write_dockerfile(component, ComponentType.Traditional, base_image=base_image)
 
         # Build the component image so we can use poetry to add dependencies
         logger.info("Building initial component image")
@@ -612,7 +1004,41 @@ def _create_traditional_component(lamp: dict, component: str) -> None:
 
 
 @app.command()
-def build(components: List[Component] = typer.Argument(None)):
+def build(
+    components: List[Component] = typer.Argument(None, autocompletion=complete_component_name),
+    engine: project.BuildEngine = typer.Option(
+        project.BuildEngine.aladdin,
+        envvar="COMPONENTS_BUILD_ENGINE",
+        help="Build with 'aladdin build' or with a single generated multi-stage build.",
+    ),
+    offline: bool = typer.Option(
+        False,
+        "--wheelhouse",
+        envvar="COMPONENTS_WHEELHOUSE",
+        help="Install python packages offline from the wheelhouse (native engine only).",
+    ),
+    hosts: str = typer.Option(
+        None,
+        envvar=distributed.HOSTS_ENVVAR,
+        help="Distribute the builds across these docker hosts, separated by spaces or commas.",
+    ),
+    cpus: float = typer.Option(
+        None,
+        help=f"The CPUs concurrent builds may use between them [env var: {admission.CPUS_ENVVAR}].",
+    ),
+    memory: str = typer.Option(
+        None,
+        help=(
+            "The memory concurrent builds may use between them, e.g. 8g "
+            f"[env var: {admission.MEMORY_ENVVAR}]."
+        ),
+    ),
+    prebuild_editors: bool = typer.Option(
+        False,
+        envvar=prebuild.ENVVAR,
+        help="Then build any missing or outdated editor images in the background.",
+    ),
+):
     """
     Build the docker images for the project's components.
 
@@ -625,6 +1051,23 @@ def build(components: List[Component] = typer.Argument(None)):
 
     :param components: The list of components to build. If none provided, all components will be
                        built.
+    :param engine: Which build engine to use. ``aladdin`` delegates to ``aladdin build``.
+                   ``native`` builds all of the components, and their dependencies, from a single
+                   generated multi-stage Dockerfile so that each dependency is built only once. See
+                   :mod:`aladdin_project_tools.multistage` for details.
+    :param offline: Install the components' locked python packages from the shared wheelhouse,
+                    without network access. Run ``components wheelhouse`` first to populate it.
+                    This requires the ``native`` engine.
+    :param hosts: The ``DOCKER_HOST`` values of several docker daemons to distribute the component
+                  builds across. The built images all end up on the first one. See
+                  :mod:`aladdin_project_tools.distributed` for details.
+    :param cpus: The number of CPUs that concurrent builds, from this and any other ``components``
+                 invocation, may use between them. Defaults to all of them.
+    :param memory: The amount of memory that concurrent builds may use between them. Defaults to
+                   three quarters of the machine's memory. See
+                   :mod:`aladdin_project_tools.admission` for details.
+    :param prebuild_editors: Then build any of the components' missing or outdated editor images in
+                             the background, see :mod:`aladdin_project_tools.prebuild`.
 
     **Examples:**
 
@@ -637,163 +1080,798 @@ def build(components: List[Component] = typer.Argument(None)):
         :caption: Build only the shared and api components
 
         $ components build --log-level DEBUG shared api
-    """
-    _validate_components(components or Component)
-
-    raise typer.Exit(_aladdin_build(component.value for component in components).returncode)
 
+    .. code-block:: shell
+        :caption: Build all components with the native multi-stage build engine
 
-def _validate_components(components: List[Component]):
-    """
-    Validate the components' component.yaml and Dockerfile files.
+        $ components build --engine native
 
-    :param component: The component to validate.
-    """
-    try:
-        with importlib.resources.path("aladdin_project_tools", "etc") as etc:
-            schema_file_path = etc / "component_schema.json"
+    .. code-block:: shell
+        :caption: Build all components, installing their python packages from the wheelhouse
 
-        with open(schema_file_path) as schema_file:
-            schema = json.load(schema_file)
-    except Exception as e:
-        logger.error("Failed to load schema file %s: %s", schema_file_path.as_posix(), e)
-        raise typer.Abort()
-    else:
-        jsonschema.Draft7Validator.check_schema(schema)
+        $ components wheelhouse
+        $ components build --engine native --wheelhouse
 
-    for component in components:
-        _validate_component(component, schema)
+    .. code-block:: shell
+        :caption: Build all components across three docker hosts
 
+        $ components build --hosts "unix:///var/run/docker.sock ssh://builder-1 ssh://builder-2"
 
-def _validate_component(component: Component, schema: dict) -> None:
-    """
-    Validate a component's component.yaml and Dockerfile files.
+    .. code-block:: shell
+        :caption: Build all components, using at most 4 CPUs and 6 GB of memory
 
-    :param component: The component to validate.
-    :param schema: The component.yaml JSONSchema.
+        $ components build --cpus 4 --memory 6g
     """
-    component_yaml = _get_component_config(component)
-    dockerfile_path = pathlib.Path("components") / component.value / "Dockerfile"
-
-    FROM_PATTERN = re.compile(r"^FROM .+")
-
-    if component_yaml:
-        try:
-            jsonschema.validate(instance=component_yaml, schema=schema)
-        except jsonschema.exceptions.ValidationError as e:
-            logger.error("Invalid component.yaml for %s component:\n%s", component.value, e)
-            raise typer.Abort()
-
-        if dockerfile_path.exists():
-            with open(dockerfile_path) as dockerfile:
-                for line in dockerfile:
-                    if FROM_PATTERN.match(line):
-                        logger.error(f"{dockerfile_path.as_posix()} contains a FROM line")
-                        raise typer.Abort()
-
-        # TODO: Ensure that the image USER info matches what's in component.yaml
+    components = list(components or Component)
+    _validate_components(components)
+    budget = _get_budget(cpus, memory)
 
-    elif dockerfile_path.exists():
-        with open(dockerfile_path) as dockerfile:
-            for line in dockerfile:
-                if FROM_PATTERN.match(line):
-                    break
-            else:
-                logger.error(f"{dockerfile_path.as_posix()} does not contain a FROM line")
-                raise typer.Abort()
-    else:
-        logger.error(
-            "Component '%s' must provide either component.yaml or Dockerfile", component.value
-        )
+    if offline and engine != project.BuildEngine.native:
+        logger.error("Installing from the wheelhouse requires --engine native")
         raise typer.Abort()
 
+    result = _project.build(
+        [component.value for component in components],
+        engine=engine,
+        hosts=distributed.parse_hosts(hosts) if hosts else None,
+        offline=offline,
+        budget=budget,
+        command=logger.name,
+    )
+    fields = {"phase": "build", "duration": result.duration}
+    if result.failed:
+        logger.error("Failed to build components: %s", ", ".join(result.failed), extra=fields)
+        raise typer.Exit(result.returncode)
 
-def _get_component_graph() -> DiGraph:
-    """
-    Get the dependency graph for our components.
+    logger.success("Built components: %s", ", ".join(result.components), extra=fields)
+    if prebuild_editors:
+        _prebuild_editors(result.components)
 
-    This reads the ``component.yaml`` file for each component to determine dependencies.
 
-    :returns: The dependency graph.
+@app.command()
+def pull(
+    components: List[Component] = typer.Argument(None, autocompletion=complete_component_name),
+    jobs: int = typer.Option(4, "--jobs", "-j", help="The number of images to pull at once."),
+    refresh: bool = typer.Option(
+        False, help="Pull tagged images again even if they are present, to pick up updates."
+    ),
+):
     """
-    # Create the graph
-    components = DiGraph()
-    components.add_nodes_from(Component)
-    for component in Component:
-        component_yaml = _get_component_config(component)
-        components.add_edges_from(
-            (Component[dependency], component)
-            for dependency in component_yaml.get("dependencies", [])
-        )
+    Pull the base images of the components ahead of a build.
+    \f
 
-    # Confirm that no cycles are present
-    try:
-        cycles = find_cycle(components)
-    except NetworkXNoCycle:
-        return components
-    else:
-        raise RuntimeError("Cycles found in component dependency graph", cycles)
+    The base images of all the components are found, deduped and pulled concurrently, so that a
+    build on a fresh machine isn't held up pulling them one at a time. Images that are already
+    present are skipped. See :mod:`aladdin_project_tools.baseimages` for which images are pulled.
 
+    :param components: The components whose base images to pull, default is all of them.
+    :param jobs: The maximum number of concurrent pulls.
+    :param refresh: Pull images referenced by tag even if they are present, in case the tag has
+                    moved. Images referenced by digest are never pulled again.
 
-def _get_component_config(component: Union[str, Component]) -> dict:
-    """
-    Read the contents of the component's component.yaml yaml file.
+    **Examples:**
 
-    :param component: The component whose component.yaml you wish to retrieve.
-    :returns: The config contents or the empty dictionary if it was not present.
+    .. code-block:: shell
+        :caption: Warm up a new machine before its first build
+
+        $ components pull && components build
     """
-    component_name = component.value if isinstance(component, Component) else component
-    try:
-        with open(
-            pathlib.Path("components") / component_name / "component.yaml"
-        ) as component_yaml_file:
-            return yaml.safe_load(component_yaml_file)
-    except FileNotFoundError:
-        return {}
+    components = list(components or Component)
 
+    base_images = baseimages.get_base_images(
+        {component.value: _get_component_config(component) for component in components}
+    )
+    present = images.inspect_images(base_images)
+    to_pull = [
+        reference
+        for reference in base_images
+        if not present.get(reference) or (refresh and "@" not in reference)
+    ]
+    for reference in sorted(set(base_images) - set(to_pull)):
+        logger.info("Already present: %s", reference)
+
+    def on_complete(result: parallel.TaskResult) -> None:
+        fields = {
+            "component": ", ".join(base_images[result.name]),
+            "phase": "pull",
+            "duration": result.duration,
+        }
+        if result.ok and not result.value.returncode:
+            logger.success("Pulled %s in %.1fs", result.name, result.duration, extra=fields)
+        else:
+            logger.error(
+                "Failed to pull %s, used by %s:\n%s",
+                result.name,
+                ", ".join(base_images[result.name]),
+                textwrap.indent(
+                    (result.value.output if result.ok else str(result.error)).rstrip(), "    "
+                ),
+                extra=fields,
+            )
 
-def _get_dependents_for(component: Component) -> Tuple[str]:
-    """
-    Get a list of all other components that depend on ``component`` at some level.
+    for reference in to_pull:
+        logger.info("Pulling %s", reference)
+    results = parallel.run_tasks(
+        {
+            reference: (
+                lambda reference=reference: parallel.run_command(
+                    ["docker", "pull", "--quiet", reference], stream=False
+                )
+            )
+            for reference in to_pull
+        },
+        jobs=jobs,
+        on_complete=on_complete,
+    )
 
-    :param component: The dependency component.
-    :return: The list of dependent components in topological order.
-    """
-    components = _get_component_graph()
-    dependents = dag.descendants(components, component)
-    return tuple(dag.topological_sort(components.subgraph(dependents)))
+    failed = [
+        result.name for result in results.values() if not result.ok or result.value.returncode
+    ]
+    logger.notice(
+        "Base images: %d present, %d pulled, %d failed",
+        len(base_images) - len(to_pull),
+        len(to_pull) - len(failed),
+        len(failed),
+    )
+    if failed:
+        raise typer.Exit(1)
 
 
 @app.command()
-def run(component: Component, command: List[str] = typer.Argument(None)):
+def size(
+    components: List[Component] = typer.Argument(None, autocompletion=complete_component_name),
+    tag: str = typer.Option("local", help="The tag of the component images to measure."),
+    compare: str = typer.Option(
+        None, help="Compare against this stored report name ('latest' for the last) or file."
+    ),
+    threshold: float = typer.Option(
+        5.0, help="With --compare, the percentage growth that counts as a regression."
+    ),
+    save: str = typer.Option(None, help="Store the report under this name."),
+    details: bool = typer.Option(False, help="Also show each image's layers."),
+):
     """
-    Run a command in a component's container.
-
-    This will mount the components/ directory in the container.
-
-    This doesn't precisely run the actual component's image, as oftentimes one will wish to
-    have an ENTRYPOINT and CMD already baked into the image. This runs an image with the sole
-    difference being that the ENTRYPOINT and CMD settings have been cleared. This gives us the
-    flexbility to get in and explore the container without compromising the image intended to be
-    published.
+    Report the size of the component images and what is taking up the space.
     \f
 
-    :param component: The component container to run.
-    :param command: Any remaining arguments will be passed to the container as its ``run`` command,
-                    defaults to ``/bin/bash``.
+    The bytes of each image layer are attributed to the base image, the OS packages from
+    ``image.packages``, the python packages, the component's own files or one of its dependency
+    components. Every report is stored so that later runs can be compared against it.
 
-                    .. important:: If these arguments contain ``-`` or ``--`` flags, you will need
-                                   to preface this argument list with ``--``.
+    :param components: The components to measure, default is all of them.
+    :param tag: The docker :-suffix tag of the images to measure, defaults to ``local``.
+    :param compare: The name of a stored report (or ``latest``), or the path to a report file, to
+                    compare the image sizes against. The command fails if any image grew by more
+                    than ``threshold``.
+    :param threshold: The percentage an image may grow before it is flagged, defaults to 5.
+    :param save: The name to store the report under, defaults to a timestamp.
+    :param details: Also show the size, category and instruction of each image layer.
 
     **Examples:**
 
     .. code-block:: shell
-        :caption: Run the default CMD for the ``pipeline-flake8`` container
+        :caption: Store a baseline, then check a later build against it
 
-        $ components run pipeline-flake8
+        $ components size --save baseline
+        $ components build
+        $ components size --compare baseline --threshold 10
+    """
+    components = list(components or Component)
 
-    .. code-block:: shell
-        :caption: Run a specific CMD for the ``pipeline`` container
+    lamp = _project.lamp
+
+    reports = sizes.analyze(
+        lamp["name"],
+        {component.value: _get_component_config(component) or {} for component in components},
+        tag=tag,
+    )
+
+    missing = [component.value for component in components if component.value not in reports]
+    if missing:
+        logger.warning("No %s image present for: %s", tag, ", ".join(missing))
+
+    previous = {}
+    if compare:
+        try:
+            previous = sizes.load_report(compare)
+        except (OSError, ValueError) as e:
+            logger.error("Could not load the %s size report: %s", compare, e)
+            raise typer.Abort()
+
+    rows = []
+    for component, report in reports.items():
+        delta = (
+            f"{images.format_bytes(report['size'] - previous[component]['size']):>10}"
+            if component in previous
+            else " " * 10
+        )
+        attribution = ", ".join(
+            f"{category} {images.format_bytes(size)}"
+            for category, size in sorted(report["attribution"].items(), key=lambda item: -item[1])
+            if size
+        )
+        rows.append(
+            f"    {component:16} | {images.format_bytes(report['size']):>10} | {delta} | "
+            f"{attribution}"
+        )
+        if details:
+            rows.extend(
+                f"        {images.format_bytes(layer['size']):>10} | {layer['category']:20} | "
+                f"{textwrap.shorten(layer['created_by'], 60)}"
+                for layer in report["layers"]
+                if layer["size"]
+            )
+
+    logger.info("Component image sizes:\n%s", "\n".join(rows) or "    None")
+
+    path = sizes.save_report(reports, name=save)
+    logger.notice("Stored size report at %s", path.as_posix())
+
+    if compare:
+        regressions = sizes.compare(reports, previous, threshold)
+        if regressions:
+            logger.error(
+                "Images grew by more than %s%%:\n%s",
+                threshold,
+                "\n".join(
+                    f"    {regression.component:16} | "
+                    f"{images.format_bytes(regression.previous):>10} -> "
+                    f"{images.format_bytes(regression.current):>10} | +{regression.growth:.1f}%"
+                    for regression in regressions
+                ),
+            )
+            raise typer.Exit(1)
+
+        logger.success("No images grew by more than %s%%", threshold)
+
+
+@app.command()
+def stats(
+    components: List[str] = typer.Argument(None, autocompletion=complete_component_name),
+    days: float = typer.Option(30, help="Only include the builds of this many recent days."),
+    command: str = typer.Option(None, help="Only include the builds run by this command."),
+):
+    """
+    Show how long the component builds took, how well they were cached and how big they got.
+    \f
+
+    Builds are recorded by ``components build``, ``create`` and ``edit``, and by ``docs build``.
+    The durations only include the builds of a component on its own; see
+    :mod:`aladdin_project_tools.metrics` for details.
+
+    :param components: The components to show, default is all of them (and the docs).
+    :param days: Only include the builds started within this many days, defaults to 30.
+    :param command: Only include the builds run by this command, e.g. ``build`` or ``docs build``.
+
+    **Examples:**
+
+    .. code-block:: shell
+        :caption: Show the metrics of the api component's builds in the last week
+
+        $ components stats --days 7 api
+    """
+    records = metrics.get_records(
+        components or (), since=time.time() - days * 24 * 60 * 60, command=command
+    )
+    if not records:
+        logger.warning("No builds recorded in the last %g days", days)
+        raise typer.Exit()
+
+    def seconds(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.1f}s"
+
+    summaries = metrics.get_stats(records)
+    logger.info(
+        "Builds in the last %g days, slowest first:\n"
+        "    component        | builds | failed |    p50 |    p90 |    max |  trend | cached |"
+        "       size\n%s",
+        days,
+        "\n".join(
+            f"    {summary.component:16} | {summary.builds:6} | {summary.failures:6} | "
+            f"{seconds(summary.p50):>6} | {seconds(summary.p90):>6} | "
+            f"{seconds(summary.slowest):>6} | "
+            + (f"{summary.trend:+5.0f}%" if summary.trend is not None else "     -")
+            + " | "
+            + (
+                f"{summary.cache_hit_ratio:>6.0%}"
+                if summary.cache_hit_ratio is not None
+                else "     -"
+            )
+            + " | "
+            + (
+                f"{images.format_bytes(summary.image_size):>10}"
+                if summary.image_size is not None
+                else "         -"
+            )
+            for summary in summaries
+        ),
+    )
+
+
+@app.command()
+def prune(
+    keep: int = typer.Option(
+        1, "--keep", "-k", min=1, help="The number of images to keep per component and tag."
+    ),
+    dry_run: bool = typer.Option(False, help="Only report what would be removed."),
+):
+    """
+    Remove the project's stale component images and generated build files.
+    \f
+
+    Builds leave the images they replace behind, untagged, and interrupted commands can leave
+    temporary tags behind. The newest images of each component and tag are kept, along with any
+    images that containers are using or that kept images were built on. The rest are removed with
+    a single ``docker rmi`` call. See :mod:`aladdin_project_tools.prune` for details.
+
+    :param keep: The number of images to keep per component and tag, and of each kind of generated
+                 build file.
+    :param dry_run: Only report what would be removed, and how much space that would reclaim.
+
+    **Examples:**
+
+    .. code-block:: shell
+        :caption: See how much space removing all but the two newest images would reclaim
+
+        $ components prune --keep 2 --dry-run
+    """
+    try:
+        plan, errors = _project.prune(keep=keep, dry_run=dry_run)
+    except subprocess.CalledProcessError as e:
+        logger.error("Could not list the images: %s", e)
+        raise typer.Abort()
+
+    if plan.images:
+        logger.info(
+            "%s images:\n%s",
+            "Stale" if dry_run else "Removed",
+            "\n".join(
+                f"    {image.component or '-':16} | {image.tag or '-':10} | {image.id:12} | "
+                f"{images.format_bytes(image.size):>10} | {', '.join(image.references)}"
+                for image in plan.images
+            ),
+        )
+    for error in errors:
+        logger.warning("%s", error)
+
+    logger.success(
+        "%s %d image(s) and %d build file(s), reclaiming at least %s",
+        "Would remove" if dry_run else "Removed",
+        len(plan.images),
+        len(plan.build_files),
+        images.format_bytes(plan.size),
+    )
+
+
+@app.command()
+def watch(
+    stop: bool = typer.Option(False, help="Stop the running watcher."),
+):
+    """
+    Cache image inspection data, kept up to date by following the docker events.
+    \f
+
+    A background process follows ``docker events`` and drops the cached data of the images each
+    event affects, so that commands can stop asking docker about images that haven't changed. See
+    :mod:`aladdin_project_tools.imagewatch` for details.
+
+    :param stop: Stop the running watcher, and stop caching image inspection data.
+
+    **Examples:**
+
+    .. code-block:: shell
+        :caption: Start caching image inspection data for the rest of the session
+
+        $ components watch
+    """
+    if stop:
+        pid = imagewatch.stop()
+        if pid:
+            logger.success("Stopped the watcher (pid %d)", pid)
+        else:
+            logger.info("No watcher is running")
+        return
+
+    pid = imagewatch.start()
+    if pid:
+        logger.success(
+            "Started the watcher (pid %d), logging to %s", pid, imagewatch.get_log_path().as_posix()
+        )
+    else:
+        logger.info("The watcher is already running (pid %s)", imagewatch.get_watcher())
+
+
+@app.command("doctor")
+def _doctor(
+    components: List[Component] = typer.Argument(None, autocompletion=complete_component_name),
+    json_output: bool = typer.Option(
+        False, "--json", help="Write the checks to stdout as JSON, for fleet-wide collection."
+    ),
+):
+    """
+    Find the environment problems that slow the component builds down.
+    \f
+
+    Measures the docker daemon's latency, the time it takes to start a container, the size of each
+    component's build context and the health of the cache directory, and checks the BuildKit and
+    storage driver settings and the free disk space. The checks are ranked by how much of a
+    bottleneck they are. See :mod:`aladdin_project_tools.doctor` for details.
+
+    :param components: The components whose build contexts and images to check, default is all of
+                       them.
+    :param json_output: Write the ranked checks to stdout as a JSON array rather than logging them.
+
+    **Examples:**
+
+    .. code-block:: shell
+        :caption: Collect the diagnostics of every engineer's machine
+
+        $ components doctor --json > doctor-$(hostname).json
+    """
+    checks = doctor.diagnose(_project, [component.value for component in components or Component])
+
+    if json_output:
+        print(json.dumps([check.to_json() for check in checks], indent=2))
+        return
+
+    logger.info(
+        "Diagnostics, biggest bottleneck first:\n%s",
+        "\n".join(
+            f"    {check.score:6.2f} | {check.name:16} | {check.subject:24} | {check.message}"
+            for check in checks
+        ),
+    )
+    bottlenecks = [check for check in checks if check.is_bottleneck]
+    for check in bottlenecks:
+        logger.warning("%s: %s. %s", check.name, check.message, check.advice)
+    if not bottlenecks:
+        logger.success("No bottlenecks found")
+
+
+@app.command()
+def lint(
+    components: List[Component] = typer.Argument(None, autocompletion=complete_component_name),
+    cache: bool = typer.Option(
+        False, "--cache", help="Check for patterns that defeat layer caching, the default."
+    ),
+    json_output: bool = typer.Option(
+        False, "--json", help="Write the findings to stdout as JSON, for CI systems to parse."
+    ),
+    jobs: int = typer.Option(
+        os.cpu_count() or 1, "--jobs", "-j", help="The maximum components to lint at once."
+    ),
+):
+    """
+    Lint the components' Dockerfiles and component.yaml files.
+
+    Finds the patterns that make typical source edits rebuild more of the component images than
+    they need to, estimates which steps an edit to each component's sources reruns, and suggests
+    how to reorder them. Fails if anything is found.
+    \f
+
+    The layer caching checks are the only checks so far, so they run with or without ``--cache``.
+    See :mod:`aladdin_project_tools.cachelint` for the patterns checked.
+
+    :param components: The components to lint, default is all of them.
+    :param cache: Check for the patterns that defeat layer caching.
+    :param json_output: Write a report of each component to stdout as a JSON array rather than
+                        logging them.
+    :param jobs: The maximum number of components to lint at once.
+
+    **Examples:**
+
+    .. code-block:: shell
+        :caption: Fail a CI job on Dockerfiles that defeat layer caching
+
+        $ components lint --cache --json > lint.json
+    """
+    reports = cachelint.lint(
+        _project, [component.value for component in components or Component], jobs=jobs
+    )
+    findings = [finding for report in reports for finding in report.findings]
+
+    if json_output:
+        print(json.dumps([report.to_json() for report in reports], indent=2))
+    else:
+        logger.info(
+            "Steps rerun by an edit to each component's sources:\n%s",
+            "\n".join(
+                f"    {report.component:16} | {len(report.invalidated):3} of "
+                f"{report.instructions:3} | "
+                + (f"from line {report.invalidated[0]}" if report.invalidated else "")
+                for report in reports
+            ),
+        )
+        for finding in findings:
+            logger.warning(
+                "%s%s: [%s] %s. %s",
+                finding.path,
+                f":{finding.line}" if finding.line else "",
+                finding.rule,
+                finding.message,
+                finding.suggestion,
+            )
+        if not findings:
+            logger.success("No cache-hostile patterns found")
+    if findings:
+        raise typer.Exit(1)
+
+
+@app.command("logs")
+def _logs(
+    component: Component = typer.Argument(..., autocompletion=complete_component_name),
+    run: int = typer.Option(
+        None, "--run", "-r", help="The run to show, default is the latest; -2 is the one before."
+    ),
+    grep: str = typer.Option(None, help="Only show the lines matching this regular expression."),
+    errors: bool = typer.Option(False, help="Only show the lines around the errors."),
+    list_runs: bool = typer.Option(False, "--list", help="List the recorded builds."),
+):
+    """
+    Show the recorded output of a component's builds.
+    \f
+
+    The output of every build is archived, compressed, in the cache directory, and the last few
+    builds of each component are kept. See :mod:`aladdin_project_tools.buildlogs`.
+
+    :param component: The component.
+    :param run: The number of the run to show, as listed by ``--list``, default is the latest.
+                Negative numbers count back from the latest run.
+    :param grep: Only show the lines of the run's output that match this regular expression.
+    :param errors: Only show the lines around the errors, which are found without decompressing
+                   the rest of the output.
+    :param list_runs: List the component's recorded builds, rather than showing one.
+
+    **Examples:**
+
+    .. code-block:: shell
+        :caption: Show what went wrong in the api component's last failed build
+
+        $ components logs api --list
+        $ components logs api --run 12 --errors
+    """
+    if list_runs:
+        logger.info(
+            "Recorded builds of %s:\n%s",
+            component.value,
+            "\n".join(
+                f"    {entry.number:4} | {entry.time:25} | "
+                f"{'succeeded' if entry.succeeded else 'failed':9} | {entry.duration:7.1f}s | "
+                f"{images.format_bytes(entry.size):>10} | {len(entry.errors):3} error(s) | "
+                + ", ".join(entry.components)
+                for entry in buildlogs.list_runs(component.value)
+            )
+            or "    None",
+        )
+        return
+
+    entry = buildlogs.get_run(component.value, run)
+    if not entry:
+        logger.error(
+            "No recorded build of %s%s", component.value, f" numbered {run}" if run else ""
+        )
+        raise typer.Abort()
+    try:
+        pattern = re.compile(grep) if grep else None
+    except re.error as e:
+        logger.error("Invalid --grep pattern: %s", e)
+        raise typer.Abort()
+
+    logger.notice(
+        "Build %d of %s, started %s, %s",
+        entry.number,
+        component.value,
+        entry.time,
+        "succeeded" if entry.succeeded else "failed",
+    )
+    regions = buildlogs.read_errors(entry) if errors else [buildlogs.read_lines(entry)]
+    for index, region in enumerate(regions):
+        if index:
+            print("--")
+        for _, line in region:
+            if not pattern or pattern.search(line):
+                print(line)
+
+
+@app.command("hash")
+def _hash(
+    components: List[Component] = typer.Argument(None, autocompletion=complete_component_name),
+    ignore: List[str] = typer.Option(
+        None, help="Also exclude the files matching this .dockerignore pattern."
+    ),
+    jobs: int = typer.Option(
+        os.cpu_count() or 1, "--jobs", "-j", help="The maximum number of files to hash at once."
+    ),
+):
+    """
+    Show the fingerprints of the components' sources.
+    \f
+
+    A component's fingerprint covers every file in its directory that is sent to the docker build,
+    along with the fingerprints of the components it depends on, so it changes whenever the
+    component or any of its dependencies changes. Its tree fingerprint covers only its own files.
+    Unchanged files are not read again. See :mod:`aladdin_project_tools.fingerprints`.
+
+    :param components: The components to fingerprint, default is all of them.
+    :param ignore: Further ``.dockerignore`` patterns of files to exclude from the fingerprints.
+    :param jobs: The maximum number of files to hash at once, defaults to the number of CPUs.
+
+    **Examples:**
+
+    .. code-block:: shell
+        :caption: Show the fingerprints of the api component and its dependencies
+
+        $ components hash api
+    """
+    components = [component.value for component in components or Component]
+    try:
+        results = _project.fingerprint(components, ignore=ignore or (), jobs=jobs)
+    except (OSError, RuntimeError) as e:
+        logger.error("Could not fingerprint the components: %s", e)
+        raise typer.Abort()
+
+    logger.info(
+        "Component fingerprints:\n    %-16s | %-40s | %-40s | files\n%s",
+        "component",
+        "fingerprint",
+        "tree",
+        "\n".join(
+            f"    {result.component:16} | {result.fingerprint} | {result.tree} | {result.files:5}"
+            for result in results.values()
+        ),
+    )
+
+
+@app.command("wheelhouse")
+def _wheelhouse(
+    components: List[Component] = typer.Argument(None, autocompletion=complete_component_name),
+    jobs: int = typer.Option(
+        os.cpu_count() or 1, "--jobs", "-j", help="The number of wheel build containers to run."
+    ),
+):
+    """
+    Build a shared wheelhouse from the components' poetry.lock files.
+    \f
+
+    The package pins from every component's ``poetry.lock`` file are deduped, so that each wheel is
+    downloaded, or built from source, only once, in a container matching the component's python
+    version. Wheels already present in the wheelhouse are skipped. Packages that the components
+    pin to different versions are reported. Use ``components build --engine native --wheelhouse``
+    to install the components' python packages from the wheelhouse without network access. See
+    :mod:`aladdin_project_tools.wheelhouse` for details.
+
+    :param components: The components whose pins to include, default is all of them.
+    :param jobs: The maximum number of ``pip wheel`` containers to run at once.
+    """
+    components = list(components or Component)
+
+    component_configs = {}
+    lock_paths = {}
+    for component in components:
+        lock_path = _components_path / component.value / "poetry.lock"
+        component_config = _get_component_config(component)
+        if component_config and lock_path.exists():
+            component_configs[component.value] = component_config
+            lock_paths[component.value] = lock_path
+
+    if not lock_paths:
+        logger.warning("No components have a poetry.lock file")
+        return
+
+    pins, conflicts = wheelhouse.collect_pins(lock_paths)
+    if conflicts:
+        logger.warning(
+            "Packages pinned to different versions by different components:\n%s",
+            "\n".join(
+                f"    {conflict.name:24} | "
+                + ", ".join(
+                    f"{version} ({', '.join(sorted(users))})"
+                    for version, users in sorted(conflict.versions.items())
+                )
+                for conflict in conflicts
+            ),
+        )
+
+    pins_by_python_version = {}
+    for component, component_config in component_configs.items():
+        component_pins = [pin for pin, users in pins.items() if component in users]
+        wheelhouse.write_requirements(component, component_pins)
+
+        python_version = str(
+            (component_config.get("language") or {}).get(
+                "version", multistage.DEFAULT_PYTHON_VERSION
+            )
+        )
+        pins_by_python_version.setdefault(python_version, set()).update(
+            pin for pin in component_pins if pin.category != "dev"
+        )
+
+    missing = {
+        python_version: wheelhouse.get_missing(version_pins, python_version)
+        for python_version, version_pins in pins_by_python_version.items()
+    }
+    missing = {python_version: pins for python_version, pins in missing.items() if pins}
+    logger.info(
+        "%d distinct pins across %d components; %d wheels to build",
+        len(pins),
+        len(lock_paths),
+        sum(len(pins) for pins in missing.values()),
+    )
+
+    results = wheelhouse.build_wheels(missing, jobs=jobs)
+    failed = [
+        result.name for result in results.values() if not result.ok or result.value.returncode
+    ]
+    if failed:
+        logger.error("Failed to build some wheels: %s", ", ".join(sorted(failed)))
+        raise typer.Exit(1)
+
+    logger.success("Wheelhouse is up to date at %s", wheelhouse.get_wheelhouse_dir().as_posix())
+
+
+def _validate_components(components: Iterable[Component]) -> None:
+    """
+    Validate the components' component.yaml and Dockerfile files, aborting on any problems.
+
+    :param components: The components to validate.
+    """
+    problems = _project.validate(component.value for component in components)
+    for problem in problems:
+        logger.error("%s", problem.message)
+    if problems:
+        raise typer.Abort()
+
+
+def _get_component_config(component: Union[str, Component]) -> dict:
+    """
+    Read the contents of the component's component.yaml yaml file.
+
+    :param component: The component whose component.yaml you wish to retrieve.
+    :returns: The config contents or the empty dictionary if it was not present.
+    """
+    return _project.get_config(component.value if isinstance(component, Component) else component)
+
+
+@app.command()
+def run(
+    component: Component = typer.Argument(..., autocompletion=complete_component_name),
+    command: List[str] = typer.Argument(None),
+    pool: bool = typer.Option(
+        False,
+        envvar="COMPONENTS_POOL",
+        help="Run the command in a long-lived pooled container with 'docker exec'.",
+    ),
+):
+    """
+    Run a command in a component's container.
+
+    This will mount the components/ directory in the container.
+
+    This doesn't precisely run the actual component's image, as oftentimes one will wish to
+    have an ENTRYPOINT and CMD already baked into the image. This runs an image with the sole
+    difference being that the ENTRYPOINT and CMD settings have been cleared. This gives us the
+    flexbility to get in and explore the container without compromising the image intended to be
+    published.
+    \f
+
+    :param component: The component container to run.
+    :param command: Any remaining arguments will be passed to the container as its ``run`` command,
+                    defaults to ``/bin/bash``.
+
+                    .. important:: If these arguments contain ``-`` or ``--`` flags, you will need
+                                   to preface this argument list with ``--``.
+    :param pool: Run the command in a pooled container rather than a fresh one. See
+                 :mod:`aladdin_project_tools.pool` for details.
+
+    **Examples:**
+
+    .. code-block:: shell
+        :caption: Run the default CMD for the ``pipeline-flake8`` container
+
+        $ components run pipeline-flake8
+
+    .. code-block:: shell
+        :caption: Run a specific CMD for the ``pipeline`` container
 
         $ components run pipeline prospector
 
@@ -801,16 +1879,212 @@ def run(component: Component, command: List[str] = typer.Argument(None)):
         :caption: Run a specific CMD with complex arguments for the ``pipeline`` container
 
         $ components run pipeline -- black --check --diff --target-version py38 .
+
+    .. code-block:: shell
+        :caption: Run a command in a warm, pooled container for the ``pipeline`` component
+
+        $ components run --pool pipeline prospector
     """
     raise typer.Exit(
         _docker_run(
-            component=component.value, tag="editor", command=list(command or ("/bin/bash",))
+            component=component.value,
+            tag="editor",
+            command=list(command or ("/bin/bash",)),
+            pooled=pool,
         ).returncode
     )
 
 
+@app.command("exec-all")
+def exec_all(
+    command: List[str] = typer.Argument(...),
+    components: List[Component] = typer.Option(
+        None, "--component", "-c", help="A component to run the command in. May be repeated."
+    ),
+    jobs: int = typer.Option(
+        os.cpu_count() or 1, "--jobs", "-j", help="The maximum number of concurrent containers."
+    ),
+    follow_dependencies: bool = typer.Option(
+        False, help="Only run the command in a component once its dependencies have finished."
+    ),
+    junit_xml: pathlib.Path = typer.Option(None, help="Also write the results to this JUnit file."),
+    pool: bool = typer.Option(
+        False,
+        envvar="COMPONENTS_POOL",
+        help="Run the commands in long-lived pooled containers with 'docker exec'.",
+    ),
+):
+    """
+    Run a command in many components' containers at once.
+    \f
+
+    The command is run in each component's editor image, from the component's directory, just as
+    with ``components edit``. Each line of output is prefixed with the component's name, and a
+    summary of the exit codes and durations is logged once all of the commands have finished.
+
+    :param command: The command to run in each container.
+
+                    .. important:: If these arguments contain ``-`` or ``--`` flags, you will need
+                                   to preface this argument list with ``--``.
+    :param components: The components to run the command in, default is all of them.
+    :param jobs: The maximum number of containers to run at once, defaults to the number of CPUs.
+    :param follow_dependencies: Do not run the command in a component until it has finished in all
+                                of that component's dependencies.
+    :param junit_xml: Write the results to this file in JUnit XML format, too.
+    :param pool: Run the commands in pooled containers rather than fresh ones.
+
+    **Examples:**
+
+    .. code-block:: shell
+        :caption: Run the tests in every component, four at a time
+
+        $ components exec-all --jobs 4 -- pytest -q
+
+    .. code-block:: shell
+        :caption: Lint the ``api`` and ``shared`` components and record the results for CI
+
+        $ components exec-all -c api -c shared --junit-xml lint.xml -- flake8 .
+    """
+    command = list(command)
+    components = list(components or Component)
+    if not components:
+        logger.error("There are no components to run the command in")
+        raise typer.Abort()
+    width = max(len(component.value) for component in components)
+    lock = threading.Lock()
+
+    def _task(component: Component):
+        @logs.context(component=component.value, phase="exec")
+        def _run():
+            if pool:
+                container, component_dir = _get_pooled_container(
+                    component.value, "editor", in_component_dir=True
+                )
+                cmd = container_pool.get_exec_command(
+                    container, command, workdir=component_dir, interactive=False
+                )
+            else:
+                cmd = _get_docker_run_command(
+                    component.value, "editor", command, in_component_dir=True, interactive=False
+                )
+            logger.debug("Running command for %s: %s", component.value, " ".join(cmd))
+            return parallel.run_command(cmd, prefix=f"{component.value:{width}} | ", lock=lock)
+
+        return _run
+
+    dependencies = None
+    if follow_dependencies:
+        graph = _project.get_graph()
+        dependencies = {
+            component.value: list(graph.predecessors(component.value))
+            for component in components
+        }
+
+    def on_complete(result: parallel.TaskResult) -> None:
+        logger.verbose(
+            "Command finished in %s with %s after %.1fs",
+            result.name,
+            f"exit code {result.value.returncode}" if result.ok else result.error,
+            result.duration,
+            extra={"component": result.name, "phase": "exec", "duration": result.duration},
+        )
+
+    results = parallel.run_tasks(
+        {component.value: _task(component) for component in components},
+        jobs=jobs,
+        dependencies=dependencies,
+        on_complete=on_complete,
+    )
+
+    summary = []
+    failed = []
+    for component in components:
+        result = results[component.value]
+        if not result.ok:
+            outcome = f"{'error':7} | {result.error}"
+        else:
+            status = "failed" if result.value.returncode else "ok"
+            outcome = f"{status:7} | exit code {result.value.returncode:<3}"
+        if not result.ok or result.value.returncode:
+            failed.append(component.value)
+        summary.append(f"    {component.value:{width}} | {outcome} | {result.duration:.1f}s")
+
+    logger.info("Results:\n%s", "\n".join(summary))
+
+    if junit_xml:
+        _write_junit_xml(junit_xml, " ".join(command), [results[c.value] for c in components])
+        logger.notice("Wrote results to %s", junit_xml.as_posix())
+
+    if failed:
+        logger.error("Command failed for: %s", ", ".join(failed))
+        raise typer.Exit(1)
+
+    logger.success("Command succeeded for all %d component(s)", len(components))
+
+
+def _write_junit_xml(path: pathlib.Path, name: str, results: List[parallel.TaskResult]) -> None:
+    """
+    Write the results of ``components exec-all`` in JUnit XML format.
+
+    Each component is reported as a single test case whose output is the command's output.
+
+    :param path: The file to write.
+    :param name: The name of the test suite.
+    :param results: The results of the command for each component.
+    """
+    suite = ElementTree.Element(
+        "testsuite",
+        name=name,
+        tests=str(len(results)),
+        failures=str(sum(1 for r in results if r.ok and r.value.returncode)),
+        errors=str(sum(1 for r in results if not r.ok)),
+        time=f"{sum(r.duration for r in results):.3f}",
+    )
+    for result in results:
+        case = ElementTree.SubElement(
+            suite,
+            "testcase",
+            classname="components",
+            name=result.name,
+            time=f"{result.duration:.3f}",
+        )
+        if not result.ok:
+            ElementTree.SubElement(case, "error", message=str(result.error))
+        else:
+            if result.value.returncode:
+                ElementTree.SubElement(
+                    case, "failure", message=f"exit code {result.value.returncode}"
+                )
+            ElementTree.SubElement(case, "system-out").text = result.value.output
+
+    ElementTree.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
+
+
 @app.command()
-def edit(component: Component):
+def edit(
+    component: Component = typer.Argument(..., autocompletion=complete_component_name),
+    pool: bool = typer.Option(
+        False,
+        envvar="COMPONENTS_POOL",
+        help="Run the editor in a long-lived pooled container with 'docker exec'.",
+    ),
+    cpus: float = typer.Option(
+        None,
+        help=f"The CPUs concurrent builds may use between them [env var: {admission.CPUS_ENVVAR}].",
+    ),
+    memory: str = typer.Option(
+        None,
+        help=(
+            "The memory concurrent builds may use between them, e.g. 8g "
+            f"[env var: {admission.MEMORY_ENVVAR}]."
+        ),
+    ),
+    prebuild_editors: bool = typer.Option(
+        False,
+        envvar=prebuild.ENVVAR,
+        help="Then build any missing or outdated editor images in the background.",
+    ),
+):
     """
     Run the editor container for the specified component.
 
@@ -822,9 +2096,17 @@ def edit(component: Component):
 
     If the poetry.lock file is changed, this will then rebuild this component and any components
     that depend upon it.
+
+    If the editor image is being built in the background, this waits for it.
     \f
 
     :param component: The component whose dependencies you wish to edit.
+    :param pool: Run the editor in a pooled container rather than a fresh one.
+    :param cpus: The number of CPUs that concurrent builds may use between them when rebuilding.
+    :param memory: The amount of memory that concurrent builds may use between them when rebuilding.
+    :param prebuild_editors: After rebuilding, build any outdated editor images of the component
+                             and its dependents in the background, see
+                             :mod:`aladdin_project_tools.prebuild`.
 
     **Example:**
 
@@ -833,79 +2115,122 @@ def edit(component: Component):
 
         $ components edit api
     """
-    with open("lamp.json") as lamp_file:
-        lamp = json.load(lamp_file)
-
-    project_name = lamp["name"]
+    budget = _get_budget(cpus, memory)
+    project_name = _project.name
     editor_image = f"{project_name}-{component.value}:editor"
+    # Attach to any background build of the editor image
+    prebuild.wait(component.value)
     try:
         subprocess.run(["docker", "inspect", editor_image], capture_output=True, check=True)
     except subprocess.CalledProcessError:
         logger.error("No editor image present for this component")
         raise typer.Abort()
 
-    poetry_lock_md5 = _get_poetry_lock_file_md5_digest(component)
+    poetry_lock_digest = _get_poetry_lock_file_digest(component)
     if _docker_run(
-        component=component.value, tag="editor", command=["/bin/bash"], in_component_dir=True
+        component=component.value,
+        tag="editor",
+        command=["/bin/bash"],
+        in_component_dir=True,
+        pooled=pool,
     ).returncode:
         logger.warning("Encountered an error when editing the component")
         raise typer.Abort()
 
-    if poetry_lock_md5 == _get_poetry_lock_file_md5_digest(component):
+    if poetry_lock_digest == _get_poetry_lock_file_digest(component):
         logger.info("No changes detected; Will not rebuild the component image")
         raise typer.Exit()
 
-    dependents = _get_dependents_for(component)
+    dependents = _project.get_dependents(component.value)
     if dependents:
         logger.notice(
             "Changes detected; Building the updated component image and any dependent components: %s",
-            ", ".join(dependent.value for dependent in dependents),
+            ", ".join(dependents),
         )
     else:
         logger.notice("Changes detected; Building the updated component image")
 
     # Build the component again
-    if _aladdin_build([component.value]).returncode:
+    if _aladdin_build([component.value], budget=budget).returncode:
         logger.error("Failed to build %s component after you edited it", component.value)
         raise typer.Abort()
 
     # Also rebuild any components that depended on it
     if dependents:
-        if _aladdin_build([dependent.value for dependent in dependents]).returncode:
+        if _aladdin_build(dependents, budget=budget).returncode:
             logger.error(
                 "Failed to build all dependent components after you edited %s", component.value
             )
             raise typer.Abort()
 
+    if prebuild_editors:
+        _prebuild_editors([component.value] + dependents)
+
+
+def _prebuild_editors(components: Iterable[str]) -> None:
+    """
+    Start building the components' missing or outdated editor images in the background.
+
+    :param components: The components.
+    """
+    queued = prebuild.start(_project, components)
+    if queued:
+        logger.info(
+            "Checking the editor images of %s in the background; See %s for the output",
+            ", ".join(queued),
+            prebuild.get_log_path().as_posix(),
+        )
+
 
-def _get_poetry_lock_file_md5_digest(component: Component) -> str:
+def _get_poetry_lock_file_digest(component: Component) -> str:
     """
-    Get the md5 digest of the contents of the poetry lock file.
+    Get the digest of the contents of the poetry lock file.
 
     :param component: The component whose poetry.lock file you wish to hash.
-    :return: The md5 digest, or None if the file was not present.
+    :return: The digest, or None if the file was not present.
     """
     poetry_lock_path = pathlib.Path("components") / component.value / "poetry.lock"
     if poetry_lock_path.exists():
-        with open(poetry_lock_path, "rb") as poetry_lock_file:
-            md5 = hashlib.md5(poetry_lock_file.read())
-        return md5.hexdigest()
+        return fingerprints.hash_file(poetry_lock_path)
 
 
-def _aladdin_build(components: Iterable[str] = ()) -> subprocess.CompletedProcess:
+def _aladdin_build(
+    components: Iterable[str], prefix: str = None, budget: admission.Resources = None
+) -> project.BuildResult:
     """
-    Build the provided components (or all of them, if none provided here).
+    Build the provided components with ``aladdin build``.
 
     :param components: The components to build.
-    :return: The completed process object
+    :param prefix: Prefix each line of the build output with this text, so that it can be told
+                   apart from the output of other concurrent builds.
+    :param budget: The resources that concurrent builds may use between them, defaults to
+                   :func:`aladdin_project_tools.admission.get_budget`.
+    :return: The outcome of the build.
     """
-    command = ["aladdin", "build"]
-    command.extend(components)
-    return subprocess.run(command)
+    return _project.build(components, prefix=prefix, budget=budget, command=logger.name)
+
+
+def _get_budget(cpus: Optional[float], memory: Optional[str]) -> admission.Resources:
+    """
+    Get the resource budget for builds, aborting if it's invalid.
+
+    :param cpus: The number of CPUs, if given on the command line.
+    :param memory: The amount of memory, if given on the command line.
+    :return: The budget.
+    """
+    try:
+        return admission.get_budget(cpus, memory)
+    except ValueError as e:
+        logger.error("%s", e)
+        raise typer.Abort()
 
 
 def _docker_run(
-    component: str, tag: str = "local", command: List[str] = None, in_component_dir: bool = False
+    component: str,
+    tag: str = "local",
+    command: List[str] = None,
+    in_component_dir: bool = False,
+    pooled: bool = False,
 ) -> subprocess.CompletedProcess:
     """
     Run a component's image with the build context mounted as a host volume.
@@ -915,90 +2240,321 @@ def _docker_run(
     :param in_component_dir: Run the command in the component directory rather than the
                              container working directory.
     :param command: The command to run in the container.
+    :param pooled: Run the command with ``docker exec`` in a long-lived pooled container instead of
+                   starting a new container.
     :return: The completed process object
     """
-    command = command or []
+    if pooled:
+        container, component_dir = _get_pooled_container(component, tag, in_component_dir)
+        return container_pool.execute(container, command or [], workdir=component_dir)
+
+    command = _get_docker_run_command(component, tag, command, in_component_dir)
+
+    logger.debug("Running docker container: %s", " ".join(command))
 
-    with open("lamp.json") as lamp_file:
-        lamp_data = json.load(lamp_file)
+    return subprocess.run(command)
+
+
+def _get_docker_run_command(
+    component: str,
+    tag: str = "local",
+    command: List[str] = None,
+    in_component_dir: bool = False,
+    interactive: bool = True,
+) -> List[str]:
+    """
+    Get the ``docker run`` command line that runs a component's image.
+
+    :param component: The component whose image to run.
+    :param tag: The docker :-suffix tag of the image to run, defaults to ``'local'``.
+    :param command: The command to run in the container.
+    :param in_component_dir: Run the command in the component directory rather than the
+                             container working directory.
+    :param interactive: Attach a terminal and stdin to the container.
+    :return: The command line.
+    """
+    command = command or []
 
-    project_name = lamp_data["name"]
+    project_name = _project.name
     image = f"{project_name}-{component}:{tag}"
 
     workdir = pathlib.Path(_get_workdir(image))
     component_dir = (workdir / "components" / component) if in_component_dir else None
 
-    cwd = os.getcwd()
-    cwd = cwd[len("/cygdrive") :] if cwd.startswith("/cygdrive") else cwd
-
-    command = (
-        ["docker", "run", "--rm", "-it", "-v", f"{cwd}/components:{workdir}/components"]
+    return (
+        ["docker", "run", "--rm"]
+        + (["-it"] if interactive else [])
+        + ["-v", f"{_get_host_cwd()}/components:{workdir}/components"]
         + (["-w", component_dir.as_posix()] if component_dir else [])
         + [image]
         + command
     )
 
-    logger.debug("Running docker container: %s", " ".join(command))
 
-    return subprocess.run(command)
+def _get_pooled_container(
+    component: str, tag: str = "local", in_component_dir: bool = False
+) -> Tuple[container_pool.PooledContainer, Optional[pathlib.Path]]:
+    """
+    Get a running pooled container for a component's image.
 
+    :param component: The component whose image to run.
+    :param tag: The docker :-suffix tag of the image to run, defaults to ``'local'``.
+    :param in_component_dir: Also return the component directory in the container.
+    :return: The pooled container and the component directory, if requested.
+    """
+    project_name = _project.name
 
-def _docker_build(
-    tags: Union[str, List[str]],
-    buildargs: dict = None,
-    dockerfile: Union[pathlib.Path, bytes] = None,
-) -> None:
+    container_pool.reap_if_due(project_name)
+    try:
+        container = container_pool.acquire(
+            project_name, component, tag, mount_path=f"{_get_host_cwd()}/components"
+        )
+    except (RuntimeError, subprocess.CalledProcessError) as e:
+        logger.error("Could not start a pooled container for %s %s image: %s", component, tag, e)
+        raise typer.Abort()
+
+    component_dir = container.workdir / "components" / component if in_component_dir else None
+    return container, component_dir
+
+
+def _get_host_cwd() -> str:
     """
-    A convenience wrapper for calling out to "docker build".
+    Get the current directory as the docker daemon will see it.
 
-    We always send the same context: the entire components/ directory.
+    :return: The current directory path.
+    """
+    cwd = os.getcwd()
+    return cwd[len("/cygdrive") :] if cwd.startswith("/cygdrive") else cwd
+
+
+@pool_app.command("list")
+def pool_list():
+    """List the project's pooled containers."""
+    lamp = _project.lamp
+
+    containers = container_pool.list_containers(lamp["name"])
+    logger.info(
+        "Pooled containers:\n%s",
+        "\n".join(
+            f"    {container['name']:40} | {container['status']:24} | "
+            + ("unknown" if container["idle"] is None else f"idle {container['idle']:.0f}s")
+            for container in containers
+        )
+        or "    None",
+    )
+
+
+@pool_app.command("reap")
+def pool_reap(
+    idle_timeout: int = typer.Option(
+        None, help="Remove containers idle for at least this many seconds."
+    ),
+    all_containers: bool = typer.Option(False, "--all", help="Remove every pooled container."),
+):
+    """
+    Remove pooled containers that have been idle for too long.
+    \f
 
-    :param tags: The tags to be applied to the built image.
-    :param buildargs: Values for ARG instructions in the dockerfile.
-    :param dockerfile: The dockerfile to build against. If not provided, it's assumed that a
-                       Dockerfile is present in the context directory. If it's a bytes object, it
-                       will be provided to the docker build process on stdin and a "no context"
-                       build will take place. Otherwise, a normal docker build will be performed
-                       with the specified Dockerfile.
+    Idle containers are also reaped opportunistically whenever a pooled command is run.
+
+    :param idle_timeout: Remove containers idle for at least this many seconds, defaults to the
+                         ``COMPONENTS_POOL_IDLE_TIMEOUT`` environment variable or 30 minutes.
+    :param all_containers: Remove every pooled container, regardless of how long it's been idle.
     """
-    buildargs = buildargs or {}
-    buildargs.setdefault("CACHE_BUST", str(time.time()))
+    lamp = _project.lamp
 
-    cmd = ["env", "DOCKER_BUILDKIT=1", "docker", "build"]
+    removed = container_pool.reap(lamp["name"], idle_timeout=0 if all_containers else idle_timeout)
+    logger.success("Removed %d pooled container(s)", len(removed))
 
-    for key, value in buildargs.items():
-        cmd.extend(["--build-arg", f"{key}={value}"])
 
-    tags = [tags] if isinstance(tags, str) else tags
-    for tag in tags:
-        cmd.extend(["--tag", tag])
+@cache_app.command("stats")
+def cache_stats():
+    """
+    Show the size of the project's package manager build caches.
+    \f
 
-    if isinstance(dockerfile, bytes):
-        # If we receive the Dockerfile as content, we should pipe it to stdin.
-        # This is the "no context" build.
-        cmd.extend(["-"])
-    else:
-        # Otherwise, they can specify the path to the Dockerfile to use or let docker
-        # find one in the context directory.
-        if dockerfile:
-            cmd.extend(["-f", dockerfile.as_posix()])
-        cmd.extend(["components"])
+    These are the BuildKit cache mounts used for the apt, pip and poetry caches by
+    ``components build --engine native``. See :mod:`aladdin_project_tools.buildcache`.
+    """
+    lamp = _project.lamp
 
-    logger.debug("Docker build command: %s", " ".join(cmd))
-    _check_call(cmd, stdin=dockerfile if isinstance(dockerfile, bytes) else None)
+    try:
+        records = buildcache.list_caches(lamp["name"])
+    except subprocess.CalledProcessError as e:
+        logger.error("Could not read the BuildKit cache records: %s", e)
+        raise typer.Abort()
 
+    totals = {}
+    for record in records:
+        size, latest = totals.get(record.cache, (0, record))
+        if record.age is not None and (latest.age is None or record.age < latest.age):
+            latest = record
+        totals[record.cache] = (size + record.size, latest)
+    logger.info(
+        "Build caches:\n%s",
+        "\n".join(
+            f"    {buildcache.get_cache_id(lamp['name'], cache):32} | "
+            f"{images.format_bytes(totals.get(cache, (0,))[0]):>10} | "
+            + (totals[cache][1].last_used if cache in totals else "unused")
+            for cache in buildcache.CACHE_TARGETS
+        ),
+    )
 
-def _check_call(cmd: List[str], stdin: bytes = None) -> None:
+
+@cache_app.command("clear")
+def cache_clear(
+    caches: List[str] = typer.Argument(None),
+):
     """
-    Make a subprocess call and indent its output to match our python logging format.
+    Clear the project's package manager build caches.
+
+    Give any of apt-archives, apt-lists, pip or poetry to clear only those caches.
+    \f
 
-    :param cmd: The command to run.
-    :param stdin: Data to send to the subprocess as its input.
+    :param caches: The caches to clear, default is all of them.
     """
-    if stdin is None:
-        subprocess.run(cmd, check=True)
-    else:
-        ps = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-        stdout, stderr = ps.communicate(input=stdin)
-        if ps.returncode:
-            raise subprocess.CalledProcessError(ps.returncode, cmd)
+    unknown = set(caches or ()) - set(buildcache.CACHE_TARGETS)
+    if unknown:
+        logger.error("Unknown caches: %s", ", ".join(sorted(unknown)))
+        raise typer.Abort()
+
+    lamp = _project.lamp
+
+    try:
+        records = [
+            record
+            for record in buildcache.list_caches(lamp["name"])
+            if not caches or record.cache in caches
+        ]
+        buildcache.clear_caches(records)
+    except subprocess.CalledProcessError as e:
+        logger.error("Could not clear the BuildKit caches: %s", e)
+        raise typer.Abort()
+
+    logger.success(
+        "Cleared %d cache record(s), %s",
+        len(records),
+        images.format_bytes(sum(record.size for record in records)),
+    )
+
+
+@cache_app.command("export")
+def cache_export(
+    path: pathlib.Path = typer.Argument(...),
+    with_images: bool = typer.Option(
+        True, "--images/--no-images", help="Also export the component images."
+    ),
+):
+    """
+    Export the component images and build caches into a directory.
+    \f
+
+    The directory is content-addressed, so layers shared between images are stored only once and
+    exporting into the same directory again only writes what changed. The BuildKit cache of the
+    last ``components build --engine native`` is exported too, when the builder supports it. See
+    :mod:`aladdin_project_tools.artifacts` for details.
+
+    :param path: The export directory.
+    :param with_images: Also export the component images. They make up most of the export.
+
+    **Examples:**
+
+    .. code-block:: shell
+        :caption: Carry the caches between CI jobs
+
+        $ components cache import ci-cache/ || true
+        $ components build --engine native
+        $ components cache export ci-cache/
+    """
+    lamp = _project.lamp
+
+    _export_buildkit_cache()
+
+    refs = []
+    if with_images:
+        refs = [
+            f"{lamp['name']}-{component.value}:{tag}"
+            for component in Component
+            for tag in ("local", "editor")
+        ]
+
+    try:
+        summary = artifacts.export_artifacts(path, refs, get_cache_dir())
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.error("Failed to export the build artifacts: %s", e)
+        raise typer.Abort()
+
+    logger.success(
+        "Exported %d image(s) and %d cache file(s) to %s; Wrote %d new blob(s), %s",
+        summary.images,
+        summary.files,
+        path.as_posix(),
+        summary.blobs,
+        images.format_bytes(summary.bytes),
+    )
+
+
+@cache_app.command("import")
+def cache_import(path: pathlib.Path = typer.Argument(...)):
+    """
+    Restore the missing component images and build caches from an export directory.
+    \f
+
+    Images that are already present with the same image ID, and cache files that already exist,
+    are left alone.
+
+    :param path: The directory written by ``components cache export``.
+    """
+    try:
+        summary = artifacts.import_artifacts(path, get_cache_dir())
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        logger.error("Failed to import the build artifacts: %s", e)
+        raise typer.Abort()
+
+    logger.success(
+        "Loaded %d image(s) and restored %d cache file(s) from %s (%s)",
+        summary.images,
+        summary.files,
+        path.as_posix(),
+        images.format_bytes(summary.bytes),
+    )
+
+
+def _export_buildkit_cache() -> None:
+    """
+    Export the BuildKit cache of the last native build into the cache directory.
+
+    The last build is replayed with ``docker buildx bake``, which is fully cached, exporting each
+    target's cache to a local directory. The replay only exports the cache, leaving the images
+    alone, and is skipped if the components changed since the build, which it would then build
+    afresh. Builders using the default ``docker`` driver cannot export caches, in which case the
+    BuildKit cache is skipped.
+    """
+    definition, changed = _project.get_last_native_build()
+    if definition is None:
+        logger.info("No native build to export the BuildKit cache of")
+        return
+    if changed:
+        logger.warning(
+            "Skipping the BuildKit cache, since components changed after the last native build: %s",
+            ", ".join(changed),
+        )
+        return
+
+    for target, target_definition in definition.get("target", {}).items():
+        target_definition.pop("tags", None)
+        target_definition["output"] = ["type=cacheonly"]
+        cache_dir = get_cache_dir("buildkit", target).resolve().as_posix()
+        target_definition["cache-to"] = [f"type=local,dest={cache_dir},mode=max"]
+    bake_path = get_cache_dir("build") / "docker-bake-export.json"
+    cmd = ["env", "DOCKER_BUILDKIT=1", "docker", "buildx", "bake", "-f", bake_path.as_posix()]
+
+    with locks.cache_locked("buildkit"):
+        with locks.atomic_write(bake_path) as bake_file:
+            json.dump(definition, bake_file, indent=2)
+        ps = subprocess.run(cmd, capture_output=True)
+    if ps.returncode:
+        logger.warning(
+            "Skipping the BuildKit cache, which this builder could not export: %s",
+            (ps.stderr.decode().strip().splitlines() or [f"exit code {ps.returncode}"])[-1],
+        )
@@ -29,7 +29,8 @@ import typer
 import yaml
 from sphinx.cmd.build import main as sphinx_main
 
-from . import LogLevel, install_coloredlogs
+from .. import metrics
+from . import LOG_FORMAT_ENVVAR, LogFormat, LogLevel, install_logging
 
 # Created in the callback
 logger = None
@@ -46,6 +47,11 @@ def main(
     log_level: LogLevel = typer.Option(
         LogLevel.INFO, help="Set the Python logger log level for this command."
     ),
+    log_format: LogFormat = typer.Option(
+        LogFormat.text,
+        envvar=LOG_FORMAT_ENVVAR,
+        help="Log colored text, or newline-delimited JSON records for CI systems to parse.",
+    ),
 ):
     """
     Commands for generating the documentation.
@@ -53,10 +59,11 @@ def main(
 
     :param ctx: The typer-provided context for the command invocation.
     :param log_level: The Python logger log level for this command.
+    :param log_format: The format of the log output. See :mod:`aladdin_project_tools.logs`.
     """
     global logger
 
-    install_coloredlogs(log_level=log_level.value)
+    install_logging(log_level.value, log_format)
 
     logger = logging.getLogger(ctx.invoked_subcommand)
 
@@ -101,7 +108,9 @@ def build(
     built_path = pathlib.Path("docs") / "built"
     logger.info("Generating docs at %s", built_path.as_posix())
 
+    timer = metrics.BuildTimer("docs build", {"docs": None})
     result = sphinx_main(["-b", "html", "docs/source", "docs/built"])
+    timer.finish(not result)
     if not result:
         logger.success("Docs generated at %s", built_path.as_posix())
     else:
@@ -0,0 +1,269 @@
+"""
+Fast shell completion of component names.
+
+Completing a component name would normally import the entire ``components`` CLI, along with
+networkx, jsonschema and yaml, and list the ``components/`` directory on every tab press. Instead,
+the ``components`` script starts in :func:`main`, which answers component name completions from a
+small on-disk index of the project's component names and types before anything else is imported.
+The index also lists the CLI's top-level options that take a value, e.g. ``--log-format json``,
+which are derived from the CLI itself, so that the subcommand can be found after them. The index
+is rebuilt whenever the ``components/`` directory's or the CLI module's mtime changes. Every other
+invocation, including the completion of subcommands and options, is handed to the real CLI.
+
+Install the completion script for your shell with ``components --install-completion <shell>``.
+"""
+import json
+import os
+import pathlib
+import shlex
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import locks
+from .cache import get_cache_dir
+
+COMPLETE_VAR = "_COMPONENTS_COMPLETE"
+"""
+The environment variable the shell completion scripts use to request completions.
+"""
+
+SINGLE_COMPONENT_COMMANDS = {"run", "edit"}
+"""
+The subcommands whose first argument is a single component name.
+"""
+
+MULTIPLE_COMPONENT_COMMANDS = {"build", "validate"}
+"""
+The subcommands whose arguments are all component names.
+"""
+
+_components_path = pathlib.Path("components")
+_CLI_PATH = pathlib.Path(__file__).parent / "commands" / "components.py"
+
+
+def main() -> None:
+    """
+    The ``components`` script entry point.
+
+    Serve component name completions directly from the index when that's what the shell is asking
+    for, otherwise run the ``components`` CLI.
+    """
+    shell = os.environ.get(COMPLETE_VAR, "")
+    if shell.startswith("complete_") and _try_complete(shell[len("complete_") :]):
+        return
+
+    from .commands.components import app
+
+    app()
+
+
+def get_component_index() -> Dict[str, str]:
+    """
+    Get the project's component names and types, rebuilding the index if it's out of date.
+
+    :returns: The type of each component, keyed by name.
+    """
+    return _get_index().get("components", {})
+
+
+def _get_index() -> dict:
+    """
+    Read the completion index, rebuilding it if it's out of date.
+
+    :returns: The index, with the ``components`` and their types and the top-level
+              ``value_options``, or nothing if there is no ``components/`` directory.
+    """
+    try:
+        mtime_ns = _components_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    cli_mtime_ns = _CLI_PATH.stat().st_mtime_ns
+
+    index_path = get_cache_dir("completion") / "components.json"
+    try:
+        with open(index_path) as index_file:
+            index = json.load(index_file)
+        if index["mtime_ns"] == mtime_ns and index["cli_mtime_ns"] == cli_mtime_ns:
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+
+    index = dict(
+        mtime_ns=mtime_ns,
+        cli_mtime_ns=cli_mtime_ns,
+        components={
+            entry.name: _get_component_type(pathlib.Path(entry.path))
+            for entry in sorted(os.scandir(_components_path), key=lambda entry: entry.name)
+            if entry.is_dir()
+        },
+        value_options=_get_value_options(),
+    )
+
+    # Write then rename, so that concurrent completions never see a partial index
+    with locks.atomic_write(index_path) as index_file:
+        json.dump(index, index_file)
+
+    return index
+
+
+def complete_component_name(incomplete: str) -> List[Tuple[str, str]]:
+    """
+    Complete a component name argument.
+
+    This is also used as the ``autocompletion`` callback for the CLI's component arguments, for
+    when completion falls through to the CLI itself.
+
+    :param incomplete: The partially typed component name.
+    :returns: The matching component names and their types.
+    """
+    return [
+        (name, component_type)
+        for name, component_type in get_component_index().items()
+        if name.startswith(incomplete)
+    ]
+
+
+def _get_component_type(path: pathlib.Path) -> str:
+    """
+    Determine a component's type from its component.yaml file.
+
+    This is only done when the index is rebuilt, so we can afford to import yaml here.
+
+    :param path: The component's directory.
+    :returns: The component type.
+    """
+    try:
+        with open(path / "component.yaml") as component_yaml_file:
+            import yaml
+
+            component_config = yaml.safe_load(component_yaml_file) or {}
+    except (OSError, ValueError):
+        return "traditional"
+
+    if not component_config:
+        return "traditional"
+    elif (component_config.get("image") or {}).get("base"):
+        return "compatible"
+    return "standard"
+
+
+def _get_value_options() -> List[str]:
+    """
+    Get the CLI's top-level options that take a value, from the ``components`` app's callback.
+
+    This is only done when the index is rebuilt, so we can afford to import the CLI here.
+
+    :returns: The option names.
+    """
+    import click
+    import typer
+
+    from .commands.components import app
+
+    command = typer.main.get_command(app)
+    return sorted(
+        name
+        for param in command.params
+        if isinstance(param, click.Option) and not param.is_flag and not param.count
+        for name in param.opts
+    )
+
+
+def _try_complete(shell: str) -> bool:
+    """
+    Print the completions for a component name argument, if that's what is being completed.
+
+    :param shell: The shell requesting completions.
+    :returns: Whether the completions were handled here.
+    """
+    if shell == "bash":
+        words = _split(os.environ.get("COMP_WORDS", ""))
+        cword = int(os.environ.get("COMP_CWORD", 0))
+        args, incomplete = words[1:cword], (words[cword] if cword < len(words) else "")
+    elif shell in ("zsh", "fish", "powershell", "pwsh"):
+        completion_args = os.environ.get("_TYPER_COMPLETE_ARGS", "")
+        args = _split(completion_args)[1:]
+        if shell in ("powershell", "pwsh"):
+            incomplete = os.environ.get("_TYPER_COMPLETE_WORD_TO_COMPLETE", "")
+            if incomplete and args and args[-1] == incomplete:
+                args = args[:-1]
+        elif args and not completion_args.endswith(" "):
+            args, incomplete = args[:-1], args[-1]
+        else:
+            incomplete = ""
+    else:
+        return False
+
+    if incomplete.startswith("-"):
+        return False
+
+    already_given = _get_component_arguments(args, _get_index().get("value_options", []))
+    if already_given is None:
+        return False
+
+    choices = [
+        (name, component_type)
+        for name, component_type in complete_component_name(incomplete)
+        if name not in already_given
+    ]
+
+    if shell == "bash":
+        sys.stdout.write("".join(f"{name}\n" for name, _ in choices))
+    elif shell == "zsh":
+        if choices:
+            items = "\n".join(f'"{name}":"{component_type}"' for name, component_type in choices)
+            sys.stdout.write(f"_arguments '*: :(({items}))'\n")
+        else:
+            sys.stdout.write("_files\n")
+    elif shell == "fish":
+        if os.environ.get("_TYPER_COMPLETE_FISH_ACTION") == "is-args":
+            sys.exit(0 if choices else 1)
+        sys.stdout.write("".join(f"{name}\t{component_type}\n" for name, component_type in choices))
+    else:
+        sys.stdout.write(
+            "".join(f"{name}:::{component_type}\n" for name, component_type in choices)
+        )
+    return True
+
+
+def _get_component_arguments(
+    args: List[str], value_options: Iterable[str] = ()
+) -> Optional[List[str]]:
+    """
+    Determine whether the next argument is a component name.
+
+    :param args: The complete words on the command line, after the program name.
+    :param value_options: The top-level options that take a value.
+    :returns: The component names already given, or ``None`` if the next argument is not a
+              component name.
+    """
+    # Skip the top-level options, and their values, to find the subcommand
+    args = list(args)
+    value_options = set(value_options)
+    while args and args[0].startswith("-"):
+        option = args.pop(0)
+        if option in value_options and args:
+            args.pop(0)
+
+    if not args:
+        return None
+
+    command, positionals = args[0], [arg for arg in args[1:] if not arg.startswith("-")]
+    if command in MULTIPLE_COMPONENT_COMMANDS:
+        return positionals
+    elif command in SINGLE_COMPONENT_COMMANDS and not positionals:
+        return []
+    return None
+
+
+def _split(command_line: str) -> List[str]:
+    """
+    Split a command line into words, tolerating unbalanced quotes.
+
+    :param command_line: The command line.
+    :returns: The words.
+    """
+    try:
+        return shlex.split(command_line)
+    except ValueError:
+        return command_line.split()
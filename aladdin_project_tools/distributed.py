@@ -0,0 +1,274 @@
+"""
+Distribution of component builds across several docker daemons.
+
+Given a pool of docker hosts (``DOCKER_HOST`` values, e.g. ``ssh://builder-1`` or
+``tcp://10.0.0.2:2376``), each component is built on one of them as soon as its dependencies are
+built, with at most one build running on each host at a time. When a host becomes free, the next
+component goes to the free host that already holds the most of its dependency images. Any
+dependency images the host is missing are then copied to it, with ``docker save`` piped into
+``docker load``, before the build starts. Afterwards, the built images are copied to the first
+host of the pool, so that they end up where they will be used. Images are never copied to a host
+that already holds the current version.
+
+The per-host report shows how many builds and image transfers each host took on and how busy it was
+over the course of the whole build.
+"""
+import logging
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, NamedTuple, Sequence, Set, Tuple
+
+from . import images, logs, parallel
+
+HOSTS_ENVVAR = "COMPONENTS_BUILD_HOSTS"
+"""
+The environment variable listing the docker hosts to distribute builds across, separated by spaces
+or commas.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class HostReport(NamedTuple):
+    """What a docker host did during a distributed build."""
+
+    host: str
+    builds: List[str]
+    transfers: int
+    busy: float
+    utilization: float
+
+
+def parse_hosts(value: str) -> List[str]:
+    """
+    Parse a list of docker hosts.
+
+    :param value: The hosts, separated by spaces or commas.
+    :returns: The hosts, without duplicates.
+    """
+    return list(dict.fromkeys(host for host in value.replace(",", " ").split() if host))
+
+
+class HostPool:
+    """
+    The docker hosts of a distributed build, and the images each of them holds.
+
+    :param hosts: The docker hosts. The first one receives all of the built images.
+    :param image_names: The images to look for on each host.
+    """
+
+    def __init__(self, hosts: Sequence[str], image_names: Sequence[str]):
+        self.hosts = list(hosts)
+        self._condition = threading.Condition()
+        self._busy_hosts: Set[str] = set()
+        self._images: Dict[str, Set[str]] = {}
+        self._builds: Dict[str, List[str]] = {host: [] for host in self.hosts}
+        self._transfers: Dict[str, int] = {host: 0 for host in self.hosts}
+        self._busy_time: Dict[str, float] = {host: 0.0 for host in self.hosts}
+
+        inventories = parallel.run_tasks(
+            {
+                host: (lambda host=host: images.inspect_images(image_names, host=host))
+                for host in self.hosts
+            },
+            jobs=len(self.hosts),
+        )
+        for host, result in inventories.items():
+            found = result.value.items() if result.ok else ()
+            self._images[host] = {image for image, info in found if info}
+
+    @property
+    def primary(self) -> str:
+        """The host that receives all of the built images."""
+        return self.hosts[0]
+
+    def acquire(self, wanted: Sequence[str]) -> str:
+        """
+        Wait for a free host, preferring the one that holds the most of the wanted images.
+
+        :param wanted: The images the build will need.
+        :returns: The host, which is now busy.
+        """
+        with self._condition:
+            while len(self._busy_hosts) == len(self.hosts):
+                self._condition.wait()
+            host = max(
+                (host for host in self.hosts if host not in self._busy_hosts),
+                key=lambda host: (
+                    sum(image in self._images[host] for image in wanted),
+                    -self._busy_time[host],
+                ),
+            )
+            self._busy_hosts.add(host)
+            return host
+
+    def release(self, host: str, busy: float) -> None:
+        """
+        Free a host after a build.
+
+        :param host: The docker host.
+        :param busy: How long the host was busy, in seconds.
+        """
+        with self._condition:
+            self._busy_time[host] += busy
+            self._busy_hosts.discard(host)
+            self._condition.notify_all()
+
+    def record_build(self, host: str, component: str, built_images: Sequence[str]) -> None:
+        """
+        Record that a host built new versions of images, which outdates the other hosts' copies.
+
+        :param host: The docker host.
+        :param component: The component that was built.
+        :param built_images: The images that were built.
+        """
+        with self._condition:
+            self._builds[host].append(component)
+            for other_images in self._images.values():
+                other_images.difference_update(built_images)
+            self._images[host].update(built_images)
+
+    def transfer(self, image: str, destination: str) -> None:
+        """
+        Copy an image to a host from another host that holds it.
+
+        :param image: The image name.
+        :param destination: The docker host to copy the image to.
+        """
+        with self._condition:
+            sources = [host for host in self.hosts if image in self._images[host]]
+        if not sources or destination in sources:
+            return
+
+        source = sources[0]
+        start = time.monotonic()
+        save = subprocess.Popen(["docker", "--host", source, "save", image], stdout=subprocess.PIPE)
+        load = subprocess.run(
+            ["docker", "--host", destination, "load"], stdin=save.stdout, capture_output=True
+        )
+        save.stdout.close()
+        if save.wait() or load.returncode:
+            raise RuntimeError(
+                f"Failed to copy {image} from {source} to {destination}: "
+                f"{load.stderr.decode().strip()}"
+            )
+
+        with self._condition:
+            self._images[destination].add(image)
+            self._transfers[destination] += 1
+
+        duration = time.monotonic() - start
+        logger.debug(
+            "Copied %s from %s to %s in %.1fs",
+            image,
+            source,
+            destination,
+            duration,
+            extra={"phase": "transfer", "duration": duration},
+        )
+
+    def get_reports(self, elapsed: float) -> List[HostReport]:
+        """
+        Summarize what each host did.
+
+        :param elapsed: The duration of the whole build, in seconds.
+        :returns: The report for each host.
+        """
+        with self._condition:
+            return [
+                HostReport(
+                    host=host,
+                    builds=list(self._builds[host]),
+                    transfers=self._transfers[host],
+                    busy=self._busy_time[host],
+                    utilization=self._busy_time[host] / elapsed if elapsed else 0.0,
+                )
+                for host in self.hosts
+            ]
+
+
+def build(
+    components: Sequence[str],
+    dependencies: Mapping[str, Sequence[str]],
+    hosts: Sequence[str],
+    get_images: Callable[[str], List[str]],
+    build_component: Callable[[str, str], parallel.CommandResult],
+    on_complete: Callable[[parallel.TaskResult], None] = None,
+    priorities: Mapping[str, float] = None,
+) -> Tuple[Dict[str, parallel.TaskResult], List[HostReport]]:
+    """
+    Build components across a pool of docker hosts.
+
+    A component whose dependency failed to build is not built.
+
+    :param components: The components to build.
+    :param dependencies: All of the (transitive) dependencies of each component. Only the ones
+                         among ``components`` are waited on, but the images of all of them are
+                         copied to the building host.
+    :param hosts: The docker hosts. The first one receives all of the built images.
+    :param get_images: Get the names of the images a component's build produces.
+    :param build_component: Build a component on a docker host.
+    :param on_complete: A function to call with each component's result as soon as it's available.
+    :param priorities: Start the components that are ready to build in order of descending
+                       priority, e.g. their expected build duration.
+    :returns: The outcome of each component's build and a report of each host's work.
+    """
+    pool = HostPool(
+        hosts,
+        [
+            image
+            for component in set(components).union(*dependencies.values())
+            for image in get_images(component)
+        ],
+    )
+    failed = set()
+    failed_lock = threading.Lock()
+
+    def build_on_a_host(component: str) -> parallel.CommandResult:
+        with failed_lock:
+            failed_dependencies = sorted(failed.intersection(dependencies.get(component, ())))
+        if failed_dependencies:
+            raise RuntimeError(f"Dependencies failed to build: {', '.join(failed_dependencies)}")
+
+        wanted = [
+            image
+            for dependency in dependencies.get(component, ())
+            for image in get_images(dependency)
+        ]
+        host = pool.acquire(wanted)
+        start = time.monotonic()
+        try:
+            with logs.context(component=component):
+                for image in wanted:
+                    pool.transfer(image, host)
+
+                result = build_component(component, host)
+                if not result.returncode:
+                    pool.record_build(host, component, get_images(component))
+                    # Gather the built images where they'll be used
+                    for image in get_images(component):
+                        pool.transfer(image, pool.primary)
+            return result
+        finally:
+            pool.release(host, time.monotonic() - start)
+
+    def complete(result: parallel.TaskResult) -> None:
+        if not result.ok or result.value.returncode:
+            with failed_lock:
+                failed.add(result.name)
+        if on_complete:
+            on_complete(result)
+
+    start = time.monotonic()
+    results = parallel.run_tasks(
+        {
+            component: (lambda component=component: build_on_a_host(component))
+            for component in components
+        },
+        jobs=len(pool.hosts),
+        dependencies=dependencies,
+        on_complete=complete,
+        priorities=priorities,
+    )
+    return results, pool.get_reports(time.monotonic() - start)
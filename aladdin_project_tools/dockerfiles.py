@@ -0,0 +1,383 @@
+"""
+Parsing of the components' Dockerfiles.
+
+Validation, base image pulls and build context pruning all need facts about the components'
+Dockerfiles: their base images, build stages, ``ARG`` instructions, the files they ``COPY`` from
+the build context, and their ``USER`` and ``WORKDIR``. :func:`parse` reads a Dockerfile in a single
+pass over its lines, following the same rules as docker's own parser:
+
+* Instructions are case-insensitive, so ``from`` is as much a ``FROM`` instruction as ``FROM``.
+* The ``# escape=`` parser directive, which is only recognized at the top of the file, changes the
+  escape character, and with it the character that continues an instruction on the next line.
+* Comment lines and empty lines within a continued instruction are dropped.
+* The bodies of ``<<EOF`` heredocs are kept with their instruction rather than read as
+  instructions.
+* Variables in ``FROM`` instructions are expanded from the defaults of the ``ARG`` instructions
+  that precede the first ``FROM``, and a stage built ``FROM`` an earlier stage starts with that
+  stage's ``USER`` and ``WORKDIR``.
+
+:func:`read` keeps the parsed Dockerfiles for as long as their inode, size and modification time
+are unchanged, so that every caller in a process shares a single parse of each file. The parsed
+Dockerfiles are shared, so callers must not modify them.
+"""
+import json
+import os
+import pathlib
+import posixpath
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from .fingerprints import RACY_INTERVAL_NS
+
+DEFAULT_ESCAPE = "\\"
+DIRECTIVES = ("syntax", "escape", "check")
+
+_DIRECTIVE_PATTERN = re.compile(r"^#\s*([A-Za-z]+)\s*=\s*(.*?)\s*$")
+_INSTRUCTION_PATTERN = re.compile(r"^\s*([A-Za-z]+)(?:\s+(.*))?$", re.DOTALL)
+_HEREDOC_PATTERN = re.compile(r"<<(-?)([\"']?)([A-Za-z_][A-Za-z0-9_]*)\2")
+_VARIABLE_PATTERN = re.compile(r"\$(?:\{([A-Za-z_][A-Za-z0-9_]*)(?::-([^}]*))?\}|([A-Za-z_]\w*))")
+
+_cache: Dict[str, Tuple[tuple, "Dockerfile"]] = {}
+_cache_lock = threading.Lock()
+
+
+class Instruction(NamedTuple):
+    """A Dockerfile instruction."""
+
+    keyword: str
+    """The instruction, in upper case."""
+    arguments: str
+    """The instruction's arguments after its flags, with continued lines joined."""
+    flags: Mapping[str, Optional[str]]
+    """The instruction's leading ``--name=value`` flags, with ``None`` for ``--name`` flags."""
+    heredocs: Tuple[str, ...]
+    """The bodies of the instruction's heredocs."""
+    line: int
+    """The number of the line the instruction starts on."""
+
+
+class Stage(NamedTuple):
+    """A Dockerfile build stage."""
+
+    name: Optional[str]
+    """The stage name from ``FROM ... AS name``, in lower case."""
+    base: str
+    """The ``FROM`` image or stage, with the variables that could be expanded expanded."""
+    image: Optional[str]
+    """The external base image, or ``None`` if the stage is built from an earlier stage,
+    ``scratch`` or an image reference that refers to unknown variables."""
+    line: int
+    """The number of the line of the stage's ``FROM`` instruction."""
+    args: Mapping[str, Optional[str]]
+    """The stage's ``ARG`` instructions, with their defaults."""
+    copy_sources: Tuple[str, ...]
+    """The build context paths copied by the stage's ``COPY`` and ``ADD`` instructions."""
+    copy_from: Tuple[str, ...]
+    """The stages and images named by the stage's ``COPY --from`` instructions."""
+    user: Optional[str]
+    """The user from the stage's last ``USER`` instruction, or its base stage's."""
+    workdir: Optional[str]
+    """The working directory from the stage's ``WORKDIR`` instructions, or its base stage's."""
+
+
+class Dockerfile(NamedTuple):
+    """A parsed Dockerfile."""
+
+    directives: Mapping[str, str]
+    """The parser directives, with lower case names."""
+    args: Mapping[str, Optional[str]]
+    """The ``ARG`` instructions before the first ``FROM``, with their defaults."""
+    stages: Tuple[Stage, ...]
+    """The build stages, in order."""
+    instructions: Tuple[Instruction, ...]
+    """All the instructions, in order."""
+
+    @property
+    def has_from(self) -> bool:
+        """Whether the Dockerfile has a ``FROM`` instruction."""
+        return bool(self.stages)
+
+    @property
+    def base_images(self) -> List[str]:
+        """The external images the stages are built from, in order of appearance."""
+        images = []
+        for stage in self.stages:
+            if stage.image and stage.image not in images:
+                images.append(stage.image)
+        return images
+
+    @property
+    def user(self) -> Optional[str]:
+        """The user of the final stage."""
+        return self.stages[-1].user if self.stages else None
+
+    @property
+    def workdir(self) -> Optional[str]:
+        """The working directory of the final stage."""
+        return self.stages[-1].workdir if self.stages else None
+
+
+def read(path: pathlib.Path) -> Optional[Dockerfile]:
+    """
+    Parse a Dockerfile, or reuse the result of parsing it before if the file is unchanged.
+
+    :param path: The Dockerfile.
+    :returns: The parsed Dockerfile, or ``None`` if there is no such file.
+    """
+    path = os.path.abspath(path)
+    try:
+        stats = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (stats.st_ino, stats.st_size, stats.st_mtime_ns)
+    with _cache_lock:
+        cached = _cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    try:
+        with open(path) as dockerfile:
+            parsed = parse(dockerfile)
+    except FileNotFoundError:
+        return None
+    # A further change within the file system's timestamp granularity could go unnoticed
+    if time.time_ns() - stats.st_mtime_ns >= RACY_INTERVAL_NS:
+        with _cache_lock:
+            _cache[path] = (key, parsed)
+    return parsed
+
+
+def parse(lines: Iterable[str]) -> Dockerfile:
+    """
+    Parse a Dockerfile in a single pass.
+
+    :param lines: The Dockerfile's lines, e.g. an open file.
+    :returns: The parsed Dockerfile.
+    """
+    directives = {}
+    escape = DEFAULT_ESCAPE
+    in_directives = True
+    instructions = []
+
+    # The instruction being continued, and the heredocs it is waiting for
+    current: List[str] = []
+    start = 0
+    heredocs: List[Tuple[str, bool]] = []
+    bodies: List[List[str]] = []
+
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+
+        if heredocs:
+            delimiter, strip_tabs = heredocs[len(bodies) - 1]
+            if (line.lstrip("\t") if strip_tabs else line) == delimiter:
+                if len(bodies) == len(heredocs):
+                    instructions.append(_make_instruction(current, bodies, start))
+                    current, heredocs, bodies = [], [], []
+                else:
+                    bodies.append([])
+            else:
+                bodies[-1].append(line.lstrip("\t") if strip_tabs else line)
+            continue
+
+        if in_directives:
+            match = _DIRECTIVE_PATTERN.match(line)
+            name = match.group(1).lower() if match else None
+            if name in DIRECTIVES and name not in directives:
+                directives[name] = match.group(2)
+                if name == "escape" and match.group(2) in ("\\", "`"):
+                    escape = match.group(2)
+                continue
+            in_directives = False
+
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if not current:
+            start = number
+
+        if line.rstrip().endswith(escape):
+            current.append(line.rstrip()[:-1])
+            continue
+        current.append(line)
+
+        heredocs = [
+            (match.group(3), match.group(1) == "-")
+            for match in _HEREDOC_PATTERN.finditer(" ".join(current))
+        ]
+        if heredocs and _INSTRUCTION_PATTERN.match(current[0]).group(1).upper() in (
+            "RUN",
+            "COPY",
+            "ADD",
+        ):
+            bodies = [[]]
+        else:
+            heredocs = []
+            instructions.append(_make_instruction(current, [], start))
+            current = []
+
+    if current:
+        instructions.append(_make_instruction(current, bodies, start))
+
+    return _make_dockerfile(directives, instructions)
+
+
+def get_sources(instruction: Instruction) -> List[str]:
+    """
+    Get the sources of a ``COPY`` or ``ADD`` instruction, other than its heredocs.
+
+    :param instruction: The instruction.
+    :returns: The source paths, or URLs, relative to the build context or the ``--from`` stage.
+    """
+    words = _split_arguments(instruction.arguments)
+    return [word for word in words[:-1] if not word.startswith("<<")]
+
+
+def _make_instruction(parts: List[str], bodies: List[List[str]], line: int) -> Instruction:
+    """
+    Make an instruction from its lines.
+
+    :param parts: The instruction's lines, without their escape characters.
+    :param bodies: The lines of the instruction's heredocs.
+    :param line: The number of the line the instruction starts on.
+    :returns: The instruction.
+    """
+    match = _INSTRUCTION_PATTERN.match("".join(parts).strip())
+    if not match:
+        return Instruction("", "".join(parts).strip(), {}, (), line)
+    arguments = (match.group(2) or "").strip()
+    flags = {}
+    while arguments.startswith("--"):
+        flag, _, arguments = arguments.partition(" ")
+        name, equals, value = flag[2:].partition("=")
+        flags[name.lower()] = value if equals else None
+        arguments = arguments.lstrip()
+    return Instruction(
+        match.group(1).upper(),
+        arguments,
+        flags,
+        tuple("\n".join(body) + "\n" for body in bodies),
+        line,
+    )
+
+
+def _make_dockerfile(directives: Dict[str, str], instructions: List[Instruction]) -> Dockerfile:
+    """
+    Gather the facts about a Dockerfile's stages from its instructions.
+
+    :param directives: The parser directives.
+    :param instructions: The instructions.
+    :returns: The parsed Dockerfile.
+    """
+    args = {}
+    stages: List[Stage] = []
+    stage = None
+    for instruction in instructions:
+        keyword = instruction.keyword
+        if keyword == "FROM":
+            if stage:
+                stages.append(stage)
+            stage = _make_stage(instruction, args, stages)
+        elif keyword == "ARG":
+            for word in instruction.arguments.split():
+                name, equals, default = word.partition("=")
+                (stage.args if stage else args)[name] = (
+                    _unquote(default) if equals else None
+                )
+        elif not stage:
+            continue
+        elif keyword in ("COPY", "ADD"):
+            if "from" in instruction.flags:
+                stage = stage._replace(copy_from=stage.copy_from + (instruction.flags["from"],))
+            else:
+                sources = [source for source in get_sources(instruction) if "://" not in source]
+                stage = stage._replace(copy_sources=stage.copy_sources + tuple(sources))
+        elif keyword == "USER":
+            stage = stage._replace(user=instruction.arguments)
+        elif keyword == "WORKDIR":
+            workdir = _unquote(instruction.arguments)
+            stage = stage._replace(workdir=posixpath.join(stage.workdir or "/", workdir))
+    if stage:
+        stages.append(stage)
+    return Dockerfile(directives, args, tuple(stages), tuple(instructions))
+
+
+def _make_stage(
+    instruction: Instruction, args: Mapping[str, Optional[str]], stages: List[Stage]
+) -> Stage:
+    """
+    Start a build stage from its ``FROM`` instruction.
+
+    :param instruction: The ``FROM`` instruction.
+    :param args: The ``ARG`` instructions before the first ``FROM``.
+    :param stages: The earlier stages.
+    :returns: The stage, without any of its other instructions.
+    """
+    words = instruction.arguments.split()
+    name = words[2].lower() if len(words) >= 3 and words[1].lower() == "as" else None
+    raw = words[0] if words else ""
+    expanded = _expand(raw, args)
+    base = raw if expanded is None else expanded
+
+    parent = next((stage for stage in stages if stage.name and stage.name == base.lower()), None)
+    image = None if parent or expanded is None or base.lower() in ("", "scratch") else base
+    return Stage(
+        name,
+        base,
+        image,
+        instruction.line,
+        {},
+        (),
+        (),
+        parent.user if parent else None,
+        parent.workdir if parent else None,
+    )
+
+
+def _split_arguments(arguments: str) -> List[str]:
+    """
+    Split the arguments of an instruction that has a JSON array form, e.g. ``COPY``.
+
+    :param arguments: The arguments.
+    :returns: The words.
+    """
+    if arguments.startswith("["):
+        try:
+            words = json.loads(arguments)
+            if isinstance(words, list):
+                return [str(word) for word in words]
+        except ValueError:
+            pass
+    return arguments.split()
+
+
+def _unquote(value: str) -> str:
+    """Remove the quotes around a value, if any."""
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def _expand(value: str, args: Mapping[str, Optional[str]]) -> Optional[str]:
+    """
+    Expand the ``$VAR``, ``${VAR}`` and ``${VAR:-default}`` variables in a value.
+
+    :param value: The value.
+    :param args: The known variable values.
+    :returns: The expanded value, or ``None`` if it refers to an unknown variable.
+    """
+    unknown = []
+
+    def replace(match):
+        name = match.group(1) or match.group(3)
+        if args.get(name):
+            return args[name]
+        if match.group(2) is not None:
+            return match.group(2)
+        unknown.append(name)
+        return ""
+
+    expanded = _VARIABLE_PATTERN.sub(replace, value)
+    return None if unknown else expanded
@@ -0,0 +1,340 @@
+"""
+Diagnosis of the environment problems that slow the component builds down.
+
+Slow builds on an engineer's machine usually come from the environment rather than the components:
+slow docker daemon round trips, slow container starts, a large build context, a slow storage
+driver, BuildKit being unavailable or disabled, or too little disk space. :func:`diagnose` measures
+or checks each of these:
+
+* ``docker-latency``: the median time a ``docker version`` call takes, which every image inspection
+  and build step pays.
+* ``container-start``: the median time to start and remove a container from a component image,
+  which every ``components run`` and ``exec-all`` pays.
+* ``context-size``: the bytes each component sends to the docker build, after the
+  ``components/.dockerignore`` file's exclusions.
+* ``cache-dir``: whether the cache directory is writable, and how big it has grown.
+* ``disk-space``: the free space left for the cache directory and the docker data, if local.
+* ``buildkit``: whether ``docker buildx`` is available and BuildKit isn't disabled.
+* ``storage-driver``: whether docker uses a storage driver known to be slow.
+
+Each check has a score: its measurement relative to the threshold at which it starts to hurt, or a
+fixed score for a failed check. Checks scoring :data:`BOTTLENECK_SCORE` or more are bottlenecks, and
+the checks are ranked by score so that the biggest bottleneck comes first.
+"""
+import json
+import os
+import pathlib
+import shutil
+import statistics
+import subprocess
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from . import fingerprints, images, locks
+from .cache import get_cache_dir
+from .project import Project
+
+BOTTLENECK_SCORE = 1.0
+FAILED_SCORE = 10.0
+"""
+The score of a check that blocks builds altogether, e.g. an unreachable docker daemon.
+"""
+BUILDKIT_SCORE = 3.0
+
+SAMPLES = 5
+START_SAMPLES = 3
+
+LATENCY_THRESHOLD = 0.5
+START_THRESHOLD = 2.0
+CONTEXT_THRESHOLD = 100 * 1000 ** 2
+CACHE_SIZE_THRESHOLD = 20 * 1000 ** 3
+FREE_SPACE_THRESHOLD = 10 * 1000 ** 3
+
+SLOW_STORAGE_DRIVERS = {"vfs": 5.0, "devicemapper": 2.0, "aufs": 1.5, "fuse-overlayfs": 1.2}
+"""
+The score of each storage driver known to be slower than ``overlay2``.
+"""
+
+
+class Check(NamedTuple):
+    """The outcome of a diagnostic check."""
+
+    name: str
+    subject: str
+    """What was checked, e.g. a component or a directory, if there is more than one."""
+    value: Optional[float]
+    """The measurement, if any, in ``unit``."""
+    unit: str
+    score: float
+    message: str
+    advice: str
+    """How to fix the problem, if the check is a bottleneck."""
+
+    @property
+    def is_bottleneck(self) -> bool:
+        """Whether the check found a problem worth fixing."""
+        return self.score >= BOTTLENECK_SCORE
+
+    def to_json(self) -> dict:
+        """Get the check as a JSON object."""
+        return dict(self._asdict(), is_bottleneck=self.is_bottleneck)
+
+
+def diagnose(project: Project, components: Iterable[str] = None) -> List[Check]:
+    """
+    Run the diagnostic checks.
+
+    :param project: The project.
+    :param components: The components whose build contexts and images to check, default is all of
+                       them.
+    :returns: The checks, biggest bottleneck first.
+    """
+    components = project.components if components is None else list(components)
+
+    checks = [check_docker_latency()]
+    if checks[0].score < FAILED_SCORE:
+        info = _get_docker_info()
+        checks.append(check_container_start(project, components))
+        checks.append(check_buildkit(info))
+        checks.append(check_storage_driver(info))
+        docker_root = info.get("DockerRootDir")
+        if docker_root and os.path.isdir(docker_root):
+            checks.append(check_disk_space("docker", pathlib.Path(docker_root)))
+    checks.extend(check_context_sizes(project, components))
+    checks.append(check_cache_dir())
+    checks.append(check_disk_space("cache", get_cache_dir()))
+
+    return sorted(checks, key=lambda check: check.score, reverse=True)
+
+
+def check_docker_latency(samples: int = SAMPLES) -> Check:
+    """
+    Measure the round trip time of docker CLI calls.
+
+    :param samples: The number of calls to time.
+    :returns: The check.
+    """
+    durations = []
+    for _ in range(samples):
+        start = time.monotonic()
+        ps = subprocess.run(
+            ["docker", "version", "--format", "{{.Server.Version}}"], capture_output=True
+        )
+        if ps.returncode:
+            return Check(
+                "docker-latency",
+                "",
+                None,
+                "s",
+                FAILED_SCORE,
+                f"The docker daemon is unreachable: {ps.stderr.decode().strip()}",
+                "Start the docker daemon, or check the DOCKER_HOST environment variable.",
+            )
+        durations.append(time.monotonic() - start)
+
+    latency = statistics.median(durations)
+    return Check(
+        "docker-latency",
+        "",
+        latency,
+        "s",
+        latency / LATENCY_THRESHOLD,
+        f"docker calls take {latency:.2f}s",
+        "Check for a remote DOCKER_HOST or an overloaded docker VM; run `components watch` to "
+        "cache image inspections.",
+    )
+
+
+def check_container_start(
+    project: Project, components: Iterable[str], samples: int = START_SAMPLES
+) -> Check:
+    """
+    Measure how long it takes to start and remove a container.
+
+    :param project: The project.
+    :param components: The components whose images may be started.
+    :param samples: The number of containers to time.
+    :returns: The check.
+    """
+    refs = project.get_images(components)
+    inspected = images.inspect_images(refs.values())
+    image = next((ref for ref in refs.values() if inspected.get(ref)), None)
+    if not image:
+        return Check("container-start", "", None, "s", 0.0, "No component image to start", "")
+
+    durations = []
+    for _ in range(samples):
+        start = time.monotonic()
+        ps = subprocess.run(
+            ["docker", "run", "--rm", "--entrypoint", "true", image], capture_output=True
+        )
+        if ps.returncode:
+            return Check(
+                "container-start",
+                image,
+                None,
+                "s",
+                0.0,
+                f"Could not start {image}: {ps.stderr.decode().strip()}",
+                "",
+            )
+        durations.append(time.monotonic() - start)
+
+    duration = statistics.median(durations)
+    return Check(
+        "container-start",
+        image,
+        duration,
+        "s",
+        duration / START_THRESHOLD,
+        f"Containers take {duration:.2f}s to start",
+        "Use `--pool` to reuse long-lived containers, and give the docker VM more CPUs.",
+    )
+
+
+def check_context_sizes(project: Project, components: Iterable[str]) -> List[Check]:
+    """
+    Measure how much each component adds to the docker build context.
+
+    :param project: The project.
+    :param components: The components.
+    :returns: A check for each component.
+    """
+    return [
+        Check(
+            "context-size",
+            component,
+            size,
+            "B",
+            size / CONTEXT_THRESHOLD,
+            f"{component} sends {files} file(s), {images.format_bytes(size)}, to the docker build",
+            "Exclude build outputs, virtual environments and data files in "
+            "components/.dockerignore.",
+        )
+        for component, (files, size) in fingerprints.get_context_sizes(
+            components, project.components_path
+        ).items()
+    ]
+
+
+def check_cache_dir() -> Check:
+    """
+    Check that the cache directory is writable, and measure how big it has grown.
+
+    :returns: The check.
+    """
+    path = get_cache_dir()
+    try:
+        with locks.atomic_write(path / "doctor.probe") as probe_file:
+            probe_file.write("ok")
+        (path / "doctor.probe").unlink()
+    except OSError as e:
+        return Check(
+            "cache-dir",
+            path.as_posix(),
+            None,
+            "B",
+            FAILED_SCORE,
+            f"The cache directory is not writable: {e}",
+            "Fix the cache directory's permissions, or set COMPONENTS_CACHE_DIR.",
+        )
+
+    size = 0
+    for directory, _, file_names in os.walk(path):
+        for name in file_names:
+            try:
+                size += os.lstat(os.path.join(directory, name)).st_size
+            except FileNotFoundError:
+                pass
+    return Check(
+        "cache-dir",
+        path.as_posix(),
+        size,
+        "B",
+        size / CACHE_SIZE_THRESHOLD,
+        f"The cache directory holds {images.format_bytes(size)}",
+        "Run `components prune` to remove stale build files, or `components cache clear`.",
+    )
+
+
+def check_disk_space(name: str, path: pathlib.Path) -> Check:
+    """
+    Measure the free space of the file system a directory is on.
+
+    :param name: What the directory holds, e.g. ``cache``.
+    :param path: The directory.
+    :returns: The check.
+    """
+    free = shutil.disk_usage(path).free
+    return Check(
+        "disk-space",
+        name,
+        free,
+        "B",
+        FREE_SPACE_THRESHOLD / max(free, 1),
+        f"{images.format_bytes(free)} free for the {name} directory, {path.as_posix()}",
+        "Run `components prune` and `docker system prune` to reclaim space.",
+    )
+
+
+def check_buildkit(info: Dict[str, str]) -> Check:
+    """
+    Check that BuildKit builds are available and enabled.
+
+    :param info: The docker daemon's ``docker info`` data.
+    :returns: The check.
+    """
+    problems = []
+    if os.environ.get("DOCKER_BUILDKIT") == "0":
+        problems.append("DOCKER_BUILDKIT=0 disables BuildKit for plain docker builds")
+    ps = subprocess.run(["docker", "buildx", "version"], capture_output=True)
+    if ps.returncode:
+        problems.append("docker buildx is not installed, so native builds cannot run")
+    version = info.get("ServerVersion", "")
+    major = version.split(".", 1)[0]
+    if major.isdigit() and int(major) < 23 and os.environ.get("DOCKER_BUILDKIT") != "1":
+        problems.append(
+            f"docker {version} uses the legacy builder for plain docker builds by default"
+        )
+
+    return Check(
+        "buildkit",
+        "",
+        None,
+        "",
+        BUILDKIT_SCORE if problems else 0.0,
+        "; ".join(problems) or "BuildKit is available",
+        "Install the docker buildx plugin, and set DOCKER_BUILDKIT=1 or upgrade docker.",
+    )
+
+
+def check_storage_driver(info: Dict[str, str]) -> Check:
+    """
+    Check that docker uses a fast storage driver.
+
+    :param info: The docker daemon's ``docker info`` data.
+    :returns: The check.
+    """
+    driver = info.get("Driver", "")
+    return Check(
+        "storage-driver",
+        driver,
+        None,
+        "",
+        SLOW_STORAGE_DRIVERS.get(driver, 0.0),
+        f"docker uses the {driver or 'unknown'} storage driver",
+        'Set "storage-driver": "overlay2" in the docker daemon.json file.',
+    )
+
+
+def _get_docker_info() -> Dict[str, str]:
+    """
+    Get the docker daemon's settings.
+
+    :returns: The ``docker info`` data, or nothing if it could not be read.
+    """
+    ps = subprocess.run(["docker", "info", "--format", "{{json .}}"], capture_output=True)
+    try:
+        return json.loads(ps.stdout.decode() or "{}")
+    except ValueError:
+        return {}
@@ -0,0 +1,368 @@
+"""
+Fingerprints of the component directories, for telling whether a component has changed.
+
+A component's tree fingerprint is a BLAKE2 digest over the relative path, kind and content digest
+of every file in its directory that would be sent to the docker build, i.e. that is not excluded
+by the ``components/.dockerignore`` file. Its fingerprint then combines its tree fingerprint with
+the fingerprints of the components it depends on, Merkle fashion, so that a change to a component
+changes the fingerprints of everything that depends on it.
+
+File contents are hashed in parallel, streaming each file in blocks. A stat cache in the cache
+directory remembers the digest of every file along with its inode, size and modification time, so
+that unchanged files are never read again. Files modified within the last couple of seconds are
+not cached, since a further change within the file system's timestamp granularity could go
+unnoticed.
+"""
+import concurrent.futures
+import hashlib
+import json
+import os
+import pathlib
+import re
+import stat
+import time
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from . import locks
+from .cache import get_cache_dir
+
+DIGEST_SIZE = 20
+BLOCK_SIZE = 1 << 20
+RACY_INTERVAL_NS = 2 * 10 ** 9
+
+
+class Fingerprint(NamedTuple):
+    """The fingerprints of a component."""
+
+    component: str
+    tree: str
+    fingerprint: str
+    files: int
+
+
+def hash_file(path: pathlib.Path) -> str:
+    """
+    Hash a file's contents without reading it all into memory at once.
+
+    :param path: The file.
+    :returns: The BLAKE2 hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, "rb") as hashed_file:
+        for block in iter(lambda: hashed_file.read(BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IgnoreRules:
+    """
+    Match paths against ``.dockerignore`` patterns.
+
+    The last matching pattern wins, patterns starting with ``!`` include paths again, and a pattern
+    matching a directory matches everything within it.
+
+    :param patterns: The patterns, relative to the build context.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._rules: List[Tuple[re.Pattern, bool]] = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            included = pattern.startswith("!")
+            pattern = os.path.normpath(pattern.lstrip("!").strip()).lstrip("/")
+            self._rules.append((re.compile(f"{_translate(pattern)}(/.*)?"), included))
+        self.has_exceptions = any(included for _, included in self._rules)
+
+    @classmethod
+    def load(cls, context_path: pathlib.Path, extra: Iterable[str] = ()) -> "IgnoreRules":
+        """
+        Load the ignore patterns of a build context.
+
+        :param context_path: The build context directory.
+        :param extra: Any further patterns to ignore.
+        :returns: The rules.
+        """
+        try:
+            with open(context_path / ".dockerignore") as ignore_file:
+                patterns = ignore_file.read().splitlines()
+        except FileNotFoundError:
+            patterns = []
+        return cls(patterns + list(extra))
+
+    def is_ignored(self, path: str) -> bool:
+        """
+        Determine whether a path is excluded.
+
+        :param path: The path, relative to the build context, with ``/`` separators.
+        :returns: Whether it's excluded.
+        """
+        ignored = False
+        for pattern, included in self._rules:
+            if pattern.fullmatch(path):
+                ignored = not included
+        return ignored
+
+
+class StatCache:
+    """
+    The digests of files that were hashed before, valid for as long as the files' stats match.
+
+    :param path: The stat cache file.
+    """
+
+    def __init__(self, path: pathlib.Path = None):
+        self.path = path or get_cache_dir("fingerprints") / "stat-cache.json"
+        try:
+            with open(self.path) as cache_file:
+                self._entries: Dict[str, list] = json.load(cache_file)
+        except (OSError, ValueError):
+            self._entries = {}
+        self._updates: Dict[str, Optional[list]] = {}
+
+    def get(self, path: str, stats: os.stat_result) -> Optional[str]:
+        """
+        Get the cached digest of a file.
+
+        :param path: The file path.
+        :param stats: The file's current stats.
+        :returns: The digest, or ``None`` if the file is unknown or has changed.
+        """
+        entry = self._entries.get(path)
+        if entry and entry[:3] == [stats.st_ino, stats.st_size, stats.st_mtime_ns]:
+            return entry[3]
+        return None
+
+    def put(self, path: str, stats: os.stat_result, digest: str) -> None:
+        """
+        Cache the digest of a file, unless it was modified too recently to trust its stats.
+
+        :param path: The file path.
+        :param stats: The file's stats when it was hashed.
+        :param digest: The file's digest.
+        """
+        if time.time_ns() - stats.st_mtime_ns < RACY_INTERVAL_NS:
+            self._updates[path] = None
+        else:
+            self._updates[path] = [stats.st_ino, stats.st_size, stats.st_mtime_ns, digest]
+
+    def forget(self, prefix: str, keep: Iterable[str]) -> None:
+        """
+        Drop the entries of files within a directory that no longer exist.
+
+        :param prefix: The directory path, ending with a separator.
+        :param keep: The paths of the directory's current files.
+        """
+        keep = set(keep)
+        for path in self._entries:
+            if path.startswith(prefix) and path not in keep:
+                self._updates[path] = None
+
+    def save(self) -> None:
+        """Merge the changes into the stat cache file, alongside those of other processes."""
+        if not self._updates:
+            return
+        with locks.cache_locked("fingerprints"):
+            try:
+                with open(self.path) as cache_file:
+                    entries = json.load(cache_file)
+            except (OSError, ValueError):
+                entries = {}
+            for path, entry in self._updates.items():
+                if entry:
+                    entries[path] = entry
+                else:
+                    entries.pop(path, None)
+            with locks.atomic_write(self.path) as cache_file:
+                json.dump(entries, cache_file)
+        self._entries = entries
+        self._updates = {}
+
+
+def fingerprint_components(
+    dependencies: Mapping[str, Sequence[str]],
+    components: Iterable[str] = None,
+    components_path: pathlib.Path = pathlib.Path("components"),
+    ignore: Iterable[str] = (),
+    jobs: int = os.cpu_count() or 1,
+    stat_cache: StatCache = None,
+) -> Dict[str, Fingerprint]:
+    """
+    Fingerprint components and everything they depend on.
+
+    :param dependencies: The direct dependencies of each component.
+    :param components: The components to fingerprint, default is all of ``dependencies``.
+    :param components_path: The ``components/`` directory, i.e. the docker build context.
+    :param ignore: Further ``.dockerignore`` patterns to exclude files with.
+    :param jobs: The maximum number of files to hash at once.
+    :param stat_cache: The stat cache to use, defaults to the one in the cache directory.
+    :returns: The fingerprints of the components and all of their dependencies.
+    """
+    order = _get_order(dependencies, dependencies if components is None else components)
+    rules = IgnoreRules.load(components_path, ignore)
+    stat_cache = stat_cache or StatCache()
+
+    # Find every file first, so that all of them can be hashed together
+    files = {component: _list_files(components_path, component, rules) for component in order}
+    pending = {}
+    digests = {}
+    for component_files in files.values():
+        for path, kind, stats in component_files:
+            if kind == "l":
+                digests[path] = _hash_text(os.readlink(path))
+            else:
+                digests[path] = stat_cache.get(path, stats)
+                if digests[path] is None:
+                    pending[path] = stats
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for path, digest in zip(pending, executor.map(hash_file, pending)):
+            digests[path] = digest
+            stat_cache.put(path, pending[path], digest)
+
+    for component, component_files in files.items():
+        prefix = os.path.join(components_path, component, "")
+        stat_cache.forget(prefix, (path for path, _, _ in component_files))
+    stat_cache.save()
+
+    fingerprints = {}
+    for component in order:
+        prefix_length = len(os.path.join(components_path, component, ""))
+        tree = _hash_text(
+            "".join(
+                f"{path[prefix_length:]}\0{kind}\0{digests[path]}\n"
+                for path, kind, _ in files[component]
+            )
+        )
+        fingerprint = _hash_text(
+            f"tree\0{tree}\n"
+            + "".join(
+                f"dependency\0{dependency}\0{fingerprints[dependency].fingerprint}\n"
+                for dependency in sorted(set(dependencies.get(component, ())))
+            )
+        )
+        fingerprints[component] = Fingerprint(
+            component, tree, fingerprint, len(files[component])
+        )
+    return fingerprints
+
+
+def get_context_sizes(
+    components: Iterable[str], components_path: pathlib.Path = pathlib.Path("components")
+) -> Dict[str, Tuple[int, int]]:
+    """
+    Measure what each component adds to the docker build context.
+
+    :param components: The components.
+    :param components_path: The ``components/`` directory, i.e. the docker build context.
+    :returns: The number of files and bytes each component sends to the docker build.
+    """
+    rules = IgnoreRules.load(components_path)
+    sizes = {}
+    for component in components:
+        files = _list_files(components_path, component, rules)
+        sizes[component] = (len(files), sum(stats.st_size for _, _, stats in files))
+    return sizes
+
+
+def _get_order(dependencies: Mapping[str, Sequence[str]], components: Iterable[str]) -> List[str]:
+    """
+    Get components and all of their dependencies, dependencies first.
+
+    :param dependencies: The direct dependencies of each component.
+    :param components: The components.
+    :returns: The components and their dependencies.
+    """
+    order = []
+    visiting = set()
+
+    def visit(component: str) -> None:
+        if component in order:
+            return
+        if component in visiting:
+            raise RuntimeError("Cycles found in component dependencies", component)
+        visiting.add(component)
+        for dependency in sorted(set(dependencies.get(component, ()))):
+            visit(dependency)
+        order.append(component)
+
+    for component in components:
+        visit(component)
+    return order
+
+
+def _list_files(
+    components_path: pathlib.Path, component: str, rules: IgnoreRules
+) -> List[Tuple[str, str, os.stat_result]]:
+    """
+    List the files of a component that would be sent to the docker build.
+
+    :param components_path: The ``components/`` directory.
+    :param component: The component.
+    :param rules: The ignore rules.
+    :returns: The path, kind (``f`` for files, ``x`` for executables and ``l`` for symlinks) and
+              stats of each file, sorted by path.
+    """
+    files = []
+    root = os.path.join(components_path, component)
+    for directory, subdirectories, file_names in os.walk(root):
+        relative_directory = os.path.relpath(directory, components_path).replace(os.sep, "/")
+        if not rules.has_exceptions:
+            # Nothing within an excluded directory can be included again, so skip it entirely
+            subdirectories[:] = [
+                name
+                for name in subdirectories
+                if not rules.is_ignored(f"{relative_directory}/{name}")
+            ]
+        for name in file_names:
+            if rules.is_ignored(f"{relative_directory}/{name}"):
+                continue
+            path = os.path.join(directory, name)
+            stats = os.lstat(path)
+            if stat.S_ISLNK(stats.st_mode):
+                kind = "l"
+            elif stat.S_ISREG(stats.st_mode):
+                kind = "x" if stats.st_mode & stat.S_IXUSR else "f"
+            else:
+                continue
+            files.append((path, kind, stats))
+    return sorted(files, key=lambda entry: entry[0])
+
+
+def _hash_text(text: str) -> str:
+    """
+    Hash some text.
+
+    :param text: The text.
+    :returns: The BLAKE2 hex digest.
+    """
+    return hashlib.blake2b(text.encode(), digest_size=DIGEST_SIZE).hexdigest()
+
+
+def _translate(pattern: str) -> str:
+    """
+    Translate a ``.dockerignore`` pattern into a regular expression.
+
+    :param pattern: The pattern.
+    :returns: The regular expression, matching whole paths.
+    """
+    regex = ""
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            regex += "(.*/)?"
+            index += 3
+        elif pattern.startswith("**", index):
+            regex += ".*"
+            index += 2
+        elif pattern[index] == "*":
+            regex += "[^/]*"
+            index += 1
+        elif pattern[index] == "?":
+            regex += "[^/]"
+            index += 1
+        else:
+            regex += re.escape(pattern[index])
+            index += 1
+    return regex
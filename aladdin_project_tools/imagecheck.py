@@ -0,0 +1,268 @@
+"""
+Checks that the components' component.yaml files agree with the images they build.
+
+The ``image.user``, ``image.workdir`` and ``language.version`` settings of a component.yaml file
+describe its image, and the components that depend on it rely on them, e.g. to copy files to the
+right place with the right owner. Nothing stops them from drifting from what the image really has,
+e.g. when a compatible component's base image changes.
+
+Most of the facts come from a single ``docker image inspect`` call covering every component image
+and base image: the user and working directory the image runs with, and the Python version the
+official Python images record in their ``PYTHON_VERSION`` environment variable. The rest, i.e. the
+Python version of other base images and the groups and home directories of the users that
+compatible components take from their base images, come from a probe container. At most one probe
+runs per distinct base image, in parallel, and what it finds is cached by image ID, so later runs
+against the same base images need no containers at all.
+"""
+import json
+import logging
+import os
+import subprocess
+from typing import Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from . import images, locks, multistage, parallel
+from .baseimages import normalize_reference
+from .cache import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+_PYTHON_VERSION = "import platform; print(platform.python_version())"
+_PROBE_SCRIPT = f"""
+(python3 -c '{_PYTHON_VERSION}' || python -c '{_PYTHON_VERSION}') 2>/dev/null || echo
+for user in "$@"; do
+    echo "$user:$(id -gn "$user" 2>/dev/null):$(grep "^$user:" /etc/passwd | cut -d: -f6)"
+done
+"""
+
+
+def check_images(
+    component_configs: Mapping[str, Optional[dict]],
+    component_images: Mapping[str, str],
+    jobs: int = os.cpu_count() or 1,
+) -> List[Tuple[str, str]]:
+    """
+    Check that components' images match their component.yaml files.
+
+    Traditional components, and components whose images haven't been built, are skipped.
+
+    :param component_configs: The component.yaml contents of each component.
+    :param component_images: The image of each component to check against.
+    :param jobs: The maximum number of probe containers to run at once.
+    :returns: The component and description of each mismatch.
+    """
+    configs = {component: config for component, config in component_configs.items() if config}
+    bases = {component: _get_base_image(config) for component, config in configs.items()}
+    inspected = images.inspect_images(
+        [component_images[component] for component in configs] + list(bases.values())
+    )
+
+    problems = []
+    # The users that components take from each base image that needs probing
+    wanted: Dict[str, Set[str]] = {}
+    for component, config in configs.items():
+        image = component_images[component]
+        info = inspected.get(image)
+        if not info:
+            logger.warning(
+                "Skipping the image checks of %s, as there's no %s image", component, image
+            )
+            continue
+
+        image_config = info.get("Config") or {}
+        user = ((config.get("image") or {}).get("user")) or {}
+        user_name = user.get("name") or multistage.DEFAULT_USER
+        actual_user = (image_config.get("User") or "root").split(":")[0]
+        if not actual_user.isdigit() and actual_user != user_name:
+            problems.append(
+                (component, f"image.user.name is {user_name} but {image} runs as {actual_user}")
+            )
+
+        workdir = multistage.get_workdir(config)
+        actual_workdir = image_config.get("WorkingDir") or "/"
+        if actual_workdir != workdir:
+            problems.append(
+                (
+                    component,
+                    f"image.workdir.path is {workdir} but the working directory of {image} is "
+                    f"{actual_workdir}",
+                )
+            )
+
+        base = bases[component]
+        base_id = (inspected.get(base) or {}).get("Id")
+        needs_python = _get_python_version(info, inspected.get(base)) is None
+        inherits_user = not user.get("create", not (config.get("image") or {}).get("base"))
+        if (needs_python or inherits_user) and not base_id:
+            logger.warning(
+                "Skipping some image checks of %s, as its base image %s is not present; "
+                "Run components pull",
+                component,
+                base,
+            )
+        elif needs_python or inherits_user:
+            wanted.setdefault(base, set()).update({user_name} if inherits_user else ())
+
+    facts = _get_base_facts(
+        {base: (inspected[base]["Id"], sorted(users)) for base, users in wanted.items()}, jobs
+    )
+
+    for component, config in configs.items():
+        info = inspected.get(component_images[component])
+        if not info:
+            continue
+        base = bases[component]
+        base_facts = facts.get(base, {})
+
+        version = str(
+            (config.get("language") or {}).get("version") or multistage.DEFAULT_PYTHON_VERSION
+        )
+        actual_version = _get_python_version(info, inspected.get(base)) or base_facts.get(
+            "python_version"
+        )
+        if actual_version and not (
+            actual_version == version or actual_version.startswith(f"{version}.")
+        ):
+            problems.append(
+                (
+                    component,
+                    f"language.version is {version} but {component_images[component]} has "
+                    f"Python {actual_version}",
+                )
+            )
+
+        user = ((config.get("image") or {}).get("user")) or {}
+        user_name = user.get("name") or multistage.DEFAULT_USER
+        if user_name not in base_facts.get("users", {}):
+            continue
+        user_facts = base_facts["users"][user_name]
+        if not user_facts:
+            problems.append(
+                (component, f"image.user.name {user_name} is not a user of the base image {base}")
+            )
+            continue
+        for setting, actual in zip(("group", "home"), user_facts):
+            if user.get(setting) and user[setting] != actual:
+                problems.append(
+                    (
+                        component,
+                        f"image.user.{setting} is {user[setting]} but the {setting} of {user_name} "
+                        f"in the base image {base} is {actual}",
+                    )
+                )
+    return problems
+
+
+def probe(image: str, users: Sequence[str] = ()) -> dict:
+    """
+    Find out facts about an image by running a container of it.
+
+    :param image: The image.
+    :param users: The users to look up.
+    :returns: The ``python_version`` of the image, if it has Python, and the ``users`` that exist,
+              with their group and home directory, or ``None`` for the ones that don't.
+    :raises RuntimeError: If the container fails.
+    """
+    ps = subprocess.run(
+        ["docker", "run", "--rm", "--user", "root", "--entrypoint", "/bin/sh", image]
+        + ["-c", _PROBE_SCRIPT, "probe"]
+        + list(users),
+        capture_output=True,
+    )
+    if ps.returncode:
+        raise RuntimeError(
+            f"Could not probe {image}: "
+            + (ps.stderr.decode().strip().splitlines() or [f"exit code {ps.returncode}"])[-1]
+        )
+
+    lines = ps.stdout.decode().splitlines() or [""]
+    user_facts = {}
+    for line in lines[1:]:
+        name, group, home = line.split(":", 2)
+        user_facts[name] = [group, home] if group else None
+    return {"python_version": lines[0].strip() or None, "users": user_facts}
+
+
+def _get_base_facts(
+    wanted: Mapping[str, Tuple[str, Sequence[str]]], jobs: int
+) -> Dict[str, dict]:
+    """
+    Get the facts about base images, from the cache or from probe containers.
+
+    :param wanted: The image ID and the users to look up of each base image.
+    :param jobs: The maximum number of probe containers to run at once.
+    :returns: The facts about each base image that could be found out, see :func:`probe`.
+    """
+    cache_path = get_cache_dir("validate") / "image-facts.json"
+    cached = _load_json(cache_path)
+    facts = {}
+    to_probe = {}
+    for base, (image_id, users) in wanted.items():
+        entry = cached.get(image_id)
+        if entry and all(user in entry["users"] for user in users):
+            facts[base] = entry
+        else:
+            to_probe[base] = (image_id, users)
+
+    results = parallel.run_tasks(
+        {
+            base: (lambda base=base, users=users: probe(base, users))
+            for base, (_, users) in to_probe.items()
+        },
+        jobs=jobs,
+    )
+    updates = {}
+    for base, result in results.items():
+        if not result.ok:
+            logger.warning("Skipping some image checks: %s", result.error)
+            continue
+        image_id = to_probe[base][0]
+        previous = cached.get(image_id) or {"users": {}}
+        facts[base] = updates[image_id] = {
+            "python_version": result.value["python_version"],
+            "users": dict(previous["users"], **result.value["users"]),
+        }
+
+    if updates:
+        with locks.cache_locked("image-facts"):
+            entries = _load_json(cache_path)
+            entries.update(updates)
+            with locks.atomic_write(cache_path) as cache_file:
+                json.dump(entries, cache_file)
+    return facts
+
+
+def _get_base_image(config: dict) -> str:
+    """
+    Get the base image of a standard or compatible component.
+
+    :param config: The component's component.yaml contents.
+    :returns: The normalized base image reference.
+    """
+    version = (config.get("language") or {}).get("version", multistage.DEFAULT_PYTHON_VERSION)
+    return normalize_reference(
+        (config.get("image") or {}).get("base") or f"python:{version}-slim"
+    )
+
+
+def _get_python_version(*infos: Optional[dict]) -> Optional[str]:
+    """
+    Get the Python version that an official Python image records in its environment.
+
+    :param infos: The inspection data of the image and of the images it was built from, if known.
+    :returns: The version, or ``None`` if none of the images record it.
+    """
+    for info in infos:
+        for variable in ((info or {}).get("Config") or {}).get("Env") or ():
+            name, _, value = variable.partition("=")
+            if name == "PYTHON_VERSION":
+                return value
+    return None
+
+
+def _load_json(path) -> dict:
+    """Load a JSON cache file, or nothing if it's missing or corrupt."""
+    try:
+        with open(path) as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return {}
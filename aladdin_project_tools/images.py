@@ -0,0 +1,176 @@
+"""
+Batched queries about docker images.
+
+Each call to the docker CLI costs a process start and a daemon round trip, so wherever possible we
+ask about many images at once rather than one at a time. While ``components watch`` is following the
+docker events, image inspection data is also cached, see :mod:`aladdin_project_tools.imagewatch`.
+"""
+import json
+import os
+import re
+import secrets
+import subprocess
+import time
+from typing import Dict, Iterable, List, Optional
+
+from . import imagewatch
+
+
+def inspect_images(images: Iterable[str], host: str = None) -> Dict[str, Optional[dict]]:
+    """
+    Inspect many images with a single ``docker image inspect`` call.
+
+    :param images: The image references to inspect.
+    :param host: The docker daemon to ask, defaults to the one the docker CLI is configured for.
+    :returns: The inspection data for each image reference, or ``None`` for any missing images.
+    """
+    images = list(dict.fromkeys(images))
+    if not images:
+        return {}
+
+    generation, cached = imagewatch.lookup(images) if not host else (None, {})
+    missing = [image for image in images if image not in cached]
+    if missing:
+        inspected = _inspect_images(missing, host)
+        if generation is not None:
+            imagewatch.store(generation, inspected)
+        cached.update(inspected)
+    return {image: cached[image] for image in images}
+
+
+def _inspect_images(images: List[str], host: Optional[str]) -> Dict[str, Optional[dict]]:
+    """
+    Ask docker about many images.
+
+    :param images: The image references to inspect.
+    :param host: The docker daemon to ask, if not the default one.
+    :returns: The inspection data for each image reference, or ``None`` for any missing images.
+    """
+    # docker reports the images it found even if some of them are missing
+    ps = subprocess.run(
+        ["docker"] + (["--host", host] if host else []) + ["image", "inspect"] + images,
+        capture_output=True,
+    )
+    try:
+        found = json.loads(ps.stdout.decode() or "[]")
+    except json.JSONDecodeError:
+        found = []
+
+    by_reference = {}
+    for info in found:
+        references = [info["Id"]] + (info.get("RepoTags") or []) + (info.get("RepoDigests") or [])
+        for reference in references:
+            by_reference[reference] = info
+        # Also find images by the short IDs that e.g. docker system df displays
+        by_reference[info["Id"].split(":")[-1][:12]] = info
+
+    return {
+        image: by_reference.get(image)
+        or by_reference.get(image if ":" in image.rsplit("/", 1)[-1] else f"{image}:latest")
+        for image in images
+    }
+
+
+def get_disk_usage() -> List[dict]:
+    """
+    List every image with the disk space it uses, with a single ``docker system df`` call.
+
+    :returns: A row for each tag of each image, and for each untagged image. Each has the image's
+              short ``id``, the ``repository`` and ``tag`` (``"<none>"`` if untagged), the number
+              of ``containers`` using the image, and its ``size`` and the ``unique_size`` that
+              removing it alone would reclaim, in bytes.
+    """
+    ps = subprocess.run(
+        ["docker", "system", "df", "--verbose", "--format", "{{json .}}"],
+        capture_output=True,
+        check=True,
+    )
+    usage = json.loads(ps.stdout.decode() or "{}")
+    return [
+        dict(
+            id=row.get("ID", "").split(":")[-1][:12],
+            repository=row.get("Repository", "<none>"),
+            tag=row.get("Tag", "<none>"),
+            containers=int(row["Containers"]) if str(row.get("Containers")).isdigit() else 0,
+            size=parse_size(row.get("Size", "0")),
+            unique_size=parse_size(row.get("UniqueSize", "0")),
+        )
+        for row in usage.get("Images") or []
+    ]
+
+
+def get_temporary_tag(image: str, purpose: str) -> str:
+    """
+    Get a unique name for a temporary image derived from another image.
+
+    The name is unique to this process and call, so that concurrent invocations never tag or
+    remove each other's temporary images. It also records the process ID and the time, so that
+    temporary images left behind by processes that have exited can be found and removed.
+
+    :param image: The image reference the temporary image is derived from.
+    :param purpose: A word describing what the temporary image is for, e.g. ``extractor``.
+    :returns: The temporary image's name, in the repository of the original image.
+    """
+    name = image.split("@", 1)[0]
+    repository, tag = name.rsplit(":", 1) if ":" in name.rsplit("/", 1)[-1] else (name, "latest")
+    return f"{repository}:{tag}-{purpose}-{os.getpid()}-{int(time.time())}-{secrets.token_hex(4)}"
+
+
+def get_history(image: str) -> List[dict]:
+    """
+    Get the layers of an image, with their sizes and the instructions that created them.
+
+    :param image: The image reference.
+    :returns: The image's layers, most recent first. Each has the ``id`` of the layer's image (or
+              ``None`` for layers of pulled base images), its ``size`` in bytes and ``created_by``
+              instruction.
+    """
+    ps = subprocess.run(
+        ["docker", "history", "--no-trunc", "--human=false", "--format", "{{json .}}", image],
+        capture_output=True,
+        check=True,
+    )
+
+    layers = []
+    for line in ps.stdout.decode().splitlines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        layers.append(
+            dict(
+                id=None if entry.get("ID") == "<missing>" else entry.get("ID"),
+                size=int(entry.get("Size") or 0),
+                created_by=entry.get("CreatedBy", ""),
+            )
+        )
+    return layers
+
+
+def format_bytes(size: float) -> str:
+    """
+    Format a number of bytes for people to read.
+
+    :param size: The number of bytes.
+    :returns: The formatted size, e.g. ``"12.3 MB"``.
+    """
+    sign = "-" if size < 0 else ""
+    size = abs(size)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1000 or unit == "GB":
+            break
+        size /= 1000
+    return f"{sign}{size:.0f} {unit}" if unit == "B" else f"{sign}{size:.1f} {unit}"
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a size as displayed by docker, e.g. ``12.3MB``.
+
+    :param size: The displayed size.
+    :returns: The number of bytes.
+    """
+    match = re.match(r"([\d.]+)\s*([KMGT]?i?B)?", size.strip(), re.IGNORECASE)
+    if not match:
+        return 0
+    unit = (match.group(2) or "B").upper().replace("I", "")
+    return int(float(match.group(1)) * 1000 ** "BKMGT".index(unit[0]))
@@ -0,0 +1,327 @@
+"""
+Live invalidation of cached image inspection data from the docker events stream.
+
+Anything we remember about an image, e.g. its ID, user or working directory, may go out of date as
+soon as someone runs ``docker build``, ``docker rmi`` or ``docker pull`` outside the tools, so
+:func:`aladdin_project_tools.images.inspect_images` normally asks docker every time.
+
+``components watch`` starts a background process that follows ``docker events`` for images. While
+it's running, :func:`~aladdin_project_tools.images.inspect_images` keeps what it learns in
+``images/inspect.json`` in the cache directory and answers from there, and the watcher drops the
+entries each event affects:
+
+* ``tag``, ``pull``, ``load`` and ``import`` events drop the entries for the reference they name,
+  for the image's ID, and for any image that the reference named before, along with every
+  reference remembered as missing.
+* ``untag`` and ``delete`` events drop the entries for the reference and the image.
+* ``prune`` events drop everything.
+
+Builds also drop the entries for the images they tag as soon as they're done, see
+:func:`invalidate`, since the watcher may not have applied their events yet.
+
+The cached entries are only trusted while the watcher that cleared them when it started is running,
+since events that happen while no watcher is running are missed. A watcher asks for the events
+since just before it cleared the cache, so that none are missed while it starts, and every change
+bumps a generation number, so that inspection data that was read from docker before an event isn't
+stored after the watcher has applied it.
+
+Data that is keyed by image ID, such as the base image facts kept by
+:mod:`aladdin_project_tools.imagecheck`, never goes out of date and needs no invalidation.
+"""
+import json
+import logging
+import os
+import pathlib
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+from . import admission, locks
+from .cache import CACHE_DIR_ENVVAR, get_cache_dir
+
+ADDING_ACTIONS = ("tag", "pull", "load", "import")
+REMOVING_ACTIONS = ("untag", "delete")
+
+logger = logging.getLogger(__name__)
+
+
+def start() -> Optional[int]:
+    """
+    Start a watcher in the background, unless one is already running.
+
+    :returns: The ID of the new watcher process, or ``None`` if one was already running.
+    """
+    with locks.cache_locked("images"):
+        cache = _read_cache()
+        if _is_watched(cache):
+            return None
+        with open(get_log_path(), "ab") as log_file:
+            ps = subprocess.Popen(
+                [sys.executable, "-m", __name__],
+                # The cache directory may be relative to this process's working directory
+                env=dict(os.environ, **{CACHE_DIR_ENVVAR: get_cache_dir().resolve().as_posix()}),
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        # Claim the cache now, so that no other watcher is started; the new one clears it again
+        _write_cache({"watcher": ps.pid, "generation": cache["generation"] + 1, "images": {}})
+    return ps.pid
+
+
+def stop() -> Optional[int]:
+    """
+    Stop the running watcher, if any.
+
+    :returns: The ID of the stopped watcher process, or ``None`` if none was running.
+    """
+    with locks.cache_locked("images"):
+        cache = _read_cache()
+        if not _is_watched(cache):
+            return None
+        # The watcher leads its own session, along with its docker events process
+        os.killpg(cache["watcher"], signal.SIGTERM)
+        _write_cache({"watcher": None, "generation": cache["generation"] + 1, "images": {}})
+    return cache["watcher"]
+
+
+def get_watcher() -> Optional[int]:
+    """
+    Get the ID of the running watcher process.
+
+    :returns: The process ID, or ``None`` if no watcher is running.
+    """
+    with locks.cache_locked("images", shared=True):
+        cache = _read_cache()
+    return cache["watcher"] if _is_watched(cache) else None
+
+
+def get_log_path() -> pathlib.Path:
+    """
+    Get the path of the watcher's log.
+
+    :returns: The log file path.
+    """
+    return get_cache_dir("images") / "watch.log"
+
+
+def lookup(references: Iterable[str]) -> Tuple[Optional[int], Dict[str, Optional[dict]]]:
+    """
+    Look up the cached inspection data of some images.
+
+    :param references: The image references.
+    :returns: The cache generation to pass to :func:`store`, or ``None`` if no watcher is running,
+              and the inspection data of each reference found in the cache, or ``None`` for those
+              known to be missing.
+    """
+    with locks.cache_locked("images", shared=True):
+        cache = _read_cache()
+    if not _is_watched(cache):
+        return None, {}
+    images = cache["images"]
+    return (
+        cache["generation"],
+        {reference: images[reference] for reference in references if reference in images},
+    )
+
+
+def store(generation: int, inspected: Mapping[str, Optional[dict]]) -> bool:
+    """
+    Cache inspection data, unless the watcher has applied any events since it was looked up.
+
+    :param generation: The cache generation returned by :func:`lookup` before inspecting.
+    :param inspected: The inspection data of each image reference, or ``None`` for missing images.
+    :returns: Whether the data was cached.
+    """
+    with locks.cache_locked("images"):
+        cache = _read_cache()
+        if not _is_watched(cache) or cache["generation"] != generation:
+            return False
+        cache["images"].update(inspected)
+        _write_cache(cache)
+    return True
+
+
+def invalidate(references: Iterable[str]) -> None:
+    """
+    Drop the cached inspection data that tagging some references makes out of date, as their
+    ``tag`` events would, without waiting for the watcher to apply them.
+
+    Builds call this as soon as they've tagged their images, so that what they inspect next isn't
+    answered from the cache before the watcher has caught up.
+
+    :param references: The image references that were just tagged.
+    """
+    with locks.cache_locked("images"):
+        cache = _read_cache()
+        if not _is_watched(cache):
+            return
+        for reference in references:
+            apply(cache["images"], {"Action": "tag", "Actor": {"Attributes": {"name": reference}}})
+        # Inspection data read before now may predate the new tags
+        cache["generation"] += 1
+        _write_cache(cache)
+
+
+def apply(images: Dict[str, Optional[dict]], event: Mapping) -> bool:
+    """
+    Drop the cached inspection data that a docker event makes out of date.
+
+    :param images: The cached inspection data of each image reference.
+    :param event: The event, as reported by ``docker events --format '{{json .}}'``.
+    :returns: Whether the event changed any images, whether or not any of them were cached.
+    """
+    if event.get("Type", "image") != "image":
+        return False
+    action = event.get("Action") or event.get("status") or ""
+    actor = event.get("Actor") or {}
+    image_id = actor.get("ID") or event.get("id") or ""
+    names = {(actor.get("Attributes") or {}).get("name"), event.get("from")}
+    if not image_id.startswith("sha256:"):
+        # Pull events identify the image by the reference that was pulled
+        names.add(image_id)
+        image_id = None
+    names = {_normalize(name) for name in names if name}
+
+    if action == "prune":
+        stale = set(images)
+    elif action in ADDING_ACTIONS + REMOVING_ACTIONS:
+        stale = set()
+        for reference, info in images.items():
+            if (
+                _normalize(reference) in names
+                or (image_id and _get_id(reference, info) == image_id)
+                or (info is None and action in ADDING_ACTIONS)
+                or (
+                    action in ADDING_ACTIONS
+                    and names & {_normalize(tag) for tag in (info or {}).get("RepoTags") or []}
+                )
+            ):
+                stale.add(reference)
+    else:
+        return False
+
+    for reference in stale:
+        del images[reference]
+    return True
+
+
+def listen(events: Iterable[str]) -> int:
+    """
+    Apply a stream of docker events to the cache, as they arrive.
+
+    :param events: The lines of ``docker events --format '{{json .}}'`` output.
+    :returns: The number of events that changed any images.
+    """
+    applied = 0
+    for line in events:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        with locks.cache_locked("images"):
+            cache = _read_cache()
+            if apply(cache["images"], event):
+                cache["generation"] += 1
+                _write_cache(cache)
+                applied += 1
+    return applied
+
+
+def _watch() -> None:
+    """Follow the docker events stream until it ends, keeping the cache up to date."""
+    since = time.time()
+    with locks.cache_locked("images"):
+        cache = _read_cache()
+        _write_cache({"watcher": os.getpid(), "generation": cache["generation"] + 1, "images": {}})
+    logger.info("Watching the docker events since %.3f", since)
+
+    ps = subprocess.Popen(
+        [
+            "docker",
+            "events",
+            "--since",
+            f"{since:.3f}",
+            "--filter",
+            "type=image",
+            "--format",
+            "{{json .}}",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        applied = listen(ps.stdout)
+    finally:
+        ps.terminate()
+        with locks.cache_locked("images"):
+            cache = _read_cache()
+            if cache["watcher"] == os.getpid():
+                _write_cache({"watcher": None, "generation": cache["generation"] + 1, "images": {}})
+    logger.info("The docker events stream ended after %d invalidation(s)", applied)
+
+
+def _is_watched(cache: dict) -> bool:
+    """Determine whether the cache's watcher is still running."""
+    return bool(cache["watcher"]) and admission.is_running(cache["watcher"])
+
+
+def _read_cache() -> dict:
+    """
+    Read the cached inspection data.
+
+    :returns: The ``watcher`` process ID, the cache ``generation`` and the inspection data of each
+              image reference in ``images``.
+    """
+    try:
+        with open(_get_cache_path()) as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        cache = {}
+    return {
+        "watcher": cache.get("watcher"),
+        "generation": cache.get("generation", 0),
+        "images": cache.get("images") or {},
+    }
+
+
+def _write_cache(cache: dict) -> None:
+    """
+    Write the cached inspection data.
+
+    :param cache: The ``watcher`` process ID, the cache ``generation`` and the inspection data of
+                  each image reference in ``images``.
+    """
+    with locks.atomic_write(_get_cache_path()) as cache_file:
+        json.dump(cache, cache_file)
+
+
+def _get_cache_path() -> pathlib.Path:
+    """Get the path of the cached inspection data."""
+    return get_cache_dir("images") / "inspect.json"
+
+
+def _get_id(reference: str, info: Optional[dict]) -> Optional[str]:
+    """Get the full ID of a cached image, from its inspection data or its ID reference."""
+    if info:
+        return info.get("Id")
+    return reference if reference.startswith("sha256:") else None
+
+
+def _normalize(reference: str) -> str:
+    """Normalize an image reference, so that e.g. ``python`` and ``python:latest`` are equal."""
+    for prefix in ("docker.io/library/", "docker.io/"):
+        if reference.startswith(prefix):
+            reference = reference[len(prefix) :]
+            break
+    if "@" not in reference and ":" not in reference.rsplit("/", 1)[-1]:
+        reference = f"{reference}:latest"
+    return reference
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    _watch()
@@ -0,0 +1,97 @@
+"""
+Coordination between concurrent ``components`` invocations sharing a host and checkout.
+
+CI often runs several ``components`` jobs side by side on the same machine, against the same
+checkout and cache directory. They coordinate through advisory ``flock`` locks on files in the
+``locks/`` cache directory:
+
+* A lock per component is held while the component's directory or images are being replaced or
+  built, so that e.g. ``components create --force`` never deletes a directory that another job is
+  building from.
+* A lock per cache is held while the cache is being updated, or shared while it's being read.
+
+Locks are released when their process exits, however it exits, so a crashed job never leaves a
+stale lock behind. Each :func:`locked` call acquires its locks in sorted order, and component locks
+are always acquired before cache locks, so that jobs wanting several of them cannot deadlock. The
+locks are not reentrant: a thread must not acquire a lock it already holds.
+
+Files that other invocations may read at any time are written with :func:`atomic_write`, so that
+readers see either the old or the new content, never a partial file.
+"""
+import contextlib
+import fcntl
+import logging
+import os
+import pathlib
+import threading
+from typing import IO, Iterable, Iterator
+
+from .cache import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.contextmanager
+def locked(*names: str, shared: bool = False) -> Iterator[None]:
+    """
+    Hold advisory locks, waiting for any other process or thread holding them.
+
+    :param names: The lock names, e.g. ``component/api``.
+    :param shared: Share the locks with other readers, rather than holding them exclusively.
+    """
+    mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    with contextlib.ExitStack() as stack:
+        for name in sorted(set(names)):
+            path = get_cache_dir("locks") / f"{name}.lock"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            lock_file = stack.enter_context(open(path, "a"))
+            try:
+                fcntl.flock(lock_file, mode | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("Waiting for another components command to release the %s lock", name)
+                fcntl.flock(lock_file, mode)
+        yield
+
+
+def components_locked(components: Iterable[str], shared: bool = False):
+    """
+    Hold the locks of some components.
+
+    :param components: The components.
+    :param shared: Share the locks with other readers, rather than holding them exclusively.
+    :returns: A context manager holding the locks.
+    """
+    return locked(*(f"component/{component}" for component in components), shared=shared)
+
+
+def cache_locked(*caches: str, shared: bool = False):
+    """
+    Hold the locks of some caches.
+
+    :param caches: The caches, e.g. ``wheelhouse-index``.
+    :param shared: Share the locks with other readers, rather than holding them exclusively.
+    :returns: A context manager holding the locks.
+    """
+    return locked(*(f"cache/{cache}" for cache in caches), shared=shared)
+
+
+@contextlib.contextmanager
+def atomic_write(path: pathlib.Path, mode: str = "w") -> Iterator[IO]:
+    """
+    Write a file by writing a temporary file beside it, then renaming it into place.
+
+    The file is left untouched if writing fails.
+
+    :param path: The file path.
+    :param mode: The mode to open the temporary file with, ``w`` or ``wb``.
+    :returns: The temporary file, open for writing.
+    """
+    path = pathlib.Path(path)
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}")
+    try:
+        with open(temp_path, mode) as temp_file:
+            yield temp_file
+        os.replace(temp_path, path)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            temp_path.unlink()
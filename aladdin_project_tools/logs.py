@@ -0,0 +1,181 @@
+"""
+Newline-delimited JSON logging, for CI systems that parse the output of the commands.
+
+By default the commands log colored lines for people to read. With ``--log-format json``, or the
+``COMPONENTS_LOG_FORMAT=json`` environment variable, they write one JSON object per line to stderr
+instead, with the ``time``, ``level``, ``logger`` and ``message`` of each record and, where known:
+
+``component``
+    The component, or comma separated components, the record is about.
+``phase``
+    The step of the command, e.g. ``build``, ``transfer``, ``pull`` or ``exec``.
+``duration``
+    How long the step took, in seconds, on the records reporting that it finished.
+``subprocess``
+    The program that printed the line. Subprocess output is logged a line at a time rather than
+    passed through, so that it can't corrupt the stream.
+
+The fields are attached to records with ``extra``, or with :func:`context` to everything logged
+within a block, including by any tasks started there with
+:func:`aladdin_project_tools.parallel.run_tasks`.
+
+Logging verbosely should not slow a build down, so records below the log level are never formatted
+and the others are written in batches: whenever :data:`FLUSH_RECORDS` of them are waiting, a
+warning or error is logged, :data:`FLUSH_INTERVAL` seconds after the first waiting record, and at
+exit.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+from typing import IO, Iterator, Mapping, Sequence
+
+FIELDS = ("component", "phase", "duration", "subprocess")
+FLUSH_RECORDS = 256
+FLUSH_INTERVAL = 1.0
+
+_fields: contextvars.ContextVar[Mapping] = contextvars.ContextVar("log_fields", default={})
+_output_logger = logging.getLogger(f"{__name__}.output")
+_structured = False
+
+
+@contextlib.contextmanager
+def context(**fields) -> Iterator[None]:
+    """
+    Attach fields to the records logged within a block.
+
+    :param fields: The fields, e.g. ``component="api"``. Fields given as ``None`` are left as they
+                   were.
+    """
+    token = _fields.set(
+        dict(_fields.get(), **{name: value for name, value in fields.items() if value is not None})
+    )
+    try:
+        yield
+    finally:
+        _fields.reset(token)
+
+
+def is_structured() -> bool:
+    """
+    Determine whether JSON logging is installed.
+
+    :returns: Whether subprocess output should be logged rather than passed through.
+    """
+    return _structured
+
+
+def log_output(cmd: Sequence[str], line: str) -> None:
+    """
+    Log a line of a subprocess's output.
+
+    :param cmd: The subprocess's command line.
+    :param line: The line.
+    """
+    _output_logger.info("%s", line.rstrip("\n"), extra={"subprocess": get_program(cmd)})
+
+
+def get_program(cmd: Sequence[str]) -> str:
+    """
+    Get the name of the program a command line runs.
+
+    :param cmd: The command line, possibly run through ``env``.
+    :returns: The program's file name.
+    """
+    arguments = list(cmd)
+    if arguments and os.path.basename(arguments[0]) == "env":
+        arguments = [argument for argument in arguments[1:] if "=" not in argument]
+    return os.path.basename(arguments[0]) if arguments else ""
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = _fields.get()
+        for name in FIELDS:
+            value = getattr(record, name, None)
+            if value is None:
+                value = fields.get(name)
+            if value is not None:
+                data[name] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """
+    Write formatted records to a stream in batches.
+
+    :param stream: The stream, defaults to ``sys.stderr``.
+    :param capacity: Write the records once this many of them are waiting.
+    :param interval: Write the records at most this many seconds after the first of them.
+    """
+
+    def __init__(
+        self,
+        stream: IO[str] = None,
+        capacity: int = FLUSH_RECORDS,
+        interval: float = FLUSH_INTERVAL,
+    ):
+        super().__init__(stream)
+        self.capacity = capacity
+        self.interval = interval
+        self._buffer = []
+        self._timer = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._buffer.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+
+        if len(self._buffer) >= self.capacity or record.levelno >= logging.WARNING:
+            self.flush()
+        elif not self._timer:
+            self._timer = threading.Timer(self.interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if self._buffer:
+                self.stream.write("\n".join(self._buffer) + "\n")
+                self._buffer.clear()
+            super().flush()
+        finally:
+            self.release()
+
+
+def install(log_level: str, stream: IO[str] = None) -> None:
+    """
+    Log JSON records in place of any other output of the root logger.
+
+    :param log_level: The log level.
+    :param stream: Where to write the records, defaults to ``sys.stderr``.
+    """
+    global _structured
+
+    handler = BufferedStreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    for other in list(root.handlers):
+        root.removeHandler(other)
+    root.addHandler(handler)
+    root.setLevel(log_level)
+    _structured = True
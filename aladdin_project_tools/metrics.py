@@ -0,0 +1,313 @@
+"""
+A history of build metrics, kept in a SQLite database in the cache directory.
+
+Every build of components, and every docs build, adds a row per component with when it started,
+how long it took, whether it succeeded and, for component images, the fingerprint of the
+component's sources (see :mod:`aladdin_project_tools.fingerprints`), the image size and the share
+of the image's layers that were reused from the image it replaced. That share is a stand-in for the
+layer cache hit ratio that works the same for every build engine, without having to parse their
+output.
+
+When several components are built by a single invocation, e.g. ``aladdin build`` of all of them or
+one ``docker buildx bake``, their individual durations are unknown. Those rows are marked with the
+number of components built together, and only the rows of components built on their own are used
+for the duration statistics and estimates. Components are built on their own by ``components
+create``, ``components edit``, ``components build --hosts`` and ``components build`` of a single
+component.
+
+The estimates are the median duration of a component's recent successful builds, which schedulers
+can use to start the longest builds first.
+"""
+import contextlib
+import logging
+import math
+import sqlite3
+import statistics
+import time
+from typing import Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence
+
+from . import images
+from .cache import get_cache_dir
+
+ESTIMATE_HISTORY = 10
+TREND_WINDOW = 5
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY,
+    command TEXT NOT NULL,
+    component TEXT NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    succeeded INTEGER NOT NULL,
+    batch INTEGER NOT NULL DEFAULT 1,
+    reused_layers INTEGER,
+    layers INTEGER,
+    image_size INTEGER,
+    fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS builds_by_component ON builds (component, started);
+"""
+
+
+class BuildRecord(NamedTuple):
+    """The metrics of one component's build."""
+
+    command: str
+    component: str
+    started: float
+    duration: float
+    succeeded: bool
+    batch: int = 1
+    reused_layers: Optional[int] = None
+    layers: Optional[int] = None
+    image_size: Optional[int] = None
+    fingerprint: Optional[str] = None
+
+
+class ComponentStats(NamedTuple):
+    """A summary of a component's builds."""
+
+    component: str
+    builds: int
+    failures: int
+    p50: Optional[float]
+    p90: Optional[float]
+    slowest: Optional[float]
+    cache_hit_ratio: Optional[float]
+    image_size: Optional[int]
+    trend: Optional[float]
+
+
+@contextlib.contextmanager
+def connect() -> Iterator[sqlite3.Connection]:
+    """
+    Open the metrics database, creating it if necessary, and commit any changes on success.
+
+    :returns: The database connection.
+    """
+    connection = sqlite3.connect(get_cache_dir() / "metrics.db", timeout=30)
+    try:
+        connection.executescript(_SCHEMA)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def record(records: Iterable[BuildRecord]) -> None:
+    """
+    Add build metrics to the database.
+
+    The metrics are a convenience, so failing to store them is logged rather than raised.
+
+    :param records: The metrics of each component's build.
+    """
+    records = list(records)
+    if not records:
+        return
+    try:
+        with connect() as connection:
+            connection.executemany(
+                f"INSERT INTO builds ({', '.join(BuildRecord._fields)}) "
+                f"VALUES ({', '.join('?' * len(BuildRecord._fields))})",
+                records,
+            )
+    except sqlite3.Error as e:
+        logger.warning("Could not store the build metrics: %s", e)
+
+
+def get_records(
+    components: Sequence[str] = (), since: float = None, command: str = None
+) -> List[BuildRecord]:
+    """
+    Get stored build metrics.
+
+    :param components: Only get the metrics of these components, default is all of them.
+    :param since: Only get the builds started since this time.
+    :param command: Only get the builds run by this command, e.g. ``build``.
+    :returns: The metrics, oldest first.
+    """
+    clauses, parameters = [], []
+    if components:
+        clauses.append(f"component IN ({', '.join('?' * len(components))})")
+        parameters.extend(components)
+    if since is not None:
+        clauses.append("started >= ?")
+        parameters.append(since)
+    if command:
+        clauses.append("command = ?")
+        parameters.append(command)
+
+    with connect() as connection:
+        rows = connection.execute(
+            f"SELECT {', '.join(BuildRecord._fields)} FROM builds"
+            + (f" WHERE {' AND '.join(clauses)}" if clauses else "")
+            + " ORDER BY started, id",
+            parameters,
+        ).fetchall()
+    return [BuildRecord(*row[:4], bool(row[4]), *row[5:]) for row in rows]
+
+
+def get_stats(records: Iterable[BuildRecord]) -> List[ComponentStats]:
+    """
+    Summarize build metrics per component.
+
+    :param records: The metrics, oldest first.
+    :returns: The summary of each component, slowest first by median duration.
+    """
+    by_component: Dict[str, List[BuildRecord]] = {}
+    for build in records:
+        by_component.setdefault(build.component, []).append(build)
+
+    stats = []
+    for component, builds in by_component.items():
+        durations = [build.duration for build in builds if build.succeeded and build.batch == 1]
+        reuse = [build for build in builds if build.succeeded and build.layers]
+        sizes = [build.image_size for build in builds if build.image_size is not None]
+        stats.append(
+            ComponentStats(
+                component=component,
+                builds=len(builds),
+                failures=sum(not build.succeeded for build in builds),
+                p50=percentile(durations, 50),
+                p90=percentile(durations, 90),
+                slowest=max(durations, default=None),
+                cache_hit_ratio=(
+                    sum(build.reused_layers for build in reuse)
+                    / sum(build.layers for build in reuse)
+                    if reuse
+                    else None
+                ),
+                image_size=sizes[-1] if sizes else None,
+                trend=get_trend(durations),
+            )
+        )
+    return sorted(stats, key=lambda stat: -(stat.p50 or 0))
+
+
+def percentile(values: Sequence[float], percent: float) -> Optional[float]:
+    """
+    Get a percentile of some values, interpolating between the closest ones.
+
+    :param values: The values.
+    :param percent: The percentile, from 0 to 100.
+    :returns: The percentile, or ``None`` if there are no values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def get_trend(durations: Sequence[float]) -> Optional[float]:
+    """
+    Compare the latest build durations with the ones before them.
+
+    :param durations: The build durations, oldest first.
+    :returns: The change of the median duration of the latest builds from that of the builds
+              before them, as a percentage, or ``None`` if there are too few builds to tell.
+    """
+    if len(durations) < 2 * TREND_WINDOW:
+        return None
+    latest = statistics.median(durations[-TREND_WINDOW:])
+    previous = statistics.median(durations[-2 * TREND_WINDOW : -TREND_WINDOW])
+    return 100.0 * (latest - previous) / previous if previous else None
+
+
+def estimate_durations(components: Iterable[str]) -> Dict[str, float]:
+    """
+    Estimate how long each component's build will take, from its recent builds.
+
+    :param components: The components.
+    :returns: The median duration of each component's recent successful builds of that component
+              alone, for the components that have any.
+    """
+    components = list(components)
+    try:
+        records = get_records(components)
+    except sqlite3.Error as e:
+        logger.warning("Could not read the build metrics: %s", e)
+        return {}
+
+    durations: Dict[str, List[float]] = {}
+    for build in records:
+        if build.succeeded and build.batch == 1:
+            durations.setdefault(build.component, []).append(build.duration)
+    return {
+        component: statistics.median(values[-ESTIMATE_HISTORY:])
+        for component, values in durations.items()
+    }
+
+
+class BuildTimer:
+    """
+    Measure a build of some components, to record its metrics afterwards.
+
+    :param command: The command running the build, e.g. ``build``.
+    :param component_images: The image each component's build produces, or ``None`` for builds
+                             that don't produce an image.
+    :param host: The docker daemon that builds the images.
+    :param fingerprints: The fingerprint of each component's sources.
+    """
+
+    def __init__(
+        self,
+        command: str,
+        component_images: Mapping[str, Optional[str]],
+        host: str = None,
+        fingerprints: Mapping[str, str] = None,
+    ):
+        self.command = command
+        self.component_images = dict(component_images)
+        self.host = host
+        self.fingerprints = dict(fingerprints or {})
+        self._before = self._inspect()
+        self.started = time.time()
+        self._start = time.monotonic()
+
+    def finish(self, succeeded: bool) -> List[BuildRecord]:
+        """
+        Record the metrics of the build.
+
+        :param succeeded: Whether the build succeeded.
+        :returns: The recorded metrics.
+        """
+        duration = time.monotonic() - self._start
+        after = self._inspect()
+
+        records = []
+        for component, image in self.component_images.items():
+            info = after.get(image)
+            layers = ((info or {}).get("RootFS") or {}).get("Layers") or []
+            previous_layers = set(
+                ((self._before.get(image) or {}).get("RootFS") or {}).get("Layers") or ()
+            )
+            records.append(
+                BuildRecord(
+                    command=self.command,
+                    component=component,
+                    started=self.started,
+                    duration=duration,
+                    succeeded=succeeded,
+                    batch=len(self.component_images),
+                    reused_layers=(
+                        sum(layer in previous_layers for layer in layers)
+                        if layers and previous_layers
+                        else None
+                    ),
+                    layers=len(layers) if layers and previous_layers else None,
+                    image_size=info.get("Size") if info else None,
+                    fingerprint=self.fingerprints.get(component),
+                )
+            )
+        record(records)
+        return records
+
+    def _inspect(self) -> Dict[str, Optional[dict]]:
+        """Inspect the component images."""
+        return images.inspect_images(filter(None, self.component_images.values()), host=self.host)
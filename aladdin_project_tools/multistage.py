@@ -0,0 +1,402 @@
+"""
+Generate a single multi-stage Dockerfile for a set of components.
+
+With ``aladdin build``, every component's dependencies are composited into its image by a separate
+build, so a component shared by many others is processed again for each of them. Here, every
+component instead becomes a handful of named stages in one Dockerfile:
+
+``<component>--base``
+    The base image, with the OS packages, user and working directory from component.yaml applied.
+``<component>--packages``
+    The component's python packages, installed from its poetry files into ``/install``.
+``<dependency>--packages-for-<component>``
+    A dependency's python packages, installed on the component's base image instead of its own,
+    for components whose base image differs from their dependency's, e.g. in its python version.
+    Dependents that share a base image share the stage.
+``<component>``
+    The component image. The python packages and the component directories of the component and
+    each of its (transitive) dependencies are copied into it with ``COPY --from``.
+``<component>--editor``
+    The component image with its ``ENTRYPOINT`` and ``CMD`` cleared, for ``components edit``.
+
+Since each dependency is a stage that is only defined once, BuildKit builds it once and reuses it
+for every dependent when all of the component images are built in a single invocation.
+
+Traditional components, which provide their own ``FROM`` instructions, cannot be merged into the
+generated Dockerfile and are built on their own.
+
+Components may also install their python packages offline from the shared wheelhouse (see
+:mod:`aladdin_project_tools.wheelhouse`), which is bind mounted into their ``--packages`` stage from
+a ``wheelhouse`` named build context.
+
+The apt, pip and poetry caches are mounted into the package installation steps as BuildKit cache
+mounts, see :mod:`aladdin_project_tools.buildcache`.
+"""
+import pathlib
+from typing import Collection, List, Mapping, Optional, Sequence
+
+from . import buildcache, prune
+
+DEFAULT_PYTHON_VERSION = "3.8"
+DEFAULT_PYTHON_LOCATION = "/usr/local"
+DEFAULT_USER = "aladdin-user"
+DEFAULT_WORKDIR = "/code"
+WHEELHOUSE_CONTEXT = "wheelhouse"
+
+
+def get_stage_name(component: str, suffix: str = "") -> str:
+    """
+    Get the name of one of a component's build stages.
+
+    :param component: The component.
+    :param suffix: The stage's role, e.g. ``base`` or ``editor``. Empty for the component image.
+    :returns: The stage name.
+    """
+    return f"{component.lower()}--{suffix}" if suffix else component.lower()
+
+
+def get_workdir(component_config: dict) -> str:
+    """
+    Get the working directory of a component image.
+
+    :param component_config: The component's component.yaml contents.
+    :returns: The working directory.
+    """
+    workdir = (component_config.get("image") or {}).get("workdir") or {}
+    return workdir.get("path") or DEFAULT_WORKDIR
+
+
+def generate_dockerfile(
+    component_configs: Mapping[str, dict],
+    dependencies: Mapping[str, Sequence[str]],
+    order: Sequence[str],
+    components_path: pathlib.Path = pathlib.Path("components"),
+    wheelhouse: Collection[str] = (),
+    project_name: str = None,
+) -> str:
+    """
+    Generate the multi-stage Dockerfile for a set of standard and compatible components.
+
+    :param component_configs: The component.yaml contents of each component to include.
+    :param dependencies: All of the (transitive) dependencies of each component, in topological
+                         order. Dependencies without a stage of their own, i.e. traditional
+                         components, are copied straight from the build context.
+    :param order: The components in topological order.
+    :param components_path: The ``components/`` directory, which is the build context.
+    :param wheelhouse: The components whose python packages to install from the wheelhouse rather
+                       than from the package index.
+    :param project_name: The project name from the ``lamp.json`` file, which identifies the
+                         project's package manager cache mounts. Without it, no caches are mounted.
+    :returns: The Dockerfile content.
+    """
+    sections = [
+        "# syntax=docker/dockerfile:1\n"
+        "# Generated by 'components build --engine native'. Do not edit.\n"
+    ]
+    has_packages = {
+        component: (components_path / component / "pyproject.toml").exists()
+        for component in order
+    }
+    # Packages are only importable on the base image they were installed on
+    packages_stages = {}
+
+    for component in order:
+        config = component_configs[component]
+        base = _get_base_image(config)
+        sections.append(_get_base_stage(component, config, project_name))
+
+        installed = [
+            dependency
+            for dependency in list(dependencies.get(component, ())) + [component]
+            if has_packages.get(dependency)
+        ]
+        for dependency in installed:
+            if (dependency, base) not in packages_stages:
+                sections.append(
+                    _get_packages_stage(
+                        dependency,
+                        component_configs[dependency],
+                        dependency in wheelhouse,
+                        project_name,
+                        target=component,
+                    )
+                )
+                packages_stages[dependency, base] = _get_packages_stage_name(dependency, component)
+        sections.append(
+            _get_component_stage(
+                component,
+                config,
+                list(dependencies.get(component, ())),
+                component_configs,
+                [packages_stages[dependency, base] for dependency in installed],
+                components_path,
+            )
+        )
+        sections.append(
+            "\n".join(
+                [
+                    f"FROM {get_stage_name(component)} AS {get_stage_name(component, 'editor')}",
+                    "ENTRYPOINT []",
+                    'CMD ["/bin/bash"]',
+                    "",
+                ]
+            )
+        )
+
+    return "\n".join(sections)
+
+
+def get_bake_definition(
+    project_name: str,
+    components: Sequence[str],
+    dockerfile: pathlib.Path,
+    tag: str = "local",
+    context: str = "components",
+    contexts: Mapping[str, str] = None,
+    cache_dir: pathlib.Path = None,
+) -> dict:
+    """
+    Get a ``docker buildx bake`` definition that builds every component image in one invocation.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :param components: The components whose images to build.
+    :param dockerfile: The generated Dockerfile.
+    :param tag: The docker :-suffix tag to apply to the component images.
+    :param context: The build context directory.
+    :param contexts: Additional named build contexts, e.g. the wheelhouse directory.
+    :param cache_dir: A directory of local BuildKit caches, one per target, such as those written
+                      by ``components cache export``. Targets with a cache there build from it.
+    :returns: The bake definition, to be written as JSON.
+    """
+    targets = {}
+    for component in components:
+        for suffix, image_tag in (("", tag), ("editor", "editor")):
+            targets[get_stage_name(component, suffix)] = dict(
+                context=context,
+                dockerfile=dockerfile.resolve().as_posix(),
+                target=get_stage_name(component, suffix),
+                tags=[f"{project_name}-{component}:{image_tag}"],
+                labels=prune.get_labels(project_name, component, image_tag),
+            )
+            if contexts:
+                targets[get_stage_name(component, suffix)]["contexts"] = dict(contexts)
+            target_cache_dir = cache_dir / get_stage_name(component, suffix) if cache_dir else None
+            if target_cache_dir and (target_cache_dir / "index.json").exists():
+                targets[get_stage_name(component, suffix)]["cache-from"] = [
+                    f"type=local,src={target_cache_dir.resolve().as_posix()}"
+                ]
+    return dict(group=dict(default=dict(targets=list(targets))), target=targets)
+
+
+def _get_base_stage(component: str, config: dict, project_name: str = None) -> str:
+    """
+    Get the stage that prepares a component's base image.
+
+    :param component: The component.
+    :param config: The component's component.yaml contents.
+    :param project_name: The project name, to mount its package manager caches.
+    :returns: The stage's instructions.
+    """
+    image = config.get("image") or {}
+    compatible = bool(image.get("base"))
+
+    base = _get_base_image(config)
+    user = image.get("user") or {}
+    user_name = user.get("name") or DEFAULT_USER
+    group = user.get("group") or user_name
+    home = user.get("home") or f"/home/{user_name}"
+    create_user = user.get("create", not compatible)
+    workdir = image.get("workdir") or {}
+    create_workdir = workdir.get("create", not compatible)
+
+    lines = [f"FROM {base} AS {get_stage_name(component, 'base')}", "USER root"]
+    if image.get("packages") and project_name:
+        lines.append(
+            "RUN "
+            + buildcache.get_mount_options(
+                project_name, buildcache.APT_ARCHIVES, buildcache.APT_LISTS
+            )
+            + buildcache.KEEP_APT_ARCHIVES
+            + " && apt-get update"
+            " && apt-get install -y --no-install-recommends "
+            + " ".join(image["packages"])
+        )
+    elif image.get("packages"):
+        lines.append(
+            "RUN apt-get update"
+            " && apt-get install -y --no-install-recommends "
+            + " ".join(image["packages"])
+            + " && rm -rf /var/lib/apt/lists/*"
+        )
+    if not compatible:
+        lines.append(_get_pip_run(project_name, "pip install poetry"))
+    if create_user:
+        lines.append(
+            f"RUN (getent group {group} || groupadd {group})"
+            f" && (id -u {user_name} || useradd --create-home --home-dir {home}"
+            f" --gid {group} {user_name})"
+        )
+    if create_workdir:
+        lines.append(f"WORKDIR {get_workdir(config)}")
+        lines.append(f"ENV PYTHONPATH={get_workdir(config)}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _get_base_image(config: dict) -> str:
+    """
+    Get the image a component's base stage is built from.
+
+    :param config: The component's component.yaml contents.
+    :returns: The image reference.
+    """
+    image = config.get("image") or {}
+    language = config.get("language") or {}
+    return image.get("base") or f"python:{language.get('version', DEFAULT_PYTHON_VERSION)}-slim"
+
+
+def _get_packages_stage_name(component: str, target: str) -> str:
+    """
+    Get the name of the stage that installs a component's python packages.
+
+    :param component: The component whose packages are installed.
+    :param target: The component whose base image they're installed on.
+    :returns: The stage name.
+    """
+    if target == component:
+        return get_stage_name(component, "packages")
+    return get_stage_name(component, f"packages-for-{target.lower()}")
+
+
+def _get_packages_stage(
+    component: str,
+    config: dict,
+    wheelhouse: bool = False,
+    project_name: str = None,
+    target: str = None,
+) -> str:
+    """
+    Get the stage that installs a component's python packages into ``/install``.
+
+    :param component: The component.
+    :param config: The component's component.yaml contents.
+    :param wheelhouse: Install the packages offline from the wheelhouse, using the component's
+                       requirements file there.
+    :param project_name: The project name, to mount its package manager caches.
+    :param target: The component whose base image to install the packages on, defaults to the
+                   component itself.
+    :returns: The stage's instructions.
+    """
+    target = target or component
+    from_line = (
+        f"FROM {get_stage_name(target, 'base')} AS {_get_packages_stage_name(component, target)}"
+    )
+    if wheelhouse:
+        return "\n".join(
+            [
+                from_line,
+                "USER root",
+                f"RUN --mount=type=bind,from={WHEELHOUSE_CONTEXT},target=/wheelhouse"
+                " pip install --no-cache-dir --no-index --find-links=/wheelhouse/wheels"
+                f" --prefix=/install -r /wheelhouse/requirements/{component}.txt",
+                "",
+            ]
+        )
+
+    return "\n".join(
+        [
+            from_line,
+            "USER root",
+            f"COPY {component}/pyproject.toml {component}/poetry.lock* /tmp/{component}/",
+            _get_pip_run(
+                project_name,
+                f"cd /tmp/{component}"
+                " && (command -v poetry || pip install poetry)"
+                " && poetry export --without-hashes --format requirements.txt"
+                " --output requirements.txt"
+                " && pip install --prefix=/install -r requirements.txt",
+                buildcache.POETRY,
+            ),
+            "",
+        ]
+    )
+
+
+def _get_pip_run(project_name: Optional[str], command: str, *caches: str) -> str:
+    """
+    Get a ``RUN`` instruction for a command that installs python packages with pip.
+
+    :param project_name: The project name, to mount its pip cache, and any other caches.
+    :param command: The command, whose pip calls should not pass ``--no-cache-dir``.
+    :param caches: Other caches to mount along with pip's.
+    :returns: The instruction.
+    """
+    if project_name:
+        mounts = buildcache.get_mount_options(project_name, buildcache.PIP, *caches)
+        return f"RUN {mounts}{command}"
+    return "RUN " + command.replace("pip install", "pip install --no-cache-dir")
+
+
+def _get_component_stage(
+    component: str,
+    config: dict,
+    dependencies: List[str],
+    component_configs: Mapping[str, dict],
+    packages_stages: List[str],
+    components_path: pathlib.Path,
+) -> str:
+    """
+    Get the stage that assembles a component's image from its dependencies' stages.
+
+    :param component: The component.
+    :param config: The component's component.yaml contents.
+    :param dependencies: The component's transitive dependencies, in topological order.
+    :param component_configs: The component.yaml contents of every included component.
+    :param packages_stages: The stages that install the python packages of the component's
+                            dependencies and its own on its base image, in topological order.
+    :param components_path: The ``components/`` directory, which is the build context.
+    :returns: The stage's instructions.
+    """
+    location = (
+        ((config.get("language") or {}).get("spec") or {}).get("location")
+        or DEFAULT_PYTHON_LOCATION
+    )
+    workdir = get_workdir(config)
+    user = ((config.get("image") or {}).get("user") or {}).get("name") or DEFAULT_USER
+
+    lines = [f"FROM {get_stage_name(component, 'base')} AS {get_stage_name(component)}"]
+    for packages_stage in packages_stages:
+        lines.append(f"COPY --from={packages_stage} /install {location}")
+    for dependency in dependencies:
+        if dependency in component_configs:
+            dependency_workdir = get_workdir(component_configs[dependency])
+            lines.append(
+                f"COPY --from={get_stage_name(dependency)} --chown={user}"
+                f" {dependency_workdir}/components/{dependency} {workdir}/components/{dependency}"
+            )
+        else:
+            lines.append(f"COPY --chown={user} {dependency} {workdir}/components/{dependency}")
+    lines.append(f"COPY --chown={user} {component} {workdir}/components/{component}")
+
+    snippet = _read_dockerfile_snippet(components_path / component / "Dockerfile")
+    if snippet:
+        lines.append(f"# From {component}/Dockerfile")
+        lines.append(snippet)
+
+    lines.append(f"USER {user}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _read_dockerfile_snippet(path: pathlib.Path) -> Optional[str]:
+    """
+    Read a component's own Dockerfile instructions, which have no ``FROM`` instruction.
+
+    :param path: The component's Dockerfile.
+    :returns: The instructions, or ``None`` if the component has no Dockerfile.
+    """
+    try:
+        with open(path) as dockerfile:
+            return dockerfile.read().strip()
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,250 @@
+"""
+Helpers for running work for many components concurrently.
+
+The scheduler runs named tasks on a bounded pool of threads. Tasks may optionally depend on other
+tasks, in which case they are only started once all of their dependencies have finished. This lets
+us follow the component dependency graph while still running independent components side by side.
+"""
+import codecs
+import concurrent.futures
+import contextlib
+import contextvars
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, IO, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from . import buildlogs, logs
+
+
+class TaskResult(NamedTuple):
+    """The outcome of a scheduled task."""
+
+    name: str
+    value: Any
+    error: Optional[BaseException]
+    duration: float
+
+    @property
+    def ok(self) -> bool:
+        """Whether the task completed without raising an exception."""
+        return self.error is None
+
+
+class CommandResult(NamedTuple):
+    """The outcome of a command run by :func:`run_command`."""
+
+    returncode: int
+    output: str
+
+
+def run_tasks(
+    tasks: Mapping[str, Callable[[], Any]],
+    jobs: int,
+    dependencies: Mapping[str, Iterable[str]] = None,
+    on_complete: Callable[[TaskResult], None] = None,
+    priorities: Mapping[str, float] = None,
+) -> Dict[str, TaskResult]:
+    """
+    Run tasks concurrently, honoring any dependencies between them.
+
+    Dependencies that are not themselves among the tasks are ignored. A task's exception does not
+    prevent its dependents from running; it is recorded in the task's result. Tasks run with the
+    caller's :func:`aladdin_project_tools.logs.context` fields.
+
+    :param tasks: The callables to run, keyed by name.
+    :param jobs: The maximum number of tasks to run at once.
+    :param dependencies: The names of the tasks that must finish before each task may start.
+    :param on_complete: A function to call with each task's result as soon as it is available.
+    :param priorities: The tasks that are ready to start are started in order of descending
+                       priority, e.g. their expected duration, so that long tasks don't end up
+                       running on their own at the end. Tasks without a priority go last.
+    :returns: The results of all the tasks, keyed by name.
+    """
+    waiting_on = {
+        name: set(dep for dep in (dependencies or {}).get(name, ()) if dep in tasks and dep != name)
+        for name in tasks
+    }
+    results = {}
+
+    def _timed(name: str) -> TaskResult:
+        start = time.monotonic()
+        try:
+            value, error = tasks[name](), None
+        except Exception as e:
+            value, error = None, e
+        return TaskResult(name, value, error, time.monotonic() - start)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        running = {}
+        while waiting_on or running:
+            ready = [name for name, deps in waiting_on.items() if not deps]
+            for name in sorted(ready, key=lambda name: -(priorities or {}).get(name, 0)):
+                del waiting_on[name]
+                running[executor.submit(contextvars.copy_context().run, _timed, name)] = name
+
+            if not running:
+                raise RuntimeError("Cycles found in task dependencies", sorted(waiting_on))
+
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                name = running.pop(future)
+                results[name] = future.result()
+                for deps in waiting_on.values():
+                    deps.discard(name)
+                if on_complete:
+                    on_complete(results[name])
+
+    return results
+
+
+def run_command(
+    cmd: List[str],
+    prefix: str = "",
+    stream: IO[str] = None,
+    lock: threading.Lock = None,
+    env: Mapping[str, str] = None,
+    cwd: os.PathLike = None,
+    stdin: bytes = None,
+) -> CommandResult:
+    """
+    Run a command, echoing each line of its output with a prefix.
+
+    Lines are written whole while holding ``lock``, so that the output of several concurrent
+    commands can be interleaved on the same stream without being garbled. With JSON logging, lines
+    bound for ``sys.stdout`` are logged instead, see :mod:`aladdin_project_tools.logs`. Within a
+    build being recorded, the command and its output are also recorded, see
+    :mod:`aladdin_project_tools.buildlogs`.
+
+    :param cmd: The command to run.
+    :param prefix: The text to prepend to each line of output.
+    :param stream: Where to echo the output, defaults to ``sys.stdout``. Use ``False`` to only
+                   capture the output.
+    :param lock: The lock guarding ``stream``.
+    :param env: Environment variables to set for the command, on top of our own.
+    :param cwd: The directory to run the command in, defaults to the current one.
+    :param stdin: Data to send to the command as its input, which must fit in the pipe's buffer.
+    :returns: The command's return code and combined stdout and stderr output.
+    """
+    structured = stream is None and logs.is_structured()
+    stream = sys.stdout if stream is None else stream
+    lock = lock or threading.Lock()
+    recorder = buildlogs.get_recorder()
+    if recorder:
+        recorder.started(cmd)
+
+    output = []
+    with subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL if stdin is None else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        env=dict(os.environ, **env) if env else None,
+        cwd=cwd,
+    ) as ps:
+        if stdin is not None:
+            ps.stdin.write(stdin)
+            ps.stdin.close()
+        for raw_line in ps.stdout:
+            line = raw_line.decode(errors="replace")
+            output.append(line)
+            if recorder:
+                recorder.write(line)
+            if structured:
+                logs.log_output(cmd, line)
+            elif stream:
+                with lock:
+                    stream.write(f"{prefix}{line}" if line.endswith("\n") else f"{prefix}{line}\n")
+                    stream.flush()
+
+    if recorder:
+        recorder.exited(cmd, ps.returncode)
+    return CommandResult(ps.returncode, "".join(output))
+
+
+def run_attached(cmd: List[str], env: Mapping[str, str] = None, cwd: os.PathLike = None) -> int:
+    """
+    Run a command attached to the terminal, for interactive use.
+
+    The command reads our standard input and, when ours is a terminal, writes to a pseudo terminal
+    of its own, so that it keeps its colors and progress displays. Its output is copied through to
+    ``sys.stdout`` as it comes. Within a build being recorded, the command and its output are also
+    recorded a line at a time, see :mod:`aladdin_project_tools.buildlogs`. Unlike with
+    :func:`run_command`, the output is not kept.
+
+    :param cmd: The command to run.
+    :param env: Environment variables to set for the command, on top of our own.
+    :param cwd: The directory to run the command in, defaults to the current one.
+    :returns: The command's return code.
+    """
+    recorder = buildlogs.get_recorder()
+    if recorder:
+        recorder.started(cmd)
+
+    master, slave = _open_pseudo_terminal() if sys.stdout.isatty() else (None, None)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    with subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE if slave is None else slave,
+        stderr=subprocess.STDOUT if slave is None else slave,
+        env=dict(os.environ, **env) if env else None,
+        cwd=cwd,
+    ) as ps:
+        if slave is not None:
+            os.close(slave)
+        source = ps.stdout.fileno() if master is None else master
+        while True:
+            try:
+                data = os.read(source, 1 << 16)
+            except OSError:
+                # Reading a pseudo terminal fails rather than ending once the command has exited
+                data = b""
+            text = decoder.decode(data, final=not data)
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            if recorder:
+                *lines, pending = (pending + text).split("\n")
+                for line in lines:
+                    recorder.write(_get_last_redraw(line))
+                if len(pending) > buildlogs.CHUNK_SIZE:
+                    pending = _get_last_redraw(pending)[-buildlogs.CHUNK_SIZE :]
+            if not data:
+                break
+        if master is not None:
+            os.close(master)
+
+    if recorder:
+        if pending:
+            recorder.write(_get_last_redraw(pending))
+        recorder.exited(cmd, ps.returncode)
+    return ps.returncode
+
+
+def _open_pseudo_terminal() -> Tuple[Optional[int], Optional[int]]:
+    """
+    Open a pseudo terminal the size of our terminal, on platforms that have them.
+
+    :returns: The file descriptors of its master and slave ends, or ``None`` for both.
+    """
+    try:
+        import fcntl
+        import pty
+        import termios
+    except ImportError:
+        return None, None
+
+    master, slave = pty.openpty()
+    with contextlib.suppress(OSError, ValueError):
+        size = fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, bytes(8))
+        fcntl.ioctl(slave, termios.TIOCSWINSZ, size)
+    return master, slave
+
+
+def _get_last_redraw(line: str) -> str:
+    """Get what a terminal would end up showing of a line redrawn with carriage returns."""
+    return line.rstrip("\r").rsplit("\r", 1)[-1]
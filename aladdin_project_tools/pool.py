@@ -0,0 +1,344 @@
+"""
+A pool of long-lived, idle component containers.
+
+``components run`` and ``components edit`` normally start a fresh ``docker run --rm -it``
+container for every invocation. In pooled mode we instead keep one idle container per component
+image and tag, and run each command in it with ``docker exec``. After the first invocation this
+avoids the cost of creating and tearing down a container entirely.
+
+Pooled containers are labeled with the project name so that we can find them again, and named
+after the checkout whose ``components/`` directory they mount, so that each checkout only ever
+lists and reaps its own. A container is recycled whenever the image it was started from no longer
+matches the current image ID for its tag (e.g. after a rebuild), and containers that have not been
+used for a while are reaped. Each use is recorded before the container is started or reused, and
+a container is only reaped while holding its lock, so a reap never removes a container that is
+being acquired.
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import subprocess
+import time
+from typing import List, NamedTuple, Optional
+
+from . import locks
+from .cache import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+POOL_LABEL = "aladdin-project-tools.pool"
+"""
+The label applied to every pooled container. Its value is the project name.
+"""
+
+WORKDIR_LABEL = "aladdin-project-tools.pool.workdir"
+"""
+The label recording the container's working directory, so we needn't inspect the image for it.
+"""
+
+IDLE_TIMEOUT_ENVVAR = "COMPONENTS_POOL_IDLE_TIMEOUT"
+"""
+The environment variable used to override the idle timeout, in seconds.
+"""
+
+DEFAULT_IDLE_TIMEOUT = 30 * 60
+"""
+Pooled containers unused for this many seconds will be reaped.
+"""
+
+REAP_INTERVAL = 60
+"""
+The minimum number of seconds between opportunistic reaps of idle containers.
+"""
+
+
+class PooledContainer(NamedTuple):
+    """The details of a pooled container."""
+
+    name: str
+    image: str
+    workdir: pathlib.Path
+
+
+def get_idle_timeout() -> int:
+    """
+    Get the configured idle timeout for pooled containers.
+
+    :returns: The idle timeout, in seconds.
+    """
+    return int(os.environ.get(IDLE_TIMEOUT_ENVVAR) or DEFAULT_IDLE_TIMEOUT)
+
+
+def get_container_name(project_name: str, component: str, tag: str) -> str:
+    """
+    Get the name of the pooled container for a component image.
+
+    The name includes a digest of the project checkout location, since the container mounts that
+    checkout's ``components/`` directory.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :param component: The component whose container to name.
+    :param tag: The docker :-suffix tag of the component image.
+    :returns: The container name.
+    """
+    return f"{project_name}-{component}-{tag}-pool-{_get_checkout()}"
+
+
+def acquire(project_name: str, component: str, tag: str, mount_path: str) -> PooledContainer:
+    """
+    Get a running pooled container for the component image, starting one if necessary.
+
+    A single ``docker inspect`` call retrieves both the current image and any existing container so
+    that the common case, a warm container from the current image, costs only one round trip. The
+    container's lock is held meanwhile, so that concurrent invocations don't both try to start or
+    recycle it.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :param component: The component whose container to acquire.
+    :param tag: The docker :-suffix tag of the component image.
+    :param mount_path: The host path of the ``components/`` directory to mount in the container.
+    :returns: The pooled container details.
+    """
+    name = get_container_name(project_name, component, tag)
+    with locks.locked(f"pool/{name}"):
+        return _acquire(project_name, component, tag, mount_path, name)
+
+
+def _acquire(
+    project_name: str, component: str, tag: str, mount_path: str, name: str
+) -> PooledContainer:
+    """
+    Get a running pooled container for the component image, while holding its lock.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :param component: The component whose container to acquire.
+    :param tag: The docker :-suffix tag of the component image.
+    :param mount_path: The host path of the ``components/`` directory to mount in the container.
+    :param name: The pooled container name.
+    :returns: The pooled container details.
+    """
+    image = f"{project_name}-{component}:{tag}"
+    # Record the use first, so that a concurrent reap leaves the container alone
+    _touch(name)
+
+    # docker inspect reports the objects it found even if some of them are missing
+    ps = subprocess.run(["docker", "inspect", image, name], capture_output=True)
+    try:
+        found = json.loads(ps.stdout.decode() or "[]")
+    except json.JSONDecodeError:
+        found = []
+
+    image_info = next((info for info in found if "RepoTags" in info), None)
+    container_info = next((info for info in found if "State" in info), None)
+    if not image_info:
+        raise RuntimeError(f"No {image} image present")
+
+    if container_info:
+        labels = container_info["Config"].get("Labels") or {}
+        workdir = pathlib.Path(labels.get(WORKDIR_LABEL) or "/")
+        if container_info["Image"] != image_info["Id"]:
+            logger.info("Image %s has changed; Recycling pooled container %s", image, name)
+            subprocess.run(["docker", "rm", "-f", name], capture_output=True)
+        elif not container_info["State"]["Running"]:
+            logger.debug("Restarting pooled container %s", name)
+            subprocess.run(["docker", "start", name], capture_output=True, check=True)
+            return PooledContainer(name, image, workdir)
+        else:
+            return PooledContainer(name, image, workdir)
+
+    workdir = pathlib.Path(image_info["Config"].get("WorkingDir") or "/")
+    command = [
+        "docker",
+        "run",
+        "--detach",
+        "--name",
+        name,
+        "--label",
+        f"{POOL_LABEL}={project_name}",
+        "--label",
+        f"{WORKDIR_LABEL}={workdir.as_posix()}",
+        "-v",
+        f"{mount_path}:{workdir}/components",
+        "--entrypoint",
+        "",
+        image,
+        "tail",
+        "-f",
+        "/dev/null",
+    ]
+    logger.info("Starting pooled container %s", name)
+    logger.debug("Running docker container: %s", " ".join(command))
+    subprocess.run(command, capture_output=True, check=True)
+    return PooledContainer(name, image, workdir)
+
+
+def get_exec_command(
+    container: PooledContainer,
+    command: List[str],
+    workdir: Optional[pathlib.Path] = None,
+    interactive: bool = True,
+) -> List[str]:
+    """
+    Get the ``docker exec`` command line that runs a command in a pooled container.
+
+    This also records that the container is in use.
+
+    :param container: The pooled container to run the command in.
+    :param command: The command to run.
+    :param workdir: The directory to run the command in, defaults to the container's workdir.
+    :param interactive: Attach a terminal and stdin to the command.
+    :returns: The command line.
+    """
+    _touch(container.name)
+    return (
+        ["docker", "exec"]
+        + (["-it"] if interactive else [])
+        + (["-w", workdir.as_posix()] if workdir else [])
+        + [container.name]
+        + command
+    )
+
+
+def execute(
+    container: PooledContainer, command: List[str], workdir: Optional[pathlib.Path] = None
+) -> subprocess.CompletedProcess:
+    """
+    Run a command interactively in a pooled container.
+
+    :param container: The pooled container to run the command in.
+    :param command: The command to run.
+    :param workdir: The directory to run the command in, defaults to the container's workdir.
+    :returns: The completed process object
+    """
+    command = get_exec_command(container, command, workdir=workdir)
+    logger.debug("Running command in pooled container: %s", " ".join(command))
+    try:
+        return subprocess.run(command)
+    finally:
+        _touch(container.name)
+
+
+def list_containers(project_name: str) -> List[dict]:
+    """
+    List the project's pooled containers that mount this checkout.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :returns: The container name, image, status and idle time (in seconds), if known, of each
+              container.
+    """
+    ps = subprocess.run(
+        [
+            "docker",
+            "ps",
+            "--all",
+            "--filter",
+            f"label={POOL_LABEL}={project_name}",
+            "--format",
+            "{{.Names}}\t{{.Image}}\t{{.Status}}",
+        ],
+        capture_output=True,
+        check=True,
+    )
+
+    suffix = f"-pool-{_get_checkout()}"
+    containers = []
+    for line in ps.stdout.decode().splitlines():
+        name, image, status = line.split("\t")
+        if name.endswith(suffix):
+            containers.append(dict(name=name, image=image, status=status, idle=_get_idle(name)))
+    return containers
+
+
+def reap(project_name: str, idle_timeout: Optional[int] = None) -> List[str]:
+    """
+    Remove this checkout's pooled containers that have been idle for too long.
+
+    Containers whose last use is unknown are left alone, unless all of them are being removed.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :param idle_timeout: Remove containers idle for at least this many seconds, defaults to the
+                         configured idle timeout. Use ``0`` to remove all pooled containers.
+    :returns: The names of the removed containers.
+    """
+    idle_timeout = get_idle_timeout() if idle_timeout is None else idle_timeout
+
+    _get_stamp_path(".reaped").touch()
+
+    def is_stale(idle: Optional[float]) -> bool:
+        return idle_timeout == 0 or (idle is not None and idle >= idle_timeout)
+
+    candidates = [
+        container["name"]
+        for container in list_containers(project_name)
+        if is_stale(container["idle"])
+    ]
+    if not candidates:
+        return []
+
+    # Containers acquired since they were listed are in use again
+    with locks.locked(*(f"pool/{name}" for name in candidates)):
+        stale = [name for name in candidates if is_stale(_get_idle(name))]
+        if stale:
+            logger.info("Removing pooled containers: %s", ", ".join(stale))
+            subprocess.run(["docker", "rm", "-f"] + stale, capture_output=True)
+            for name in stale:
+                with contextlib.suppress(FileNotFoundError):
+                    _get_stamp_path(name).unlink()
+    return stale
+
+
+def reap_if_due(project_name: str) -> None:
+    """
+    Reap idle containers, but only if we haven't done so recently.
+
+    This keeps the cost of opportunistic reaping off of the pooled command's critical path.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    """
+    stamp = _get_stamp_path(".reaped")
+    if not stamp.exists() or time.time() - stamp.stat().st_mtime >= REAP_INTERVAL:
+        reap(project_name)
+
+
+def _get_checkout() -> str:
+    """
+    Get the digest of the project checkout location that names its pooled containers.
+
+    :returns: The digest.
+    """
+    return hashlib.md5(os.getcwd().encode()).hexdigest()[:8]
+
+
+def _get_idle(name: str) -> Optional[float]:
+    """
+    Get how long a pooled container has been idle.
+
+    :param name: The pooled container name.
+    :returns: The idle time in seconds, or ``None`` if the container's last use is unknown.
+    """
+    try:
+        return time.time() - _get_stamp_path(name).stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def _get_stamp_path(name: str) -> pathlib.Path:
+    """
+    Get the path of the file whose mtime records when a pooled container was last used.
+
+    :param name: The pooled container name.
+    :returns: The stamp file path.
+    """
+    return get_cache_dir("pool") / name
+
+
+def _touch(name: str) -> None:
+    """
+    Record that a pooled container is in use.
+
+    :param name: The pooled container name.
+    """
+    _get_stamp_path(name).touch()
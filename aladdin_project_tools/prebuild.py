@@ -0,0 +1,214 @@
+"""
+Building editor images in the background.
+
+``components edit`` needs the component's editor image, which ``components create`` removes and
+``--engine aladdin`` builds may leave outdated, so an engineer may have to wait for a full build
+before they can start editing. With ``--prebuild-editors``, or the
+``COMPONENTS_PREBUILD_EDITORS=1`` environment variable, ``components build``, ``create`` and
+``edit`` start a background process once they're done, which builds the editor images that are
+missing or older than their component's image.
+
+The background builds run at a low priority: at most :data:`JOBS` of them at a time, each waiting
+until it fits within :data:`BUDGET_SHARE` of the admission budget (see
+:mod:`aladdin_project_tools.admission`), so that they never hold up more than a share of the
+machine, and with a nice client process. They hold the component locks like any other build.
+
+The components waiting for or having their editor images built are listed, with the ID of the
+process building them, in ``prebuild/queue.json`` in the cache directory, so that a later command
+doesn't queue them again and ``components edit`` can wait for an in-flight build rather than fail.
+The background builds' output goes to ``prebuild/prebuild.log``.
+"""
+import json
+import logging
+import os
+import pathlib
+import subprocess
+import sys
+import time
+from typing import Dict, Iterable, List
+
+from . import admission, images, locks, parallel
+from .cache import CACHE_DIR_ENVVAR, get_cache_dir
+from .project import Project
+
+ENVVAR = "COMPONENTS_PREBUILD_EDITORS"
+JOBS = 2
+BUDGET_SHARE = 0.5
+NICENESS = 10
+POLL_INTERVAL = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+def start(project: Project, components: Iterable[str]) -> List[str]:
+    """
+    Start building the components' missing or outdated editor images in the background.
+
+    :param project: The project.
+    :param components: The components whose editor images to check.
+    :returns: The components newly queued, excluding any already queued by a running process.
+    """
+    with locks.cache_locked("prebuild"):
+        queue = _read_queue()
+        components = [component for component in components if component not in queue]
+        if not components:
+            return []
+
+        with open(get_log_path(), "ab") as log_file:
+            ps = subprocess.Popen(
+                [sys.executable, "-m", __name__] + components,
+                cwd=project.root,
+                # The cache directory may be relative to this process's working directory
+                env=dict(os.environ, **{CACHE_DIR_ENVVAR: get_cache_dir().resolve().as_posix()}),
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        queue.update((component, ps.pid) for component in components)
+        _write_queue(queue)
+    return components
+
+
+def get_log_path() -> pathlib.Path:
+    """
+    Get the path of the log of the background builds.
+
+    :returns: The log file path.
+    """
+    return get_cache_dir("prebuild") / "prebuild.log"
+
+
+def wait(component: str) -> bool:
+    """
+    Wait for any background build of a component's editor image to finish.
+
+    :param component: The component.
+    :returns: Whether there was a build to wait for.
+    """
+    waited = False
+    while True:
+        with locks.cache_locked("prebuild", shared=True):
+            queued = component in _read_queue()
+        if not queued:
+            return waited
+        if not waited:
+            logger.info("Waiting for the %s editor image being built in the background", component)
+            waited = True
+        time.sleep(POLL_INTERVAL)
+
+
+def get_outdated(project: Project, components: Iterable[str]) -> List[str]:
+    """
+    Find the components whose editor images are missing or older than their images.
+
+    :param project: The project.
+    :param components: The components.
+    :returns: The components whose editor images need building.
+    """
+    components = list(components)
+    component_images = project.get_images(components)
+    editor_images = project.get_images(components, "editor")
+    inspected = images.inspect_images(
+        list(component_images.values()) + list(editor_images.values())
+    )
+
+    outdated = []
+    for component in components:
+        image = inspected.get(component_images[component])
+        editor = inspected.get(editor_images[component])
+        if not image and not project.get_config(component):
+            # A traditional component's editor image is built from its image
+            continue
+        if not editor or (image and image.get("Created", "") > editor.get("Created", "")):
+            outdated.append(component)
+    return outdated
+
+
+def run(project: Project, components: Iterable[str], jobs: int = JOBS) -> Dict[str, bool]:
+    """
+    Build the components' missing or outdated editor images, at a low priority.
+
+    Each component is removed from the queue as soon as its editor image is built, or found not to
+    need building.
+
+    :param project: The project.
+    :param components: The components.
+    :param jobs: The maximum number of editor images to build at once.
+    :returns: Whether each editor image that needed building was built.
+    """
+    components = list(components)
+    outdated = get_outdated(project, components)
+    _dequeue(set(components) - set(outdated))
+
+    budget = admission.get_budget()
+    budget = admission.Resources(budget.cpus * BUDGET_SHARE, int(budget.memory * BUDGET_SHARE))
+
+    def on_complete(result: parallel.TaskResult) -> None:
+        _dequeue([result.name])
+        if result.ok:
+            logger.info("Built the %s editor image in %.1fs", result.name, result.duration)
+        else:
+            logger.error("Could not build the %s editor image: %s", result.name, result.error)
+
+    results = parallel.run_tasks(
+        {
+            component: (lambda component=component: project.build_editor(component, budget=budget))
+            for component in outdated
+        },
+        jobs=jobs,
+        on_complete=on_complete,
+    )
+    return {component: result.ok for component, result in results.items()}
+
+
+def _dequeue(components: Iterable[str]) -> None:
+    """
+    Remove this process's entries for some components from the queue.
+
+    :param components: The components.
+    """
+    with locks.cache_locked("prebuild"):
+        queue = _read_queue()
+        for component in components:
+            if queue.get(component) == os.getpid():
+                del queue[component]
+        _write_queue(queue)
+
+
+def _read_queue() -> Dict[str, int]:
+    """
+    Read the queue of editor image builds, dropping the entries of processes that have exited.
+
+    :returns: The ID of the process building each queued component's editor image.
+    """
+    try:
+        with open(_get_queue_path()) as queue_file:
+            queue = json.load(queue_file)
+    except (OSError, ValueError):
+        return {}
+    return {component: pid for component, pid in queue.items() if admission.is_running(pid)}
+
+
+def _write_queue(queue: Dict[str, int]) -> None:
+    """
+    Write the queue of editor image builds.
+
+    :param queue: The ID of the process building each queued component's editor image.
+    """
+    with locks.atomic_write(_get_queue_path()) as queue_file:
+        json.dump(queue, queue_file)
+
+
+def _get_queue_path() -> pathlib.Path:
+    """Get the path of the queue of editor image builds."""
+    return get_cache_dir("prebuild") / "queue.json"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    os.nice(NICENESS)
+    try:
+        run(Project(), sys.argv[1:])
+    finally:
+        _dequeue(sys.argv[1:])
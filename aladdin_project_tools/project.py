@@ -0,0 +1,1011 @@
+"""
+An in-process API for working with a project's components.
+
+The ``components`` commands are thin adapters over :class:`Project`, which other tools, e.g.
+deployment scripts, can use directly rather than running the commands and parsing their output.
+
+.. code-block:: python
+
+    from aladdin_project_tools.project import Project
+
+    project = Project()
+    problems = project.validate(["api"])
+    if not problems:
+        result = project.build(["api"], engine="native")
+        print(result.succeeded, [record.duration for record in result.records])
+
+A project reads its ``lamp.json`` file and its components' ``component.yaml`` files on demand and
+keeps what it read for as long as the files are unchanged, along with the stat cache used to
+fingerprint the components, so a single project object can serve any number of calls in a
+long-running process. Validation and builds report structured results rather than exiting.
+
+The project's own files are found relative to its root directory, while the on-disk caches are kept
+in the cache directory, see :mod:`aladdin_project_tools.cache`.
+"""
+import contextlib
+import copy
+import enum
+import functools
+import hashlib
+import importlib.resources
+import json
+import logging
+import os
+import pathlib
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import jsonschema
+import yaml
+from networkx import DiGraph
+from networkx.algorithms import dag
+from networkx.algorithms.cycles import find_cycle
+from networkx.exception import NetworkXNoCycle
+
+from . import (
+    admission,
+    buildlogs,
+    distributed,
+    dockerfiles,
+    fingerprints,
+    imagecheck,
+    imagewatch,
+    locks,
+    logs,
+    metrics,
+    multistage,
+    parallel,
+    prune,
+    wheelhouse,
+)
+from .cache import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+LAST_NATIVE_BUILD = "docker-bake.json"
+LAST_NATIVE_BUILD_FINGERPRINTS = "docker-bake.fingerprints.json"
+
+
+class BuildEngine(str, enum.Enum):
+    """The ways to build component images."""
+
+    aladdin = "aladdin"
+    native = "native"
+
+
+class Problem(NamedTuple):
+    """A problem found while validating a component."""
+
+    component: str
+    message: str
+
+
+class BuildResult(NamedTuple):
+    """The outcome of building some components."""
+
+    components: List[str]
+    returncode: int
+    failed: List[str]
+    records: List[metrics.BuildRecord]
+    duration: float = 0.0
+
+    @property
+    def succeeded(self) -> bool:
+        """Whether every component was built."""
+        return not self.returncode
+
+
+@functools.lru_cache(maxsize=None)
+def load_schema() -> dict:
+    """
+    Load the component.yaml JSONSchema.
+
+    :returns: The schema.
+    """
+    with importlib.resources.path("aladdin_project_tools", "etc") as etc:
+        with open(etc / "component_schema.json") as schema_file:
+            schema = json.load(schema_file)
+    jsonschema.Draft7Validator.check_schema(schema)
+    return schema
+
+
+class Project:
+    """
+    A project and its components.
+
+    :param root: The project directory, holding the ``lamp.json`` file and the ``components/``
+                 directory.
+    """
+
+    def __init__(self, root: Union[str, pathlib.Path] = "."):
+        self.root = pathlib.Path(root)
+        self.components_path = self.root / "components"
+        self._files: Dict[pathlib.Path, Tuple[tuple, Any]] = {}
+        self._stat_cache: Optional[fingerprints.StatCache] = None
+        self._fingerprint_lock = threading.Lock()
+
+    @property
+    def lamp(self) -> dict:
+        """The contents of the ``lamp.json`` file."""
+        return self._read(self.root / "lamp.json", json.load)
+
+    @property
+    def name(self) -> str:
+        """The project name from the ``lamp.json`` file."""
+        return self.lamp["name"]
+
+    @property
+    def components(self) -> List[str]:
+        """The project's components."""
+        return sorted(
+            entry.name for entry in os.scandir(self.components_path) if entry.is_dir()
+        )
+
+    def get_config(self, component: str) -> dict:
+        """
+        Read the contents of the component's component.yaml file.
+
+        :param component: The component.
+        :returns: The config contents or the empty dictionary if it was not present.
+        """
+        try:
+            return (
+                self._read(
+                    self.components_path / component / "component.yaml", yaml.safe_load
+                )
+                or {}
+            )
+        except FileNotFoundError:
+            return {}
+
+    def get_dockerfile(self, component: str) -> Optional[dockerfiles.Dockerfile]:
+        """
+        Parse the component's Dockerfile.
+
+        :param component: The component.
+        :returns: The parsed Dockerfile, which callers must not modify, or ``None`` if it was not
+                  present.
+        """
+        return dockerfiles.read(self.components_path / component / "Dockerfile")
+
+    def get_component_type(self, component: str) -> str:
+        """
+        Determine the kind of a component.
+
+        :param component: The component.
+        :returns: ``standard``, ``compatible`` or ``traditional``.
+        """
+        component_config = self.get_config(component)
+        if not component_config:
+            return "traditional"
+        elif component_config.get("image", {}).get("base"):
+            return "compatible"
+        return "standard"
+
+    def get_images(self, components: Iterable[str], tag: str = "local") -> Dict[str, str]:
+        """
+        Get the name of each component's image.
+
+        :param components: The components.
+        :param tag: The docker :-suffix tag of the images.
+        :returns: The image name of each component.
+        """
+        return {component: f"{self.name}-{component}:{tag}" for component in components}
+
+    def get_graph(self) -> DiGraph:
+        """
+        Get the dependency graph of the components, with edges from dependencies to dependents.
+
+        :returns: The dependency graph.
+        :raises RuntimeError: If the dependencies have cycles.
+        """
+        graph = DiGraph()
+        components = self.components
+        graph.add_nodes_from(components)
+        for component in components:
+            graph.add_edges_from(
+                (dependency, component)
+                for dependency in self.get_config(component).get("dependencies", [])
+            )
+
+        try:
+            cycles = find_cycle(graph)
+        except NetworkXNoCycle:
+            return graph
+        else:
+            raise RuntimeError("Cycles found in component dependency graph", cycles)
+
+    def get_dependents(self, component: str) -> List[str]:
+        """
+        Get all other components that depend on a component at some level.
+
+        :param component: The dependency component.
+        :returns: The dependent components in topological order.
+        """
+        graph = self.get_graph()
+        return list(dag.topological_sort(graph.subgraph(dag.descendants(graph, component))))
+
+    def get_build_order(self, components: Iterable[str] = None) -> Tuple[DiGraph, List[str]]:
+        """
+        Get some components, along with all of their dependencies, in build order.
+
+        :param components: The components, default is all of them.
+        :returns: The dependency graph and the components to build, in topological order.
+        """
+        graph = self.get_graph()
+        selected = self.components if components is None else list(components)
+        included = set(selected).union(*(dag.ancestors(graph, component) for component in selected))
+        return graph, [
+            component for component in dag.topological_sort(graph) if component in included
+        ]
+
+    def validate(self, components: Iterable[str] = None) -> List[Problem]:
+        """
+        Validate the components' component.yaml and Dockerfile files.
+
+        Standard and compatible components must have a valid component.yaml file and a Dockerfile
+        without a ``FROM`` line, if any. Traditional components must have a Dockerfile with one.
+
+        :param components: The components to validate, default is all of them.
+        :returns: The problems found, if any.
+        """
+        schema = load_schema()
+        problems = []
+        for component in self.components if components is None else components:
+            component_yaml = self.get_config(component)
+            dockerfile_path = self.components_path / component / "Dockerfile"
+            dockerfile = self.get_dockerfile(component)
+            has_from = dockerfile.has_from if dockerfile else None
+
+            if component_yaml:
+                try:
+                    jsonschema.validate(instance=component_yaml, schema=schema)
+                except jsonschema.exceptions.ValidationError as e:
+                    problems.append(
+                        Problem(
+                            component, f"Invalid component.yaml for {component} component:\n{e}"
+                        )
+                    )
+                if has_from:
+                    problems.append(
+                        Problem(component, f"{dockerfile_path.as_posix()} contains a FROM line")
+                    )
+            elif has_from is None:
+                problems.append(
+                    Problem(
+                        component,
+                        f"Component '{component}' must provide either component.yaml or Dockerfile",
+                    )
+                )
+            elif not has_from:
+                problems.append(
+                    Problem(component, f"{dockerfile_path.as_posix()} does not contain a FROM line")
+                )
+        return problems
+
+    def validate_images(self, components: Iterable[str] = None, jobs: int = None) -> List[Problem]:
+        """
+        Check the components' component.yaml files against their built images.
+
+        See :mod:`aladdin_project_tools.imagecheck`.
+
+        :param components: The components to check, default is all of them.
+        :param jobs: The maximum number of probe containers to run at once, defaults to the number
+                     of CPUs.
+        :returns: The problems found, if any.
+        """
+        components = self.components if components is None else list(components)
+        return [
+            Problem(component, message)
+            for component, message in imagecheck.check_images(
+                {component: self.get_config(component) for component in components},
+                self.get_images(components),
+                jobs=jobs or os.cpu_count() or 1,
+            )
+        ]
+
+    def fingerprint(
+        self, components: Iterable[str] = None, ignore: Iterable[str] = (), jobs: int = None
+    ) -> Dict[str, fingerprints.Fingerprint]:
+        """
+        Fingerprint components and all of their dependencies.
+
+        See :mod:`aladdin_project_tools.fingerprints`.
+
+        :param components: The components, default is all of them.
+        :param ignore: Further ``.dockerignore`` patterns to exclude files with.
+        :param jobs: The maximum number of files to hash at once, defaults to the number of CPUs.
+        :returns: The fingerprints of the components and their dependencies.
+        :raises RuntimeError: If the dependencies have cycles.
+        """
+        dependencies = {}
+        pending = self.components if components is None else list(components)
+        while pending:
+            component = pending.pop()
+            if component not in dependencies:
+                dependencies[component] = self.get_config(component).get("dependencies", [])
+                pending.extend(dependencies[component])
+
+        # The stat cache records its changes until they're saved, so only one call may use it
+        with self._fingerprint_lock:
+            self._stat_cache = self._stat_cache or fingerprints.StatCache()
+            return fingerprints.fingerprint_components(
+                dependencies,
+                components_path=self.components_path,
+                ignore=ignore,
+                jobs=jobs or os.cpu_count() or 1,
+                stat_cache=self._stat_cache,
+            )
+
+    def get_last_native_build(self) -> Tuple[Optional[dict], List[str]]:
+        """
+        Get the bake definition of the last successful native build, for replaying it.
+
+        A replay builds from the components directory as it is now, so it only reproduces the
+        build while the components' sources are unchanged.
+
+        :returns: The bake definition, or ``None`` if there was no native build, and the components
+                  whose sources changed since that build.
+        """
+        with locks.cache_locked("last-native-build"):
+            try:
+                with open(get_cache_dir("build") / LAST_NATIVE_BUILD) as bake_file:
+                    definition = json.load(bake_file)
+            except FileNotFoundError:
+                return None, []
+            try:
+                with open(get_cache_dir("build") / LAST_NATIVE_BUILD_FINGERPRINTS) as output:
+                    built = json.load(output)
+            except (OSError, ValueError):
+                built = {}
+
+        if not built:
+            # The sources of the build are unknown, so they must be assumed to have changed
+            return definition, self.components
+        current = self._get_source_fingerprints(list(built))
+        return definition, sorted(
+            component for component in built if current.get(component) != built[component]
+        )
+
+    def prune(self, keep: int = 1, dry_run: bool = False) -> Tuple[prune.Plan, List[str]]:
+        """
+        Remove the project's stale images and generated build files.
+
+        See :mod:`aladdin_project_tools.prune`. The component locks are held while removing them,
+        so that no build is using them.
+
+        :param keep: The number of images to keep per component and tag, and of build files to
+                     keep per kind.
+        :param dry_run: Only find what to remove.
+        :returns: What was, or would be, removed, and the errors docker reported for any images it
+                  could not remove.
+        """
+        if dry_run:
+            return prune.plan(self.name, self.components, keep), []
+        with locks.components_locked(self.components):
+            plan = prune.plan(self.name, self.components, keep)
+            return plan, prune.remove(plan)
+
+    def build_editor(
+        self, component: str, tag: str = "local", budget: admission.Resources = None
+    ) -> None:
+        """
+        Build a component's editor image on its own, with ``docker build``.
+
+        :param component: The component.
+        :param tag: The tag of the image that a traditional component's editor image is built from.
+        :param budget: The resources that concurrent builds may use between them.
+        :raises subprocess.CalledProcessError: If the build fails.
+        """
+        graph, order = self.get_build_order([component])
+        component_configs = {dependency: self.get_config(dependency) for dependency in order}
+        dockerfile_path, contexts = self._write_dockerfile(graph, order, component_configs)
+        with locks.components_locked([component]), self._admitted([component], budget):
+            self._build_component_images(
+                component,
+                component_configs[component],
+                dockerfile_path,
+                contexts,
+                tag,
+                editor_only=True,
+            )
+
+    def build(
+        self,
+        components: Iterable[str] = None,
+        engine: BuildEngine = BuildEngine.aladdin,
+        hosts: List[str] = None,
+        offline: bool = False,
+        tag: str = "local",
+        budget: admission.Resources = None,
+        prefix: str = None,
+        command: str = "build",
+    ) -> BuildResult:
+        """
+        Build the docker images of components.
+
+        The ``aladdin`` engine builds just the given components, with ``aladdin build``. The
+        ``native`` engine builds them and all of their dependencies from a single generated
+        multi-stage Dockerfile, see :mod:`aladdin_project_tools.multistage`. Given several docker
+        hosts, the components and all of their dependencies are built across them with either
+        engine, see :mod:`aladdin_project_tools.distributed`.
+
+        Every build holds the locks of the components it builds, see
+        :mod:`aladdin_project_tools.locks`, and local builds wait until they fit within the
+        resource budget, see :mod:`aladdin_project_tools.admission`.
+
+        :param components: The components to build, default is all of them.
+        :param engine: The build engine.
+        :param hosts: The ``DOCKER_HOST`` values of several docker daemons to distribute the builds
+                      across. The built images all end up on the first one.
+        :param offline: Install the components' locked python packages from the wheelhouse. This
+                        requires the ``native`` engine.
+        :param tag: The docker :-suffix tag to apply to the component images. The ``aladdin``
+                    engine always uses ``local``.
+        :param budget: The resources that concurrent builds may use between them, defaults to
+                       :func:`aladdin_project_tools.admission.get_budget`.
+        :param prefix: Prefix each line of the build output with this text, so that it can be told
+                       apart from the output of other concurrent builds.
+        :param command: The command to record the build metrics under, see
+                        :mod:`aladdin_project_tools.metrics`.
+        :returns: The outcome of the build.
+        :raises ValueError: If ``offline`` is used with the ``aladdin`` engine.
+        """
+        components = self.components if components is None else list(components)
+        if offline and engine != BuildEngine.native:
+            raise ValueError("Installing from the wheelhouse requires the native engine")
+
+        start = time.monotonic()
+        with logs.context(phase="build"):
+            if hosts:
+                result = self._distributed_build(components, hosts, engine, tag, offline, command)
+            elif engine == BuildEngine.native:
+                result = self._native_build(components, tag, offline, budget, prefix, command)
+            else:
+                returncode, _, records = self._aladdin_build(
+                    components, prefix, None, budget, command
+                )
+                result = BuildResult(
+                    components, returncode, components if returncode else [], records
+                )
+        return result._replace(duration=time.monotonic() - start)
+
+    def _read(self, path: pathlib.Path, load: Callable) -> Any:
+        """
+        Read and parse a file, or reuse what was read before if the file is unchanged.
+
+        :param path: The file.
+        :param load: Parses the open file.
+        :returns: A copy of the parsed contents, which callers may modify.
+        """
+        stats = os.stat(path)
+        key = (stats.st_ino, stats.st_size, stats.st_mtime_ns)
+        cached = self._files.get(path)
+        if not cached or cached[0] != key:
+            with open(path) as parsed_file:
+                cached = self._files[path] = (key, load(parsed_file))
+        return copy.deepcopy(cached[1])
+
+    def _get_source_fingerprints(self, components: List[str]) -> Dict[str, str]:
+        """
+        Fingerprint the sources of components being built, for the build metrics.
+
+        :param components: The components.
+        :returns: The fingerprint of each component, or nothing if they could not be fingerprinted.
+        """
+        try:
+            return {
+                component: fingerprint.fingerprint
+                for component, fingerprint in self.fingerprint(components).items()
+            }
+        except (OSError, RuntimeError) as e:
+            logger.debug("Could not fingerprint %s: %s", ", ".join(components), e)
+            return {}
+
+    def _admitted(self, components: List[str], budget: admission.Resources = None):
+        """
+        Wait until a build of the components fits within the resource budget.
+
+        :param components: The components being built.
+        :param budget: The resources that concurrent builds may use between them.
+        :returns: A context manager holding the build's share of the budget.
+        """
+        return admission.admitted(
+            ", ".join(components),
+            admission.add(
+                *(
+                    admission.get_demand(component, self.get_config(component))
+                    for component in components
+                )
+            ),
+            budget or admission.get_budget(),
+            components,
+        )
+
+    def _aladdin_build(
+        self,
+        components: List[str],
+        prefix: str = None,
+        env: dict = None,
+        budget: admission.Resources = None,
+        command: str = "build",
+    ) -> Tuple[int, Optional[str], List[metrics.BuildRecord]]:
+        """
+        Build components with ``aladdin build``.
+
+        :param components: The components to build.
+        :param prefix: Prefix each line of the build output with this text. Without a prefix, the
+                       build is attached to the terminal and its output is not returned.
+        :param env: Environment variables to set for the build, e.g. ``DOCKER_HOST``. Builds on
+                    another docker host are not held to the local resource budget.
+        :param budget: The resources that concurrent builds may use between them.
+        :param command: The command to record the build metrics under.
+        :returns: The exit code, the output (or ``None`` if the build was attached to the
+                  terminal) and the build metrics.
+        """
+        cmd = ["aladdin", "build"] + components
+
+        # Take the component locks before waiting for admission, which other jobs may be holding
+        with logs.context(component=", ".join(components)), locks.components_locked(
+            components
+        ), (contextlib.nullcontext() if env else self._admitted(components, budget)):
+            if not env:
+                # aladdin doesn't label its images, so prune needs to know which ones it replaces
+                prune.record_replaced(self.name, self.get_images(components))
+            timer = metrics.BuildTimer(
+                command,
+                self.get_images(components),
+                host=(env or {}).get("DOCKER_HOST"),
+                fingerprints=self._get_source_fingerprints(components),
+            )
+            with buildlogs.recording(components):
+                if prefix is None and not logs.is_structured():
+                    returncode = parallel.run_attached(cmd, env=env, cwd=self.root)
+                    output = None
+                else:
+                    returncode, output = parallel.run_command(
+                        cmd, prefix=prefix or "", env=env, cwd=self.root
+                    )
+            if not env:
+                imagewatch.invalidate(self.get_images(components).values())
+        return returncode, output, timer.finish(not returncode)
+
+    def _write_dockerfile(
+        self, graph: DiGraph, order: List[str], component_configs: dict, offline: bool = False
+    ) -> Tuple[pathlib.Path, dict]:
+        """
+        Generate the multi-stage Dockerfile for the standard and compatible components.
+
+        :param graph: The component graph.
+        :param order: The components to include, in topological order.
+        :param component_configs: The component.yaml contents of each component.
+        :param offline: Install the components' locked python packages from the wheelhouse.
+        :returns: The Dockerfile path and the named build contexts it needs.
+        """
+        staged = [component for component in order if component_configs[component]]
+
+        offline_components = []
+        contexts = {}
+        if offline:
+            for component in staged:
+                lock_path = self.components_path / component / "poetry.lock"
+                if lock_path.exists():
+                    wheelhouse.write_requirements(
+                        component, wheelhouse.parse_poetry_lock(lock_path)
+                    )
+                    offline_components.append(component)
+            contexts[multistage.WHEELHOUSE_CONTEXT] = (
+                wheelhouse.get_wheelhouse_dir().resolve().as_posix()
+            )
+
+        dockerfile_path = _write_build_file(
+            "Dockerfile",
+            multistage.generate_dockerfile(
+                {component: component_configs[component] for component in staged},
+                {
+                    component: [
+                        dependency
+                        for dependency in order
+                        if dependency in dag.ancestors(graph, component)
+                    ]
+                    for component in staged
+                },
+                staged,
+                wheelhouse=offline_components,
+                project_name=self.name,
+            ),
+        )
+        logger.debug("Generated multi-stage Dockerfile at %s", dockerfile_path.as_posix())
+        return dockerfile_path, contexts
+
+    def _build_component_images(
+        self,
+        component: str,
+        component_config: dict,
+        dockerfile_path: pathlib.Path,
+        contexts: dict,
+        tag: str = "local",
+        host: str = None,
+        prefix: str = None,
+        editor_only: bool = False,
+    ) -> None:
+        """
+        Build a component's image and editor image on their own, with ``docker build``.
+
+        :param component: The component.
+        :param component_config: The component's component.yaml contents.
+        :param dockerfile_path: The generated multi-stage Dockerfile, for standard and compatible
+                                components.
+        :param contexts: The named build contexts the generated Dockerfile needs.
+        :param tag: The docker :-suffix tag to apply to the component image.
+        :param host: The docker daemon to build on, defaults to the one the docker CLI is
+                     configured for.
+        :param prefix: Prefix each line of the build output with this text.
+        :param editor_only: Only build the editor image. A traditional component's editor image is
+                            built from its existing image.
+        """
+        with logs.context(component=component), buildlogs.recording([component]):
+            image = f"{self.name}-{component}"
+            if not component_config:
+                if not editor_only:
+                    docker_build(
+                        tags=f"{image}:{tag}",
+                        dockerfile=self.components_path / component / "Dockerfile",
+                        context=self.components_path,
+                        host=host,
+                        prefix=prefix,
+                        labels=prune.get_labels(self.name, component, tag),
+                    )
+                docker_build(
+                    tags=f"{image}:editor",
+                    dockerfile=f'FROM {image}:{tag}\nENTRYPOINT []\nCMD ["/bin/bash"]\n'.encode(),
+                    host=host,
+                    labels=prune.get_labels(self.name, component, "editor"),
+                )
+                return
+
+            stages = (("", tag), ("editor", "editor"))
+            for suffix, image_tag in stages[1:] if editor_only else stages:
+                docker_build(
+                    tags=f"{image}:{image_tag}",
+                    dockerfile=dockerfile_path,
+                    target=multistage.get_stage_name(component, suffix),
+                    contexts=contexts,
+                    context=self.components_path,
+                    host=host,
+                    prefix=prefix,
+                    labels=prune.get_labels(self.name, component, image_tag),
+                )
+
+    def _native_build(
+        self,
+        components: List[str],
+        tag: str,
+        offline: bool,
+        budget: Optional[admission.Resources],
+        prefix: Optional[str],
+        command: str,
+    ) -> BuildResult:
+        """
+        Build components and their dependencies from a single generated multi-stage Dockerfile.
+
+        All of the standard and compatible component images are built by one ``docker buildx
+        bake`` invocation, so BuildKit builds each shared dependency stage only once. If buildx is
+        not available, each image is built with its own ``docker build --target`` call instead,
+        which still reuses the shared stages through the BuildKit cache. Traditional components are
+        built on their own, first.
+
+        See :meth:`build` for the parameters.
+        """
+        graph, order = self.get_build_order(components)
+        component_configs = {component: self.get_config(component) for component in order}
+        traditional = [component for component in order if not component_configs[component]]
+        staged = [component for component in order if component_configs[component]]
+        dockerfile_path, contexts = self._write_dockerfile(
+            graph, order, component_configs, offline=offline
+        )
+
+        with locks.components_locked(order), self._admitted(order, budget), buildlogs.recording(
+            order
+        ):
+            source_fingerprints = self._get_source_fingerprints(order)
+            timer = metrics.BuildTimer(
+                command, self.get_images(order, tag), fingerprints=source_fingerprints
+            )
+            try:
+                for component in traditional:
+                    logger.info("Building traditional component %s", component)
+                    self._build_component_images(
+                        component, None, dockerfile_path, contexts, tag, prefix=prefix
+                    )
+
+                buildx = not subprocess.run(
+                    ["docker", "buildx", "version"], capture_output=True
+                ).returncode
+                if staged and buildx:
+                    logger.info(
+                        "Building components in one multi-stage build: %s", ", ".join(staged)
+                    )
+                    bake_definition = json.dumps(
+                        multistage.get_bake_definition(
+                            self.name,
+                            staged,
+                            dockerfile_path,
+                            tag=tag,
+                            context=self.components_path.as_posix(),
+                            contexts=contexts,
+                            cache_dir=get_cache_dir("buildkit"),
+                        ),
+                        indent=2,
+                    )
+                    bake_path = _write_build_file("docker-bake.json", bake_definition)
+
+                    with locks.cache_locked("buildkit", shared=True):
+                        try:
+                            check_call(
+                                [
+                                    "env",
+                                    "DOCKER_BUILDKIT=1",
+                                    "docker",
+                                    "buildx",
+                                    "bake",
+                                    "-f",
+                                    bake_path.as_posix(),
+                                ],
+                                prefix=prefix,
+                            )
+                        finally:
+                            # Some targets may have been built even if others failed
+                            imagewatch.invalidate(
+                                list(self.get_images(staged, tag).values())
+                                + list(self.get_images(staged, "editor").values())
+                            )
+                    # Remember the last native build, for components cache export
+                    _write_last_native_build(bake_definition, source_fingerprints)
+                elif staged:
+                    logger.info(
+                        "docker buildx is not available; Building each component image in turn"
+                    )
+                    for component in staged:
+                        self._build_component_images(
+                            component,
+                            component_configs[component],
+                            dockerfile_path,
+                            contexts,
+                            tag,
+                            prefix=prefix,
+                        )
+            except subprocess.CalledProcessError as e:
+                logger.debug("Build command failed: %s", e)
+                return BuildResult(order, e.returncode or 1, order, timer.finish(False))
+            return BuildResult(order, 0, [], timer.finish(True))
+
+    def _distributed_build(
+        self,
+        components: List[str],
+        hosts: List[str],
+        engine: BuildEngine,
+        tag: str,
+        offline: bool,
+        command: str,
+    ) -> BuildResult:
+        """
+        Build components and their dependencies across a pool of docker hosts.
+
+        Each component is built on its own, on the free host holding the most of its dependency
+        images, which are copied over first if need be. With the native engine, such a host is
+        also likely to hold the dependencies' stages in its build cache. All of the images end up
+        on the first host.
+
+        See :meth:`build` for the parameters.
+        """
+        graph, order = self.get_build_order(components)
+        component_configs = {component: self.get_config(component) for component in order}
+        dockerfile_path, contexts = None, {}
+        if engine == BuildEngine.native:
+            dockerfile_path, contexts = self._write_dockerfile(
+                graph, order, component_configs, offline=offline
+            )
+        records = []
+
+        def build_component(component: str, host: str) -> parallel.CommandResult:
+            prefix = f"{component}@{host} | "
+            if engine == BuildEngine.aladdin:
+                returncode, output, component_records = self._aladdin_build(
+                    [component], prefix, {"DOCKER_HOST": host}, command=command
+                )
+                records.extend(component_records)
+                return parallel.CommandResult(returncode, output)
+
+            timer = metrics.BuildTimer(
+                command,
+                self.get_images([component], tag),
+                host=host,
+                fingerprints=self._get_source_fingerprints([component]),
+            )
+            try:
+                self._build_component_images(
+                    component,
+                    component_configs[component],
+                    dockerfile_path,
+                    contexts,
+                    tag,
+                    host=host,
+                    prefix=prefix,
+                )
+            except subprocess.CalledProcessError as e:
+                records.extend(timer.finish(False))
+                return parallel.CommandResult(e.returncode, e.output or "")
+            records.extend(timer.finish(True))
+            return parallel.CommandResult(0, "")
+
+        def on_complete(result: parallel.TaskResult) -> None:
+            fields = {"component": result.name, "duration": result.duration}
+            if not result.ok:
+                logger.error("Did not build %s: %s", result.name, result.error, extra=fields)
+            elif result.value.returncode:
+                logger.error("Failed to build %s", result.name, extra=fields)
+            else:
+                logger.info("Built %s in %.1fs", result.name, result.duration, extra=fields)
+
+        results, reports = distributed.build(
+            order,
+            {
+                component: [
+                    dependency
+                    for dependency in order
+                    if dependency in dag.ancestors(graph, component)
+                ]
+                for component in order
+            },
+            hosts,
+            lambda component: [
+                f"{self.name}-{component}:{image_tag}" for image_tag in (tag, "editor")
+            ],
+            build_component,
+            on_complete=on_complete,
+            priorities=metrics.estimate_durations(order),
+        )
+
+        logger.info(
+            "Build host utilization:\n%s",
+            "\n".join(
+                f"    {report.host:32} | {report.utilization:>4.0%} busy | "
+                f"{len(report.builds):3} build(s) | {report.transfers:3} transfer(s) | "
+                + (", ".join(report.builds) or "-")
+                for report in reports
+            ),
+        )
+
+        failed = [
+            component
+            for component in order
+            if component not in results
+            or not results[component].ok
+            or results[component].value.returncode
+        ]
+        return BuildResult(order, 1 if failed else 0, failed, records)
+
+
+def docker_build(
+    tags: Union[str, List[str]],
+    buildargs: dict = None,
+    dockerfile: Union[pathlib.Path, bytes] = None,
+    target: str = None,
+    contexts: dict = None,
+    context: pathlib.Path = pathlib.Path("components"),
+    host: str = None,
+    prefix: str = None,
+    labels: Dict[str, str] = None,
+) -> None:
+    """
+    A convenience wrapper for calling out to "docker build".
+
+    We always send the same context: the entire components/ directory.
+
+    :param tags: The tags to be applied to the built image.
+    :param buildargs: Values for ARG instructions in the dockerfile.
+    :param dockerfile: The dockerfile to build against. If not provided, it's assumed that a
+                       Dockerfile is present in the context directory. If it's a bytes object, it
+                       will be provided to the docker build process on stdin and a "no context"
+                       build will take place. Otherwise, a normal docker build will be performed
+                       with the specified Dockerfile.
+    :param target: The build stage to build, defaults to the last one in the dockerfile.
+    :param contexts: Additional named build contexts, keyed by name.
+    :param context: The project's components/ directory.
+    :param host: The docker daemon to build on, defaults to the one the docker CLI is configured
+                 for.
+    :param prefix: Prefix each line of the build output with this text, so that it can be told
+                   apart from the output of other concurrent builds.
+    :param labels: Labels to apply to the built image, see :func:`prune.get_labels`.
+    :raises subprocess.CalledProcessError: If the build fails.
+    """
+    buildargs = buildargs or {}
+    buildargs.setdefault("CACHE_BUST", str(time.time()))
+
+    cmd = ["env", "DOCKER_BUILDKIT=1", "docker"]
+    if host:
+        cmd.extend(["--host", host])
+    cmd.append("build")
+
+    for key, value in buildargs.items():
+        cmd.extend(["--build-arg", f"{key}={value}"])
+
+    tags = [tags] if isinstance(tags, str) else tags
+    for tag in tags:
+        cmd.extend(["--tag", tag])
+
+    for key, value in (labels or {}).items():
+        cmd.extend(["--label", f"{key}={value}"])
+
+    if target:
+        cmd.extend(["--target", target])
+
+    for name, path in (contexts or {}).items():
+        cmd.extend(["--build-context", f"{name}={path}"])
+
+    if isinstance(dockerfile, bytes):
+        # If we receive the Dockerfile as content, we should pipe it to stdin.
+        # This is the "no context" build.
+        cmd.extend(["-"])
+    else:
+        # Otherwise, they can specify the path to the Dockerfile to use or let docker
+        # find one in the context directory.
+        if dockerfile:
+            cmd.extend(["-f", dockerfile.as_posix()])
+        cmd.extend([context.as_posix()])
+
+    logger.debug("Docker build command: %s", " ".join(cmd))
+    check_call(cmd, stdin=dockerfile if isinstance(dockerfile, bytes) else None, prefix=prefix)
+    if not host:
+        imagewatch.invalidate(tags)
+
+
+def check_call(cmd: List[str], stdin: bytes = None, prefix: str = None) -> None:
+    """
+    Make a subprocess call, echoing its output, and recording it if a build is being recorded.
+
+    :param cmd: The command to run.
+    :param stdin: Data to send to the subprocess as its input.
+    :param prefix: Prefix each line of the output with this text.
+    :raises subprocess.CalledProcessError: If the command fails.
+    """
+    result = parallel.run_command(cmd, prefix=prefix or "", stdin=stdin)
+    if result.returncode:
+        raise subprocess.CalledProcessError(result.returncode, cmd, output=result.output)
+
+
+def _write_build_file(name: str, content: str) -> pathlib.Path:
+    """
+    Write a generated build file under a name derived from its content.
+
+    Concurrent builds of different sets of components each build from their own files, while
+    identical builds share them.
+
+    :param name: The file name, e.g. ``Dockerfile``.
+    :param content: The file content.
+    :returns: The file path.
+    """
+    stem, dot, suffix = name.partition(".")
+    digest = hashlib.sha256(content.encode()).hexdigest()[:12]
+    path = get_cache_dir("build") / f"{stem}-{digest}{dot}{suffix}"
+    if not path.exists():
+        with locks.atomic_write(path) as build_file:
+            build_file.write(content)
+    return path
+
+
+def _write_last_native_build(bake_definition: str, source_fingerprints: Dict[str, str]) -> None:
+    """
+    Remember the last successful native build, see :meth:`Project.get_last_native_build`.
+
+    :param bake_definition: The build's bake definition.
+    :param source_fingerprints: The fingerprints of the built components' sources.
+    """
+    with locks.cache_locked("last-native-build"):
+        with locks.atomic_write(get_cache_dir("build") / LAST_NATIVE_BUILD_FINGERPRINTS) as output:
+            json.dump(source_fingerprints, output, indent=2, sort_keys=True)
+        with locks.atomic_write(get_cache_dir("build") / LAST_NATIVE_BUILD) as output:
+            output.write(bake_definition)
@@ -0,0 +1,287 @@
+"""
+Removal of stale component images and generated build files.
+
+Every ``components build``, ``create`` and ``edit`` replaces the ``local`` and ``editor`` images
+of the components it builds, and the images they replace stay behind, untagged, until they're
+removed. Interrupted commands can also leave temporary tags behind, such as the
+``python:3.8-slim-extractor-...`` tags from :func:`aladdin_project_tools.images.get_temporary_tag`.
+
+The images we build are labeled with the project, component and tag they were built for (see
+:func:`get_labels`), so that their untagged versions can still be told apart from other projects'
+images. A project's images are grouped by component and tag, and the newest ``keep`` of each group
+are kept, always including the image the tag currently names. Images that kept images were built
+on, and images that containers are using, are kept too, since docker refuses to remove them. The
+rest are removed by a single ``docker rmi`` call. ``aladdin build`` doesn't label the images it
+builds, so the image each tag names is recorded before it runs (see :func:`record_replaced`), and
+the recorded images join their tag's group once they're untagged. Other images that were built
+before they were labeled can only be found while they're tagged, so those are never removed.
+
+Temporary tags are removed once the process that made them has exited, and they're older than
+:data:`TEMPORARY_TAG_AGE`, in case the process was running in another container. Their age is
+recorded in the tags themselves, since the image they name is usually much older.
+
+Generated build files are named after their content, so a new one is written whenever a build's
+components or their configuration change. The newest ``keep`` of each kind are kept.
+"""
+import contextlib
+import datetime
+import json
+import pathlib
+import re
+import subprocess
+import time
+from typing import Dict, Iterable, List, Mapping, NamedTuple
+
+from . import admission, images, locks
+from .cache import get_cache_dir
+
+PROJECT_LABEL = "aladdin-project-tools.project"
+COMPONENT_LABEL = "aladdin-project-tools.component"
+TAG_LABEL = "aladdin-project-tools.tag"
+
+TEMPORARY_TAG_AGE = datetime.timedelta(hours=1)
+"""
+How old a temporary tag must be before it is considered stale.
+"""
+
+_TEMPORARY_TAG = re.compile(r"-[a-z]+-(\d+)-(\d+)-[0-9a-f]{8}$")
+_BUILD_FILE = re.compile(r"^(.+)-[0-9a-f]{12}(\.[^.]+)?$")
+
+
+class Image(NamedTuple):
+    """An image to remove."""
+
+    id: str
+    component: str
+    tag: str
+    references: List[str]
+    size: int
+
+
+class Plan(NamedTuple):
+    """What pruning a project removes, and the number of bytes that reclaims, at least."""
+
+    images: List[Image]
+    build_files: List[pathlib.Path]
+    size: int
+
+
+def get_labels(project_name: str, component: str, tag: str) -> Dict[str, str]:
+    """
+    Get the labels to apply to a component image.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :param component: The component.
+    :param tag: The docker :-suffix tag the image is built for.
+    :returns: The labels.
+    """
+    return {PROJECT_LABEL: project_name, COMPONENT_LABEL: component, TAG_LABEL: tag}
+
+
+def record_replaced(project_name: str, component_images: Mapping[str, str]) -> None:
+    """
+    Record the images that some tags name before a build that doesn't label its images replaces
+    them, so that :func:`plan` can find them once they're untagged.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :param component_images: The image reference each component's build tags.
+    """
+    inspected = images.inspect_images(component_images.values())
+    with locks.cache_locked("prune-replaced"):
+        replaced = _read_replaced()
+        recorded = replaced.setdefault(project_name, {})
+        for component, reference in component_images.items():
+            info = inspected.get(reference)
+            if info:
+                recorded[_get_id(info)] = [component, reference.rpartition(":")[2]]
+        _write_replaced(replaced)
+
+
+def plan(project_name: str, components: Iterable[str], keep: int = 1) -> Plan:
+    """
+    Find a project's stale images and build files.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :param components: The project's components.
+    :param keep: The number of images to keep per component and tag, and of build files to keep
+                 per kind.
+    :returns: What to remove.
+    """
+    repositories = {f"{project_name}-{component}": component for component in components}
+    rows_by_id = {}
+    for row in images.get_disk_usage():
+        rows_by_id.setdefault(row["id"], []).append(row)
+
+    # Only consider images that are untagged, or that only have this project's or temporary tags
+    candidates = [
+        image_id
+        for image_id, rows in rows_by_id.items()
+        if all(
+            row["repository"] in repositories
+            or row["repository"] == "<none>"
+            or _TEMPORARY_TAG.search(row["tag"])
+            for row in rows
+        )
+    ]
+    inspected = images.inspect_images(candidates)
+    with locks.cache_locked("prune-replaced", shared=True):
+        replaced = _read_replaced().get(project_name, {})
+
+    groups = {}
+    temporary = {}
+    tagged = set()
+    in_use = set()
+    for image_id in candidates:
+        info = inspected.get(image_id)
+        if not info:
+            continue
+        rows = rows_by_id[image_id]
+        if any(row["containers"] for row in rows):
+            in_use.add(image_id)
+
+        tags = [
+            f"{row['repository']}:{row['tag']}" for row in rows if row["repository"] != "<none>"
+        ]
+        labels = (info.get("Config") or {}).get("Labels") or {}
+        current = [tag for tag in tags if not _TEMPORARY_TAG.search(tag)]
+        if len(current) < len(tags):
+            temporary[image_id] = [tag for tag in tags if tag not in current]
+        if current:
+            tagged.add(image_id)
+            for tag in current:
+                repository, _, image_tag = tag.rpartition(":")
+                groups.setdefault((repositories[repository], image_tag), []).append(info)
+        elif (
+            not tags
+            and labels.get(PROJECT_LABEL) == project_name
+            and labels.get(COMPONENT_LABEL) in repositories.values()
+        ):
+            groups.setdefault((labels[COMPONENT_LABEL], labels.get(TAG_LABEL)), []).append(info)
+        elif not tags and replaced.get(image_id, [None])[0] in repositories.values():
+            groups.setdefault(tuple(replaced[image_id]), []).append(info)
+
+    kept = tagged | in_use
+    for members in groups.values():
+        # Rank the image the tag currently names as the newest
+        members.sort(key=lambda info: (_get_id(info) in tagged, info.get("Created", "")))
+        kept.update(_get_id(info) for info in members[-keep:])
+
+    # Keep the images that kept images were built on
+    parents = {_get_id(info): info.get("Parent") for info in inspected.values() if info}
+    for image_id in list(kept):
+        parent = _get_short_id(parents.get(image_id) or "")
+        while parent and parent not in kept:
+            kept.add(parent)
+            parent = _get_short_id(parents.get(parent) or "")
+
+    to_remove = []
+    for (component, tag), members in groups.items():
+        for info in members:
+            image_id = _get_id(info)
+            if image_id not in kept:
+                size = rows_by_id[image_id][0]["unique_size"]
+                to_remove.append((info, Image(image_id, component, tag, [info["Id"]], size)))
+    for image_id, tags in temporary.items():
+        stale = [tag for tag in tags if _is_stale(tag)]
+        # Untagging an image only reclaims its space once its last tag is gone
+        removed = image_id not in kept and stale == tags
+        size = rows_by_id[image_id][0]["unique_size"] if removed else 0
+        if stale:
+            to_remove.append((inspected[image_id], Image(image_id, "", "", stale, size)))
+
+    # Remove newer images first, in case older ones were built on them
+    to_remove.sort(key=lambda removal: removal[0].get("Created", ""), reverse=True)
+    build_files = _get_stale_build_files(keep)
+    return Plan(
+        [image for _, image in to_remove],
+        build_files,
+        sum(image.size for _, image in to_remove)
+        + sum(path.stat().st_size for path in build_files),
+    )
+
+
+def remove(plan: Plan) -> List[str]:
+    """
+    Remove the images and build files that :func:`plan` found.
+
+    :param plan: What to remove.
+    :returns: The errors docker reported for any images it could not remove.
+    """
+    for path in plan.build_files:
+        with contextlib.suppress(FileNotFoundError):
+            path.unlink()
+
+    references = [reference for image in plan.images for reference in image.references]
+    if not references:
+        return []
+    ps = subprocess.run(["docker", "rmi"] + references, capture_output=True)
+
+    # Forget the recorded images that were removed
+    image_ids = [image.id for image in plan.images if image.component]
+    inspected = images.inspect_images(image_ids)
+    with locks.cache_locked("prune-replaced"):
+        replaced = _read_replaced()
+        for recorded in replaced.values():
+            for image_id in image_ids:
+                if not inspected.get(image_id):
+                    recorded.pop(image_id, None)
+        _write_replaced(replaced)
+    return [line for line in ps.stderr.decode().splitlines() if line.strip()]
+
+
+def _get_stale_build_files(keep: int) -> List[pathlib.Path]:
+    """
+    Find the generated build files that all but the newest few builds used.
+
+    :param keep: The number of build files to keep per kind, e.g. ``Dockerfile``.
+    :returns: The other build files.
+    """
+    kinds = {}
+    for path in get_cache_dir("build").iterdir():
+        match = _BUILD_FILE.match(path.name)
+        if match and path.is_file():
+            kinds.setdefault(match.groups(), []).append(path)
+
+    stale = []
+    for paths in kinds.values():
+        paths.sort(key=lambda path: path.stat().st_mtime, reverse=True)
+        stale.extend(paths[keep:])
+    return sorted(stale)
+
+
+def _read_replaced() -> Dict[str, Dict[str, List[str]]]:
+    """Read the component and tag of each image recorded by :func:`record_replaced`."""
+    try:
+        with open(get_cache_dir("prune") / "replaced.json") as replaced_file:
+            return json.load(replaced_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_replaced(replaced: Dict[str, Dict[str, List[str]]]) -> None:
+    """Write the images recorded by :func:`record_replaced`."""
+    with locks.atomic_write(get_cache_dir("prune") / "replaced.json") as replaced_file:
+        json.dump(replaced, replaced_file, indent=2, sort_keys=True)
+
+
+def _is_stale(tag: str) -> bool:
+    """
+    Determine whether a temporary tag was left behind by a process that has exited.
+
+    :param tag: The temporary tag.
+    :returns: Whether to remove the tag.
+    """
+    pid, created = _TEMPORARY_TAG.search(tag).groups()
+    if time.time() - int(created) < TEMPORARY_TAG_AGE.total_seconds():
+        return False
+    return not admission.is_running(int(pid))
+
+
+def _get_id(info: dict) -> str:
+    """Get the short ID of an image from its inspection data."""
+    return _get_short_id(info["Id"])
+
+
+def _get_short_id(image_id: str) -> str:
+    """Get the short form of an image ID, as displayed by docker."""
+    return image_id.split(":")[-1][:12]
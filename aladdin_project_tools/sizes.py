@@ -0,0 +1,208 @@
+"""
+Component image size analysis.
+
+We attribute the bytes of each layer of a component's image to what most likely put them there:
+the base image, the OS distribution packages listed in ``image.packages``, the python packages, the
+component's own files, or the files of one of its dependency components. Reports are stored in the
+cache directory so that later runs can be compared against them to catch images that have grown.
+"""
+import datetime
+import json
+import os
+import pathlib
+import re
+from typing import Dict, List, Mapping, NamedTuple
+
+from . import images, locks, parallel
+from .cache import get_cache_dir
+
+BASE = "base"
+COMPONENT = "component"
+OS_PACKAGES = "os-packages"
+PYTHON_PACKAGES = "python-packages"
+OTHER = "other"
+DEPENDENCY_PREFIX = "dependency:"
+
+_OS_PACKAGE_PATTERN = re.compile(r"\b(apt-get|apt|apk|yum|dnf|microdnf)\b.*\b(install|add)\b")
+_PYTHON_PACKAGE_PATTERN = re.compile(r"\b(poetry|pip3?)\b.*\binstall\b")
+
+
+class Regression(NamedTuple):
+    """A component image that grew beyond the allowed threshold."""
+
+    component: str
+    previous: int
+    current: int
+
+    @property
+    def growth(self) -> float:
+        """The relative growth of the image, as a percentage."""
+        return 100.0 * (self.current - self.previous) / self.previous if self.previous else 100.0
+
+
+def analyze(
+    project_name: str,
+    component_configs: Mapping[str, dict],
+    tag: str = "local",
+    jobs: int = os.cpu_count() or 1,
+) -> Dict[str, dict]:
+    """
+    Measure the component images and attribute their bytes.
+
+    The images are inspected with a single ``docker image inspect`` call and their histories, along
+    with those of any base images named in ``image.base``, are fetched concurrently.
+
+    :param project_name: The project name from the ``lamp.json`` file.
+    :param component_configs: The component.yaml contents for each component to analyze.
+    :param tag: The docker :-suffix tag of the images to analyze.
+    :param jobs: The maximum number of concurrent ``docker history`` calls.
+    :returns: The report for each component whose image is present. Each has the ``image`` name,
+              its ``id``, total ``size``, its ``layers`` and the bytes attributed to each category.
+    """
+    names = {component: f"{project_name}-{component}:{tag}" for component in component_configs}
+    inspected = images.inspect_images(names.values())
+    present = {component: image for component, image in names.items() if inspected.get(image)}
+
+    base_images = {
+        component: (component_configs[component].get("image") or {}).get("base")
+        for component in present
+    }
+    histories = parallel.run_tasks(
+        {
+            image: (lambda image=image: images.get_history(image))
+            for image in set(present.values()) | set(filter(None, base_images.values()))
+        },
+        jobs=jobs,
+    )
+
+    reports = {}
+    for component, image in present.items():
+        if not histories[image].ok:
+            continue
+
+        # The oldest layers are the base image's, when we know what the base image is
+        base_history = histories.get(base_images[component])
+        base_layer_count = len(base_history.value) if base_history and base_history.ok else 0
+        history = histories[image].value
+        layers = [
+            dict(
+                layer,
+                category=BASE
+                if index >= len(history) - base_layer_count
+                else categorize(layer, component, component_configs[component]),
+            )
+            for index, layer in enumerate(history)
+        ]
+        attribution = {}
+        for layer in layers:
+            attribution[layer["category"]] = attribution.get(layer["category"], 0) + layer["size"]
+        reports[component] = dict(
+            image=image,
+            id=inspected[image]["Id"],
+            size=inspected[image].get("Size", sum(layer["size"] for layer in layers)),
+            layers=layers,
+            attribution=attribution,
+        )
+    return reports
+
+
+def categorize(layer: dict, component: str, component_config: dict) -> str:
+    """
+    Guess what put a layer's bytes into a component image.
+
+    This is a heuristic based on the instruction that created the layer.
+
+    :param layer: The layer, as returned by :func:`aladdin_project_tools.images.get_history`.
+    :param component: The component whose image the layer belongs to.
+    :param component_config: The component's component.yaml contents.
+    :returns: The category of the layer.
+    """
+    created_by = layer["created_by"]
+
+    for dependency in component_config.get("dependencies", []):
+        if re.search(
+            rf"(--from=\S*\b{re.escape(dependency)}\b|components/{re.escape(dependency)}\b)",
+            created_by,
+        ):
+            return f"{DEPENDENCY_PREFIX}{dependency}"
+
+    packages = (component_config.get("image") or {}).get("packages") or []
+    if _OS_PACKAGE_PATTERN.search(created_by) or (
+        packages and all(package in created_by for package in packages)
+    ):
+        return OS_PACKAGES
+    if _PYTHON_PACKAGE_PATTERN.search(created_by):
+        return PYTHON_PACKAGES
+    if re.search(rf"components/{re.escape(component)}\b", created_by):
+        return COMPONENT
+    if layer["id"] is None:
+        # Layers without an image ID were most likely pulled rather than built locally
+        return BASE
+    if re.search(r"\b(COPY|ADD)\b", created_by):
+        return COMPONENT
+    return OTHER
+
+
+def save_report(reports: Dict[str, dict], name: str = None) -> pathlib.Path:
+    """
+    Store a size report so that later runs may be compared against it.
+
+    :param reports: The component reports returned by :func:`analyze`.
+    :param name: The name to store the report under, defaults to a timestamp.
+    :returns: The path of the stored report.
+    """
+    name = name or datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+    path = get_cache_dir("sizes") / f"{name}.json"
+    with locks.atomic_write(path) as report_file:
+        json.dump(reports, report_file)
+    return path
+
+
+def load_report(name: str) -> Dict[str, dict]:
+    """
+    Load a stored size report.
+
+    :param name: The name the report was stored under, ``latest`` for the most recent report, or
+                 the path of a report file.
+    :returns: The component reports.
+    """
+    if name == "latest":
+        path = max(list_reports(), key=lambda path: path.stat().st_mtime, default=None)
+        if not path:
+            raise FileNotFoundError("No stored size reports")
+    elif os.path.exists(name):
+        path = pathlib.Path(name)
+    else:
+        path = get_cache_dir("sizes") / f"{name}.json"
+
+    with open(path) as report_file:
+        return json.load(report_file)
+
+
+def list_reports() -> List[pathlib.Path]:
+    """
+    List the stored size reports.
+
+    :returns: The report file paths.
+    """
+    return sorted(get_cache_dir("sizes").glob("*.json"))
+
+
+def compare(
+    current: Mapping[str, dict], previous: Mapping[str, dict], threshold: float
+) -> List[Regression]:
+    """
+    Find the component images that have grown by more than the threshold.
+
+    :param current: The current component reports.
+    :param previous: The component reports to compare against.
+    :param threshold: The allowed growth, as a percentage.
+    :returns: The components whose images grew too much.
+    """
+    regressions = []
+    for component, report in current.items():
+        if component in previous:
+            regression = Regression(component, previous[component]["size"], report["size"])
+            if regression.growth > threshold:
+                regressions.append(regression)
+    return regressions
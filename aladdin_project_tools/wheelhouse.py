@@ -0,0 +1,487 @@
+"""
+A shared wheelhouse built from every component's ``poetry.lock`` file.
+
+Many components pin the same python packages, yet each component image downloads and builds them
+on its own. Instead, we gather the pins from every component's lock file, dedupe the identical
+ones, and build or download each wheel only once into a local, content-addressed wheelhouse in the
+cache directory:
+
+``wheelhouse/blobs/<sha256>``
+    Each wheel file, stored under the digest of its contents.
+``wheelhouse/wheels/<wheel file name>``
+    A flat directory of links to the blobs, for ``pip install --find-links``.
+``wheelhouse/requirements/<component>.txt``
+    Each component's pinned requirements.
+``wheelhouse/index.json``
+    The wheel files present for each pin and python version.
+
+Wheels are built in ``python:<version>-slim`` containers so that they match the component images
+rather than the host. Component builds can then install their packages from the wheelhouse with no
+network access at all.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import re
+import shutil
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Set, Tuple
+
+from . import locks, parallel
+from .cache import get_cache_dir
+
+
+class Pin(NamedTuple):
+    """A package version pinned by a poetry.lock file."""
+
+    name: str
+    version: str
+    hashes: Tuple[str, ...]
+    category: str = "main"
+    markers: str = ""
+
+    @property
+    def key(self) -> str:
+        """The normalized ``name==version`` requirement for the pin."""
+        return f"{normalize_name(self.name)}=={self.version}"
+
+
+class Conflict(NamedTuple):
+    """A package pinned to different versions by different components."""
+
+    name: str
+    versions: Dict[str, Set[str]]
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize a python package name, per PEP 503.
+
+    :param name: The package name.
+    :returns: The normalized name.
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def get_wheelhouse_dir(*parts: str) -> pathlib.Path:
+    """
+    Get a directory within the wheelhouse, creating it if necessary.
+
+    :param parts: Optional subdirectory path components.
+    :returns: The directory path.
+    """
+    return get_cache_dir("wheelhouse", *parts)
+
+
+def parse_poetry_lock(path: pathlib.Path) -> List[Pin]:
+    """
+    Read the pins from a poetry.lock file.
+
+    Both the older layout, with file hashes under ``[metadata.files]``, and the newer one, with a
+    ``files`` list for each package, are supported.
+
+    :param path: The poetry.lock file.
+    :returns: The pinned packages.
+    """
+    with open(path, "rb") as lock_file:
+        data = _load_toml(lock_file.read().decode())
+
+    files = {
+        normalize_name(name): package_files
+        for name, package_files in ((data.get("metadata") or {}).get("files") or {}).items()
+    }
+    pins = []
+    for package in data.get("package", []):
+        package_files = package.get("files") or files.get(normalize_name(package["name"])) or []
+        markers = package.get("markers", "")
+        pins.append(
+            Pin(
+                name=package["name"],
+                version=str(package["version"]),
+                hashes=tuple(sorted(f["hash"] for f in package_files if f.get("hash"))),
+                category=package.get("category", "main"),
+                markers=markers if isinstance(markers, str) else "",
+            )
+        )
+    return pins
+
+
+def collect_pins(
+    lock_paths: Mapping[str, pathlib.Path]
+) -> Tuple[Dict[Pin, Set[str]], List[Conflict]]:
+    """
+    Gather and dedupe the pins from many components' lock files.
+
+    :param lock_paths: The poetry.lock file of each component.
+    :returns: The components using each distinct pin, and the packages pinned to more than one
+              version across the components.
+    """
+    pins = {}
+    versions = {}
+    for component, lock_path in lock_paths.items():
+        for pin in parse_poetry_lock(lock_path):
+            pins.setdefault(pin, set()).add(component)
+            versions.setdefault(normalize_name(pin.name), {}).setdefault(pin.version, set()).add(
+                component
+            )
+
+    conflicts = [
+        Conflict(name, by_version)
+        for name, by_version in sorted(versions.items())
+        if len(by_version) > 1
+    ]
+    return pins, conflicts
+
+
+def write_requirements(component: str, pins: Iterable[Pin]) -> pathlib.Path:
+    """
+    Write a component's pinned (non-development) requirements into the wheelhouse.
+
+    :param component: The component.
+    :param pins: The component's pins.
+    :returns: The requirements file.
+    """
+    path = get_wheelhouse_dir("requirements") / f"{component}.txt"
+    lines = sorted(
+        f"{pin.key} ; {pin.markers}" if pin.markers else pin.key
+        for pin in pins
+        if pin.category != "dev"
+    )
+    with locks.atomic_write(path) as requirements_file:
+        requirements_file.write("".join(f"{line}\n" for line in lines))
+    return path
+
+
+def get_missing(pins: Iterable[Pin], python_version: str) -> List[Pin]:
+    """
+    Find the pins that have no wheel in the wheelhouse for a python version yet.
+
+    :param pins: The pins.
+    :param python_version: The major.minor python version.
+    :returns: The pins that still need to be built or downloaded, one for each ``name==version``.
+    """
+    index = _load_index()
+    missing = {pin.key: pin for pin in pins if python_version not in index.get(pin.key, {})}
+    return [missing[key] for key in sorted(missing)]
+
+
+def build_wheels(
+    pins_by_python_version: Mapping[str, Iterable[Pin]], jobs: int
+) -> Dict[str, parallel.TaskResult]:
+    """
+    Build or download the wheels for pins into the wheelhouse.
+
+    The pins for each python version are split among at most ``jobs`` containers, each of which
+    runs a single ``pip wheel`` command for its share.
+
+    :param pins_by_python_version: The pins to build for each major.minor python version.
+    :param jobs: The maximum number of containers to run at once.
+    :returns: The outcome of each container's ``pip wheel`` command, keyed by a task name.
+    """
+    tasks = {}
+    for python_version, pins in pins_by_python_version.items():
+        pins = [pin for _, pin in sorted({pin.key: pin for pin in pins}.items())]
+        chunks = max(1, min(jobs, len(pins)))
+        for chunk in range(chunks):
+            chunk_pins = pins[chunk::chunks]
+            if chunk_pins:
+                name = f"python{python_version}-{chunk}"
+                tasks[name] = (
+                    lambda name=name, python_version=python_version, chunk_pins=chunk_pins: (
+                        _build_chunk(name, python_version, chunk_pins)
+                    )
+                )
+
+    return parallel.run_tasks(tasks, jobs=jobs)
+
+
+def _build_chunk(name: str, python_version: str, pins: List[Pin]) -> parallel.CommandResult:
+    """
+    Build or download the wheels for some pins in a single container, then store them.
+
+    :param name: A unique name for this chunk of work.
+    :param python_version: The major.minor python version to build the wheels for.
+    :param pins: The pins to build.
+    :returns: The outcome of the ``pip wheel`` command.
+    """
+    # Concurrent wheelhouse builds each get their own incoming directories
+    incoming = get_wheelhouse_dir("incoming", f"{name}-{os.getpid()}")
+    with open(incoming / "requirements.txt", "w") as requirements_file:
+        requirements_file.write("".join(f"{pin.key}\n" for pin in pins))
+
+    result = parallel.run_command(
+        [
+            "docker",
+            "run",
+            "--rm",
+            "-v",
+            f"{incoming.resolve().as_posix()}:/wheelhouse",
+            f"python:{python_version}-slim",
+            "pip",
+            "wheel",
+            "--no-deps",
+            "--wheel-dir",
+            "/wheelhouse",
+            "-r",
+            "/wheelhouse/requirements.txt",
+        ],
+        prefix=f"{name} | ",
+    )
+
+    try:
+        _store_wheels(incoming, python_version, {normalize_name(pin.name): pin for pin in pins})
+    finally:
+        shutil.rmtree(incoming, ignore_errors=True)
+    return result
+
+
+def _store_wheels(incoming: pathlib.Path, python_version: str, pins: Mapping[str, Pin]) -> None:
+    """
+    Move freshly built wheels into the content-addressed store and record them in the index.
+
+    :param incoming: The directory holding the new wheel files.
+    :param python_version: The major.minor python version the wheels were built for.
+    :param pins: The pins the wheels were built for, keyed by normalized package name.
+    """
+    blobs = get_wheelhouse_dir("blobs")
+    wheels = get_wheelhouse_dir("wheels")
+    stored = {}
+
+    for wheel_path in incoming.glob("*.whl"):
+        pin = pins.get(normalize_name(wheel_path.name.split("-", 1)[0]))
+        if not pin:
+            continue
+
+        digest = _sha256(wheel_path)
+        blob_path = blobs / digest
+        if not blob_path.exists():
+            os.replace(wheel_path, blob_path)
+
+        link_path = wheels / wheel_path.name
+        if not link_path.exists():
+            try:
+                os.link(blob_path, link_path)
+            except FileExistsError:
+                # Another wheelhouse build stored the same wheel at the same time
+                pass
+            except OSError:
+                with open(blob_path, "rb") as blob_file, locks.atomic_write(
+                    link_path, "wb"
+                ) as link_file:
+                    shutil.copyfileobj(blob_file, link_file)
+
+        stored.setdefault(pin.key, []).append(
+            dict(file=wheel_path.name, sha256=digest, verified=f"sha256:{digest}" in pin.hashes)
+        )
+
+    with locks.cache_locked("wheelhouse-index"):
+        index = _load_index()
+        for key, files in stored.items():
+            index.setdefault(key, {})[python_version] = files
+        _save_index(index)
+
+
+def _sha256(path: pathlib.Path) -> str:
+    """
+    Hash a file's contents without reading it all into memory at once.
+
+    :param path: The file.
+    :returns: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as hashed_file:
+        for block in iter(lambda: hashed_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_index() -> dict:
+    """
+    Load the wheelhouse index.
+
+    :returns: The wheel files present for each pin key and python version.
+    """
+    try:
+        with open(get_wheelhouse_dir() / "index.json") as index_file:
+            return json.load(index_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index: dict) -> None:
+    """
+    Save the wheelhouse index.
+
+    :param index: The wheel files present for each pin key and python version.
+    """
+    with locks.atomic_write(get_wheelhouse_dir() / "index.json") as index_file:
+        json.dump(index, index_file, indent=2, sort_keys=True)
+
+
+def _load_toml(content: str) -> dict:
+    """
+    Parse the TOML content of a poetry.lock file.
+
+    The standard library only gained a TOML parser in python 3.11, so on older versions we fall
+    back to a minimal parser that understands just the subset of TOML poetry writes to lock files.
+
+    :param content: The TOML content.
+    :returns: The parsed data.
+    """
+    try:
+        import tomllib
+    except ImportError:
+        return _parse_lock_toml(content)
+    return tomllib.loads(content)
+
+
+_TABLE_PATTERN = re.compile(r"^\[(\[)?\s*([^\]]+?)\s*\]\]?\s*$")
+_KEY_PATTERN = re.compile(r'^\s*("(?:[^"\\]|\\.)*"|[A-Za-z0-9_.-]+)\s*=\s*(.*)$')
+
+
+def _parse_lock_toml(content: str) -> dict:
+    """
+    Parse the subset of TOML found in poetry.lock files.
+
+    :param content: The TOML content.
+    :returns: The parsed data.
+    """
+    data = {}
+    table = data
+    lines = content.splitlines()
+    index = 0
+    while index < len(lines):
+        line = _strip_comment(lines[index])
+        index += 1
+        if not line:
+            continue
+
+        table_match = _TABLE_PATTERN.match(line)
+        if table_match:
+            keys = [_unquote(key) for key in _split_dotted(table_match.group(2))]
+            parent = data
+            for key in keys[:-1]:
+                parent = parent.setdefault(key, {})
+                parent = parent[-1] if isinstance(parent, list) else parent
+            if table_match.group(1):
+                table = {}
+                parent.setdefault(keys[-1], []).append(table)
+            else:
+                table = parent.setdefault(keys[-1], {})
+            continue
+
+        key_match = _KEY_PATTERN.match(line)
+        if not key_match:
+            continue
+        value = key_match.group(2)
+        # Multi-line arrays continue until their brackets balance
+        while _bracket_depth(value) > 0 and index < len(lines):
+            value += " " + _strip_comment(lines[index])
+            index += 1
+        table[_unquote(key_match.group(1))] = _parse_value(value.strip())
+
+    return data
+
+
+def _strip_comment(line: str) -> str:
+    """Remove the comment and surrounding whitespace from a line of TOML."""
+    in_string = None
+    escaped = False
+    for position, char in enumerate(line):
+        if escaped:
+            escaped = False
+        elif in_string:
+            escaped = char == "\\" and in_string == '"'
+            if char == in_string:
+                in_string = None
+        elif char in "\"'":
+            in_string = char
+        elif char == "#":
+            return line[:position].strip()
+    return line.strip()
+
+
+def _split_dotted(key: str) -> List[str]:
+    """Split a dotted TOML key, respecting quoted parts."""
+    return re.findall(r'"(?:[^"\\]|\\.)*"|[^.]+', key)
+
+
+def _unquote(value: str) -> str:
+    """Remove the quotes from a TOML string or quoted key."""
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        if value[0] == "'":
+            return value[1:-1]
+        # JSON shares TOML's basic string escapes, except for the 8 digit unicode one
+        return json.loads(
+            re.sub(
+                r"(?<!\\)((?:\\\\)*)\\U([0-9A-Fa-f]{8})",
+                lambda match: match.group(1) + json.dumps(chr(int(match.group(2), 16)))[1:-1],
+                value,
+            )
+        )
+    return value
+
+
+def _bracket_depth(value: str) -> int:
+    """Count the unclosed brackets and braces in a TOML value, ignoring those in strings."""
+    depth = 0
+    for token in re.sub(r'"(?:[^"\\]|\\.)*"|\'[^\']*\'', "", value):
+        depth += {"[": 1, "{": 1, "]": -1, "}": -1}.get(token, 0)
+    return depth
+
+
+def _parse_value(value: str):
+    """Parse a TOML value: a string, number, boolean, array or inline table."""
+    value = value.strip()
+    if value.startswith("["):
+        return [_parse_value(item) for item in _split_items(value[1:-1])]
+    elif value.startswith("{"):
+        table = {}
+        for item in _split_items(value[1:-1]):
+            key, _, item_value = item.partition("=")
+            table[_unquote(key)] = _parse_value(item_value.strip())
+        return table
+    elif value in ("true", "false"):
+        return value == "true"
+    elif value[:1] in "\"'":
+        if value.startswith('"""') or value.startswith("'''"):
+            return value[3:-3]
+        return _unquote(value)
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def _split_items(value: str) -> List[str]:
+    """Split the items of a TOML array or inline table on their top-level commas."""
+    items = []
+    depth = 0
+    current = ""
+    in_string = None
+    escaped = False
+    for char in value:
+        if escaped:
+            escaped = False
+        elif in_string:
+            escaped = char == "\\" and in_string == '"'
+            if char == in_string:
+                in_string = None
+        elif char in "\"'":
+            in_string = char
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+        elif char == "," and depth == 0:
+            items.append(current.strip())
+            current = ""
+            continue
+        current += char
+    if current.strip():
+        items.append(current.strip())
+    return items
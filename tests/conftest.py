@@ -0,0 +1,10 @@
+import pytest
+
+from aladdin_project_tools import cache
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keep each test's caches in a temporary directory of its own."""
+    monkeypatch.setenv(cache.CACHE_DIR_ENVVAR, str(tmp_path / "cache"))
+    return tmp_path / "cache"
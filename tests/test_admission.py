@@ -0,0 +1,161 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from aladdin_project_tools import admission, locks
+from aladdin_project_tools.admission import Resources
+
+
+class _FakeSampler:
+    def start(self):
+        pass
+
+    def stop(self):
+        return Resources(1.5, 2 << 30)
+
+
+@pytest.fixture(autouse=True)
+def sampler(monkeypatch):
+    monkeypatch.setattr(admission, "_UsageSampler", _FakeSampler)
+    monkeypatch.setattr(admission, "POLL_INTERVAL", 0.01)
+
+
+def _write_ledger(cache_dir, **entries):
+    (cache_dir / "admission").mkdir(parents=True, exist_ok=True)
+    with locks.cache_locked("admission-ledger"):
+        (cache_dir / "admission" / "ledger.json").write_text(json.dumps(entries))
+
+
+def _read_ledger(cache_dir):
+    return json.loads((cache_dir / "admission" / "ledger.json").read_text())
+
+
+def _read_decisions(cache_dir):
+    with open(cache_dir / "admission" / "decisions.log") as log_file:
+        return [json.loads(line)["decision"] for line in log_file]
+
+
+def test_memory_is_parsed():
+    assert admission.parse_memory(1024) == 1024
+    assert admission.parse_memory("512") == 512
+    assert admission.parse_memory("2kb") == 2048
+    assert admission.parse_memory("512m") == 512 << 20
+    assert admission.parse_memory(" 1.5G ") == 3 << 29
+    for value in ["", "lots", "1t", "-1g"]:
+        with pytest.raises(ValueError):
+            admission.parse_memory(value)
+
+
+def test_budget_and_demand(monkeypatch):
+    monkeypatch.setenv(admission.CPUS_ENVVAR, "6")
+    monkeypatch.setenv(admission.MEMORY_ENVVAR, "8g")
+    assert admission.get_budget() == Resources(6.0, 8 << 30)
+    assert admission.get_budget(cpus=2, memory="1g") == Resources(2.0, 1 << 30)
+
+    assert admission.get_demand("api", None) == Resources(
+        admission.DEFAULT_CPUS, admission.DEFAULT_MEMORY
+    )
+    with admission.admitted("api", Resources(1, 1), Resources(4, 8 << 30), ["api"]):
+        pass
+    # The measured peak usage stands in for missing hints
+    assert admission.get_demand("api", {}) == Resources(1.5, 2 << 30)
+    assert admission.get_demand("api", {"build": {"memory": "3g"}}) == Resources(1.5, 3 << 30)
+    assert admission.get_demand("api", {"build": {"cpus": 4}}) == Resources(4.0, 2 << 30)
+
+
+def test_usage_is_only_recorded_for_builds_that_ran_alone(cache_dir):
+    budget = Resources(4, 8 << 30)
+    default = Resources(admission.DEFAULT_CPUS, admission.DEFAULT_MEMORY)
+
+    # Another build was already running ...
+    _write_ledger(cache_dir, other=dict(pid=os.getpid(), name="web", cpus=1, memory=1 << 30))
+    with admission.admitted("api", Resources(1, 1 << 30), budget, ["api"]):
+        pass
+    assert admission.get_demand("api", None) == default
+
+    # ... or started while this one was running
+    _write_ledger(cache_dir)
+    with admission.admitted("api", Resources(1, 1 << 30), budget, ["api"]):
+        with admission.admitted("web", Resources(1, 1 << 30), budget, ["web"]):
+            pass
+    assert admission.get_demand("api", None) == default
+    assert admission.get_demand("web", None) == default
+
+    with admission.admitted("api", Resources(1, 1 << 30), budget, ["api"]):
+        pass
+    assert admission.get_demand("api", None) == Resources(1.5, 2 << 30)
+
+
+def test_builds_wait_for_the_running_builds_to_leave_room(cache_dir):
+    budget = Resources(4, 8 << 30)
+    _write_ledger(cache_dir, other=dict(pid=os.getpid(), name="web", cpus=3, memory=1 << 30))
+
+    with admission.admitted("shared", Resources(1, 1 << 30), budget):
+        ledger = _read_ledger(cache_dir)
+        assert len(ledger) == 2 and ledger["other"]["name"] == "web"
+
+    admitted = threading.Event()
+
+    def build():
+        with admission.admitted("api", Resources(2, 1 << 30), budget):
+            admitted.set()
+
+    thread = threading.Thread(target=build)
+    thread.start()
+    time.sleep(0.1)
+    assert not admitted.is_set()
+    _write_ledger(cache_dir)
+    thread.join(5)
+
+    assert admitted.is_set()
+    assert _read_ledger(cache_dir) == {}
+    assert _read_decisions(cache_dir) == [
+        "admitted",
+        "finished",
+        "waiting",
+        "admitted",
+        "finished",
+    ]
+
+
+def test_entries_of_exited_processes_are_dropped(cache_dir):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    _write_ledger(cache_dir, stale=dict(pid=exited.pid, name="web", cpus=4, memory=8 << 30))
+
+    with admission.admitted("api", Resources(4, 8 << 30), Resources(4, 8 << 30)):
+        assert "stale" not in _read_ledger(cache_dir)
+    assert _read_decisions(cache_dir) == ["admitted", "finished"]
+
+
+def test_builds_over_the_budget_are_admitted_alone(cache_dir):
+    budget = Resources(2, 1 << 30)
+    with admission.admitted("api", Resources(8, 4 << 30), budget):
+        pass
+    assert _read_decisions(cache_dir) == ["admitted-over-budget", "finished"]
+
+    # ... but only once nothing else is running
+    _write_ledger(cache_dir, other=dict(pid=os.getpid(), name="web", cpus=0.5, memory=1))
+    admitted = threading.Event()
+    finished = threading.Event()
+
+    def build():
+        with admission.admitted("api", Resources(8, 4 << 30), budget):
+            admitted.set()
+            finished.wait(5)
+
+    thread = threading.Thread(target=build)
+    thread.start()
+    time.sleep(0.1)
+    assert not admitted.is_set()
+    _write_ledger(cache_dir)
+    assert admitted.wait(5)
+    assert [entry["name"] for entry in _read_ledger(cache_dir).values()] == ["api"]
+    finished.set()
+    thread.join(5)
+    assert _read_decisions(cache_dir)[2:] == ["waiting", "admitted-over-budget", "finished"]
@@ -0,0 +1,109 @@
+import json
+import os
+import stat
+import sys
+import textwrap
+
+import pytest
+
+from aladdin_project_tools import artifacts
+
+# A stand-in for the docker CLI that keeps its images in a JSON file. Each image is a tar archive of
+# a manifest and layers, and the layers of the two images overlap.
+FAKE_DOCKER = textwrap.dedent(
+    """
+    import io, json, os, sys, tarfile
+
+    state_path = os.path.join(os.path.dirname(__file__), "state.json")
+    with open(state_path) as state_file:
+        state = json.load(state_file)
+    args = sys.argv[1:]
+
+    if args[:2] == ["image", "inspect"]:
+        found = [
+            dict(Id=state["images"][ref], RepoTags=[ref])
+            for ref in args[2:]
+            if ref in state["images"]
+        ]
+        print(json.dumps(found))
+        sys.exit(0 if len(found) == len(args) - 2 else 1)
+    elif args[0] == "save":
+        with tarfile.open(fileobj=sys.stdout.buffer, mode="w|") as archive:
+            for ref in args[1:]:
+                for name, content in [("manifest.json", json.dumps([ref]))] + [
+                    (f"{layer}/layer.tar", layer * 1000) for layer in state["layers"][ref]
+                ]:
+                    info = tarfile.TarInfo(f"{ref}/{name}")
+                    info.size = len(content)
+                    archive.addfile(info, io.BytesIO(content.encode()))
+    elif args[0] == "load":
+        with tarfile.open(fileobj=sys.stdin.buffer, mode="r|") as archive:
+            for info in archive:
+                content = archive.extractfile(info).read().decode()
+                if info.name.endswith("manifest.json"):
+                    state["images"][json.loads(content)[0]] = "loaded"
+                else:
+                    state["loaded_layers"].append(content[:1])
+        with open(state_path, "w") as state_file:
+            json.dump(state, state_file)
+    """
+)
+
+
+@pytest.fixture
+def docker(tmp_path, monkeypatch):
+    bin_path = tmp_path / "bin"
+    bin_path.mkdir()
+    docker_path = bin_path / "docker"
+    docker_path.write_text(f"#!{sys.executable}\n{FAKE_DOCKER}")
+    docker_path.chmod(docker_path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_path}{os.pathsep}{os.environ['PATH']}")
+
+    state_path = bin_path / "state.json"
+
+    def set_state(**state):
+        state_path.write_text(json.dumps(dict(dict(loaded_layers=[]), **state)))
+
+    def get_state():
+        return json.loads(state_path.read_text())
+
+    return set_state, get_state
+
+
+def test_export_and_import(tmp_path, cache_dir, docker):
+    set_state, get_state = docker
+    set_state(
+        images={"demo-api:local": "sha256:api", "demo-web:local": "sha256:web"},
+        layers={"demo-api:local": ["a", "b"], "demo-web:local": ["a", "c"]},
+    )
+    cache_root = cache_dir
+    (cache_root / "sizes").mkdir(parents=True)
+    (cache_root / "sizes" / "baseline.json").write_text("{}")
+    (cache_root / "pool").mkdir()
+    (cache_root / "pool" / "stamp").write_text("")
+    export_path = tmp_path / "export"
+
+    summary = artifacts.export_artifacts(
+        export_path, ["demo-api:local", "demo-web:local", "demo-missing:local"], cache_root
+    )
+
+    assert (summary.images, summary.files) == (2, 1)
+    # Two manifests, the shared layer once, two distinct layers and the cache file
+    assert summary.blobs == 6
+    assert len(list((export_path / "blobs" / "sha256").iterdir())) == 6
+
+    # Exporting again writes nothing new
+    assert artifacts.export_artifacts(
+        export_path, ["demo-api:local", "demo-web:local"], cache_root
+    ).blobs == 0
+
+    # On a cold machine with only one of the images, only the other one is loaded
+    set_state(images={"demo-api:local": "sha256:api"}, layers={})
+    cold_cache_root = tmp_path / "cold"
+    summary = artifacts.import_artifacts(export_path, cold_cache_root)
+
+    assert (summary.images, summary.files) == (1, 1)
+    assert get_state()["images"]["demo-web:local"] == "loaded"
+    assert sorted(get_state()["loaded_layers"]) == ["a", "c"]
+    assert (cold_cache_root / "sizes" / "baseline.json").read_text() == "{}"
+    assert not (cold_cache_root / "pool").exists()
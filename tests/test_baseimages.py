@@ -0,0 +1,52 @@
+import pytest
+
+from aladdin_project_tools import baseimages
+
+
+@pytest.mark.parametrize(
+    "reference, normalized",
+    [
+        ("python", "python:latest"),
+        ("python:3.8", "python:3.8"),
+        ("docker.io/python:3.8", "python:3.8"),
+        ("index.docker.io/library/python:3.8", "python:3.8"),
+        ("docker.io/jupyter/base-notebook", "jupyter/base-notebook:latest"),
+        ("python@sha256:abc", "python@sha256:abc"),
+        ("docker.io/library/python:3.8@sha256:abc", "python@sha256:abc"),
+        ("localhost:5000/team/image", "localhost:5000/team/image:latest"),
+        ("localhost:5000/team/image:1.0@sha256:abc", "localhost:5000/team/image@sha256:abc"),
+    ],
+)
+def test_references_are_normalized(reference, normalized):
+    assert baseimages.normalize_reference(reference) == normalized
+
+
+def test_base_images_are_deduped_across_components(tmp_path):
+    (tmp_path / "legacy").mkdir()
+    (tmp_path / "legacy" / "Dockerfile").write_text(
+        "ARG PYTHON=3.8\n"
+        "FROM python:${PYTHON}-slim AS build\n"
+        "FROM build AS test\n"
+        "FROM docker.io/library/python:3.8-slim@sha256:abc\n"
+        "COPY --from=build /code /code\n"
+        "FROM scratch\n"
+        "FROM ${UNKNOWN}\n"
+    )
+    (tmp_path / "pinned").mkdir()
+    (tmp_path / "pinned" / "Dockerfile").write_text("FROM python@sha256:abc\n")
+
+    assert baseimages.get_base_images(
+        {
+            "api": {"language": {"version": "3.8"}},
+            "default": {"meta": {"version": 1}},
+            "notebook": {"image": {"base": "docker.io/jupyter/base-notebook"}},
+            "legacy": None,
+            "pinned": None,
+            "missing": None,
+        },
+        tmp_path,
+    ) == {
+        "python:3.8-slim": ["api", "default", "legacy"],
+        "jupyter/base-notebook:latest": ["notebook"],
+        "python@sha256:abc": ["legacy", "pinned"],
+    }
@@ -0,0 +1,68 @@
+import datetime
+import subprocess
+
+from aladdin_project_tools import buildcache
+
+DU_OUTPUT = """\
+ID:\t\tq1w2e3
+Created at:\t2024-01-01 10:00:00.000000000 +0000 UTC
+Mutable:\ttrue
+Reclaimable:\ttrue
+Shared:\t\tfalse
+Size:\t\t120MB
+Description:\tcached mount /root/.cache/pip from exec pip install poetry with id "demo-pip"
+Usage count:\t4
+Last used:\tAbout an hour ago
+Type:\t\texec.cachemount
+
+ID:\t\tr4t5y6
+Size:\t\t30MB
+Description:\tcached mount /root/.cache/pip from exec pip install poetry with id "demo-pip"
+Last used:\t5 minutes ago
+Type:\t\texec.cachemount
+
+ID:\t\tu7i8o9
+Size:\t\t1GB
+Description:\tcached mount /root/.cache/pip from exec pip install with id "other-pip"
+Last used:\t2 days ago
+Type:\t\texec.cachemount
+
+ID:\t\tp0a1s2
+Size:\t\t5kB
+Description:\tmount / from exec /bin/sh -c apt-get update
+Type:\t\tregular
+"""
+
+
+def test_cache_records_are_listed_with_their_age(monkeypatch):
+    monkeypatch.setattr(
+        buildcache.subprocess,
+        "run",
+        lambda cmd, **kwargs: subprocess.CompletedProcess(cmd, 0, DU_OUTPUT.encode(), b""),
+    )
+    assert buildcache.list_caches("demo") == [
+        buildcache.CacheRecord(
+            "q1w2e3", buildcache.PIP, 120000000, "About an hour ago", datetime.timedelta(hours=1)
+        ),
+        buildcache.CacheRecord(
+            "r4t5y6", buildcache.PIP, 30000000, "5 minutes ago", datetime.timedelta(minutes=5)
+        ),
+    ]
+
+
+def test_ages_are_parsed():
+    ages = {
+        "Less than a second ago": datetime.timedelta(),
+        "1 second ago": datetime.timedelta(seconds=1),
+        "About a minute ago": datetime.timedelta(minutes=1),
+        "59 minutes ago": datetime.timedelta(minutes=59),
+        "About an hour ago": datetime.timedelta(hours=1),
+        "47 hours ago": datetime.timedelta(hours=47),
+        "13 days ago": datetime.timedelta(days=13),
+        "8 weeks ago": datetime.timedelta(weeks=8),
+        "23 months ago": datetime.timedelta(days=690),
+        "2 years ago": datetime.timedelta(days=730),
+        "": None,
+        "<nil>": None,
+    }
+    assert {last_used: buildcache._parse_age(last_used) for last_used in ages} == ages
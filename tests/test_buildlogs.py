@@ -0,0 +1,79 @@
+import gzip
+import sys
+
+from aladdin_project_tools import buildlogs, cache, parallel
+
+
+def _record(components, lines, fail=False):
+    with buildlogs.recording(components) as recorder:
+        for line in lines:
+            recorder.write(line)
+        if fail:
+            recorder.exited(["docker", "build"], 1)
+
+
+def test_commands_run_while_recording_are_archived(capsys):
+    script = "import sys; print('step 1'); print('ERROR: no space left', file=sys.stderr)"
+    with buildlogs.recording(["api", "web"]):
+        result = parallel.run_command([sys.executable, "-c", script], prefix="api | ")
+        with buildlogs.recording(["api"]):
+            parallel.run_command([sys.executable, "-c", "import sys; sys.exit(3)"])
+
+    assert result.returncode == 0
+    assert "api | step 1" in capsys.readouterr().out
+    for component in ["api", "web"]:
+        run = buildlogs.get_run(component)
+        assert run.number == 1
+        assert run.components == ["api", "web"]
+        assert not run.succeeded
+    lines = [line for _, line in buildlogs.read_lines(run)]
+    assert lines[1:3] == ["step 1", "ERROR: no space left"]
+    assert lines[-1].endswith("exited with 3")
+    assert gzip.decompress(run.path.read_bytes()).decode().splitlines() == lines
+
+
+def test_errors_are_read_from_their_own_chunks(monkeypatch):
+    monkeypatch.setattr(buildlogs, "CHUNK_SIZE", 100)
+    lines = [f"line {i:03}" for i in range(100)]
+    lines[42] = "error: failed to compile"
+    lines[45] = "fatal: out of memory"
+    _record(["api"], lines, fail=True)
+    run = buildlogs.get_run("api")
+    assert len(run.chunks) > 5
+    assert len(run.errors) == 2
+
+    decompressed = []
+    original = buildlogs._decompress_member
+    monkeypatch.setattr(
+        buildlogs,
+        "_decompress_member",
+        lambda run_file: decompressed.append(run_file.tell()) or original(run_file),
+    )
+    regions = buildlogs.read_errors(run, context=2)
+    assert len(regions) == 1
+    assert "error: failed to compile" in [line for _, line in regions[0]]
+    assert "fatal: out of memory" in [line for _, line in regions[0]]
+    assert len(decompressed) < len(run.chunks) / 2
+
+    assert [line for _, line in buildlogs.read_lines(run)] == lines + [
+        "# docker build exited with 1"
+    ]
+
+
+def test_only_the_latest_runs_are_kept(monkeypatch):
+    monkeypatch.setattr(buildlogs, "KEEP_RUNS", 3)
+    for i in range(5):
+        _record(["api"], [f"build {i}"])
+    _record(["web"], ["web build"])
+
+    runs = buildlogs.list_runs("api")
+    assert [run.number for run in runs] == [3, 4, 5]
+    assert buildlogs.get_run("api").number == 5
+    assert buildlogs.get_run("api", -3).number == 3
+    assert buildlogs.get_run("api", -4) is None
+    assert buildlogs.get_run("api", 1) is None
+    assert list(buildlogs.read_lines(buildlogs.get_run("api", 4))) == [(0, "build 3")]
+    run_files = cache.get_cache_dir("buildlogs", "runs").glob("*.log.gz")
+    assert sorted(path.name for path in run_files) == sorted(
+        run.path.name for run in runs + buildlogs.list_runs("web")
+    )
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from aladdin_project_tools import cachelint
+from aladdin_project_tools.project import Project
+
+TRADITIONAL = """\
+FROM python:latest AS deps
+ARG BUILD_DATE
+RUN apt-get update
+COPY legacy /code
+RUN pip install -r /code/requirements.txt
+ADD https://example.com/tool.tar.gz /opt/
+RUN echo $BUILD_DATE > /built
+
+FROM deps
+RUN true
+
+FROM python:3.8-slim
+COPY legacy/requirements.txt /tmp/
+RUN apt-get update && apt-get install -y curl && pip install -r /tmp/requirements.txt
+COPY --from=deps /code /code
+"""
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "project"
+    components = root / "components"
+    for component in ["api", "legacy", "tidy"]:
+        (components / component).mkdir(parents=True)
+    (root / "lamp.json").write_text(json.dumps({"name": "demo"}))
+    (components / ".dockerignore").write_text("**/.venv\n")
+    (components / "api" / "component.yaml").write_text("image:\n  base: jupyter/notebook\n")
+    (components / "api" / "Dockerfile").write_text("RUN pip install requests\nCMD main.py\n")
+    (components / "api" / "__pycache__").mkdir()
+    (components / "api" / ".venv").mkdir()
+    (components / "legacy" / "Dockerfile").write_text(TRADITIONAL)
+    (components / "tidy" / "Dockerfile").write_text(
+        "FROM python:3.8-slim\nCOPY tidy/poetry.lock* tidy/pyproject.toml /code/\n"
+        "RUN pip install poetry && poetry install\nCOPY tidy /code\nARG GIT_COMMIT\n"
+    )
+    return Project(root)
+
+
+def test_source_edits_rerun_the_steps_after_the_sources_are_copied(project):
+    reports = {report.component: report for report in cachelint.lint(project, jobs=2)}
+    legacy = reports["legacy"]
+    assert legacy.instructions == 10
+    assert legacy.invalidated == [4, 5, 6, 7, 10, 15]
+    assert [(finding.rule, finding.line) for finding in legacy.findings] == [
+        ("unpinned-base", 1),
+        ("volatile-arg", 2),
+        ("apt-get-update", 3),
+        ("source-before-install", 5),
+        ("add-url", 6),
+    ]
+    assert "lines 3, 5" in legacy.findings[1].message
+
+    tidy = reports["tidy"]
+    assert tidy.invalidated == [4, 5]
+    assert tidy.findings == []
+
+
+def test_standard_components_are_checked_for_installs_after_their_sources(project):
+    report = cachelint.lint_component(project, "api")
+    assert report.invalidated == [1, 2]
+    assert [(finding.rule, finding.path.split("/")[-1]) for finding in report.findings] == [
+        ("volatile-context", ".dockerignore"),
+        ("snippet-install", "Dockerfile"),
+        ("unpinned-base", "component.yaml"),
+    ]
+    assert "api/__pycache__" in report.findings[0].message
+    assert json.loads(json.dumps(report.to_json()))["findings"][1]["line"] == 1
@@ -0,0 +1,73 @@
+import json
+import sys
+
+import pytest
+
+from aladdin_project_tools import completion
+
+CLI_MODULE = "aladdin_project_tools.commands.components"
+
+
+@pytest.fixture(autouse=True)
+def project_root(tmp_path, monkeypatch):
+    root = tmp_path / "project"
+    for component in ["api", "shared", "legacy"]:
+        (root / "components" / component).mkdir(parents=True)
+    (root / "components" / "api" / "component.yaml").write_text("image:\n  base: python:3.8\n")
+    (root / "components" / "shared" / "component.yaml").write_text("meta:\n  version: 1\n")
+    (root / "lamp.json").write_text(json.dumps({"name": "demo"}))
+    monkeypatch.chdir(root)
+    return root
+
+
+def _complete_bash(monkeypatch, capsys, command_line):
+    words = command_line.split()
+    cword = len(words) if command_line.endswith(" ") else len(words) - 1
+    monkeypatch.setenv("COMP_WORDS", command_line)
+    monkeypatch.setenv("COMP_CWORD", str(cword))
+    handled = completion._try_complete("bash")
+    return handled, capsys.readouterr().out.split()
+
+
+def test_component_names_are_completed_from_the_index(monkeypatch, capsys):
+    assert completion.get_component_index() == {
+        "api": "compatible",
+        "legacy": "traditional",
+        "shared": "standard",
+    }
+    # Once the index is built, completions don't import the CLI
+    monkeypatch.delitem(sys.modules, CLI_MODULE, raising=False)
+
+    assert _complete_bash(monkeypatch, capsys, "components run ") == (
+        True,
+        ["api", "legacy", "shared"],
+    )
+    assert _complete_bash(monkeypatch, capsys, "components build api s") == (True, ["shared"])
+    assert _complete_bash(monkeypatch, capsys, "components run api ") == (False, [])
+    assert _complete_bash(monkeypatch, capsys, "components build --") == (False, [])
+    assert CLI_MODULE not in sys.modules
+
+
+@pytest.mark.parametrize(
+    "command_line",
+    [
+        "components --log-format json run ",
+        "components --log-level DEBUG --log-format=json run ",
+        "components --log-format json --log-level DEBUG validate api ",
+    ],
+)
+def test_top_level_option_values_are_skipped(monkeypatch, capsys, command_line):
+    completion.get_component_index()
+    monkeypatch.delitem(sys.modules, CLI_MODULE, raising=False)
+
+    handled, names = _complete_bash(monkeypatch, capsys, command_line)
+    assert handled
+    assert "legacy" in names
+    assert CLI_MODULE not in sys.modules
+
+
+def test_the_index_is_rebuilt_when_components_change(project_root):
+    completion.get_component_index()
+    (project_root / "components" / "web").mkdir()
+    assert "web" in completion.get_component_index()
+    assert "--log-format" in completion._get_index()["value_options"]
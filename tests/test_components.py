@@ -0,0 +1,192 @@
+import datetime
+import importlib
+import json
+import re
+import subprocess
+import sys
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+from typer.testing import CliRunner
+
+
+@pytest.fixture
+def project_root(tmp_path, monkeypatch):
+    root = tmp_path / "project"
+    for component in ["api", "shared"]:
+        (root / "components" / component).mkdir(parents=True)
+    (root / "components" / "api" / "component.yaml").write_text("dependencies:\n- shared\n")
+    (root / "components" / "shared" / "component.yaml").write_text("meta:\n  version: 1\n")
+    (root / "lamp.json").write_text(json.dumps({"name": "demo"}))
+    monkeypatch.chdir(root)
+    return root
+
+
+@pytest.fixture
+def cli(project_root):
+    """The components commands, for the project in the current directory."""
+    sys.modules.pop("aladdin_project_tools.commands.components", None)
+    return importlib.import_module("aladdin_project_tools.commands.components")
+
+
+def _invoke(cli, *args):
+    return CliRunner().invoke(cli.app, list(args))
+
+
+def test_exec_all_follows_dependencies_and_writes_junit_xml(cli, project_root, monkeypatch):
+    log_path = project_root / "order.log"
+
+    def run_command(component, tag, command, in_component_dir, interactive):
+        script = (
+            f"open({str(log_path)!r}, 'a').write('{component}\\n'); "
+            f"print('{component} output'); raise SystemExit({int(component == 'api')})"
+        )
+        return [sys.executable, "-c", script]
+
+    monkeypatch.setattr(cli, "_get_docker_run_command", run_command)
+    result = _invoke(
+        cli, "exec-all", "--follow-dependencies", "--junit-xml", "results.xml", "--", "pytest"
+    )
+
+    assert result.exit_code == 1
+    assert log_path.read_text().split() == ["shared", "api"]
+    suite = ElementTree.parse(project_root / "results.xml").getroot()
+    assert (suite.get("name"), suite.get("tests"), suite.get("failures")) == ("pytest", "2", "1")
+    cases = {case.get("name"): case for case in suite.iter("testcase")}
+    assert cases["api"].find("failure").get("message") == "exit code 1"
+    assert cases["shared"].find("failure") is None
+    assert cases["shared"].find("system-out").text == "shared output\n"
+
+
+def test_exec_all_without_components_aborts(cli, project_root):
+    for component in ["api", "shared"]:
+        for path in (project_root / "components" / component).iterdir():
+            path.unlink()
+        (project_root / "components" / component).rmdir()
+    cli = importlib.reload(cli)
+    result = _invoke(cli, "exec-all", "--", "true")
+    assert result.exit_code == 1
+    assert "There are no components" in result.output
+
+
+@pytest.mark.parametrize(
+    "spec, error",
+    [
+        ("components: []", "does not describe any components"),
+        ("components:\n- web", "must be mappings"),
+        ("name: web\ntype: exotic", "Component 'web' has an unknown type 'exotic'"),
+        ("name: web\ntype: compatible", "Compatible component 'web' must provide an image.base"),
+        ("name: web\ndependencies: [db]", "Component 'web' has unknown dependencies: db"),
+    ],
+)
+def test_invalid_specs_are_reported_before_creating_anything(cli, project_root, spec, error):
+    (project_root / "spec.yaml").write_text(spec)
+    result = _invoke(cli, "create", "--from-spec", "spec.yaml")
+    assert result.exit_code == 1
+    assert error in result.output
+    assert not (project_root / "components" / "web").exists()
+
+
+def test_spec_component_types_and_component_yaml_data(cli):
+    assert cli._get_spec_component_type({"name": "web"}) == cli.ComponentType.Standard
+    assert cli._get_spec_component_type({"base": "nginx"}) == cli.ComponentType.Traditional
+    assert cli._get_spec_component_type({"type": "Compatible"}) == cli.ComponentType.Compatible
+    assert cli._get_spec_component_type({"image": {"base": "jupyter/base-notebook:abc"}}) == (
+        cli.ComponentType.Compatible
+    )
+    assert cli._get_spec_component_type({"image": "not a mapping"}) == cli.ComponentType.Standard
+
+    spec = {"name": "web", "image": {"packages": ["curl"]}, "dependencies": ["api"]}
+    assert cli._get_spec_component_yaml_data(spec, cli.ComponentType.Standard) == {
+        "meta": {"version": 1},
+        "language": {"name": "python", "version": "3.8"},
+        "image": {"packages": ["curl"]},
+        "dependencies": ["api"],
+    }
+
+    # A compatible spec with every detail given needs no container to read them from its image
+    spec = {
+        "image": {
+            "base": "jupyter/base-notebook:abc",
+            "user": {"name": "jovyan"},
+            "workdir": {"path": "/home/jovyan"},
+        },
+        "language": {"version": "3.7", "spec": {"location": "/opt/conda"}},
+    }
+    data = cli._get_spec_component_yaml_data(spec, cli.ComponentType.Compatible)
+    assert data["image"]["user"] == {"name": "jovyan"}
+    assert data["language"]["spec"]["location"] == "/opt/conda"
+
+
+def test_cache_stats_show_the_latest_use_of_each_cache(cli, monkeypatch):
+    record = cli.buildcache.CacheRecord
+    records = [
+        record("a", "pip", 2000, "About an hour ago", datetime.timedelta(hours=1)),
+        record("b", "pip", 3000, "5 minutes ago", datetime.timedelta(minutes=5)),
+        record("c", "pip", 5000, "<nil>"),
+    ]
+    monkeypatch.setattr(cli.buildcache, "list_caches", lambda project_name: records)
+
+    result = _invoke(cli, "cache", "stats")
+    assert result.exit_code == 0
+    assert re.search(r"demo-pip +\| +10.0 KB \| 5 minutes ago", result.output)
+    assert re.search(r"demo-poetry +\| +0 B \| unused", result.output)
+
+
+def test_cache_export_replays_the_last_native_build_for_its_cache_only(cli, monkeypatch):
+    definition = {"target": {"api": {"target": "api", "tags": ["demo-api:local"]}}}
+    monkeypatch.setattr(cli._project, "get_last_native_build", lambda: (definition, []))
+    replayed = []
+
+    def run(cmd, capture_output=False):
+        with open(cmd[cmd.index("-f") + 1]) as bake_file:
+            replayed.append(json.load(bake_file))
+        return subprocess.CompletedProcess(cmd, 0, b"", b"")
+
+    monkeypatch.setattr(cli.subprocess, "run", run)
+    assert _invoke(cli, "cache", "export", "--no-images", "exported").exit_code == 0
+    cache_dir = cli.get_cache_dir("buildkit", "api").resolve().as_posix()
+    assert replayed == [
+        {
+            "target": {
+                "api": {
+                    "target": "api",
+                    "output": ["type=cacheonly"],
+                    "cache-to": [f"type=local,dest={cache_dir},mode=max"],
+                }
+            }
+        }
+    ]
+
+    # A replay of a build whose components changed since would build them afresh
+    replayed.clear()
+    monkeypatch.setattr(cli._project, "get_last_native_build", lambda: (definition, ["api"]))
+    result = _invoke(cli, "cache", "export", "--no-images", "exported")
+    assert "components changed after the last native build: api" in result.output
+    assert replayed == []
+
+
+def test_pull_skips_present_images_and_pulls_each_digest_once(cli, project_root, monkeypatch):
+    for component, base in [("api", "python:3.8@sha256:abc"), ("shared", "python@sha256:abc")]:
+        (project_root / "components" / component / "component.yaml").write_text(
+            f"meta:\n  version: 1\nimage:\n  base: {base}\n"
+        )
+    (project_root / "components" / "web").mkdir()
+    (project_root / "components" / "web" / "Dockerfile").write_text("FROM python:3.8-slim\n")
+    cli = importlib.reload(cli)
+    pulled = []
+    monkeypatch.setattr(
+        cli.images,
+        "inspect_images",
+        lambda refs: {ref: {"Id": "sha256:slim"} if "slim" in ref else None for ref in refs},
+    )
+    monkeypatch.setattr(
+        cli.parallel,
+        "run_command",
+        lambda cmd, stream: pulled.append(cmd[-1]) or cli.parallel.CommandResult(0, ""),
+    )
+
+    result = _invoke(cli, "pull")
+    assert result.exit_code == 0
+    assert pulled == ["python@sha256:abc"]
+    assert "Base images: 1 present, 1 pulled, 0 failed" in result.output
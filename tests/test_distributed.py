@@ -0,0 +1,111 @@
+import json
+import os
+import stat
+import sys
+import textwrap
+
+import pytest
+
+from aladdin_project_tools import distributed, parallel
+
+# A stand-in for the docker CLI that keeps the images of several daemons in a JSON file, and logs
+# the image transfers between them.
+FAKE_DOCKER = textwrap.dedent(
+    """
+    import fcntl, json, os, sys
+
+    state_path = os.path.join(os.path.dirname(__file__), "state.json")
+    args = sys.argv[1:]
+    host = args[1] if args[0] == "--host" else "default"
+    args = args[2:] if args[0] == "--host" else args
+    loaded = sys.stdin.read().strip() if args[0] == "load" else None
+
+    with open(state_path, "r+") as state_file:
+        fcntl.flock(state_file, fcntl.LOCK_EX)
+        state = json.load(state_file)
+        images = state["images"].setdefault(host, [])
+        if args[:2] == ["image", "inspect"]:
+            found = [dict(Id=ref, RepoTags=[ref]) for ref in args[2:] if ref in images]
+            print(json.dumps(found))
+        elif args[0] == "save":
+            print(args[1])
+        elif args[0] == "load":
+            images.append(loaded)
+            state["transfers"].append([loaded, host])
+        state_file.seek(0)
+        state_file.truncate()
+        json.dump(state, state_file)
+    """
+)
+
+
+@pytest.fixture
+def docker(tmp_path, monkeypatch):
+    bin_path = tmp_path / "bin"
+    bin_path.mkdir()
+    docker_path = bin_path / "docker"
+    docker_path.write_text(f"#!{sys.executable}\n{FAKE_DOCKER}")
+    docker_path.chmod(docker_path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_path}{os.pathsep}{os.environ['PATH']}")
+
+    state_path = bin_path / "state.json"
+
+    def set_images(images):
+        state_path.write_text(json.dumps(dict(images=images, transfers=[])))
+
+    def get_state():
+        return json.loads(state_path.read_text())
+
+    return set_images, get_state
+
+
+def test_parse_hosts():
+    assert distributed.parse_hosts("ssh://a, ssh://b ssh://a") == ["ssh://a", "ssh://b"]
+
+
+def test_build_prefers_hosts_with_dependency_images(docker):
+    set_images, get_state = docker
+    # Only the second host has the image of the shared component, which isn't being rebuilt
+    set_images({"local": [], "ssh://b": ["shared"], "ssh://c": []})
+    built = []
+
+    def build_component(component, host):
+        built.append((component, host))
+        return parallel.CommandResult(0, "")
+
+    results, reports = distributed.build(
+        ["api", "web"],
+        {"api": ["shared"], "web": ["shared", "api"]},
+        ["local", "ssh://b", "ssh://c"],
+        lambda component: [component],
+        build_component,
+    )
+
+    assert all(result.ok and not result.value.returncode for result in results.values())
+    # Both builds go to the host holding the dependency images, so no dependency is copied
+    assert built == [("api", "ssh://b"), ("web", "ssh://b")]
+    # The built images are copied to the first host only
+    assert get_state()["transfers"] == [["api", "local"], ["web", "local"]]
+    assert [len(report.builds) for report in reports] == [0, 2, 0]
+    assert [report.transfers for report in reports] == [2, 0, 0]
+
+
+def test_build_copies_missing_dependencies_and_skips_failed_dependents(docker):
+    set_images, get_state = docker
+    set_images({"local": ["shared"], "ssh://b": []})
+
+    def build_component(component, host):
+        return parallel.CommandResult(1 if component == "api" else 0, "")
+
+    results, _ = distributed.build(
+        ["api", "web"],
+        {"api": ["shared"], "web": ["shared", "api"]},
+        ["ssh://b", "local"],
+        lambda component: [component],
+        build_component,
+    )
+
+    assert results["api"].value.returncode == 1
+    assert not results["web"].ok
+    # The api build went to the host with the shared image, so nothing was copied
+    assert get_state()["transfers"] == []
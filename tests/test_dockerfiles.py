@@ -0,0 +1,103 @@
+import io
+import os
+
+from aladdin_project_tools import baseimages, dockerfiles
+
+MULTISTAGE = """\
+# syntax=docker/dockerfile:1
+ARG BASE=python
+ARG VERSION
+from --platform=$BUILDPLATFORM ${BASE}:${VERSION:-3.8}-slim as build
+ARG PIP_INDEX=https://pypi.org/simple
+WORKDIR /build
+COPY requirements.txt \\
+# The sources are copied separately
+     setup.py ./
+COPY --from=wheels /wheels /wheels
+RUN <<EOF
+pip wheel .
+FROM not-an-instruction
+EOF
+USER builder
+
+FROM build AS test
+WORKDIR tests
+ADD https://example.com/data.json ./
+COPY ["fixtures/one", "fixtures/two", "./"]
+
+FROM scratch
+COPY --from=build /build/dist /dist
+FROM docker.io/library/${BASE}:3.9
+"""
+
+
+def test_multistage_dockerfiles_are_parsed():
+    dockerfile = dockerfiles.parse(io.StringIO(MULTISTAGE))
+    assert dockerfile.directives == {"syntax": "docker/dockerfile:1"}
+    assert dockerfile.args == {"BASE": "python", "VERSION": None}
+    assert [(stage.name, stage.base, stage.image) for stage in dockerfile.stages] == [
+        ("build", "python:3.8-slim", "python:3.8-slim"),
+        ("test", "build", None),
+        (None, "scratch", None),
+        (None, "docker.io/library/python:3.9", "docker.io/library/python:3.9"),
+    ]
+    build, test, _, final = dockerfile.stages
+    assert build.line == 4
+    assert build.args == {"PIP_INDEX": "https://pypi.org/simple"}
+    assert build.copy_sources == ("requirements.txt", "setup.py")
+    assert build.copy_from == ("wheels",)
+    assert (build.user, build.workdir) == ("builder", "/build")
+    assert test.copy_sources == ("fixtures/one", "fixtures/two")
+    assert (test.user, test.workdir) == ("builder", "/build/tests")
+    assert (dockerfile.user, dockerfile.workdir) == (None, None)
+
+    run = next(instruction for instruction in dockerfile.instructions if instruction.heredocs)
+    assert run.heredocs == ("pip wheel .\nFROM not-an-instruction\n",)
+    assert [instruction.keyword for instruction in dockerfile.instructions].count("FROM") == 4
+
+    assert baseimages.get_dockerfile_base_images(dockerfile) == ["python:3.8-slim", "python:3.9"]
+
+
+def test_escape_directive_changes_the_continuation_character():
+    dockerfile = dockerfiles.parse(
+        io.StringIO(
+            "# escape=`\n"
+            "FROM mcr.microsoft.com/windows/servercore:ltsc2022\n"
+            "WORKDIR C:\\app\n"
+            "RUN dir `\n"
+            "    C:\\app\n"
+            "# escape=\\\n"
+        )
+    )
+    assert dockerfile.directives == {"escape": "`"}
+    assert [instruction.arguments for instruction in dockerfile.instructions] == [
+        "mcr.microsoft.com/windows/servercore:ltsc2022",
+        "C:\\app",
+        "dir     C:\\app",
+    ]
+
+
+def test_dockerfiles_without_from_have_no_stages():
+    dockerfile = dockerfiles.parse(io.StringIO("RUN pip install -e .\nUSER root\n"))
+    assert not dockerfile.has_from
+    assert dockerfile.stages == ()
+    assert [instruction.keyword for instruction in dockerfile.instructions] == ["RUN", "USER"]
+
+
+def test_parsed_dockerfiles_are_reused_until_they_change(tmp_path, monkeypatch):
+    path = tmp_path / "Dockerfile"
+    path.write_text("FROM python:3.8-slim\n")
+    os.utime(path, (1000, 1000))
+    parsed = []
+    parse = dockerfiles.parse
+    monkeypatch.setattr(dockerfiles, "parse", lambda lines: parsed.append(1) or parse(lines))
+
+    assert dockerfiles.read(path).base_images == ["python:3.8-slim"]
+    assert dockerfiles.read(path) is dockerfiles.read(path)
+    assert len(parsed) == 1
+
+    path.write_text("FROM python:3.9-slim\n")
+    os.utime(path, (2000, 2000))
+    assert dockerfiles.read(path).base_images == ["python:3.9-slim"]
+    assert len(parsed) == 2
+    assert dockerfiles.read(tmp_path / "missing") is None
@@ -0,0 +1,77 @@
+import json
+import subprocess
+
+import pytest
+
+from aladdin_project_tools import doctor, images
+from aladdin_project_tools.project import Project
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "project"
+    (root / "components" / "api" / "data").mkdir(parents=True)
+    (root / "components" / "web").mkdir()
+    (root / "lamp.json").write_text(json.dumps({"name": "demo"}))
+    (root / "components" / ".dockerignore").write_text("api/data\n")
+    (root / "components" / "api" / "main.py").write_text("x" * 1000)
+    (root / "components" / "api" / "data" / "dump.sql").write_text("x" * 5000)
+    (root / "components" / "web" / "index.html").write_text("x" * 10)
+    return Project(root)
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    """A fake docker CLI using the vfs storage driver, without buildx."""
+    calls = []
+
+    def run(cmd, capture_output=False):
+        calls.append(cmd[1])
+        stdout = b""
+        returncode = 0
+        if cmd[1] == "info":
+            stdout = json.dumps({"Driver": "vfs", "ServerVersion": "24.0.7"}).encode()
+        elif cmd[1] == "buildx":
+            returncode = 1
+        return subprocess.CompletedProcess(cmd, returncode, stdout, b"")
+
+    monkeypatch.setattr(doctor.subprocess, "run", run)
+    monkeypatch.setattr(
+        images,
+        "inspect_images",
+        lambda refs: {ref: {"Id": ref} if ref == "demo-web:local" else None for ref in refs},
+    )
+    return calls
+
+
+def test_checks_are_ranked_by_how_much_of_a_bottleneck_they_are(project, docker, monkeypatch):
+    monkeypatch.setattr(doctor, "CONTEXT_THRESHOLD", 500)
+    checks = doctor.diagnose(project)
+
+    assert [(check.name, check.subject) for check in checks if check.is_bottleneck] == [
+        ("storage-driver", "vfs"),
+        ("buildkit", ""),
+        ("context-size", "api"),
+    ]
+    context = {check.subject: check.value for check in checks if check.name == "context-size"}
+    assert context == {"api": 1000, "web": 10}
+    assert "docker buildx is not installed" in checks[1].message
+    assert next(check for check in checks if check.name == "container-start").subject == (
+        "demo-web:local"
+    )
+    assert docker.count("run") == doctor.START_SAMPLES
+    assert json.loads(json.dumps([check.to_json() for check in checks]))[0]["is_bottleneck"]
+
+
+def test_an_unreachable_daemon_is_the_biggest_bottleneck(project, monkeypatch):
+    monkeypatch.setattr(
+        doctor.subprocess,
+        "run",
+        lambda cmd, capture_output=False: subprocess.CompletedProcess(
+            cmd, 1, b"", b"Cannot connect to the Docker daemon"
+        ),
+    )
+    checks = doctor.diagnose(project, ["web"])
+    assert checks[0].name == "docker-latency"
+    assert checks[0].score == doctor.FAILED_SCORE
+    assert sorted(check.name for check in checks[1:]) == ["cache-dir", "context-size", "disk-space"]
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from aladdin_project_tools import fingerprints
+
+
+@pytest.fixture
+def components_path(tmp_path):
+    path = tmp_path / "components"
+    for component in ("shared", "api"):
+        (path / component).mkdir(parents=True)
+        (path / component / "component.yaml").write_text(f"meta:\n  name: {component}\n")
+    (path / "shared" / "__pycache__").mkdir()
+    (path / "shared" / "__pycache__" / "module.pyc").write_text("bytecode")
+    (path / ".dockerignore").write_text("**/__pycache__\n**/*.log\n!api/keep.log\n")
+    # Old enough for the stat cache to trust
+    for directory, _, file_names in os.walk(path):
+        for name in file_names:
+            os.utime(os.path.join(directory, name), (1, 1))
+    return path
+
+
+def _fingerprint(components_path, **kwargs):
+    return fingerprints.fingerprint_components(
+        {"api": ["shared"], "shared": []}, components_path=components_path, **kwargs
+    )
+
+
+def test_ignore_rules():
+    rules = fingerprints.IgnoreRules(["# comment", "**/*.log", "!api/keep.log", "docs", "/a?c"])
+    assert rules.is_ignored("api/debug.log")
+    assert rules.is_ignored("api/logs/debug.log")
+    assert not rules.is_ignored("api/keep.log")
+    assert rules.is_ignored("docs/index.rst")
+    assert not rules.is_ignored("api/docs")
+    assert rules.is_ignored("abc")
+    assert not rules.is_ignored("abbc")
+    assert rules.has_exceptions
+
+
+def test_ignored_files_do_not_change_fingerprints(components_path):
+    before = _fingerprint(components_path)
+    assert before["shared"].files == 1
+
+    (components_path / "shared" / "__pycache__" / "other.pyc").write_text("bytecode")
+    (components_path / "api" / "debug.log").write_text("log")
+    assert _fingerprint(components_path) == before
+
+    (components_path / "api" / "keep.log").write_text("log")
+    assert _fingerprint(components_path)["api"] != before["api"]
+
+
+def test_changes_propagate_to_dependents(components_path):
+    before = _fingerprint(components_path)
+
+    (components_path / "shared" / "component.yaml").write_text("meta:\n  name: changed\n")
+    after = _fingerprint(components_path)
+    assert after["shared"].tree != before["shared"].tree
+    assert after["api"].tree == before["api"].tree
+    assert after["api"].fingerprint != before["api"].fingerprint
+
+    assert _fingerprint(components_path, components=["shared"]).keys() == {"shared"}
+
+
+def test_stat_cache_skips_unchanged_files(components_path, monkeypatch):
+    hashed = []
+    hash_file = fingerprints.hash_file
+    monkeypatch.setattr(
+        fingerprints, "hash_file", lambda path: hashed.append(path) or hash_file(path)
+    )
+
+    before = _fingerprint(components_path)
+    assert len(hashed) == 2
+    assert _fingerprint(components_path) == before
+    assert len(hashed) == 2
+
+    # Recently modified files are hashed every time
+    (components_path / "api" / "component.yaml").write_text("meta:\n  name: api\n  new: 1\n")
+    _fingerprint(components_path)
+    _fingerprint(components_path)
+    assert len(hashed) == 4
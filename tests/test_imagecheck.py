@@ -0,0 +1,80 @@
+import pytest
+
+from aladdin_project_tools import imagecheck, images
+
+STANDARD = {"meta": {"version": 1}, "language": {"name": "python", "version": "3.8"}}
+COMPATIBLE = {
+    "meta": {"version": 1},
+    "language": {"name": "python", "version": "3.9"},
+    "image": {
+        "base": "example/base:1",
+        "user": {"name": "app", "group": "staff", "home": "/home/app"},
+        "workdir": {"path": "/srv"},
+    },
+}
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    inspected = {
+        "demo-api:local": {"Config": {"User": "aladdin-user", "WorkingDir": "/code"}},
+        "demo-web:local": {"Config": {"User": "app", "WorkingDir": "/app"}},
+        "python:3.8-slim": {
+            "Id": "sha256:python",
+            "Config": {"Env": ["PYTHON_VERSION=3.8.12"]},
+        },
+        "example/base:1": {"Id": "sha256:base", "Config": {}},
+    }
+    probes = []
+
+    def inspect_images(refs, host=None):
+        return {ref: inspected.get(ref) for ref in refs}
+
+    def probe(image, users=()):
+        probes.append((image, list(users)))
+        return {"python_version": "3.10.1", "users": {"app": ["app", "/home/app"]}}
+
+    monkeypatch.setattr(images, "inspect_images", inspect_images)
+    monkeypatch.setattr(imagecheck, "probe", probe)
+    return inspected, probes
+
+
+def test_mismatches_are_reported(docker):
+    problems = imagecheck.check_images(
+        {"api": STANDARD, "web": COMPATIBLE, "legacy": {}},
+        {"api": "demo-api:local", "web": "demo-web:local", "legacy": "demo-legacy:local"},
+    )
+    assert problems == [
+        ("web", "image.workdir.path is /srv but the working directory of demo-web:local is /app"),
+        ("web", "language.version is 3.9 but demo-web:local has Python 3.10.1"),
+        (
+            "web",
+            "image.user.group is staff but the group of app in the base image "
+            "example/base:1 is app",
+        ),
+    ]
+
+
+def test_base_images_are_probed_once_and_cached_by_id(docker):
+    inspected, probes = docker
+    configs = {"web": COMPATIBLE, "worker": COMPATIBLE, "api": STANDARD}
+    refs = {"web": "demo-web:local", "worker": "demo-web:local", "api": "demo-api:local"}
+
+    first = imagecheck.check_images(configs, refs)
+    assert probes == [("example/base:1", ["app"])]
+
+    assert imagecheck.check_images(configs, refs) == first
+    assert len(probes) == 1
+
+    inspected["example/base:1"]["Id"] = "sha256:rebuilt"
+    imagecheck.check_images(configs, refs)
+    assert len(probes) == 2
+
+
+def test_missing_images_are_skipped(docker):
+    inspected, probes = docker
+    del inspected["example/base:1"]
+    assert imagecheck.check_images(
+        {"web": COMPATIBLE, "api": STANDARD}, {"web": "demo-web:local", "api": "demo-gone:local"}
+    ) == [("web", "image.workdir.path is /srv but the working directory of demo-web:local is /app")]
+    assert probes == []
@@ -0,0 +1,110 @@
+import json
+import os
+
+import pytest
+
+from aladdin_project_tools import images, imagewatch, project
+
+
+def _event(action, image_id, name=None):
+    return json.dumps(
+        {
+            "Type": "image",
+            "Action": action,
+            "Actor": {"ID": image_id, "Attributes": {"name": name} if name else {}},
+        }
+    )
+
+
+def _info(image_id, *tags):
+    return {"Id": image_id, "RepoTags": list(tags)}
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    """A fake docker daemon, whose image inspections are counted."""
+    state = {
+        "demo-api:local": _info("sha256:api1", "demo-api:local"),
+        "demo-web:local": _info("sha256:web1", "demo-web:local"),
+        "python:3.8-slim": _info("sha256:py38", "python:3.8-slim"),
+    }
+    inspected = []
+
+    def inspect(refs, host):
+        inspected.extend(refs)
+        return {ref: state.get(ref) for ref in refs}
+
+    monkeypatch.setattr(images, "_inspect_images", inspect)
+    return state, inspected
+
+
+@pytest.fixture
+def watcher():
+    """Pretend that this process is the watcher."""
+    imagewatch._write_cache({"watcher": os.getpid(), "generation": 0, "images": {}})
+
+
+def test_images_are_inspected_every_time_without_a_watcher(docker):
+    state, inspected = docker
+    images.inspect_images(["demo-api:local"])
+    images.inspect_images(["demo-api:local"])
+    assert inspected == ["demo-api:local", "demo-api:local"]
+
+
+def test_cached_images_are_invalidated_by_events(docker, watcher):
+    state, inspected = docker
+    refs = ["demo-api:local", "demo-web:local", "python:3.8-slim", "demo-new:local"]
+    assert images.inspect_images(refs)["demo-new:local"] is None
+    assert images.inspect_images(refs)["demo-api:local"]["Id"] == "sha256:api1"
+    assert len(inspected) == 4
+
+    # A rebuild outside the tools moves the tag to a new image, and a new image is pulled
+    state["demo-api:local"] = _info("sha256:api2", "demo-api:local")
+    state["demo-new:local"] = _info("sha256:new1", "demo-new:local")
+    applied = imagewatch.listen(
+        [
+            _event("tag", "sha256:api2", "demo-api:local"),
+            "not json",
+            _event("push", "sha256:web1", "demo-web:local"),
+            _event("pull", "demo-new:local"),
+        ]
+    )
+    assert applied == 2
+    assert images.inspect_images(refs)["demo-api:local"]["Id"] == "sha256:api2"
+    assert inspected[4:] == ["demo-api:local", "demo-new:local"]
+
+    del state["python:3.8-slim"]
+    imagewatch.listen([_event("delete", "sha256:py38")])
+    assert images.inspect_images(refs)["python:3.8-slim"] is None
+    assert inspected[6:] == ["python:3.8-slim"]
+
+
+def test_inspections_from_before_an_event_are_not_stored(docker, watcher):
+    generation, cached = imagewatch.lookup(["demo-api:local"])
+    assert cached == {}
+    imagewatch.listen([_event("untag", "sha256:api1", "demo-api:local")])
+    assert not imagewatch.store(generation, {"demo-api:local": _info("sha256:api1")})
+    assert imagewatch.lookup(["demo-api:local"])[1] == {}
+
+
+def test_images_are_invalidated_as_soon_as_a_build_tags_them(docker, watcher, monkeypatch):
+    state, inspected = docker
+    refs = ["demo-api:local", "demo-web:local"]
+    images.inspect_images(refs)
+
+    def build(cmd, stdin=None, prefix=None):
+        state["demo-api:local"] = _info("sha256:api2", "demo-api:local")
+
+    # The watcher hasn't applied the build's tag event yet
+    monkeypatch.setattr(project, "check_call", build)
+    project.docker_build("demo-api:local")
+    assert images.inspect_images(refs)["demo-api:local"]["Id"] == "sha256:api2"
+    assert inspected[2:] == ["demo-api:local"]
+
+
+def test_cached_images_are_ignored_once_the_watcher_exits(docker, watcher, monkeypatch):
+    state, inspected = docker
+    images.inspect_images(["demo-api:local"])
+    monkeypatch.setattr(imagewatch.admission, "is_running", lambda pid: False)
+    images.inspect_images(["demo-api:local"])
+    assert inspected == ["demo-api:local", "demo-api:local"]
@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from aladdin_project_tools import images, locks
+
+
+def _try_lock(*names, shared=False):
+    """Acquire locks in another thread, and report whether it got them within a second."""
+    acquired = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with locks.locked(*names, shared=shared):
+            acquired.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold, daemon=True)
+    thread.start()
+    got_them = acquired.wait(1)
+    return got_them, acquired, release, thread
+
+
+def test_exclusive_locks_wait_for_each_other():
+    with locks.components_locked(["api", "shared"]):
+        got_them, acquired, release, thread = _try_lock("component/shared")
+        assert not got_them
+        # Other locks are unaffected
+        got_other, _, release_other, _ = _try_lock("component/web")
+        assert got_other
+        release_other.set()
+
+    assert acquired.wait(5)
+    release.set()
+    thread.join()
+
+
+def test_shared_locks_only_wait_for_exclusive_ones():
+    with locks.cache_locked("buildkit", shared=True):
+        got_them, _, release, thread = _try_lock("cache/buildkit", shared=True)
+        assert got_them
+        release.set()
+        thread.join()
+
+        got_exclusive, _, release, _ = _try_lock("cache/buildkit")
+        assert not got_exclusive
+        release.set()
+
+
+def test_atomic_write_leaves_the_file_untouched_on_failure(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text("old")
+
+    with pytest.raises(RuntimeError):
+        with locks.atomic_write(path) as manifest_file:
+            manifest_file.write("partial")
+            raise RuntimeError()
+    assert path.read_text() == "old"
+
+    with locks.atomic_write(path) as manifest_file:
+        manifest_file.write("new")
+    assert path.read_text() == "new"
+    assert [child.name for child in tmp_path.iterdir()] == ["manifest.json"]
+
+
+def test_temporary_tags_are_unique():
+    tag = images.get_temporary_tag("python:3.8-slim", "extractor")
+    assert tag.startswith("python:3.8-slim-extractor-")
+    assert tag != images.get_temporary_tag("python:3.8-slim", "extractor")
+    tag = images.get_temporary_tag("registry:5000/base", "extractor")
+    assert tag.startswith("registry:5000/base:latest-extractor-")
@@ -0,0 +1,87 @@
+import io
+import json
+import logging
+import os
+import sys
+
+import pytest
+
+from aladdin_project_tools import logs, parallel
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    root = logging.getLogger()
+    monkeypatch.setattr(root, "handlers", [])
+    monkeypatch.setattr(root, "level", root.level)
+    monkeypatch.setattr(logs, "_structured", False)
+    stream = io.StringIO()
+    logs.install("INFO", stream)
+    yield stream
+    root.handlers[0].close()
+
+
+def _records(stream):
+    logging.getLogger().handlers[0].flush()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_carry_context_and_extra_fields(stream):
+    logger = logging.getLogger("build")
+    logger.debug("Hidden %s", object())
+    with logs.context(phase="build", component="api"):
+        logger.info("Built %s", "api", extra={"duration": 1.5})
+        with logs.context(component="shared"):
+            logger.info("Built %s", "shared", extra={"duration": 0.5})
+        logger.info("Done")
+
+    records = _records(stream)
+    assert [record["message"] for record in records] == ["Built api", "Built shared", "Done"]
+    assert records[0]["component"] == "api"
+    assert records[0]["duration"] == 1.5
+    assert records[1]["component"] == "shared"
+    assert records[2]["level"] == "INFO"
+    assert records[2]["logger"] == "build"
+    assert records[2]["phase"] == "build"
+    assert "duration" not in records[2]
+
+
+def test_subprocess_output_is_logged_with_the_task_context(stream):
+    def greet(name):
+        with logs.context(component=name):
+            return parallel.run_command(
+                ["env", "GREETING=hi", sys.executable, "-c", f"print('{name}')"]
+            )
+
+    with logs.context(phase="exec"):
+        results = parallel.run_tasks(
+            {name: (lambda name=name: greet(name)) for name in ("api", "web")}, jobs=2
+        )
+
+    assert all(result.ok and not result.value.returncode for result in results.values())
+    records = sorted(_records(stream), key=lambda record: record["message"])
+    assert [(record["message"], record["component"]) for record in records] == [
+        ("api", "api"),
+        ("web", "web"),
+    ]
+    assert {record["phase"] for record in records} == {"exec"}
+    assert {record["subprocess"] for record in records} == {os.path.basename(sys.executable)}
+
+
+def test_records_are_written_in_batches():
+    stream = io.StringIO()
+    handler = logs.BufferedStreamHandler(stream, capacity=3, interval=60)
+    handler.setFormatter(logs.JsonFormatter())
+    logger = logging.Logger("batched")
+    logger.addHandler(handler)
+
+    logger.info("one")
+    logger.info("two")
+    assert stream.getvalue() == ""
+    logger.info("three")
+    assert len(stream.getvalue().splitlines()) == 3
+
+    logger.info("four")
+    logger.warning("five")
+    assert len(stream.getvalue().splitlines()) == 5
+    handler.close()
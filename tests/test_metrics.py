@@ -0,0 +1,35 @@
+import pytest
+
+from aladdin_project_tools import metrics
+
+
+def test_percentile():
+    assert metrics.percentile([], 50) is None
+    assert metrics.percentile([4, 1, 3, 2], 50) == 2.5
+    assert metrics.percentile([1, 2, 3, 4, 5], 90) == pytest.approx(4.6)
+
+
+def test_stats_and_estimates_only_use_builds_of_a_component_alone():
+    metrics.record(
+        [
+            metrics.BuildRecord("build", "api", started, 10.0 + started, True)
+            for started in range(10)
+        ]
+        + [
+            metrics.BuildRecord(
+                "build", "api", 20, 100.0, True, batch=2, reused_layers=3, layers=4
+            ),
+            metrics.BuildRecord("build", "web", 20, 100.0, True, batch=2, image_size=1000),
+            metrics.BuildRecord("edit", "web", 30, 5.0, False),
+        ]
+    )
+
+    api, web = metrics.get_stats(metrics.get_records())
+    assert (api.component, api.builds, api.failures) == ("api", 11, 0)
+    assert (api.p50, api.slowest, api.cache_hit_ratio) == (14.5, 19.0, 0.75)
+    # The median of the latest five builds (17s) against the five before them (12s)
+    assert api.trend == pytest.approx(100.0 * 5 / 12)
+    assert (web.builds, web.failures, web.p50, web.image_size) == (2, 1, None, 1000)
+
+    assert metrics.estimate_durations(["api", "web"]) == {"api": 14.5}
+    assert [record.command for record in metrics.get_records(command="edit")] == ["edit"]
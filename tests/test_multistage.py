@@ -0,0 +1,171 @@
+import pathlib
+import re
+
+from aladdin_project_tools import multistage, prune
+
+
+def _get_stages(dockerfile):
+    """The instructions of each stage of a Dockerfile, by stage name."""
+    stages = {}
+    for line in dockerfile.splitlines():
+        match = re.match(r"FROM (\S+) AS (\S+)$", line)
+        if match:
+            stage = stages.setdefault(match.group(2), [])
+        if line and not line.startswith("#") and stages:
+            stage.append(line)
+    return stages
+
+
+def test_stage_names():
+    assert multistage.get_stage_name("API") == "api"
+    assert multistage.get_stage_name("api", "packages") == "api--packages"
+    assert multistage.get_workdir({}) == "/code"
+    assert multistage.get_workdir({"image": {"workdir": {"path": "/srv"}}}) == "/srv"
+
+
+def test_dependencies_are_copied_from_their_own_stages(tmp_path):
+    components_path = tmp_path / "components"
+    for component in ["shared", "api", "legacy"]:
+        (components_path / component).mkdir(parents=True)
+    (components_path / "shared" / "pyproject.toml").touch()
+    (components_path / "api" / "pyproject.toml").touch()
+    (components_path / "api" / "Dockerfile").write_text("EXPOSE 8080\n")
+    configs = {
+        "shared": {"image": {"packages": ["curl"]}},
+        "api": {
+            "image": {"base": "jupyter/base-notebook:abc", "user": {"name": "jovyan"}},
+            "language": {"spec": {"location": "/opt/conda"}},
+        },
+    }
+
+    stages = _get_stages(
+        multistage.generate_dockerfile(
+            configs,
+            {"api": ["legacy", "shared"]},
+            ["shared", "api"],
+            components_path,
+            wheelhouse=["api"],
+        )
+    )
+
+    assert list(stages) == [
+        "shared--base",
+        "shared--packages",
+        "shared",
+        "shared--editor",
+        "api--base",
+        "shared--packages-for-api",
+        "api--packages",
+        "api",
+        "api--editor",
+    ]
+    assert stages["shared--base"][0] == "FROM python:3.8-slim AS shared--base"
+    assert "--no-cache-dir" in stages["shared--packages"][-1]
+    assert "from=wheelhouse" in stages["api--packages"][-1]
+    # api's base image differs from shared's, so shared's packages are installed on api's
+    assert stages["shared--packages-for-api"][0] == "FROM api--base AS shared--packages-for-api"
+    assert "--no-cache-dir" in stages["shared--packages-for-api"][-1]
+    assert stages["api"] == [
+        "FROM api--base AS api",
+        "COPY --from=shared--packages-for-api /install /opt/conda",
+        "COPY --from=api--packages /install /opt/conda",
+        "COPY --chown=jovyan legacy /code/components/legacy",
+        "COPY --from=shared --chown=jovyan /code/components/shared /code/components/shared",
+        "COPY --chown=jovyan api /code/components/api",
+        "EXPOSE 8080",
+        "USER jovyan",
+    ]
+    assert stages["api--editor"] == [
+        "FROM api AS api--editor",
+        "ENTRYPOINT []",
+        'CMD ["/bin/bash"]',
+    ]
+
+
+def test_dependency_packages_are_installed_for_each_python_version(tmp_path):
+    for component in ["shared", "api", "web", "jobs"]:
+        (tmp_path / component).mkdir()
+        (tmp_path / component / "pyproject.toml").touch()
+    configs = {
+        "shared": {},
+        "api": {"language": {"version": "3.11"}},
+        "web": {"language": {"version": "3.11"}},
+        "jobs": {"language": {"version": "3.8"}},
+    }
+
+    stages = _get_stages(
+        multistage.generate_dockerfile(
+            configs,
+            {"api": ["shared"], "web": ["shared"], "jobs": ["shared"]},
+            ["shared", "api", "web", "jobs"],
+            tmp_path,
+        )
+    )
+
+    assert [name for name in stages if name.startswith("shared--packages")] == [
+        "shared--packages",
+        "shared--packages-for-api",
+    ]
+    assert stages["api--base"][0] == "FROM python:3.11-slim AS api--base"
+    # Components on the same python version share the dependency's packages
+    for component, packages_stage in [
+        ("api", "shared--packages-for-api"),
+        ("web", "shared--packages-for-api"),
+        ("jobs", "shared--packages"),
+    ]:
+        assert stages[component][1:3] == [
+            f"COPY --from={packages_stage} /install /usr/local",
+            f"COPY --from={component}--packages /install /usr/local",
+        ]
+
+
+def test_package_manager_caches_are_mounted_for_a_project(tmp_path):
+    (tmp_path / "api").mkdir()
+    (tmp_path / "api" / "pyproject.toml").touch()
+    config = {"image": {"packages": ["curl"]}}
+
+    stages = _get_stages(multistage.generate_dockerfile({"api": config}, {}, ["api"], tmp_path))
+    assert not any("--mount" in line for line in stages["api--base"] + stages["api--packages"])
+
+    stages = _get_stages(
+        multistage.generate_dockerfile({"api": config}, {}, ["api"], tmp_path, project_name="demo")
+    )
+    assert "--mount=type=cache" in stages["api--base"][2]
+    assert "rm -rf /var/lib/apt/lists" not in stages["api--base"][2]
+    assert "--mount=type=cache" in stages["api--packages"][-1]
+
+
+def test_bake_targets_build_from_exported_caches(tmp_path):
+    cache_dir = tmp_path / "cache"
+    (cache_dir / "api").mkdir(parents=True)
+    (cache_dir / "api" / "index.json").write_text("{}")
+    (cache_dir / "web").mkdir()
+    dockerfile = tmp_path / "Dockerfile"
+
+    definition = multistage.get_bake_definition(
+        "demo",
+        ["api", "web"],
+        dockerfile,
+        tag="abc",
+        contexts={"wheelhouse": "/wheelhouse"},
+        cache_dir=cache_dir,
+    )
+
+    assert definition["group"]["default"]["targets"] == ["api", "api--editor", "web", "web--editor"]
+    targets = definition["target"]
+    assert targets["api"] == {
+        "context": "components",
+        "dockerfile": dockerfile.resolve().as_posix(),
+        "target": "api",
+        "tags": ["demo-api:abc"],
+        "labels": prune.get_labels("demo", "api", "abc"),
+        "contexts": {"wheelhouse": "/wheelhouse"},
+        "cache-from": [f"type=local,src={(cache_dir / 'api').resolve().as_posix()}"],
+    }
+    assert targets["api--editor"]["tags"] == ["demo-api:editor"]
+    assert "cache-from" not in targets["api--editor"]
+    assert "cache-from" not in targets["web"]
+
+    definition = multistage.get_bake_definition("demo", ["api"], pathlib.Path("Dockerfile"))
+    assert "contexts" not in definition["target"]["api"]
+    assert "cache-from" not in definition["target"]["api"]
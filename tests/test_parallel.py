@@ -0,0 +1,93 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from aladdin_project_tools import buildlogs, parallel
+
+
+def test_tasks_start_once_their_dependencies_finish():
+    events = []
+    lock = threading.Lock()
+
+    def task(name, duration=0.0):
+        def run():
+            with lock:
+                events.append(f"start {name}")
+            time.sleep(duration)
+            with lock:
+                events.append(f"end {name}")
+            if name == "shared":
+                raise RuntimeError("shared failed")
+            return name
+
+        return run
+
+    results = parallel.run_tasks(
+        {
+            "shared": task("shared", 0.05),
+            "api": task("api"),
+            "web": task("web"),
+            "tools": task("tools", 0.05),
+        },
+        jobs=4,
+        dependencies={"api": ["shared", "missing"], "web": ["api"]},
+    )
+
+    assert events.index("end shared") < events.index("start api")
+    assert events.index("end api") < events.index("start web")
+    assert events.index("start tools") < events.index("end shared")
+    # A failure is recorded rather than stopping its dependents
+    assert str(results["shared"].error) == "shared failed"
+    assert [results[name].value for name in ["api", "web", "tools"]] == ["api", "web", "tools"]
+
+
+def test_ready_tasks_start_in_order_of_priority():
+    order = []
+    parallel.run_tasks(
+        {name: (lambda name=name: order.append(name)) for name in ["a", "b", "c"]},
+        jobs=1,
+        priorities={"b": 10.0, "c": 5.0},
+    )
+    assert order == ["b", "c", "a"]
+
+
+def test_dependency_cycles_are_reported():
+    try:
+        parallel.run_tasks(
+            {"a": lambda: None, "b": lambda: None}, jobs=2, dependencies={"a": ["b"], "b": ["a"]}
+        )
+    except RuntimeError as e:
+        assert e.args == ("Cycles found in task dependencies", ["a", "b"])
+    else:
+        raise AssertionError("The cycle was not reported")
+
+
+@pytest.mark.parametrize("terminal", [False, True])
+def test_attached_commands_are_recorded_without_keeping_their_output(
+    capsys, monkeypatch, terminal
+):
+    if terminal:
+        pytest.importorskip("pty")
+        monkeypatch.setattr(sys.stdout, "isatty", lambda: True)
+    script = (
+        "import sys; print('tty' if sys.stdout.isatty() else 'pipe'); "
+        "print('10%\\r50%\\r100%'); print('ERROR: failed', file=sys.stderr); "
+        "sys.stdout.write('no newline'); sys.exit(2)"
+    )
+    with buildlogs.recording(["api"]):
+        returncode = parallel.run_attached([sys.executable, "-c", script])
+
+    assert returncode == 2
+    output = capsys.readouterr().out.replace("\r\n", "\n")
+    assert output.startswith("tty\n" if terminal else "pipe\n")
+    assert "10%\r50%\r100%\n" in output
+    lines = [line for _, line in buildlogs.read_lines(buildlogs.get_run("api"))]
+    assert lines[1:] == [
+        "tty" if terminal else "pipe",
+        "100%",
+        "ERROR: failed",
+        "no newline",
+        f"# {sys.executable} -c {script} exited with 2",
+    ]
@@ -0,0 +1,99 @@
+import json
+import os
+import subprocess
+import time
+
+import pytest
+
+from aladdin_project_tools import pool
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    """A fake docker CLI, with the demo-api:local image and any containers added to it."""
+    state = {"image": "sha256:api2", "containers": {}, "calls": [], "on_ps": None}
+
+    def run(cmd, capture_output=False, check=False):
+        state["calls"].append(cmd[1:3])
+        stdout = ""
+        if cmd[1] == "ps":
+            if state["on_ps"]:
+                state["on_ps"]()
+            stdout = "".join(f"{name}\tdemo-api:local\tUp\n" for name in state["containers"])
+        elif cmd[1] == "inspect":
+            found = [{"Id": state["image"], "RepoTags": ["demo-api:local"], "Config": {}}]
+            if cmd[3] in state["containers"]:
+                found.append(
+                    {
+                        "Image": state["containers"][cmd[3]],
+                        "State": {"Running": True},
+                        "Config": {"Labels": {pool.WORKDIR_LABEL: "/code"}},
+                    }
+                )
+            stdout = json.dumps(found)
+        elif cmd[1] == "rm":
+            for name in cmd[3:]:
+                del state["containers"][name]
+        elif cmd[1] == "run":
+            name = cmd[cmd.index("--name") + 1]
+            # The use is recorded before the container exists, for concurrent reaps to see
+            assert pool._get_idle(name) is not None
+            state["containers"][name] = state["image"]
+        return subprocess.CompletedProcess(cmd, 0, stdout.encode(), b"")
+
+    monkeypatch.setattr(pool.subprocess, "run", run)
+    return state
+
+
+def _stamp(name, age):
+    path = pool._get_stamp_path(name)
+    path.touch()
+    os.utime(path, (time.time() - age, time.time() - age))
+
+
+def test_only_this_checkouts_idle_containers_are_reaped(docker):
+    name = pool.get_container_name("demo", "api", "local")
+    idle, busy, unknown = name, name.replace("-api-", "-web-"), name.replace("-api-", "-db-")
+    other_checkout = name.replace(pool._get_checkout(), "0123abcd")
+    for container in [idle, busy, unknown, other_checkout]:
+        docker["containers"][container] = "sha256:api2"
+    _stamp(idle, 3600)
+    _stamp(busy, 10)
+    _stamp(other_checkout, 3600)
+
+    assert [container["name"] for container in pool.list_containers("demo")] == [
+        idle,
+        busy,
+        unknown,
+    ]
+    assert pool.reap("demo", idle_timeout=60) == [idle]
+    assert sorted(docker["containers"]) == sorted([busy, unknown, other_checkout])
+    assert not pool._get_stamp_path(idle).exists()
+
+    assert sorted(pool.reap("demo", idle_timeout=0)) == sorted([busy, unknown])
+    assert list(docker["containers"]) == [other_checkout]
+
+
+def test_containers_acquired_while_reaping_are_kept(docker):
+    name = pool.get_container_name("demo", "api", "local")
+    docker["containers"][name] = "sha256:api2"
+    _stamp(name, 3600)
+    # Another thread acquires the container right after the reap lists it
+    docker["on_ps"] = lambda: pool._touch(name)
+
+    assert pool.reap("demo", idle_timeout=60) == []
+    assert name in docker["containers"]
+
+
+def test_containers_from_an_outdated_image_are_recycled(docker, tmp_path):
+    name = pool.get_container_name("demo", "api", "local")
+    docker["containers"][name] = "sha256:api1"
+
+    container = pool.acquire("demo", "api", "local", str(tmp_path))
+    assert container.name == name
+    assert docker["containers"][name] == "sha256:api2"
+    assert [call[0] for call in docker["calls"]] == ["inspect", "rm", "run"]
+
+    docker["calls"].clear()
+    assert pool.acquire("demo", "api", "local", str(tmp_path)).workdir.as_posix() == "/code"
+    assert docker["calls"] == [["inspect", "demo-api:local"]]
@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from aladdin_project_tools import images, prebuild
+from aladdin_project_tools.project import Project
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "project"
+    (root / "components").mkdir(parents=True)
+    (root / "lamp.json").write_text(json.dumps({"name": "demo"}))
+    for component in ("api", "web", "worker"):
+        (root / "components" / component).mkdir()
+        (root / "components" / component / "component.yaml").write_text(
+            "meta:\n  version: 1\nlanguage:\n  name: python\n"
+        )
+    (root / "components" / "legacy").mkdir()
+    (root / "components" / "legacy" / "Dockerfile").write_text("FROM python:3.8-slim\n")
+    return Project(root)
+
+
+def test_missing_and_outdated_editor_images_are_found(project, monkeypatch):
+    inspected = {
+        "demo-api:local": {"Created": "2026-01-02T00:00:00Z"},
+        "demo-api:editor": {"Created": "2026-01-01T00:00:00Z"},
+        "demo-web:local": {"Created": "2026-01-01T00:00:00Z"},
+        "demo-web:editor": {"Created": "2026-01-01T00:00:01Z"},
+    }
+    monkeypatch.setattr(
+        images, "inspect_images", lambda refs: {ref: inspected.get(ref) for ref in refs}
+    )
+    assert prebuild.get_outdated(project, project.components) == ["api", "worker"]
+
+
+def test_queued_builds_are_not_queued_again(project, monkeypatch):
+    class Process:
+        pid = os.getpid()
+
+    started = []
+    monkeypatch.setattr(
+        prebuild.subprocess, "Popen", lambda cmd, **kwargs: started.append(cmd) or Process()
+    )
+    assert prebuild.start(project, ["api", "web"]) == ["api", "web"]
+    assert prebuild.start(project, ["web", "worker"]) == ["worker"]
+    assert [cmd[3:] for cmd in started] == [["api", "web"], ["worker"]]
+
+    built = []
+    monkeypatch.setattr(prebuild, "get_outdated", lambda project, components: ["api"])
+    monkeypatch.setattr(project, "build_editor", lambda component, budget: built.append(component))
+    assert prebuild.run(project, ["api", "web", "worker"]) == {"api": True}
+    assert built == ["api"]
+    assert not prebuild.wait("api")
+    assert prebuild.start(project, ["api"]) == ["api"]
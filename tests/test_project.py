@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+from aladdin_project_tools import images, parallel
+from aladdin_project_tools import project as project_module
+from aladdin_project_tools.project import Problem, Project
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "project"
+    (root / "components").mkdir(parents=True)
+    (root / "lamp.json").write_text(json.dumps({"name": "demo"}))
+    for component, dependencies in (("shared", []), ("api", ["shared"]), ("web", ["api"])):
+        (root / "components" / component).mkdir()
+        (root / "components" / component / "component.yaml").write_text(
+            "meta:\n  version: 1\nlanguage:\n  name: python\n"
+            f"dependencies: {json.dumps(dependencies)}\n"
+        )
+    (root / "components" / "legacy").mkdir()
+    (root / "components" / "legacy" / "Dockerfile").write_text("FROM python:3.8-slim\n")
+    return Project(root)
+
+
+def test_graph_and_build_order(project):
+    assert project.name == "demo"
+    assert project.components == ["api", "legacy", "shared", "web"]
+    assert project.get_component_type("legacy") == "traditional"
+    assert project.get_component_type("api") == "standard"
+    assert project.get_dependents("shared") == ["api", "web"]
+    assert project.get_build_order(["web"])[1] == ["shared", "api", "web"]
+    assert project.get_images(["api"], "editor") == {"api": "demo-api:editor"}
+
+
+def test_configs_are_reread_when_changed(project):
+    config = project.get_config("api")
+    config["dependencies"].append("legacy")
+    assert project.get_config("api")["dependencies"] == ["shared"]
+
+    config_path = project.components_path / "api" / "component.yaml"
+    config_path.write_text(config_path.read_text().replace('["shared"]', "[]"))
+    os.utime(config_path, ns=(0, 0))
+    assert project.get_config("api")["dependencies"] == []
+    assert project.get_dependents("shared") == []
+
+
+def test_validate_reports_every_problem(project):
+    assert project.validate() == []
+
+    (project.components_path / "api" / "Dockerfile").write_text("FROM python:3.8-slim\n")
+    (project.components_path / "legacy" / "Dockerfile").write_text("RUN true\n")
+    (project.components_path / "empty").mkdir()
+    problems = project.validate()
+    assert [problem.component for problem in problems] == ["api", "empty", "legacy"]
+    assert problems[1] == Problem(
+        "empty", "Component 'empty' must provide either component.yaml or Dockerfile"
+    )
+
+
+def test_the_last_native_build_is_replayed_only_while_unchanged(project):
+    assert project.get_last_native_build() == (None, [])
+
+    definition = {"target": {"api": {"tags": ["demo-api:local"]}}}
+    project_module._write_last_native_build(
+        json.dumps(definition), project._get_source_fingerprints(["shared", "api"])
+    )
+    assert project.get_last_native_build() == (definition, [])
+
+    (project.components_path / "shared" / "module.py").write_text("VALUE = 1\n")
+    assert project.get_last_native_build() == (definition, ["api", "shared"])
+
+
+def test_aladdin_builds_without_a_prefix_are_attached_to_the_terminal(project, monkeypatch):
+    monkeypatch.setattr(images, "inspect_images", lambda refs, host=None: dict.fromkeys(refs))
+    attached = []
+    monkeypatch.setattr(parallel, "run_attached", lambda cmd, env, cwd: attached.append(cmd) or 0)
+
+    assert project.build(["api"]).succeeded
+    assert attached == [["aladdin", "build", "api"]]
@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+from aladdin_project_tools import images, prune
+from aladdin_project_tools.cache import get_cache_dir
+
+OLD = "2026-01-01T00:00:00.000000000Z"
+EXITED_PID = 2 ** 22 + 1
+TEMPORARY_TAG = f"3.8-slim-extractor-{EXITED_PID}-1767225600-0123abcd"
+
+
+def _image(image_id, created, labels=None, parent=""):
+    return {
+        "Id": f"sha256:{image_id}",
+        "Created": created,
+        "Parent": parent,
+        "Config": {"Labels": labels},
+    }
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    rows = [
+        ("aaaaaaaaaaa1", "demo-api", "local", 0, 100),
+        ("aaaaaaaaaaa2", "<none>", "<none>", 0, 200),
+        ("aaaaaaaaaaa3", "<none>", "<none>", 0, 300),
+        ("aaaaaaaaaaa4", "<none>", "<none>", 1, 400),
+        ("bbbbbbbbbbb1", "demo-api", "editor", 0, 10),
+        ("ccccccccccc1", "<none>", "<none>", 0, 1000),
+        ("ddddddddddd1", "python", TEMPORARY_TAG, 0, 0),
+        ("eeeeeeeeeee1", "other", "latest", 0, 5000),
+        ("fffffffffff1", "demo-web", "local", 0, 20),
+        ("fffffffffff2", "<none>", "<none>", 0, 50),
+    ]
+    labels = {
+        "aaaaaaaaaaa1": prune.get_labels("demo", "api", "local"),
+        "aaaaaaaaaaa2": prune.get_labels("demo", "api", "local"),
+        "aaaaaaaaaaa3": prune.get_labels("demo", "api", "local"),
+        "aaaaaaaaaaa4": prune.get_labels("demo", "api", "local"),
+        "bbbbbbbbbbb1": prune.get_labels("demo", "api", "editor"),
+        "ccccccccccc1": prune.get_labels("other", "api", "local"),
+    }
+    created = {
+        "aaaaaaaaaaa1": "2026-01-04",
+        "aaaaaaaaaaa2": "2026-01-03",
+        "fffffffffff1": "2026-01-05",
+    }
+    inspected = {
+        image_id: _image(image_id, created.get(image_id, OLD), labels.get(image_id))
+        for image_id, *_ in rows
+        if image_id != "eeeeeeeeeee1"
+    }
+    monkeypatch.setattr(
+        images,
+        "get_disk_usage",
+        lambda: [
+            dict(
+                id=image_id,
+                repository=repository,
+                tag=tag,
+                containers=containers,
+                size=size,
+                unique_size=size,
+            )
+            for image_id, repository, tag, containers, size in rows
+        ],
+    )
+    monkeypatch.setattr(
+        images, "inspect_images", lambda refs: {ref: inspected.get(ref) for ref in refs}
+    )
+    return inspected
+
+
+def test_stale_images_are_found(docker):
+    plan = prune.plan("demo", ["api", "web"], keep=2)
+    assert [(image.id, image.component, image.tag) for image in plan.images] == [
+        ("aaaaaaaaaaa3", "api", "local"),
+        ("ddddddddddd1", "", ""),
+    ]
+    assert plan.images[0].references == ["sha256:aaaaaaaaaaa3"]
+    assert plan.images[1].references == [f"python:{TEMPORARY_TAG}"]
+    assert plan.size == 300
+
+    plan = prune.plan("demo", ["api", "web"], keep=1)
+    assert [image.id for image in plan.images] == ["aaaaaaaaaaa2", "aaaaaaaaaaa3", "ddddddddddd1"]
+
+
+def test_images_replaced_by_unlabeled_builds_are_found(docker, monkeypatch):
+    # aladdin build moved the demo-web:local tag from the unlabeled fffffffffff2 to fffffffffff1
+    assert "fffffffffff2" not in [image.id for image in prune.plan("demo", ["web"]).images]
+    monkeypatch.setitem(docker, "demo-web:local", docker["fffffffffff2"])
+    prune.record_replaced("demo", {"web": "demo-web:local"})
+    monkeypatch.delitem(docker, "demo-web:local")
+
+    plan = prune.plan("demo", ["api", "web"], keep=1)
+    assert [(image.id, image.component, image.tag) for image in plan.images] == [
+        ("aaaaaaaaaaa2", "api", "local"),
+        ("aaaaaaaaaaa3", "api", "local"),
+        ("fffffffffff2", "web", "local"),
+        ("ddddddddddd1", "", ""),
+    ]
+    assert all(image.id != "fffffffffff2" for image in prune.plan("other", ["web"]).images)
+
+
+def test_parents_of_kept_images_are_kept(docker):
+    docker["aaaaaaaaaaa1"]["Parent"] = "sha256:aaaaaaaaaaa3"
+    plan = prune.plan("demo", ["api"], keep=1)
+    assert [image.id for image in plan.images] == ["aaaaaaaaaaa2", "ddddddddddd1"]
+
+
+def test_old_build_files_are_found(docker):
+    build_dir = get_cache_dir("build")
+    for age, name in enumerate(
+        ["Dockerfile-0123456789ab", "Dockerfile-ba9876543210", "docker-bake-0123456789ab.json"]
+    ):
+        (build_dir / name).write_text(name)
+        os.utime(build_dir / name, (1000 - age, 1000 - age))
+    (build_dir / "docker-bake.json").write_text("{}")
+
+    plan = prune.plan("demo", ["api"], keep=1)
+    assert plan.build_files == [build_dir / "Dockerfile-ba9876543210"]
+
+
+def test_temporary_tags_age_by_the_time_they_record():
+    assert prune._is_stale(TEMPORARY_TAG)
+    assert not prune._is_stale(TEMPORARY_TAG.replace(str(EXITED_PID), str(os.getpid())))
+
+    # The image a fresh temporary tag names is usually much older than the tag
+    tag = images.get_temporary_tag("python:3.8-slim", "extractor").split(":", 1)[1]
+    assert not prune._is_stale(tag.replace(f"-{os.getpid()}-", f"-{EXITED_PID}-"))
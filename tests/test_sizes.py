@@ -0,0 +1,77 @@
+import json
+import subprocess
+
+import pytest
+
+from aladdin_project_tools import images, sizes
+
+HISTORY = [
+    {"ID": "sha256:top", "Size": "120", "CreatedBy": "COPY components/api /code/components/api"},
+    {"ID": "sha256:dep", "Size": "30", "CreatedBy": "COPY --from=shared /code /code/shared"},
+    {"ID": "sha256:pip", "Size": "5000", "CreatedBy": "RUN pip install -r requirements.txt"},
+    {"ID": "sha256:apt", "Size": "700", "CreatedBy": "RUN apt-get update && apt-get install curl"},
+    {"ID": "sha256:env", "Size": "0", "CreatedBy": "ENV PYTHONPATH=/code"},
+    {"ID": "<missing>", "Size": "40000", "CreatedBy": "/bin/sh -c #(nop) ADD file:abc in /"},
+]
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    """A fake docker CLI with the demo-api:local image, whose history is ``HISTORY``."""
+
+    def run(cmd, capture_output=False, check=False):
+        assert cmd[:2] == ["docker", "history"]
+        stdout = "".join(json.dumps(entry) + "\n" for entry in HISTORY) + "\n"
+        return subprocess.CompletedProcess(cmd, 0, stdout.encode(), b"")
+
+    monkeypatch.setattr(images.subprocess, "run", run)
+    monkeypatch.setattr(
+        images,
+        "inspect_images",
+        lambda refs: {
+            ref: {"Id": "sha256:api", "Size": 45850} if ref == "demo-api:local" else None
+            for ref in refs
+        },
+    )
+
+
+def test_history_sizes_are_parsed():
+    assert images.parse_size("12.3MB") == 12300000
+    assert images.parse_size("1.5 kB") == 1500
+    assert images.parse_size("2GiB") == 2000000000
+    assert images.parse_size("0B") == 0
+    assert images.parse_size("unknown") == 0
+    assert images.format_bytes(45850) == "45.9 KB"
+    assert images.format_bytes(-512) == "-512 B"
+
+
+def test_layers_are_attributed_to_what_put_them_there(docker):
+    config = {"dependencies": ["shared"], "image": {"packages": ["curl"]}}
+    reports = sizes.analyze("demo", {"api": config, "web": {}}, jobs=2)
+
+    assert list(reports) == ["api"]
+    report = reports["api"]
+    assert (report["image"], report["id"]) == ("demo-api:local", "sha256:api")
+    assert report["size"] == 45850
+    assert [layer["size"] for layer in report["layers"]] == [120, 30, 5000, 700, 0, 40000]
+    assert report["attribution"] == {
+        sizes.COMPONENT: 120,
+        f"{sizes.DEPENDENCY_PREFIX}shared": 30,
+        sizes.PYTHON_PACKAGES: 5000,
+        sizes.OS_PACKAGES: 700,
+        sizes.OTHER: 0,
+        sizes.BASE: 40000,
+    }
+
+
+def test_reports_are_stored_and_compared():
+    sizes.save_report({"api": {"size": 1000}, "web": {"size": 500}}, "baseline")
+    previous = sizes.load_report("baseline")
+    assert sizes.load_report("latest") == previous
+
+    current = {"api": {"size": 1200}, "web": {"size": 510}, "new": {"size": 1}}
+    regressions = sizes.compare(current, previous, 5)
+    assert regressions == [sizes.Regression("api", 1000, 1200)]
+    assert regressions[0].growth == 20.0
+    with pytest.raises(FileNotFoundError):
+        sizes.load_report("missing")
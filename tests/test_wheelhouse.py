@@ -0,0 +1,148 @@
+import pytest
+
+from aladdin_project_tools import wheelhouse
+
+# Written by poetry 1.1, with the file hashes under [metadata.files]
+LOCK_1_1 = r"""
+[[package]]
+name = "attrs"
+version = "21.4.0"
+description = "Classes Without Boilerplate"
+category = "main"
+optional = false
+python-versions = ">=2.7, !=3.0.*, !=3.1.*"
+
+[package.extras]
+dev = ["coverage[toml] (>=5.0.2)", "hypothesis", "pytest (>=4.3.0)"]
+
+[[package]]
+name = "Zope.Interface"
+version = "5.4.0"
+description = "Interfaces for Python, \"the\" way"
+category = "dev"
+optional = false
+python-versions = ">=2.7"
+
+[package.dependencies]
+setuptools = "*"
+colorama = {version = "*", markers = "sys_platform == \"win32\""}
+
+[metadata]
+lock-version = "1.1"
+python-versions = "^3.7"
+content-hash = "0123abcd"
+
+[metadata.files]
+attrs = [
+    {file = "attrs-21.4.0-py2.py3-none-any.whl", hash = "sha256:aaa"},
+    {file = "attrs-21.4.0.tar.gz", hash = "sha256:bbb"},
+]
+"zope.interface" = [{file = "zope.interface-5.4.0.tar.gz", hash = "sha256:zzz"}]
+"""
+
+# Written by poetry 1.5+, with a files list for each package
+LOCK_2_0 = r"""
+# This file is automatically @generated by Poetry 1.5.1 and should not be changed by hand.
+
+[[package]]
+name = "attrs"
+version = "21.4.0"
+description = "Classes Without Boilerplate"
+optional = false
+python-versions = ">=2.7"
+files = [
+    {file = "attrs-21.4.0-py2.py3-none-any.whl", hash = "sha256:aaa"},
+    {file = "attrs-21.4.0.tar.gz", hash = "sha256:bbb"},
+]
+
+[package.extras]
+tests = ["pytest (>=4.3.0)", "zope.interface"]
+
+[[package]]
+name = "colorama"
+version = "0.4.6"
+description = "Cross-platform colored terminal text: café \\ \U0001F600"
+optional = false
+python-versions = "!=3.0.*, !=3.1.*"
+groups = ["main"]
+markers = "sys_platform == \"win32\" or platform_system == 'Windows'"
+files = [
+    {file = "colorama-0.4.6-py2.py3-none-any.whl", hash = "sha256:ccc"},
+]
+
+[metadata]
+lock-version = "2.0"
+python-versions = "^3.8"
+content-hash = "4567cdef"
+"""
+
+
+@pytest.mark.parametrize("content", [LOCK_1_1, LOCK_2_0], ids=["1.1", "2.0"])
+def test_lock_files_parse_as_with_a_full_toml_parser(content):
+    tomllib = pytest.importorskip("tomllib")
+    assert wheelhouse._parse_lock_toml(content) == tomllib.loads(content)
+
+
+def test_values_are_parsed():
+    content = r"""
+    multi = [
+        "a, b",  # commas in strings
+        'c]',
+        ["nested", {inline = "table"}],
+    ]
+    escapes = ["quote \" comma, ", "backslash \\", 'literal \n']
+    "quoted.key" = {version = ">=1", optional = true, count = 2, ratio = 0.5}
+    """
+    assert wheelhouse._parse_lock_toml(content) == {
+        "multi": ["a, b", "c]", ["nested", {"inline": "table"}]],
+        "escapes": ['quote " comma, ', "backslash \\", "literal \\n"],
+        "quoted.key": {"version": ">=1", "optional": True, "count": 2, "ratio": 0.5},
+    }
+
+
+@pytest.mark.parametrize("content", [LOCK_1_1, LOCK_2_0], ids=["1.1", "2.0"])
+def test_pins_are_read_from_both_lock_formats(tmp_path, monkeypatch, content):
+    monkeypatch.setattr(wheelhouse, "_load_toml", wheelhouse._parse_lock_toml)
+    (tmp_path / "poetry.lock").write_text(content, encoding="utf-8")
+
+    pins = wheelhouse.parse_poetry_lock(tmp_path / "poetry.lock")
+    assert pins[0] == wheelhouse.Pin("attrs", "21.4.0", ("sha256:aaa", "sha256:bbb"))
+    if content is LOCK_1_1:
+        zope = wheelhouse.Pin("Zope.Interface", "5.4.0", ("sha256:zzz",), category="dev")
+        assert pins[1] == zope
+    else:
+        assert pins[1].markers == "sys_platform == \"win32\" or platform_system == 'Windows'"
+
+
+def test_identical_pins_are_deduped_and_conflicts_reported(tmp_path):
+    locks = {}
+    for component, requests_version in [("api", "2.25.1"), ("web", "2.25.1"), ("jobs", "2.26.0")]:
+        locks[component] = tmp_path / f"{component}.lock"
+        locks[component].write_text(
+            "\n".join(
+                [
+                    "[[package]]",
+                    'name = "Requests"' if component == "web" else 'name = "requests"',
+                    f'version = "{requests_version}"',
+                    "[[package]]",
+                    'name = "idna"',
+                    'version = "3.1"',
+                    'files = [{file = "idna-3.1.tar.gz", hash = "sha256:idna"}]',
+                ]
+            )
+        )
+
+    pins, conflicts = wheelhouse.collect_pins(locks)
+    idna = wheelhouse.Pin("idna", "3.1", ("sha256:idna",))
+    assert pins[idna] == {"api", "web", "jobs"}
+    assert pins[wheelhouse.Pin("requests", "2.25.1", ())] == {"api"}
+    assert conflicts == [
+        wheelhouse.Conflict("requests", {"2.25.1": {"api", "web"}, "2.26.0": {"jobs"}})
+    ]
+
+    # Differently spelled names are the same package, so each one is only built once
+    assert [pin.key for pin in wheelhouse.get_missing(pins, "3.8")] == [
+        "idna==3.1",
+        "requests==2.25.1",
+        "requests==2.26.0",
+    ]